@@ -0,0 +1,147 @@
+"""
+Benchmark engine for the performance tabs
+Vectorized group KPIs, engagement quartiles and close-rate confidence
+intervals, cached per dataset and cohort version (in memory, and on disk
+through the cohort cache)
+"""
+
+import pandas as pd
+import numpy as np
+from utils import shared_aggregate
+from segmentation_core.intervals import close_rate_intervals, interval_settings, add_close_rate_intervals
+from segmentation_core.metrics import group_kpis
+
+QUARTILE_LEVELS = [0.25, 0.5, 0.75, 0.9]
+QUARTILE_LABELS = ['Q1 (Bottom 25%)', 'Q2 (25-50%)', 'Q3 (50-75%)', 'Q4 (75-90%)', 'Top 10%']
+
+def group_performance(cohort, group_col, columns):
+    """
+    Compute a compact performance table (count, session/engagement means, closed).
+
+    Args:
+        cohort: Cohort dataframe
+        group_col: Column (or aligned Series) to group by
+        columns: Display names for [count, avg sessions, avg engagement, closed]
+    """
+    performance = cohort.groupby(group_col, observed=True).agg(
+        count=('contact_id', 'count'),
+        avg_sessions=('num_sessions', 'mean'),
+        avg_engagement=('engagement_score', 'mean'),
+        closed=('close_date', 'count')
+    ).round(2)
+    performance.columns = columns
+    return performance
+
+def engagement_quartiles(scores):
+    """
+    Assign each score to an engagement quartile bucket without copying the cohort.
+
+    Buckets are right-closed (score <= threshold), matching the original
+    Q1/Q2/Q3/Q4/Top 10% definitions.
+
+    Returns:
+        (categorical Series aligned with `scores`, thresholds Series)
+    """
+    thresholds = scores.quantile(QUARTILE_LEVELS)
+    codes = np.searchsorted(thresholds.to_numpy(), scores.to_numpy(dtype='float64', na_value=np.nan), side='left')
+    codes = np.where(scores.isna().to_numpy(), -1, codes)
+    buckets = pd.Series(
+        pd.Categorical.from_codes(codes, categories=QUARTILE_LABELS, ordered=True),
+        index=scores.index,
+        name='engagement_quartile'
+    )
+    return buckets, thresholds
+
+def quartile_close_rates(cohort, score_col='engagement_score'):
+    """Close rate per engagement quartile bucket"""
+    buckets, thresholds = engagement_quartiles(cohort[score_col])
+    quartile_analysis = cohort.groupby(buckets, observed=True).agg(
+        Count=('contact_id', 'count'),
+        Closed=('close_date', 'count')
+    )
+    quartile_analysis['Close Rate %'] = (quartile_analysis['Closed'] / quartile_analysis['Count'] * 100).round(1)
+    add_close_rate_intervals(quartile_analysis, cohort, buckets, ['CI Low %', 'CI High %'])
+    quartile_analysis.index = quartile_analysis.index.astype(str)
+    return quartile_analysis, thresholds
+
+def _benchmarks_c1(cohort):
+    """Benchmark tables for Cluster 1"""
+    benchmark_metrics = group_kpis(
+        cohort, 'segment_engagement',
+        ['num_sessions', 'num_pageviews', 'forms_submitted', 'social_clicks_total', 'engagement_score']
+    )
+
+    platform_performance = group_performance(
+        cohort, 'platform_tag', ['Count', 'Avg Sessions', 'Avg Engagement', 'Closed']
+    )
+    platform_performance['Close Rate %'] = (platform_performance['Closed'] / platform_performance['Count'] * 100).round(1)
+    add_close_rate_intervals(platform_performance, cohort, 'platform_tag', ['CI Low %', 'CI High %'])
+    platform_performance = platform_performance.sort_values('Close Rate %', ascending=False).head(15)
+
+    quartile_analysis, thresholds = quartile_close_rates(cohort)
+
+    return {
+        'benchmark_metrics': benchmark_metrics,
+        'platform_performance': platform_performance,
+        'quartile_analysis': quartile_analysis,
+        'quartile_thresholds': thresholds,
+    }
+
+def _benchmarks_c2(cohort):
+    """Benchmark tables for Cluster 2"""
+    benchmark_metrics = group_kpis(
+        cohort, 'segment_c2',
+        ['num_sessions', 'num_pageviews', 'forms_submitted', 'engagement_score']
+    )
+
+    columns = ['Conteo', 'Sesiones Prom', 'Compromiso Prom', 'Cerrados']
+    geo_performance = group_performance(cohort, 'geo_tier', columns)
+    geo_performance['Tasa de Cierre %'] = (geo_performance['Cerrados'] / geo_performance['Conteo'] * 100).round(1)
+    add_close_rate_intervals(geo_performance, cohort, 'geo_tier', ['IC Inf %', 'IC Sup %'])
+
+    # Restrict to top countries through a boolean mask instead of a filtered copy
+    top_countries = cohort['country_any'].value_counts().head(15).index
+    country_key = cohort['country_any'].where(cohort['country_any'].isin(top_countries))
+    country_performance = group_performance(cohort, country_key, columns)
+    country_performance.index.name = 'country_any'
+    country_performance['Tasa de Cierre %'] = (country_performance['Cerrados'] / country_performance['Conteo'] * 100).round(1)
+    add_close_rate_intervals(country_performance, cohort, country_key, ['IC Inf %', 'IC Sup %'])
+    country_performance = country_performance.sort_values('Tasa de Cierre %', ascending=False)
+
+    ttc_by_geo = None
+    if 'days_to_close' in cohort.columns:
+        ttc_by_geo = cohort.groupby('geo_tier', observed=True).agg(
+            mean=('days_to_close', 'mean'),
+            median=('days_to_close', 'median'),
+            count=('days_to_close', 'count')
+        ).round(1)
+        ttc_by_geo = ttc_by_geo[ttc_by_geo['count'] > 0]
+        ttc_by_geo.columns = ['Días Prom', 'Días Mediana', 'Conteo Cerrados']
+
+    return {
+        'benchmark_metrics': benchmark_metrics,
+        'geo_performance': geo_performance,
+        'country_performance': country_performance,
+        'ttc_by_geo': ttc_by_geo,
+    }
+
+def compute_benchmarks_c1(cohort, version):
+    """Benchmark tables for Cluster 1, cached per dataset and cohort version"""
+    return shared_aggregate('benchmarks_c1', (version, interval_settings()), lambda: _benchmarks_c1(cohort))
+
+def compute_benchmarks_c2(cohort, version):
+    """Benchmark tables for Cluster 2, cached per dataset and cohort version"""
+    return shared_aggregate('benchmarks_c2', (version, interval_settings()), lambda: _benchmarks_c2(cohort))
+
+def compute_close_rate_intervals(cohort, version, group_col):
+    """close_rate_intervals of a cohort column, cached per dataset and cohort version"""
+    return shared_aggregate(
+        f'close_rate_ci_{group_col}', (version, interval_settings()),
+        lambda: close_rate_intervals(cohort, group_col)
+    )
+
+def interval_caption():
+    """Caption for charts with close-rate error bars"""
+    method, confidence, resamples = interval_settings()
+    detail = f"bootstrap de {resamples:,} remuestreos" if method == 'bootstrap' else "método de Wilson"
+    return f"Barras de error: intervalo de confianza del {confidence:.0%} de la tasa de cierre ({detail})."
@@ -0,0 +1,147 @@
+"""
+Comparación entre Campus
+Compares the three segmentations across campuses from the partitioned output
+of scripts/run_campus_segmentation.py, without loading any campus export
+"""
+
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+
+import campus_store
+from utils import display_metrics
+
+CLUSTER_LABELS = {
+    'cluster1': "📱 Cluster 1: Compromiso Social",
+    'cluster2': "🌍 Cluster 2: Geografía y Compromiso",
+    'cluster3': "🎪 Cluster 3: Actividades APREU",
+}
+
+# Contact-level columns compared as shares per campus
+SHARE_COLUMNS = {
+    'cluster1': ('platform_tag', "Plataforma"),
+    'cluster2': ('geo_tier', "Nivel geográfico"),
+    'cluster3': ('entry_channel', "Canal de entrada"),
+}
+
+@st.cache_data(show_spinner=False)
+def _campus_overview(version, root):
+    """One row per campus: local region and funnel counts (cluster 2 stages, else the first cluster run)"""
+    funnel = campus_store.read_table("funnel", root=root)
+    rows = []
+    for meta in campus_store.campuses(root):
+        counts = funnel[funnel['campus'] == meta['campus']]
+        if counts.empty:
+            continue
+        cluster = 'cluster2' if (counts['cluster'] == 'cluster2').any() else counts['cluster'].iloc[0]
+        stages = counts[counts['cluster'] == cluster].set_index('stage')['count']
+        cleaned = int(stages.get('cleaned', 0))
+        closed = int(stages.get('closed', 0))
+        rows.append({
+            'Campus': meta['campus'],
+            'Región Local': meta['geo_config']['local_region'],
+            'Contactos': int(stages.get('total', meta['contacts'])),
+            'APREU': int(stages.get('apreu', 0)),
+            'Trabajables': cleaned,
+            'Cerrados': closed,
+            'Tasa de Cierre (%)': round(closed / cleaned * 100, 1) if cleaned else 0.0,
+        })
+    return pd.DataFrame(rows)
+
+@st.cache_data(show_spinner=False)
+def _cluster_summary(version, root, cluster):
+    return campus_store.read_table("summary", cluster=cluster, root=root)
+
+@st.cache_data(show_spinner=False)
+def _column_shares(version, root, cluster, column):
+    return campus_store.column_shares(cluster, column, root=root)
+
+def render_campus_comparison():
+    """Render the cross-campus comparison page"""
+
+    st.markdown("## 🏫 Comparación entre Campus")
+
+    root = campus_store.CAMPUS_OUTPUT_DIR
+    version = campus_store.store_version(root)
+    if not version:
+        st.info(f"""
+        **No hay resultados por campus en `{root}`.**
+
+        Procesa las exportaciones de cada campus (cada una con su región local) con:
+
+        `python scripts/run_campus_segmentation.py campuses.json`
+
+        Consulta `docs/guides/BATCH_SEGMENTATION_GUIDE.md` para el formato del manifiesto.
+        """)
+        return
+
+    overview = _campus_overview(version, root)
+    if overview.empty:
+        st.warning("⚠️ Los resultados por campus están incompletos. Vuelve a ejecutar el procesamiento por campus.")
+        return
+
+    display_metrics({
+        "Campus": f"{len(overview)}",
+        "Contactos Totales": f"{overview['Contactos'].sum():,}",
+        "Trabajables": f"{overview['Trabajables'].sum():,}",
+        "Tasa de Cierre Global": f"{overview['Cerrados'].sum() / max(overview['Trabajables'].sum(), 1) * 100:.1f}%",
+    })
+
+    st.markdown("### 📊 Pipeline por Campus")
+    st.dataframe(overview, hide_index=True, use_container_width=True)
+
+    fig = px.bar(
+        overview, x='Campus', y='Tasa de Cierre (%)', color='Región Local',
+        title="Tasa de Cierre por Campus", text='Tasa de Cierre (%)'
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.markdown("---")
+    available = [c for c in CLUSTER_LABELS if not _cluster_summary(version, root, c).empty]
+    if not available:
+        return
+    cluster = st.radio(
+        "Segmentación:", available, format_func=CLUSTER_LABELS.get,
+        horizontal=True, key="campus_cluster"
+    )
+    summary = _cluster_summary(version, root, cluster)
+
+    st.markdown("### 🧩 Mezcla de Segmentos por Campus")
+    mix = summary.pivot_table(index='campus', columns='segment', values='contact_id_count', aggfunc='sum', fill_value=0)
+    mix_pct = mix.div(mix.sum(axis=1), axis=0).mul(100).round(1)
+    fig = px.bar(
+        mix_pct.reset_index().melt(id_vars='campus', var_name='Segmento', value_name='% de Contactos'),
+        x='campus', y='% de Contactos', color='Segmento',
+        title="Distribución de Segmentos (% de contactos de cada campus)",
+        labels={'campus': 'Campus'}
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.markdown("### 🎯 Tasa de Cierre por Segmento y Campus")
+    fig = px.bar(
+        summary, x='segment', y='close_rate_pct', color='campus', barmode='group',
+        labels={'segment': 'Segmento', 'close_rate_pct': 'Tasa de Cierre (%)', 'campus': 'Campus'}
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(
+        summary.pivot_table(index='segment', columns='campus', values='close_rate_pct').round(1),
+        use_container_width=True
+    )
+
+    column, label = SHARE_COLUMNS[cluster]
+    shares = _column_shares(version, root, cluster, column)
+    if not shares.empty:
+        st.markdown(f"### 🔎 {label} por Campus")
+        fig = px.bar(
+            shares.round(1).reset_index().melt(id_vars='campus', var_name=label, value_name='% de Contactos'),
+            x='campus', y='% de Contactos', color=label, labels={'campus': 'Campus'}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    with st.expander("⏱️ Ejecuciones por Campus", expanded=False):
+        runs = pd.DataFrame([
+            {'Campus': m['campus'], 'Exportación': m['export_path'], 'Contactos': m['contacts'],
+             'Segundos': m['total_seconds']}
+            for m in campus_store.campuses(root)
+        ])
+        st.dataframe(runs, hide_index=True, use_container_width=True)
@@ -0,0 +1,127 @@
+"""
+Campus Store Module
+Partitioned output of multi-campus batch runs (scripts/run_campus_segmentation.py)
+and the cross-campus reads behind the comparison page.
+
+Layout under CAMPUS_OUTPUT_DIR (Hive-style partitions, readable as one
+dataset by pyarrow, DuckDB or BigQuery):
+
+    segments/cluster=<clusterN>/campus=<campus>/part-0.parquet   one row per contact
+    summary/cluster=<clusterN>/campus=<campus>/part-0.parquet    one row per segment
+    funnel/campus=<campus>/part-0.parquet                        stage counts per cluster
+    campuses/<campus>.json                                       geo config, contacts, timings
+
+Each campus partition is written under a temporary name and renamed into
+place, so re-running one campus replaces only its partitions and readers
+never see a partial file. The small tables (summary, funnel) are read for
+every campus at once; contact-level columns are aggregated one campus
+partition at a time, so comparisons never hold every campus in memory.
+"""
+
+from pathlib import Path
+from urllib.parse import quote, unquote
+import json
+import os
+import shutil
+import uuid
+
+import pandas as pd
+
+APP_DIR = Path(__file__).resolve().parent
+
+# Root of the partitioned multi-campus output
+CAMPUS_OUTPUT_DIR = os.getenv("CAMPUS_OUTPUT_DIR", str(APP_DIR.parent / "exports" / "campus"))
+
+PART_FILE = "part-0.parquet"
+
+def _partition_value(value):
+    # Campus names may carry spaces or accents ("San Luis Potosí")
+    return quote(str(value), safe='')
+
+def partition_dir(root, table, campus, cluster=None):
+    """Directory of one campus (and cluster) partition of `table`"""
+    path = Path(root) / table
+    if cluster is not None:
+        path = path / f"cluster={cluster}"
+    return path / f"campus={_partition_value(campus)}"
+
+def write_partition(root, table, frame, campus, cluster=None):
+    """Write `frame` as the campus partition of `table`, replacing the previous one"""
+    target = partition_dir(root, table, campus, cluster)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.parent / f".tmp-{target.name}-{uuid.uuid4().hex[:8]}"
+    tmp.mkdir()
+    try:
+        frame.to_parquet(tmp / PART_FILE, index=False)
+        doomed = target.parent / f".del-{target.name}-{uuid.uuid4().hex[:8]}"
+        if target.exists():
+            os.rename(target, doomed)
+        os.rename(tmp, target)
+        shutil.rmtree(doomed, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return target / PART_FILE
+
+def write_campus_meta(root, campus, meta):
+    """Record the geo config, contact counts and timings of a campus run"""
+    directory = Path(root) / "campuses"
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / f"{_partition_value(campus)}.json", "w", encoding="utf-8") as f:
+        json.dump({'campus': campus, **meta}, f, ensure_ascii=False, indent=2)
+
+def campuses(root=None):
+    """Metadata of every campus in the store, sorted by campus name"""
+    directory = Path(root or CAMPUS_OUTPUT_DIR) / "campuses"
+    if not directory.is_dir():
+        return []
+    metas = []
+    for path in directory.glob("*.json"):
+        with open(path, encoding="utf-8") as f:
+            metas.append(json.load(f))
+    return sorted(metas, key=lambda m: m['campus'])
+
+def store_version(root=None):
+    """Fingerprint of the store (campus runs and their times), for keying cached reads"""
+    directory = Path(root or CAMPUS_OUTPUT_DIR) / "campuses"
+    if not directory.is_dir():
+        return ()
+    return tuple(sorted((path.name, path.stat().st_mtime_ns) for path in directory.glob("*.json")))
+
+def _campus_parts(root, table, cluster=None):
+    """(campus, parquet file) of each partition of `table`"""
+    directory = Path(root or CAMPUS_OUTPUT_DIR) / table
+    if cluster is not None:
+        directory = directory / f"cluster={cluster}"
+    if not directory.is_dir():
+        return []
+    parts = []
+    for path in sorted(directory.glob(f"campus=*/{PART_FILE}")):
+        parts.append((unquote(path.parent.name[len("campus="):]), path))
+    return parts
+
+def read_table(table, cluster=None, root=None, columns=None):
+    """Every campus partition of a small table (summary, funnel) with a `campus` column"""
+    frames = []
+    for campus, path in _campus_parts(root, table, cluster):
+        frame = pd.read_parquet(path, columns=columns)
+        frame.insert(0, 'campus', campus)
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=['campus'] + list(columns or []))
+    return pd.concat(frames, ignore_index=True)
+
+def column_shares(cluster, column, root=None):
+    """
+    Percent of each value of a contact-level column per campus, as a
+    [campus x value] table.
+
+    Reads only `column` from one campus partition at a time.
+    """
+    shares = {}
+    for campus, path in _campus_parts(root, "segments", cluster):
+        values = pd.read_parquet(path, columns=[column])[column]
+        shares[campus] = values.value_counts(normalize=True).mul(100)
+    if not shares:
+        return pd.DataFrame()
+    return pd.DataFrame(shares).T.fillna(0).rename_axis('campus')
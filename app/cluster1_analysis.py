@@ -3,6 +3,8 @@ Cluster 1: Prospectos Socialmente Comprometidos
 Identifica y segmenta prospectos con actividad en redes sociales usando análisis de datos históricos
 """
 
+import os
+
 import streamlit as st
 import pandas as pd
 import numpy as np
@@ -11,321 +13,126 @@ import plotly.graph_objects as go
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 from matplotlib.patches import FancyBboxPatch, FancyArrowPatch
-from collections import Counter
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
 from utils import (
-    hist_latest, hist_all, hist_concat_text, normalize_text,
+    hist_latest, hist_all,
     create_segment_pie_chart, create_bar_chart, create_funnel_chart,
-    calculate_close_rate, calculate_days_to_close, categorize_ttc,
-    display_metrics, create_download_button, display_dataframe_with_style
+    calculate_close_rate,
+    display_metrics, create_download_button, display_dataframe_with_style,
+    create_box_plot,
+    get_cohort_version, render_section_selector, memoize_section, shared_cohort,
+    shared_history, run_key, load_model_state, save_model_state
 )
+from benchmarks import compute_benchmarks_c1, interval_caption
+from pipeline_metrics import get_funnel_counts, format_funnel, PipelineTimer
+from segmentation_core import PLATFORM_KEYWORDS, build_cluster1_cohort, parse_k_values
+from segmentation_core.incremental import MODEL_PREFIX
+from path_analysis import render_path_analysis
 
-# Platform keywords dictionary
-PLATFORM_KEYWORDS = {
-    'Facebook': ['facebook', 'fb.com', 'facebook.com', 'facebook ads', 'facebook lead ads', 'fb ads', 'meta ads', 'fb.me'],
-    'Instagram': ['instagram', 'ig.com', 'instagram.com', 'instagram ads', 'ig ads', 'insta', 'instagr.am'],
-    'LinkedIn': ['linkedin', 'linkedin.com', 'linkedin ads', 'lnkd.in', 'linked in'],
-    'Twitter': ['twitter', 'twitter.com', 'x.com', 'twitter ads', 't.co', 'tweet', 'x ads'],
-    'TikTok': ['tiktok', 'tiktok.com', 'tiktok ads', 'tt ads', 'tik tok'],
-    'YouTube': ['youtube', 'youtube.com', 'youtu.be', 'youtube ads', 'yt.com', 'youtube.mx'],
-    'Google_Ads': ['google ads', 'google adwords', 'adwords', 'googleads', 'paid_search', 'cpc', 'ppc', 'sem'],
-    'Eventbrite': ['eventbrite', 'eventbrite.com', 'eventbrite.mx', 'evbuc.com'],
-    'WhatsApp': ['whatsapp', 'whatsapp.com', 'wa.me', 'whatsapp business'],
-    'MAKE': ['make.com', 'make', 'integromat'],
-    'AtomChat': ['atomchat', 'atom chat'],
-    'Organic_Social': ['organic_social', 'organic social', 'social']
-}
-
-def detect_platforms_in_text(text, platform_keywords=PLATFORM_KEYWORDS):
-    """Search for platform keywords in text and return a Counter of platform mentions"""
-    if pd.isna(text) or text == "":
-        return Counter()
-    
-    text_lower = str(text).lower()
-    platform_counts = Counter()
-    
-    for platform, keywords in platform_keywords.items():
-        for keyword in keywords:
-            keyword_lower = keyword.lower()
-            count = text_lower.count(keyword_lower)
-            if count > 0:
-                platform_counts[platform] += count
-    
-    return platform_counts
-
-def extract_platform_signals(row, text_columns):
-    """Extract platform signals from multiple text columns for a single row"""
-    all_counts = Counter()
-    
-    for col in text_columns:
-        if col in row.index and pd.notna(row[col]):
-            text = row[col]
-            counts = detect_platforms_in_text(text)
-            all_counts.update(counts)
-    
-    return all_counts
-
-def detect_offline_source(text):
-    """Check if text contains 'offline' indicator"""
-    if pd.isna(text) or text == "":
-        return False
-    
-    text_lower = str(text).lower()
-    return 'offline' in text_lower
-
-def count_offline_mentions(text):
-    """Count total number of offline mentions in historical data"""
-    if pd.isna(text) or text == "":
-        return 0
-    
-    text_lower = str(text).lower()
-    return text_lower.count('offline')
+# Candidate numbers of engagement segments (e.g. "3-6"); empty keeps the fixed
+# 1A/1B split. The page's automatic k selection toggle overrides it
+CLUSTER1_K_SWEEP = parse_k_values(os.getenv("CLUSTER1_K_SWEEP", ""))
+K_SWEEP_RANGE = (2, 10)
+# Engagement segment colors: 1A green, 1B red, the 1M segments (k > 2) in between
+SEGMENT_COLORS = {'1A': '#2ecc71', '1B': '#e74c3c'}
+MIDDLE_SEGMENT_COLORS = ['#f39c12', '#f1c40f', '#e67e22', '#3498db', '#9b59b6', '#1abc9c', '#95a5a6', '#34495e']
 
-@st.cache_data
-def process_cluster1_data(_data, cache_key=None):
-    """Process data for Cluster 1 analysis
+def process_cluster1_data(_data, cache_key=None, k_values=()):
+    """Process data for Cluster 1 analysis (shared read-only cohort, see shared_cohort)
     
     Args:
-        _data: Input dataframe (underscore prevents caching on this param)
-        cache_key: String to bust cache when filters change (NO underscore = used for cache hashing)
+        _data: Input dataframe
+        cache_key: Pipeline run identifier (funnel counts are recorded under it)
+        k_values: Candidate numbers of engagement segments (k_sweep_values);
+            empty for the fixed 1A/1B split
     """
-    
-    df = _data.copy()
-    
-    # Column mapping
-    column_map = {
-        'Record ID': 'contact_id',
-        'Broadcast Clicks': 'broadcast_clicks',
-        'LinkedIn Clicks': 'linkedin_clicks',
-        'Twitter Clicks': 'twitter_clicks',
-        'Facebook Clicks': 'facebook_clicks',
-        'Number of Sessions': 'num_sessions',
-        'Number of Pageviews': 'num_pageviews',
-        'Number of Form Submissions': 'forms_submitted',
-        'Original Source': 'original_source',
-        'Original Source Drill-Down 1': 'original_source_d1',
-        'Original Source Drill-Down 2': 'original_source_d2',
-        'Canal de adquisición': 'canal_de_adquisicion',
-        'Latest Traffic Source': 'latest_source',
-        'Last Referring Site': 'last_referrer',
-        'Likelihood to close': 'likelihood_to_close',
-        'Create Date': 'create_date',
-        'Close Date': 'close_date',
-        'Lifecycle Stage': 'lifecycle_stage',
-        'Propiedad del contacto': 'propiedad_del_contacto'
-    }
-    
-    # Rename columns
-    df = df.rename(columns=column_map)
-    
-    # Apply hist_latest to get latest values
-    text_cols = ['original_source', 'original_source_d1', 'original_source_d2', 
-                 'canal_de_adquisicion', 'latest_source', 'last_referrer']
-    
-    for col in text_cols:
-        if col in df.columns:
-            df[f'{col}_latest'] = df[col].apply(hist_latest)
-            df[f'{col}_hist_all'] = df[col].apply(hist_concat_text)
-    
-    # Convert numeric columns
-    numeric_cols = ['broadcast_clicks', 'linkedin_clicks', 'twitter_clicks', 'facebook_clicks',
-                   'num_sessions', 'num_pageviews', 'forms_submitted', 'likelihood_to_close']
-    
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col].apply(hist_latest), errors='coerce').fillna(0)
-    
-    # Calculate total social clicks
-    click_cols = ['broadcast_clicks', 'linkedin_clicks', 'twitter_clicks', 'facebook_clicks']
-    df['social_clicks_total'] = df[[c for c in click_cols if c in df.columns]].sum(axis=1)
-    
-    # Filter for APREU contacts only
-    if 'propiedad_del_contacto' in df.columns:
-        df['propiedad_del_contacto'] = df['propiedad_del_contacto'].apply(hist_latest)
-        df = df[df['propiedad_del_contacto'].str.upper() == 'APREU'].copy()
-    
-    # Filter out "Other" and "subscriber" lifecycle stages
-    if 'lifecycle_stage' in df.columns:
-        df['lifecycle_stage'] = df['lifecycle_stage'].apply(hist_latest)
-        df = df[~df['lifecycle_stage'].str.lower().isin(['other', 'subscriber'])].copy()
-    
-    # Filter for paid_social and paid_search only
-    if 'original_source_latest' in df.columns:
-        df = df[df['original_source_latest'].str.lower().isin(['paid_social', 'paid_search'])].copy()
-    
-    # Extract platform signals from historical data
-    search_columns = [f'{c}_hist_all' for c in text_cols if f'{c}_hist_all' in df.columns]
-    search_columns += [f'{c}_latest' for c in text_cols if f'{c}_latest' in df.columns]
-    
-    platform_signals = df.apply(
-        lambda row: extract_platform_signals(row, search_columns), 
-        axis=1
-    )
-    
-    # Create platform count columns
-    for platform in PLATFORM_KEYWORDS.keys():
-        df[f'platform_count_{platform}'] = platform_signals.apply(
-            lambda counter: counter.get(platform, 0)
+    if not k_values:
+        return shared_cohort(
+            'cluster1', _data, lambda delta: build_cluster1_cohort(_data, funnel_key=cache_key, delta=delta, history=shared_history()),
+            cache_key, funnel_key=cache_key
         )
     
-    # Total platform mentions and diversity
-    platform_count_cols = [f'platform_count_{p}' for p in PLATFORM_KEYWORDS.keys()]
-    df['platform_mentions_total'] = df[platform_count_cols].sum(axis=1)
-    df['platform_diversity'] = (df[platform_count_cols] > 0).sum(axis=1)
+    context = ('k_sweep', tuple(k_values))
     
-    # Define socially engaged cohort
-    has_clicks = df['social_clicks_total'] > 0
-    has_platform_mentions = df['platform_mentions_total'] > 0
-    
-    social_keywords = ['facebook', 'instagram', 'linkedin', 'twitter', 'tiktok', 'youtube', 
-                      'social', 'fb', 'ig', 'ads', 'eventbrite', 'make', 'atomchat']
-    
-    def is_social_source(val):
-        if pd.isna(val):
-            return False
-        val_lower = str(val).lower()
-        return any(kw in val_lower for kw in social_keywords)
-    
-    has_social_source = False
-    for col in ['original_source_latest', 'original_source_d1_latest', 'original_source_d2_latest',
-                'canal_de_adquisicion_latest', 'latest_source_latest', 'last_referrer_latest']:
-        if col in df.columns:
-            has_social_source = has_social_source | df[col].apply(is_social_source)
-    
-    df['is_socially_engaged'] = has_clicks | has_platform_mentions | has_social_source
-    
-    # Filter to socially engaged cohort
-    cohort = df[df['is_socially_engaged']].copy()
-    
-    # Feature engineering
-    for col in ['social_clicks_total', 'num_sessions', 'num_pageviews', 'forms_submitted']:
-        if col in cohort.columns:
-            cohort[f'log_{col}'] = np.log1p(cohort[col])
-    
-    # Ratios
-    cohort['pageviews_per_session'] = cohort['num_pageviews'] / (1 + cohort['num_sessions'])
-    cohort['forms_per_session'] = cohort['forms_submitted'] / (1 + cohort['num_sessions'])
-    cohort['forms_per_click'] = cohort['forms_submitted'] / (1 + cohort['social_clicks_total'])
-    
-    # Replace inf/nan
-    for c in ['pageviews_per_session', 'forms_per_session', 'forms_per_click']:
-        cohort[c] = cohort[c].replace([np.inf, -np.inf], np.nan).fillna(0)
-    
-    # Clustering
-    feature_cols = [
-        'log_social_clicks_total', 'log_num_sessions',
-        'log_num_pageviews', 'log_forms_submitted',
-        'pageviews_per_session', 'forms_per_session', 'forms_per_click'
-    ]
-    
-    feature_cols = [c for c in feature_cols if c in cohort.columns]
-    
-    if len(cohort) > 0 and len(feature_cols) > 0:
-        X_num = cohort[feature_cols].fillna(0)
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X_num)
-        
-        kmeans = KMeans(n_clusters=2, random_state=42, n_init=10)
-        cohort['cluster'] = kmeans.fit_predict(X_scaled)
-        
-        # Calculate engagement scores
-        cohort['engagement_score'] = (
-            cohort.get('log_num_sessions', 0) +
-            cohort.get('log_num_pageviews', 0) +
-            cohort.get('log_forms_submitted', 0)
+    def build(delta):
+        # The chosen model and its diagnostics are kept per dataset version
+        models = load_model_state('cluster1', _data, *context)
+        cohort = build_cluster1_cohort(
+            _data, funnel_key=cache_key, delta=delta, history=shared_history(), k_values=k_values, models=models
         )
-        cohort['social_intensity'] = cohort.get('log_social_clicks_total', 0)
-        
-        # Label clusters
-        cluster_stats = (
-            cohort.groupby('cluster')[['engagement_score', 'social_intensity']]
-            .mean()
-            .assign(combined=lambda df: df['engagement_score'] + df['social_intensity'])
-        )
-        
-        cluster_1A = cluster_stats['combined'].idxmax()
-        cluster_1B = [c for c in cluster_stats.index if c != cluster_1A][0]
-        
-        label_map = {cluster_1A: '1A - Alto Compromiso', cluster_1B: '1B - Bajo Compromiso'}
-        cohort['segment_engagement'] = cohort['cluster'].map(label_map)
-        
-        # Platform tagging
-        def platform_tag(row):
-            platform_scores = {}
-            for platform in ['Facebook', 'Instagram', 'LinkedIn', 'Twitter', 'TikTok',
-                           'YouTube', 'Google_Ads', 'Eventbrite', 'WhatsApp', 'MAKE']:
-                count_col = f'platform_count_{platform}'
-                if count_col in row.index:
-                    platform_scores[platform] = row[count_col]
-            
-            if platform_scores:
-                dominant = max(platform_scores.items(), key=lambda x: x[1])
-                if dominant[1] > 0:
-                    return dominant[0]
-            
-            return 'Mixed'
-        
-        cohort['platform_tag'] = cohort.apply(platform_tag, axis=1)
-        cohort['segment_overlay'] = cohort['segment_engagement'] + ' + ' + cohort['platform_tag']
-    else:
-        cohort['segment_engagement'] = 'Unknown'
-        cohort['platform_tag'] = 'Unknown'
-        cohort['segment_overlay'] = 'Unknown'
-    
-    # Detect offline sources - using FULL HISTORICAL DATA for richer analysis
-    # Instead of just latest, we count ALL offline mentions across interaction history
-    
-    # Extract offline mention counts from historical data
-    offline_count_original = pd.Series(0, index=cohort.index)
-    offline_count_latest = pd.Series(0, index=cohort.index)
-    
-    # Check original source fields (full history)
-    for col in ['original_source_hist_all', 'original_source_d1_hist_all', 'original_source_d2_hist_all']:
-        if col in cohort.columns:
-            offline_count_original = offline_count_original + cohort[col].apply(count_offline_mentions)
-    
-    # Check latest source fields (full history) 
-    for col in ['latest_source_hist_all', 'last_referrer_hist_all']:
-        if col in cohort.columns:
-            offline_count_latest = offline_count_latest + cohort[col].apply(count_offline_mentions)
-    
-    # Total offline mentions across all history
-    cohort['offline_mentions_total'] = offline_count_original + offline_count_latest
-    cohort['has_offline_source'] = cohort['offline_mentions_total'] > 0
+        save_model_state('cluster1', _data, models, *context)
+        return cohort
     
-    # Classification based on where offline appears in journey
-    cohort['offline_type'] = 'Online'
-    cohort['offline_intensity'] = 'None'
-    
-    # Classify by offline touchpoints
-    has_original_offline = offline_count_original > 0
-    has_latest_offline = offline_count_latest > 0
-    
-    cohort.loc[has_original_offline & ~has_latest_offline, 'offline_type'] = 'Offline (Original Only)'
-    cohort.loc[~has_original_offline & has_latest_offline, 'offline_type'] = 'Offline (Latest Only)'
-    cohort.loc[has_original_offline & has_latest_offline, 'offline_type'] = 'Offline (Throughout)'
-    
-    # Intensity based on total mentions
-    cohort['offline_intensity'] = cohort['offline_mentions_total'].apply(
-        lambda x: 'None' if x == 0 else ('Low (1-2)' if x <= 2 else ('Medium (3-5)' if x <= 5 else 'High (6+)'))
+    return shared_cohort('cluster1', _data, build, cache_key, *context, funnel_key=cache_key)
+
+def engagement_segments(cohort):
+    """Engagement segments present in the cohort, ordered 1A, 1M..., 1B"""
+    rank = {'1A': 0, '1B': 2}
+    return sorted(cohort['segment_engagement'].dropna().unique(), key=lambda s: (rank.get(s[:2], 1), s))
+
+def engagement_color_map(segments):
+    """Color of every engagement segment (1A green, 1B red, 1M segments from MIDDLE_SEGMENT_COLORS)"""
+    middle = iter(MIDDLE_SEGMENT_COLORS * len(segments))
+    return {s: SEGMENT_COLORS.get(s[:2]) or next(middle) for s in segments}
+
+def segment_short_label(segment):
+    """'1A - Alto Compromiso' → '1A (Alto Compromiso)'"""
+    code, _, name = segment.partition(' - ')
+    return f"{code} ({name})" if name else code
+
+def k_sweep_values():
+    """Candidate k values selected on the Cluster 1 page (empty tuple: fixed 1A/1B split)"""
+    if not st.session_state.get('c1_k_sweep', bool(CLUSTER1_K_SWEEP)):
+        return ()
+    low, high = st.session_state.get('c1_k_range', (min(CLUSTER1_K_SWEEP or (3,)), max(CLUSTER1_K_SWEEP or (6,))))
+    return tuple(range(low, high + 1))
+
+def k_sweep_diagnostics(data, k_values):
+    """Diagnostics of the k sweep behind the Cluster 1 cohort of `data` (None when not stored)"""
+    state = load_model_state('cluster1', data, 'k_sweep', tuple(k_values))
+    for name, frame in state.previous.items():
+        if name.startswith(f'{MODEL_PREFIX}diagnostics_'):
+            return frame
+    return None
+
+def render_k_sweep_controls():
+    """Automatic k selection toggle and candidate range"""
+    enabled = st.toggle(
+        "Selección automática de k",
+        value=bool(CLUSTER1_K_SWEEP),
+        key="c1_k_sweep",
+        help="Evalúa varios números de segmentos con MiniBatchKMeans y elige el de mejor silueta y "
+             "Davies-Bouldin, en lugar de la división fija 1A/1B."
     )
-    
-    # Calculate days to close and TTC bucket
-    if 'create_date' in cohort.columns and 'close_date' in cohort.columns:
-        cohort['days_to_close'] = cohort.apply(
-            lambda row: calculate_days_to_close(row['create_date'], row['close_date']),
-            axis=1
-        )
-        cohort['ttc_bucket'] = cohort['days_to_close'].apply(categorize_ttc)
-    
-    # Normalize likelihood to close
-    if 'likelihood_to_close' in cohort.columns:
-        s = cohort['likelihood_to_close']
-        s = np.where(s > 1, s / 100.0, s)
-        cohort['likelihood_to_close_norm'] = pd.Series(s, index=cohort.index).clip(0, 1)
-    
-    return cohort
+    st.slider(
+        "Valores de k a evaluar:",
+        min_value=K_SWEEP_RANGE[0], max_value=K_SWEEP_RANGE[1],
+        value=(min(CLUSTER1_K_SWEEP or (3,)), max(CLUSTER1_K_SWEEP or (6,))),
+        key="c1_k_range", disabled=not enabled
+    )
+
+def render_k_sweep_diagnostics(data, k_values):
+    """Scores of every candidate k and the chosen one"""
+    diagnostics = k_sweep_diagnostics(data, k_values)
+    if diagnostics is None:
+        st.info("El modelo se reutilizó del procesamiento incremental; no hay diagnósticos de esta ejecución.")
+        return
+    chosen = int(diagnostics.loc[diagnostics['chosen'], 'k'].iloc[0])
+    st.markdown(f"**k elegido:** {chosen} segmentos (1A = mayor compromiso, 1B = menor, 1M = intermedios)")
+    table = diagnostics.rename(columns={
+        'k': 'k', 'inertia': 'Inercia', 'silhouette': 'Silueta', 'davies_bouldin': 'Davies-Bouldin',
+        'smallest_cluster_pct': 'Segmento Menor %', 'fit_seconds': 'Ajuste (s)',
+        'score_seconds': 'Evaluación (s)', 'chosen': 'Elegido'
+    })
+    st.dataframe(table.round(3), hide_index=True, use_container_width=True)
+    fig = px.line(
+        diagnostics.melt(id_vars='k', value_vars=['silhouette', 'davies_bouldin'], var_name='metric'),
+        x='k', y='value', color='metric', markers=True,
+        labels={'value': 'Puntuación', 'metric': 'Métrica'},
+        title="Silueta (mayor es mejor) y Davies-Bouldin (menor es mejor) por k"
+    )
+    fig.add_vline(x=chosen, line_dash='dash', line_color='gray')
+    st.plotly_chart(fig, use_container_width=True)
+    st.caption("La silueta se calcula sobre una muestra estratificada por segmento; Davies-Bouldin sobre todos los contactos.")
 
 def create_cluster1_xlsx_export(cohort):
     """Create comprehensive XLSX workbook with 25+ analysis sheets"""
@@ -333,6 +140,8 @@ def create_cluster1_xlsx_export(cohort):
     import pandas as pd
     from utils import hist_latest
     
+    timer = PipelineTimer('cluster1_export', rows_in=len(cohort))
+    
     # Apply hist_latest to get only the latest values for export
     cohort_export = cohort.copy()
     
@@ -344,6 +153,8 @@ def create_cluster1_xlsx_export(cohort):
         if col in cohort_export.columns:
             cohort_export[col] = cohort_export[col].apply(hist_latest)
     
+    timer.lap('latest_values', len(cohort_export))
+    
     output = BytesIO()
     
     with pd.ExcelWriter(output, engine='openpyxl') as writer:
@@ -494,6 +305,8 @@ def create_cluster1_xlsx_export(cohort):
         meta.to_excel(writer, sheet_name="29_run_metadata", index=False)
     
     output.seek(0)
+    timer.lap('write_workbook', len(cohort_export))
+    timer.finish(len(cohort_export))
     return output.getvalue()
 
 def render_cluster1(data):
@@ -521,6 +334,7 @@ def render_cluster1(data):
         ### 📊 Segmentos Definidos
         - **1A (Alto Compromiso)** - Usuarios sociales activos con fuerte interacción (sesiones, formularios, páginas vistas)
         - **1B (Bajo Compromiso)** - Presencia social pero compromiso mínimo en el sitio web
+        - **1M (Compromiso Medio)** - Segmentos intermedios, solo con la selección automática de k y más de dos segmentos
         - **Superposiciones de Plataforma** - Etiquetas combinadas como "1A + Instagram", "1B + Facebook" para targeting preciso
         
         ### 💡 Ejemplo de Insight
@@ -534,11 +348,17 @@ def render_cluster1(data):
         st.error("⚠️ Datos no cargados.")
         return
     
-    # Process data with cache busting based on data length
-    # This ensures the cache refreshes when global filters change the data
-    cache_key = f"c1_{len(data)}_{data['Record ID'].iloc[0] if 'Record ID' in data.columns else 'na'}"
+    # Pipeline run key of this dataset and global filter selection
+    cache_key = run_key("c1")
+    k_sweep_box = st.expander("🔢 Número de Segmentos de Compromiso (k)", expanded=False)
+    with k_sweep_box:
+        render_k_sweep_controls()
+    k_values = k_sweep_values()
     with st.spinner("Procesando datos del Cluster 1..."):
-        cohort = process_cluster1_data(data, cache_key)
+        cohort = process_cluster1_data(data, cache_key, k_values)
+    if k_values and len(cohort) > 0:
+        with k_sweep_box:
+            render_k_sweep_diagnostics(data, k_values)
     
     # Show contact count AFTER core filters (APREU + removing other/subscriber)
     if data is not None:
@@ -547,18 +367,31 @@ def render_cluster1(data):
             st.info(f"🔍 Analizando {len(cohort):,} contactos después de aplicar filtros principales (APREU, excluyendo 'other'/'subscriber') + filtros globales")
         else:
             st.info(f"📊 Analizando {len(cohort):,} contactos después de aplicar filtros principales (APREU, excluyendo 'other'/'subscriber')")
+        
+        # Stage counts recorded while the pipeline ran
+        funnel = get_funnel_counts(cache_key)
+        if funnel:
+            st.caption(f"🔻 Pipeline: {format_funnel(funnel)}")
     
     if len(cohort) == 0:
         st.warning("No se encontraron prospectos socialmente comprometidos con los filtros actuales.")
         return
     
+    # Cluster filters and sections rerun as a fragment, without reloading
+    # data or re-applying the global filters
+    render_cluster1_sections(cohort, cache_key)
+
+@st.fragment
+def render_cluster1_sections(cohort, cache_key):
+    """Render Cluster 1 filters, export and the selected section as an isolated fragment"""
+    
     # Add cluster-specific filters
     with st.expander("🎛️ Filtros Específicos del Cluster 1", expanded=False):
         col1, col2 = st.columns(2)
         
         with col1:
             # Segment filter
-            available_segments = sorted(cohort['segment_engagement'].unique())
+            available_segments = engagement_segments(cohort)
             selected_segments = st.multiselect(
                 "Filtrar por Segmento:",
                 options=available_segments,
@@ -610,6 +443,8 @@ def render_cluster1(data):
     
     # Use filtered cohort for all subsequent analysis
     cohort = cohort_filtered
+    # The k selection relabels the same rows, so it is part of the version
+    cohort_version = get_cohort_version(cohort, cache_key, k_sweep_values())
     
     # Export functionality
     with st.expander("📥 Exportar Datos", expanded=False):
@@ -669,7 +504,7 @@ def render_cluster1(data):
         with col2:
             # Export comprehensive XLSX workbook
             with st.spinner("Generando libro de trabajo Excel integral..."):
-                xlsx_data = create_cluster1_xlsx_export(cohort)
+                xlsx_data = memoize_section("c1_xlsx_export", cohort_version, lambda: create_cluster1_xlsx_export(cohort))
                 st.download_button(
                     label="📊 Descargar Libro de Trabajo Integral (XLSX) - 25+ Hojas",
                     data=xlsx_data,
@@ -679,59 +514,42 @@ def render_cluster1(data):
                     help="Libro de trabajo de análisis integral con 25+ hojas: conteos, métricas de compromiso, ciclo de vida, estadísticas de cierre, desgloses por plataforma, ¡y más!"
                 )
     
-    # Create tabs for different analyses
-    tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8, tab9 = st.tabs([
-        "📊 Resumen", "🎯 Análisis de Segmento", "🏷️ Análisis de Plataforma", 
-        "💰 Resultados de Negocio", "⚡ Cerradores Rápidos/Lentos", "🌐 En Línea vs Fuera de Línea",
-        "📅 Período Académico", "🔬 Benchmarks de Rendimiento", "🔍 Búsqueda de Contactos"
-    ])
-    
-    with tab1:
-        render_overview_tab(cohort)
-    
-    with tab2:
-        render_segment_analysis_tab(cohort)
-    
-    with tab3:
-        render_platform_analysis_tab(cohort)
-    
-    with tab4:
-        render_outcomes_tab(cohort)
-    
-    with tab5:
-        render_fast_slow_closers_c1(cohort)
-    
-    with tab6:
-        render_online_offline_analysis_tab(cohort)
-    
-    with tab7:
-        render_academic_period_tab(cohort)
-    
-    with tab8:
-        render_performance_benchmarks_c1(cohort)
-    
-    with tab9:
-        render_contact_lookup_tab(cohort)
+    # Section navigation: only the selected section is computed on each rerun
+    sections = {
+        "📊 Resumen": render_overview_tab,
+        "🎯 Análisis de Segmento": render_segment_analysis_tab,
+        "🏷️ Análisis de Plataforma": render_platform_analysis_tab,
+        "💰 Resultados de Negocio": render_outcomes_tab,
+        "⚡ Cerradores Rápidos/Lentos": render_fast_slow_closers_c1,
+        "🌐 En Línea vs Fuera de Línea": render_online_offline_analysis_tab,
+        "📅 Período Académico": render_academic_period_tab,
+        "🔬 Benchmarks de Rendimiento": lambda c: render_performance_benchmarks_c1(c, cohort_version),
+        "🔀 Rutas de Fuentes": lambda c: render_path_analysis(
+            c, cohort_version, 'original_source', 'segment_engagement',
+            "Rutas entre Fuentes de Tráfico", "fuentes de origen", "c1"
+        ),
+        "🔍 Búsqueda de Contactos": render_contact_lookup_tab,
+    }
+    selected_section = render_section_selector(list(sections.keys()), key="c1_section")
+    sections[selected_section](cohort)
 
 def render_overview_tab(cohort):
     """Render overview tab"""
     st.markdown("### 📊 Resumen Ejecutivo")
     
-    # Key metrics
-    col1, col2, col3, col4 = st.columns(4)
+    # Key metrics: total, one per engagement segment (1A, 1M..., 1B), close rate
+    segments = engagement_segments(cohort)
+    segment_counts = cohort['segment_engagement'].value_counts()
+    cols = st.columns(len(segments) + 2)
     
-    with col1:
+    with cols[0]:
         st.metric("Total Socialmente Comprometidos", f"{len(cohort):,}")
     
-    with col2:
-        seg_1a_count = (cohort['segment_engagement'] == '1A - Alto Compromiso').sum()
-        st.metric("1A (Alto Compromiso)", f"{seg_1a_count:,}")
-    
-    with col3:
-        seg_1b_count = (cohort['segment_engagement'] == '1B - Bajo Compromiso').sum()
-        st.metric("1B (Bajo Compromiso)", f"{seg_1b_count:,}")
+    for col, segment in zip(cols[1:], segments):
+        with col:
+            st.metric(segment_short_label(segment), f"{segment_counts.get(segment, 0):,}")
     
-    with col4:
+    with cols[-1]:
         close_rate = calculate_close_rate(cohort)
         st.metric("Tasa de Cierre General", f"{close_rate:.1f}%")
     
@@ -799,6 +617,9 @@ def render_segment_analysis_tab(cohort):
     segment_comparison['Close Rate %'] = (
         segment_comparison['Closed Count'] / segment_comparison['Contacts'] * 100
     ).round(1)
+    segments = engagement_segments(cohort)
+    segment_comparison = segment_comparison.reindex(segments)
+    segment_colors = engagement_color_map(segments)
     
     st.dataframe(segment_comparison, use_container_width=True)
     
@@ -809,23 +630,21 @@ def render_segment_analysis_tab(cohort):
     
     with col1:
         st.markdown("#### Distribución de Puntuación de Compromiso")
-        fig = px.box(
-            cohort, x='segment_engagement', y='engagement_score',
-            color='segment_engagement',
+        fig = create_box_plot(
+            cohort, x_col='segment_engagement', y_col='engagement_score',
             title="Puntuación de Compromiso por Segmento (1A=Alto Compromiso, 1B=Bajo Compromiso)",
             labels={'segment_engagement': 'Segmento', 'engagement_score': 'Puntuación de Compromiso'},
-            color_discrete_map={'1A - Alto Compromiso': '#2ecc71', '1B - Bajo Compromiso': '#e74c3c'}
+            color_discrete_map=segment_colors
         )
         st.plotly_chart(fig, use_container_width=True)
     
     with col2:
         st.markdown("#### Distribución de Sesiones")
-        fig = px.box(
-            cohort, x='segment_engagement', y='num_sessions',
-            color='segment_engagement',
+        fig = create_box_plot(
+            cohort, x_col='segment_engagement', y_col='num_sessions',
             title="Número de Sesiones por Segmento (1A=Alto Compromiso, 1B=Bajo Compromiso)",
             labels={'segment_engagement': 'Segmento', 'num_sessions': 'Sesiones'},
-            color_discrete_map={'1A - Alto Compromiso': '#2ecc71', '1B - Bajo Compromiso': '#e74c3c'}
+            color_discrete_map=segment_colors
         )
         st.plotly_chart(fig, use_container_width=True)
     
@@ -871,34 +690,23 @@ def render_platform_analysis_tab(cohort):
     
     st.markdown("---")
     
-    # Platform breakdown within each engagement segment
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown("#### Distribución de Plataformas en 1A")
-        seg_1a = cohort[cohort['segment_engagement'] == '1A - Alto Compromiso']
-        platform_1a = seg_1a['platform_tag'].value_counts().head(8)
-        
-        fig = px.pie(
-            values=platform_1a.values,
-            names=platform_1a.index,
-            title="Mezcla de Plataformas 1A",
-            hole=0.3
-        )
-        st.plotly_chart(fig, use_container_width=True)
-    
-    with col2:
-        st.markdown("#### Distribución de Plataformas en 1B")
-        seg_1b = cohort[cohort['segment_engagement'] == '1B - Bajo Compromiso']
-        platform_1b = seg_1b['platform_tag'].value_counts().head(8)
-        
-        fig = px.pie(
-            values=platform_1b.values,
-            names=platform_1b.index,
-            title="Mezcla de Plataformas 1B",
-            hole=0.3
-        )
-        st.plotly_chart(fig, use_container_width=True)
+    # Platform breakdown within each engagement segment (two per row)
+    segments = engagement_segments(cohort)
+    for start in range(0, len(segments), 2):
+        cols = st.columns(2)
+        for col, segment in zip(cols, segments[start:start + 2]):
+            code = segment.partition(' - ')[0]
+            with col:
+                st.markdown(f"#### Distribución de Plataformas en {code}")
+                platform_counts = cohort.loc[cohort['segment_engagement'] == segment, 'platform_tag'].value_counts().head(8)
+                
+                fig = px.pie(
+                    values=platform_counts.values,
+                    names=platform_counts.index,
+                    title=f"Mezcla de Plataformas {code}",
+                    hole=0.3
+                )
+                st.plotly_chart(fig, use_container_width=True)
     
     # Platform mention details
     st.markdown("#### Estadísticas de Menciones de Plataformas")
@@ -1144,20 +952,16 @@ def render_outcomes_tab(cohort):
         
         st.markdown("---")
     
-    # Close rate by segment
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        seg_1a = cohort[cohort['segment_engagement'] == '1A - Alto Compromiso']
-        close_rate_1a = calculate_close_rate(seg_1a)
-        st.metric("1A Close Rate", f"{close_rate_1a:.1f}%")
+    # Close rate by segment (1A, 1M..., 1B)
+    segments = engagement_segments(cohort)
+    cols = st.columns(len(segments) + 1)
     
-    with col2:
-        seg_1b = cohort[cohort['segment_engagement'] == '1B - Bajo Compromiso']
-        close_rate_1b = calculate_close_rate(seg_1b)
-        st.metric("1B Close Rate", f"{close_rate_1b:.1f}%")
+    for col, segment in zip(cols, segments):
+        with col:
+            close_rate = calculate_close_rate(cohort[cohort['segment_engagement'] == segment])
+            st.metric(f"{segment.partition(' - ')[0]} Close Rate", f"{close_rate:.1f}%")
     
-    with col3:
+    with cols[-1]:
         if 'likelihood_to_close_norm' in cohort.columns:
             avg_likelihood = cohort['likelihood_to_close_norm'].mean() * 100
             st.metric("Probabilidad Promedio de Cierre", f"{avg_likelihood:.1f}%")
@@ -1591,13 +1395,12 @@ def render_online_offline_analysis_tab(cohort):
             st.dataframe(ttc_by_offline, use_container_width=True)
             
             # Box plot
-            fig = px.box(
+            fig = create_box_plot(
                 closed_cohort,
-                x='offline_type',
-                y='days_to_close',
+                x_col='offline_type',
+                y_col='days_to_close',
                 title="Distribución de Días hasta Cierre: En Línea vs Fuera de Línea",
                 labels={'offline_type': 'Tipo', 'days_to_close': 'Días hasta Cierre'},
-                color='offline_type',
                 color_discrete_sequence=['#3498db', '#e74c3c', '#f39c12', '#2ecc71']
             )
             st.plotly_chart(fig, use_container_width=True)
@@ -1958,8 +1761,10 @@ def render_academic_period_tab(cohort):
         for insight in insights:
             st.markdown(insight)
 
-def render_performance_benchmarks_c1(cohort):
+def render_performance_benchmarks_c1(cohort, cohort_version=None):
     """Render performance benchmarks tab"""
+    benchmarks = compute_benchmarks_c1(cohort, cohort_version or get_cohort_version(cohort))
+    
     st.markdown("### 🔬 Performance Benchmarks & Comparisons")
     st.markdown("Compara segmentos contra indicadores clave de rendimiento")
     
@@ -1968,19 +1773,7 @@ def render_performance_benchmarks_c1(cohort):
     # Benchmark metrics by segment
     st.markdown("#### 📊 Key Performance Indicators by Segment")
     
-    benchmark_metrics = cohort.groupby('segment_engagement').agg({
-        'contact_id': 'count',
-        'num_sessions': ['mean', 'median', 'std'],
-        'num_pageviews': ['mean', 'median', 'std'],
-        'forms_submitted': ['mean', 'median', 'std'],
-        'social_clicks_total': ['mean', 'median', 'std'],
-        'engagement_score': ['mean', 'median', 'std'],
-        'close_date': lambda x: x.notna().sum()
-    }).round(2)
-    
-    # Flatten columns
-    benchmark_metrics.columns = ['_'.join(col).strip('_') for col in benchmark_metrics.columns.values]
-    benchmark_metrics['close_rate_pct'] = (benchmark_metrics['close_date_<lambda>'] / benchmark_metrics['contact_id_count'] * 100).round(1)
+    benchmark_metrics = benchmarks['benchmark_metrics']
     
     st.dataframe(benchmark_metrics, use_container_width=True)
     
@@ -1989,16 +1782,7 @@ def render_performance_benchmarks_c1(cohort):
     # Platform performance comparison
     st.markdown("#### 🏷️ Platform Performance Comparison")
     
-    platform_performance = cohort.groupby('platform_tag').agg({
-        'contact_id': 'count',
-        'num_sessions': 'mean',
-        'engagement_score': 'mean',
-        'close_date': lambda x: x.notna().sum()
-    }).round(2)
-    
-    platform_performance.columns = ['Count', 'Avg Sessions', 'Avg Engagement', 'Closed']
-    platform_performance['Close Rate %'] = (platform_performance['Closed'] / platform_performance['Count'] * 100).round(1)
-    platform_performance = platform_performance.sort_values('Close Rate %', ascending=False).head(15)
+    platform_performance = benchmarks['platform_performance']
     
     col1, col2 = st.columns(2)
     
@@ -2009,6 +1793,8 @@ def render_performance_benchmarks_c1(cohort):
         fig = px.bar(
             x=platform_performance.index,
             y=platform_performance['Close Rate %'],
+            error_y=platform_performance['CI High %'] - platform_performance['Close Rate %'],
+            error_y_minus=platform_performance['Close Rate %'] - platform_performance['CI Low %'],
             title="Tasa de Cierre por Plataforma (Top 15)",
             labels={'x': 'Plataforma', 'y': 'Tasa de Cierre %'},
             color=platform_performance['Close Rate %'],
@@ -2016,39 +1802,16 @@ def render_performance_benchmarks_c1(cohort):
         )
         fig.update_layout(xaxis_tickangle=-45, showlegend=False)
         st.plotly_chart(fig, use_container_width=True)
+        st.caption(interval_caption())
     
     st.markdown("---")
     
     # Engagement distribution quartiles
     st.markdown("#### 📈 Engagement Score Quartile Analysis")
     
-    quartiles = cohort['engagement_score'].quantile([0.25, 0.5, 0.75, 0.9])
-    
-    def categorize_engagement_quartile(score):
-        if score <= quartiles[0.25]:
-            return 'Q1 (Bottom 25%)'
-        elif score <= quartiles[0.5]:
-            return 'Q2 (25-50%)'
-        elif score <= quartiles[0.75]:
-            return 'Q3 (50-75%)'
-        elif score <= quartiles[0.9]:
-            return 'Q4 (75-90%)'
-        else:
-            return 'Top 10%'
-    
-    cohort_q = cohort.copy()
-    cohort_q['engagement_quartile'] = cohort_q['engagement_score'].apply(categorize_engagement_quartile)
-    
-    quartile_analysis = cohort_q.groupby('engagement_quartile').agg({
-        'contact_id': 'count',
-        'close_date': lambda x: x.notna().sum()
-    })
-    quartile_analysis.columns = ['Count', 'Closed']
-    quartile_analysis['Close Rate %'] = (quartile_analysis['Closed'] / quartile_analysis['Count'] * 100).round(1)
-    
-    # Ensure proper ordering
-    quartile_order = ['Q1 (Bottom 25%)', 'Q2 (25-50%)', 'Q3 (50-75%)', 'Q4 (75-90%)', 'Top 10%']
-    quartile_analysis = quartile_analysis.reindex([q for q in quartile_order if q in quartile_analysis.index])
+    # Buckets come out in Q1 → Top 10% order from the categorical grouping
+    quartile_analysis = benchmarks['quartile_analysis']
+    quartiles = benchmarks['quartile_thresholds']
     
     col1, col2 = st.columns(2)
     
@@ -2066,6 +1829,8 @@ def render_performance_benchmarks_c1(cohort):
         fig = px.bar(
             x=quartile_analysis.index,
             y=quartile_analysis['Close Rate %'],
+            error_y=quartile_analysis['CI High %'] - quartile_analysis['Close Rate %'],
+            error_y_minus=quartile_analysis['Close Rate %'] - quartile_analysis['CI Low %'],
             title="Tasa de Cierre por Cuartil de Compromiso",
             labels={'x': 'Cuartil', 'y': 'Tasa de Cierre %'},
             color=quartile_analysis['Close Rate %'],
@@ -11,286 +11,43 @@ import plotly.graph_objects as go
 import matplotlib.pyplot as plt
 from matplotlib.patches import FancyBboxPatch, FancyArrowPatch
 from utils import (
-    hist_latest, hist_all, normalize_text,
+    hist_latest, hist_all,
     create_segment_pie_chart, create_bar_chart, create_funnel_chart,
-    calculate_close_rate, calculate_days_to_close, categorize_ttc,
-    display_metrics, create_download_button, display_dataframe_with_style
+    calculate_close_rate,
+    display_metrics, create_download_button, display_dataframe_with_style,
+    create_box_plot, create_histogram,
+    get_cohort_version, render_section_selector, memoize_section, shared_cohort,
+    run_key
 )
-from geo_config import get_geo_config, is_home_country, is_local_region, classify_geo_tier_dynamic, get_geo_display_names
+from benchmarks import compute_benchmarks_c2, interval_caption
+from pipeline_metrics import get_funnel_counts, format_funnel, PipelineTimer
+from geo_config import get_geo_config, get_geo_display_names
+from segmentation_core import build_cluster2_base, apply_geo_config
+import query_engine
 
-# Mexican states and cities
-MX_ALIASES = {"mexico", "mx", "mex", "cdmx", "mexico."}
-QRO_TOKENS = {
-    "queretaro", "queretaro de arteaga", "santiago de queretaro", "qro", "qro.",
-    "queretaro, qro", "queretaro qro"
-}
-
-MEXICAN_STATES = {
-    "aguascalientes", "baja california", "baja california sur", "campeche", "chiapas",
-    "chihuahua", "coahuila", "colima", "durango", "guanajuato", "guerrero", "hidalgo",
-    "jalisco", "michoacan", "morelos", "nayarit", "nuevo leon", "oaxaca", "puebla", 
-    "queretaro", "quintana roo", "san luis potosi", "sinaloa", "sonora", "tabasco", 
-    "tamaulipas", "tlaxcala", "veracruz", "yucatan", "zacatecas",
-    "ags", "bc", "bcs", "camp", "chis", "chih", "coah", "col", "dgo", "gto", "gro", "hgo",
-    "jal", "mich", "mor", "nay", "nl", "oax", "pue", "qro", "q.roo", "slp",
-    "sin", "son", "tab", "tamps", "tlax", "ver", "yuc", "zac",
-    "edo mex", "estado de mexico", "edo. mex.", "edomex", "mexico",
-    "cdmx", "ciudad de mexico", "df", "distrito federal", "cuidad de mexico"
-}
-
-STATE_NORMALIZATION = {
-    "aguascalientes": "Aguascalientes", "ags": "Aguascalientes",
-    "baja california": "Baja California", "bc": "Baja California",
-    "baja california sur": "Baja California Sur", "bcs": "Baja California Sur",
-    "campeche": "Campeche", "camp": "Campeche",
-    "chiapas": "Chiapas", "chis": "Chiapas",
-    "chihuahua": "Chihuahua", "chih": "Chihuahua",
-    "coahuila": "Coahuila", "coah": "Coahuila",
-    "colima": "Colima", "col": "Colima",
-    "durango": "Durango", "dgo": "Durango",
-    "guanajuato": "Guanajuato", "gto": "Guanajuato",
-    "guerrero": "Guerrero", "gro": "Guerrero",
-    "hidalgo": "Hidalgo", "hgo": "Hidalgo",
-    "jalisco": "Jalisco", "jal": "Jalisco",
-    "estado de mexico": "Estado de Mexico", "edo mex": "Estado de Mexico",
-    "edo. mex.": "Estado de Mexico", "edomex": "Estado de Mexico",
-    "ciudad de mexico": "Ciudad de Mexico", "cdmx": "Ciudad de Mexico",
-    "df": "Ciudad de Mexico", "distrito federal": "Ciudad de Mexico",
-    "michoacan": "Michoacan", "mich": "Michoacan",
-    "morelos": "Morelos", "mor": "Morelos",
-    "nayarit": "Nayarit", "nay": "Nayarit",
-    "nuevo leon": "Nuevo Leon", "nl": "Nuevo Leon",
-    "oaxaca": "Oaxaca", "oax": "Oaxaca",
-    "puebla": "Puebla", "pue": "Puebla",
-    "queretaro": "Queretaro", "qro": "Queretaro",
-    "quintana roo": "Quintana Roo", "q.roo": "Quintana Roo",
-    "san luis potosi": "San Luis Potosi", "slp": "San Luis Potosi",
-    "sinaloa": "Sinaloa", "sin": "Sinaloa",
-    "sonora": "Sonora", "son": "Sonora",
-    "tabasco": "Tabasco", "tab": "Tabasco",
-    "tamaulipas": "Tamaulipas", "tamps": "Tamaulipas",
-    "tlaxcala": "Tlaxcala", "tlax": "Tlaxcala",
-    "veracruz": "Veracruz", "ver": "Veracruz",
-    "yucatan": "Yucatan", "yuc": "Yucatan",
-    "zacatecas": "Zacatecas", "zac": "Zacatecas",
-    "mexico": "Estado de Mexico",
-}
-
-@st.cache_data
 def process_cluster2_data(_data, geo_config=None, cache_key=None):
-    """Process data for Cluster 2 analysis with dynamic geo configuration
+    """Process data for Cluster 2 analysis with dynamic geo configuration (shared read-only cohort)
     
     Args:
-        _data: Input dataframe (underscore prevents caching on this param)
+        _data: Input dataframe
         geo_config: Geographic configuration dict
-        cache_key: String to bust cache when filters change (NO underscore = used for cache hashing)
+        cache_key: Pipeline run identifier (funnel counts are recorded under it)
     """
     
-    df = _data.copy()
-    
     # Get geo config (use provided or get from session state)
     if geo_config is None:
         geo_config = get_geo_config()
     
-    # Column mapping
-    column_map = {
-        'Record ID': 'contact_id',
-        'Number of Sessions': 'num_sessions',
-        'Number of Pageviews': 'num_pageviews',
-        'Number of Form Submissions': 'forms_submitted',
-        'IP Country': 'ip_country',
-        'IP State/Region': 'ip_state_region',
-        'Ciudad preparatoria BPM': 'prep_city_bpm',
-        'Preparatoria BPM': 'prep_school_bpm',
-        'Estado de preparatoria BPM': 'prep_state_bpm',
-        'Estado de procedencia': 'estado_de_procedencia',
-        'País preparatoria BPM': 'prep_country_bpm',
-        'Likelihood to close': 'likelihood_to_close',
-        'Create Date': 'create_date',
-        'Close Date': 'close_date',
-        'Lifecycle Stage': 'lifecycle_stage',
-        'Propiedad del contacto': 'propiedad_del_contacto',
-        'Original Source': 'original_source',
-        'Latest Traffic Source': 'latest_source',
-        'Last Referring Site': 'last_referrer',
-        'Periodo de ingreso a licenciatura (MQL)': 'periodo_de_ingreso',
-        'Periodo de ingreso': 'periodo_de_ingreso',
-        'PERIODO DE INGRESO': 'periodo_de_ingreso'
-    }
-    
-    df = df.rename(columns=column_map)
-    
-    # Apply hist_latest
-    for col in df.columns:
-        if col in ['num_sessions', 'num_pageviews', 'forms_submitted', 'likelihood_to_close']:
-            df[col] = pd.to_numeric(df[col].apply(hist_latest), errors='coerce').fillna(0)
-        elif col not in ['create_date', 'close_date']:
-            df[col] = df[col].apply(hist_latest)
-    
-    # Filter for APREU contacts
-    if 'propiedad_del_contacto' in df.columns:
-        df = df[df['propiedad_del_contacto'].str.upper() == 'APREU'].copy()
-    
-    # Filter out "Other" and "subscriber" lifecycle stages
-    if 'lifecycle_stage' in df.columns:
-        df = df[~df['lifecycle_stage'].str.lower().isin(['other', 'subscriber'])].copy()
-    
-    # Normalize geography columns
-    geo_cols = ['ip_country', 'ip_state_region', 'prep_city_bpm', 'prep_school_bpm',
-                'prep_state_bpm', 'prep_country_bpm', 'estado_de_procedencia']
-    
-    for col in geo_cols:
-        if col in df.columns:
-            df[col] = df[col].apply(normalize_text)
-    
-    # Normalize state names
-    for col in ['ip_state_region', 'prep_state_bpm', 'estado_de_procedencia']:
-        if col in df.columns:
-            df[col] = df[col].map(STATE_NORMALIZATION).fillna(df[col])
-    
-    # Consolidate geography fields
-    def coalesce_non_unknown(series_list):
-        cleaned = [s.replace({"unknown": np.nan}) if isinstance(s, pd.Series) else s 
-                  for s in series_list]
-        if cleaned:
-            out = pd.concat(cleaned, axis=1).bfill(axis=1).iloc[:, 0]
-            return out.fillna("unknown")
-        return pd.Series("unknown", index=df.index)
-    
-    country_series = [df.get(col, pd.Series("unknown", index=df.index)) 
-                     for col in ['prep_country_bpm', 'ip_country']]
-    df['country_any'] = coalesce_non_unknown(country_series)
-    
-    # Normalize United States variations to a single format
-    def normalize_united_states(country):
-        if pd.isna(country) or country == "unknown" or country == "":
-            return country
-        country_lower = str(country).lower().strip()
-        # Normalize variations of United States
-        us_variations = [
-            "estados unidos de america",
-            "estados unidos de américa", 
-            "united states of america",
-            "united states",
-            "usa",
-            "us",
-            "u.s.a.",
-            "u.s."
-        ]
-        if country_lower in us_variations:
-            return "estados unidos"
-        return country
-    
-    df['country_any'] = df['country_any'].apply(normalize_united_states)
-    
-    state_series = [df.get(col, pd.Series("unknown", index=df.index)) 
-                   for col in ['prep_state_bpm', 'estado_de_procedencia', 'ip_state_region']]
-    df['state_any'] = coalesce_non_unknown(state_series)
-    
-    city_series = [df.get(col, pd.Series("unknown", index=df.index)) 
-                  for col in ['prep_city_bpm']]
-    df['city_any'] = coalesce_non_unknown(city_series)
-    
-    # Classify geo tier using dynamic configuration
-    df['geo_tier'] = df.apply(lambda row: classify_geo_tier_dynamic(row, geo_config), axis=1)
-    
-    # Rescue contacts with domestic indicators but no country
-    rescued_mask = (df['country_any'] == 'unknown') & (df['geo_tier'].isin(['local', 'domestic_non_local']))
-    df.loc[rescued_mask, 'country_any'] = geo_config['home_country'].lower()
-    
-    # Engagement features
-    df['log_sessions'] = np.log1p(df.get('num_sessions', 0))
-    df['log_pageviews'] = np.log1p(df.get('num_pageviews', 0))
-    df['log_forms'] = np.log1p(df.get('forms_submitted', 0))
-    df['engagement_score'] = df['log_sessions'] + df['log_pageviews'] + df['log_forms']
-    
-    # Mark high/low per geo tier using quantile threshold
-    HIGH_ENG_Q = 0.70
-    df['is_high_engager'] = False
-    for tier, grp in df.groupby('geo_tier'):
-        if len(grp) > 0:
-            thr = grp['engagement_score'].quantile(HIGH_ENG_Q)
-            df.loc[grp.index, 'is_high_engager'] = grp['engagement_score'] >= thr
-    
-    # Assign 2A-2F segments with descriptive names
-    def assign_c2(row):
-        tier = row['geo_tier']
-        hi = bool(row['is_high_engager'])
-        if tier == 'domestic_non_local':
-            return '2A - Foráneo, Alto Compromiso' if hi else '2B - Foráneo, Bajo Compromiso'
-        if tier == 'international':
-            return '2C - Internacional, Alto Compromiso' if hi else '2D - Internacional, Bajo Compromiso'
-        if tier == 'local':
-            return '2E - Local, Alto Compromiso' if hi else '2F - Local, Bajo Compromiso'
-        return '2Z - Sin Geografía'
-    
-    df['segment_c2'] = df.apply(assign_c2, axis=1)
-    
-    # Dynamic action map based on geo config
-    local_name = geo_config['local_region']
-    country_name = geo_config['home_country']
-    
-    ACTION_MAP = {
-        '2A - Foráneo, Alto Compromiso': f'Compromiso digital + eventos virtuales ({country_name} fuera de {local_name})',
-        '2B - Foráneo, Bajo Compromiso': f'Empuje WhatsApp/email ({country_name} fuera de {local_name})',
-        '2C - Internacional, Alto Compromiso': 'Webinars + Q&A virtual (Internacional)',
-        '2D - Internacional, Bajo Compromiso': 'Campañas de concientización (Internacional)',
-        '2E - Local, Alto Compromiso': f'Eventos presenciales + compromiso local (Local {local_name})',
-        '2F - Local, Bajo Compromiso': f'Nutrición local + WhatsApp (Local {local_name})',
-        '2Z - Sin Geografía': 'Investigar geografía faltante'
-    }
-    df['segment_c2_action'] = df['segment_c2'].map(ACTION_MAP)
-    
-    # Calculate days to close
-    if 'create_date' in df.columns and 'close_date' in df.columns:
-        df['days_to_close'] = df.apply(
-            lambda row: calculate_days_to_close(row['create_date'], row['close_date']),
-            axis=1
+    def build(delta):
+        # The geo-independent base is shared by every geo configuration, so
+        # changing it only re-runs tiering, thresholds and segment labels
+        base = shared_cohort(
+            'cluster2_base', _data, lambda base_delta: build_cluster2_base(_data, funnel_key=cache_key, delta=base_delta),
+            cache_key, funnel_key=cache_key
         )
-        df['ttc_bucket'] = df['days_to_close'].apply(categorize_ttc)
+        return apply_geo_config(base, geo_config, funnel_key=cache_key, delta=delta)
     
-    # Convert academic period codes to readable formats (YYYYMM -> "Year Semester")
-    def convert_academic_period(period_code):
-        """Convert YYYYMM period codes to readable format"""
-        if pd.isna(period_code) or period_code == "" or period_code == "unknown":
-            return "Desconocido"
-        
-        try:
-            period_str = str(period_code).strip()
-            if len(period_str) != 6:
-                return f"Invalid: {period_code}"
-            
-            year = int(period_str[:4])
-            period = int(period_str[4:])
-            
-            # Map period codes to semester names
-            period_map = {
-                5: "Especial",
-                10: "Primavera", 
-                35: "Verano",
-                60: "Otoño",
-                75: "Invierno/Especial"
-            }
-            
-            semester = period_map.get(period, f"Desconocido({period})")
-            return f"{year} {semester}"
-            
-        except (ValueError, IndexError):
-            return f"Inválido: {period_code}"
-    
-    # Apply period conversion
-    if 'periodo_de_ingreso' in df.columns:
-        df['periodo_ingreso'] = df['periodo_de_ingreso'].apply(convert_academic_period)
-        # Drop the old column to avoid confusion
-        df = df.drop(columns=['periodo_de_ingreso'])
-    
-    # Normalize likelihood
-    if 'likelihood_to_close' in df.columns:
-        s = df['likelihood_to_close']
-        s = np.where(s > 1, s / 100.0, s)
-        df['likelihood_pct'] = pd.Series(s, index=df.index).clip(0, 1) * 100
-    
-    return df
+    return shared_cohort('cluster2', _data, build, cache_key, sorted(geo_config.items()), funnel_key=cache_key)
 
 def create_cluster2_xlsx_export(cohort):
     """Create comprehensive XLSX workbook with 20+ analysis sheets"""
@@ -298,6 +55,8 @@ def create_cluster2_xlsx_export(cohort):
     import pandas as pd
     from utils import hist_latest
     
+    timer = PipelineTimer('cluster2_export', rows_in=len(cohort))
+    
     # Apply hist_latest to get only the latest values for export
     cohort_export = cohort.copy()
     
@@ -309,6 +68,8 @@ def create_cluster2_xlsx_export(cohort):
         if col in cohort_export.columns:
             cohort_export[col] = cohort_export[col].apply(hist_latest)
     
+    timer.lap('latest_values', len(cohort_export))
+    
     output = BytesIO()
     
     with pd.ExcelWriter(output, engine='openpyxl') as writer:
@@ -444,6 +205,8 @@ def create_cluster2_xlsx_export(cohort):
             segment_bucket_df.to_excel(writer, sheet_name="20_comprehensive_bucket_by_segment", index=False)
     
     output.seek(0)
+    timer.lap('write_workbook', len(cohort_export))
+    timer.finish(len(cohort_export))
     return output.getvalue()
 
 def render_cluster2(data):
@@ -502,9 +265,8 @@ def render_cluster2(data):
         st.error("⚠️ Datos no cargados.")
         return
     
-    # Process data with geo config and cache busting
-    # This ensures the cache refreshes when global filters change the data
-    cache_key = f"c2_{len(data)}_{data['Record ID'].iloc[0] if 'Record ID' in data.columns else 'na'}"
+    # Pipeline run key of this dataset and global filter selection
+    cache_key = run_key("c2")
     with st.spinner(f"Procesando datos del Cluster 2 para {geo_config['home_country']}..."):
         cohort = process_cluster2_data(data, geo_config, cache_key)
     
@@ -515,11 +277,24 @@ def render_cluster2(data):
             st.info(f"🔍 Analizando {len(cohort):,} contactos después de aplicar filtros principales (APREU, excluyendo 'other'/'subscriber') + filtros globales")
         else:
             st.info(f"📊 Analizando {len(cohort):,} contactos después de aplicar filtros principales (APREU, excluyendo 'other'/'subscriber')")
+        
+        # Stage counts recorded while the pipeline ran
+        funnel = get_funnel_counts(cache_key)
+        if funnel:
+            st.caption(f"🔻 Pipeline: {format_funnel(funnel)}")
     
     if len(cohort) == 0:
         st.warning("No hay datos disponibles después de los filtros.")
         return
     
+    # Cluster filters and sections rerun as a fragment, without reloading
+    # data or re-applying the global filters
+    render_cluster2_sections(cohort, cache_key, geo_config)
+
+@st.fragment
+def render_cluster2_sections(cohort, cache_key, geo_config):
+    """Render Cluster 2 filters, export and the selected section as an isolated fragment"""
+    
     # Add cluster-specific filters
     with st.expander("🎛️ Filtros Específicos del Cluster 2", expanded=False):
         col1, col2, col3 = st.columns(3)
@@ -612,6 +387,7 @@ def render_cluster2(data):
     
     # Use filtered cohort
     cohort = cohort_filtered
+    cohort_version = get_cohort_version(cohort, cache_key, sorted(geo_config.items()))
     
     # Export functionality
     with st.expander("📥 Export Data", expanded=False):
@@ -672,7 +448,7 @@ def render_cluster2(data):
         with col2:
             # Export comprehensive XLSX workbook
             with st.spinner("Generando libro de trabajo Excel integral..."):
-                xlsx_data = create_cluster2_xlsx_export(cohort)
+                xlsx_data = memoize_section("c2_xlsx_export", cohort_version, lambda: create_cluster2_xlsx_export(cohort))
                 st.download_button(
                     label="📊 Descargar Libro de Trabajo Integral (XLSX) - 20+ Hojas",
                     data=xlsx_data,
@@ -682,32 +458,18 @@ def render_cluster2(data):
                     help="Libro de trabajo de análisis integral con 20+ hojas: resumen ejecutivo, rendimiento de segmentos, geografía, compromiso, ciclo de vida, estadísticas de cierre, ¡y más!"
                 )
     
-    # Create tabs
-    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
-        "📊 Resumen", "🎯 Análisis de Segmento", "🗺️ Análisis Geográfico",
-        "💰 Resultados de Negocio", "⚡ Cerradores Rápidos/Lentos", "🔬 Benchmarks de Rendimiento", "🔍 Búsqueda de Contactos"
-    ])
-    
-    with tab1:
-        render_overview_tab_c2(cohort)
-    
-    with tab2:
-        render_segment_analysis_tab_c2(cohort)
-    
-    with tab3:
-        render_geography_analysis_tab(cohort)
-    
-    with tab4:
-        render_outcomes_tab_c2(cohort)
-    
-    with tab5:
-        render_fast_slow_closers_c2(cohort)
-    
-    with tab6:
-        render_performance_benchmarks_c2(cohort)
-    
-    with tab7:
-        render_contact_lookup_tab_c2(cohort)
+    # Section navigation: only the selected section is computed on each rerun
+    sections = {
+        "📊 Resumen": render_overview_tab_c2,
+        "🎯 Análisis de Segmento": lambda c: render_segment_analysis_tab_c2(c, cohort_version),
+        "🗺️ Análisis Geográfico": render_geography_analysis_tab,
+        "💰 Resultados de Negocio": render_outcomes_tab_c2,
+        "⚡ Cerradores Rápidos/Lentos": render_fast_slow_closers_c2,
+        "🔬 Benchmarks de Rendimiento": lambda c: render_performance_benchmarks_c2(c, cohort_version),
+        "🔍 Búsqueda de Contactos": render_contact_lookup_tab_c2,
+    }
+    selected_section = render_section_selector(list(sections.keys()), key="c2_section")
+    sections[selected_section](cohort)
 
 def render_overview_tab_c2(cohort):
     """Render overview tab for Cluster 2"""
@@ -791,7 +553,7 @@ def render_overview_tab_c2(cohort):
     
     st.dataframe(segment_summary, use_container_width=True)
 
-def render_segment_analysis_tab_c2(cohort):
+def render_segment_analysis_tab_c2(cohort, cohort_version=None):
     """Render segment analysis tab"""
     st.markdown("### 🎯 Análisis Profundo de Segmentos 2A-2F")
     
@@ -826,21 +588,23 @@ def render_segment_analysis_tab_c2(cohort):
     
     with col1:
         st.markdown("#### Distribución de Puntuación de Compromiso")
-        fig = px.histogram(
-            seg_data, x='engagement_score',
+        fig = create_histogram(
+            seg_data, x_col='engagement_score',
             title=f"Distribución de Puntuación de Compromiso - {selected_segment}",
             nbins=30,
-            color_discrete_sequence=['#3498db']
+            color_discrete_sequence=['#3498db'],
+            version=(cohort_version, selected_segment) if cohort_version else None
         )
         st.plotly_chart(fig, use_container_width=True)
     
     with col2:
         st.markdown("#### Distribución de Sesiones")
-        fig = px.histogram(
-            seg_data, x='num_sessions',
+        fig = create_histogram(
+            seg_data, x_col='num_sessions',
             title=f"Distribución de Sesiones - {selected_segment}",
             nbins=20,
-            color_discrete_sequence=['#e74c3c']
+            color_discrete_sequence=['#e74c3c'],
+            version=(cohort_version, selected_segment) if cohort_version else None
         )
         st.plotly_chart(fig, use_container_width=True)
     
@@ -858,13 +622,24 @@ def render_segment_analysis_tab_c2(cohort):
         )
         st.plotly_chart(fig, use_container_width=True)
 
+# Per-country / per-state performance table (see query_engine.aggregate)
+GEO_PERFORMANCE_AGGS = {
+    'Total': ('contact_id', 'count'),
+    'Sesiones Prom': ('num_sessions', 'mean'),
+    'Páginas Prom': ('num_pageviews', 'mean'),
+    'Formularios Prom': ('forms_submitted', 'mean'),
+    'Compromiso Prom': ('engagement_score', 'mean'),
+    'Cerrados': ('close_date', 'count'),
+    'Días Prom hasta Cierre': ('days_to_close', 'mean'),
+}
+
 def render_geography_analysis_tab(cohort):
     """Render geography analysis tab"""
     st.markdown("### 🗺️ Análisis de Distribución Geográfica")
     
     # Top countries
     st.markdown("#### Principales Países")
-    country_counts = cohort['country_any'].value_counts().head(15)
+    country_counts = query_engine.value_counts(cohort, 'country_any', limit=15)
     country_counts = country_counts[country_counts.index != 'unknown']
     
     fig = px.bar(
@@ -886,32 +661,17 @@ def render_geography_analysis_tab(cohort):
     st.markdown("Análisis completo de rendimiento de los principales países")
     
     # Filter out unknown countries
-    country_data = cohort[cohort['country_any'] != 'unknown'].copy()
+    country_data = cohort[cohort['country_any'] != 'unknown']
     
     if len(country_data) > 0:
-        # Get top countries by volume
-        top_countries = country_data['country_any'].value_counts().head(15).index
-        
-        # Calculate comprehensive performance metrics by country
-        country_performance = country_data[country_data['country_any'].isin(top_countries)].groupby('country_any').agg({
-            'contact_id': 'count',
-            'num_sessions': 'mean',
-            'num_pageviews': 'mean',
-            'forms_submitted': 'mean',
-            'engagement_score': 'mean',
-            'close_date': lambda x: x.notna().sum(),
-            'days_to_close': lambda x: x.dropna().mean() if x.dropna().any() else None
-        }).round(2)
-        
-        country_performance.columns = ['Total', 'Sesiones Prom', 'Páginas Prom', 'Formularios Prom', 
-                                      'Compromiso Prom', 'Cerrados', 'Días Prom hasta Cierre']
+        # Comprehensive performance metrics of the top 15 countries by volume
+        country_performance = query_engine.aggregate(
+            country_data, 'country_any', GEO_PERFORMANCE_AGGS, sort='Total', ascending=False, limit=15
+        ).round(2)
         country_performance['Tasa de Cierre %'] = (
             country_performance['Cerrados'] / country_performance['Total'] * 100
         ).round(1)
         
-        # Sort by total contacts
-        country_performance = country_performance.sort_values('Total', ascending=False)
-        
         # Display table
         st.markdown("**Métricas de Rendimiento por País (Top 15 por Volumen):**")
         st.dataframe(country_performance, use_container_width=True)
@@ -971,7 +731,7 @@ def render_geography_analysis_tab(cohort):
     domestic = cohort[cohort['geo_tier'].isin(['local', 'domestic_non_local'])]
     
     if len(domestic) > 0:
-        state_counts = domestic['state_any'].value_counts().head(15)
+        state_counts = query_engine.value_counts(domestic, 'state_any', limit=15)
         state_counts = state_counts[state_counts.index != 'unknown']
         
         fig = px.bar(
@@ -993,32 +753,17 @@ def render_geography_analysis_tab(cohort):
         st.markdown("Análisis completo de rendimiento de los principales estados")
         
         # Filter out unknown states
-        state_data = domestic[domestic['state_any'] != 'unknown'].copy()
+        state_data = domestic[domestic['state_any'] != 'unknown']
         
         if len(state_data) > 0:
-            # Get top states by volume
-            top_states = state_data['state_any'].value_counts().head(15).index
-            
-            # Calculate comprehensive performance metrics by state
-            state_performance = state_data[state_data['state_any'].isin(top_states)].groupby('state_any').agg({
-                'contact_id': 'count',
-                'num_sessions': 'mean',
-                'num_pageviews': 'mean',
-                'forms_submitted': 'mean',
-                'engagement_score': 'mean',
-                'close_date': lambda x: x.notna().sum(),
-                'days_to_close': lambda x: x.dropna().mean() if x.dropna().any() else None
-            }).round(2)
-            
-            state_performance.columns = ['Total', 'Sesiones Prom', 'Páginas Prom', 'Formularios Prom', 
-                                       'Compromiso Prom', 'Cerrados', 'Días Prom hasta Cierre']
+            # Comprehensive performance metrics of the top 15 states by volume
+            state_performance = query_engine.aggregate(
+                state_data, 'state_any', GEO_PERFORMANCE_AGGS, sort='Total', ascending=False, limit=15
+            ).round(2)
             state_performance['Tasa de Cierre %'] = (
                 state_performance['Cerrados'] / state_performance['Total'] * 100
             ).round(1)
             
-            # Sort by total contacts
-            state_performance = state_performance.sort_values('Total', ascending=False)
-            
             # Display table
             st.markdown("**Métricas de Rendimiento por Estado (Top 15 por Volumen):**")
             st.dataframe(state_performance, use_container_width=True)
@@ -1111,7 +856,7 @@ def render_outcomes_tab_c2(cohort):
     st.markdown("#### 🔄 Distribución de Etapa del Ciclo de Vida")
     
     if 'lifecycle_stage' in cohort.columns:
-        lifecycle_counts = cohort['lifecycle_stage'].value_counts().head(10)
+        lifecycle_counts = query_engine.value_counts(cohort, 'lifecycle_stage', limit=10)
         
         col1, col2 = st.columns([2, 1])
         
@@ -1137,14 +882,12 @@ def render_outcomes_tab_c2(cohort):
         # Lifecycle by segment
         st.markdown("**Etapa del Ciclo de Vida por Segmento:**")
         
-        lifecycle_by_segment = pd.crosstab(
-            cohort['lifecycle_stage'],
-            cohort['segment_c2'],
-            normalize='columns'
-        ) * 100
+        lifecycle_by_segment = query_engine.shares(cohort, 'segment_c2', 'lifecycle_stage').pivot(
+            index='lifecycle_stage', columns='segment_c2', values='percent'
+        ).fillna(0)
         
         # Show top 8 stages
-        top_stages = cohort['lifecycle_stage'].value_counts().head(8).index
+        top_stages = lifecycle_counts.head(8).index
         lifecycle_filtered = lifecycle_by_segment.loc[lifecycle_by_segment.index.isin(top_stages)]
         
         st.dataframe(lifecycle_filtered.round(1), use_container_width=True)
@@ -1159,15 +902,14 @@ def render_outcomes_tab_c2(cohort):
     
     if 'latest_source' in cohort.columns:
         # Calculate latest source percentage by segment (matching notebook logic)
-        src_pct_list = []
-        for seg, grp in cohort.groupby("segment_c2"):
-            vc = grp['latest_source'].fillna("unknown").astype(str).str.strip().replace({"": "unknown"}).value_counts(normalize=True)
-            df = vc.mul(100).round(1).to_frame(name="percent").reset_index().rename(columns={"index": "latest_source"})
-            df.insert(0, "segment", seg)
-            src_pct_list.append(df)
-        
-        if src_pct_list:
-            latest_source_pct = pd.concat(src_pct_list, ignore_index=True)
+        sources = pd.DataFrame({
+            'segment': cohort['segment_c2'],
+            'latest_source': cohort['latest_source'].fillna("unknown").astype(str).str.strip().replace({"": "unknown"}),
+        })
+        latest_source_pct = query_engine.shares(sources, 'segment', 'latest_source')
+        latest_source_pct['percent'] = latest_source_pct['percent'].round(1)
+        
+        if len(latest_source_pct) > 0:
             
             # Display table
             st.markdown("**Porcentaje de Fuentes por Segmento:**")
@@ -1231,14 +973,14 @@ def render_outcomes_tab_c2(cohort):
     # Close rates by segment
     st.markdown("#### Comparación de Tasa de Cierre")
     
-    segment_close_rates = []
-    for seg in sorted(cohort['segment_c2'].unique()):
-        seg_data = cohort[cohort['segment_c2'] == seg]
-        close_rate = calculate_close_rate(seg_data)
-        segment_close_rates.append({'Segmento': seg, 'Tasa de Cierre %': close_rate})
-    
-    close_rate_df = pd.DataFrame(segment_close_rates)
-    close_rate_df.columns = ['Segmento', 'Tasa de Cierre %']
+    segment_closed = query_engine.aggregate(cohort, 'segment_c2', {
+        'contacts': ('segment_c2', 'size'),
+        'closed': ('close_date', 'count'),
+    })
+    close_rate_df = pd.DataFrame({
+        'Segmento': segment_closed.index,
+        'Tasa de Cierre %': segment_closed['closed'] / segment_closed['contacts'] * 100,
+    })
     
     fig = px.bar(
         close_rate_df, x='Segmento', y='Tasa de Cierre %',
@@ -1256,11 +998,9 @@ def render_outcomes_tab_c2(cohort):
     if 'ttc_bucket' in cohort.columns:
         st.markdown("#### Análisis de Tiempo hasta Cierre")
         
-        ttc_dist = pd.crosstab(
-            cohort['segment_c2'],
-            cohort['ttc_bucket'],
-            normalize='index'
-        ) * 100
+        ttc_dist = query_engine.shares(cohort, 'segment_c2', 'ttc_bucket').pivot(
+            index='segment_c2', columns='ttc_bucket', values='percent'
+        ).fillna(0)
         
         bucket_order = ['Early (≤30 days)', 'Medium (31-60 days)', 'Late (61-120 days)', 
                        'Very Late (>120 days)', 'Still Open']
@@ -1281,9 +1021,11 @@ def render_outcomes_tab_c2(cohort):
         
         closed_cohort = cohort[cohort['days_to_close'].notna()]
         if len(closed_cohort) > 0:
-            geo_days = closed_cohort.groupby('geo_tier')['days_to_close'].agg(['mean', 'median', 'count'])
-            geo_days.columns = ['Días Prom', 'Días Mediana', 'Conteo Cerrados']
-            geo_days = geo_days.round(1)
+            geo_days = query_engine.aggregate(closed_cohort, 'geo_tier', {
+                'Días Prom': ('days_to_close', 'mean'),
+                'Días Mediana': ('days_to_close', 'median'),
+                'Conteo Cerrados': ('days_to_close', 'count'),
+            }).round(1)
             
             st.dataframe(geo_days, use_container_width=True)
 
@@ -1430,8 +1172,11 @@ def render_fast_slow_closers_c2(cohort):
     else:
         st.info("No hay suficientes datos para insights")
 
-def render_performance_benchmarks_c2(cohort):
+def render_performance_benchmarks_c2(cohort, cohort_version=None):
     """Render performance benchmarks tab for Cluster 2"""
+    cohort_version = cohort_version or get_cohort_version(cohort, sorted(get_geo_config().items()))
+    benchmarks = compute_benchmarks_c2(cohort, cohort_version)
+    
     st.markdown("### 🔬 Benchmarks de Rendimiento y Análisis Geográfico")
     st.markdown("Compara segmentos y geografías contra indicadores clave de rendimiento")
     
@@ -1440,17 +1185,7 @@ def render_performance_benchmarks_c2(cohort):
     # Benchmark metrics by segment
     st.markdown("#### 📊 Indicadores Clave de Rendimiento por Segmento")
     
-    benchmark_metrics = cohort.groupby('segment_c2').agg({
-        'contact_id': 'count',
-        'num_sessions': ['mean', 'median', 'std'],
-        'num_pageviews': ['mean', 'median', 'std'],
-        'forms_submitted': ['mean', 'median', 'std'],
-        'engagement_score': ['mean', 'median', 'std'],
-        'close_date': lambda x: x.notna().sum()
-    }).round(2)
-    
-    benchmark_metrics.columns = ['_'.join(col).strip('_') for col in benchmark_metrics.columns.values]
-    benchmark_metrics['close_rate_pct'] = (benchmark_metrics['close_date_<lambda>'] / benchmark_metrics['contact_id_count'] * 100).round(1)
+    benchmark_metrics = benchmarks['benchmark_metrics']
     
     st.dataframe(benchmark_metrics, use_container_width=True)
     
@@ -1459,15 +1194,7 @@ def render_performance_benchmarks_c2(cohort):
     # Geography tier performance
     st.markdown("#### 🗺️ Rendimiento por Nivel Geográfico")
     
-    geo_performance = cohort.groupby('geo_tier').agg({
-        'contact_id': 'count',
-        'num_sessions': 'mean',
-        'engagement_score': 'mean',
-        'close_date': lambda x: x.notna().sum()
-    }).round(2)
-    
-    geo_performance.columns = ['Conteo', 'Sesiones Prom', 'Compromiso Prom', 'Cerrados']
-    geo_performance['Tasa de Cierre %'] = (geo_performance['Cerrados'] / geo_performance['Conteo'] * 100).round(1)
+    geo_performance = benchmarks['geo_performance']
     
     col1, col2 = st.columns(2)
     
@@ -1478,31 +1205,22 @@ def render_performance_benchmarks_c2(cohort):
         fig = px.bar(
             x=geo_performance.index,
             y=geo_performance['Tasa de Cierre %'],
+            error_y=geo_performance['IC Sup %'] - geo_performance['Tasa de Cierre %'],
+            error_y_minus=geo_performance['Tasa de Cierre %'] - geo_performance['IC Inf %'],
             title="Tasa de Cierre por Nivel Geográfico",
             labels={'x': 'Nivel Geográfico', 'y': 'Tasa de Cierre %'},
             color=geo_performance['Tasa de Cierre %'],
             color_continuous_scale='RdYlGn'
         )
         st.plotly_chart(fig, use_container_width=True)
+        st.caption(interval_caption())
     
     st.markdown("---")
     
     # Country performance (top countries)
     st.markdown("#### 🌍 Rendimiento de Principales Países")
     
-    top_countries = cohort['country_any'].value_counts().head(15).index
-    country_data = cohort[cohort['country_any'].isin(top_countries)]
-    
-    country_performance = country_data.groupby('country_any').agg({
-        'contact_id': 'count',
-        'num_sessions': 'mean',
-        'engagement_score': 'mean',
-        'close_date': lambda x: x.notna().sum()
-    }).round(2)
-    
-    country_performance.columns = ['Conteo', 'Sesiones Prom', 'Compromiso Prom', 'Cerrados']
-    country_performance['Tasa de Cierre %'] = (country_performance['Cerrados'] / country_performance['Conteo'] * 100).round(1)
-    country_performance = country_performance.sort_values('Tasa de Cierre %', ascending=False)
+    country_performance = benchmarks['country_performance']
     
     col1, col2 = st.columns(2)
     
@@ -1513,6 +1231,8 @@ def render_performance_benchmarks_c2(cohort):
         fig = px.bar(
             x=country_performance.index,
             y=country_performance['Tasa de Cierre %'],
+            error_y=country_performance['IC Sup %'] - country_performance['Tasa de Cierre %'],
+            error_y_minus=country_performance['Tasa de Cierre %'] - country_performance['IC Inf %'],
             title="Tasa de Cierre por País (Top 15)",
             labels={'x': 'País', 'y': 'Tasa de Cierre %'},
             color=country_performance['Tasa de Cierre %'],
@@ -1526,11 +1246,11 @@ def render_performance_benchmarks_c2(cohort):
     # Engagement distribution by geography
     st.markdown("#### 📈 Distribución de Compromiso por Nivel Geográfico")
     
-    fig = px.box(
-        cohort, x='geo_tier', y='engagement_score',
-        color='geo_tier',
+    fig = create_box_plot(
+        cohort, x_col='geo_tier', y_col='engagement_score',
         title="Distribución de Puntuación de Compromiso por Nivel Geográfico",
-        labels={'geo_tier': 'Nivel Geográfico', 'engagement_score': 'Puntuación de Compromiso'}
+        labels={'geo_tier': 'Nivel Geográfico', 'engagement_score': 'Puntuación de Compromiso'},
+        version=cohort_version
     )
     st.plotly_chart(fig, use_container_width=True)
     
@@ -1557,11 +1277,8 @@ def render_performance_benchmarks_c2(cohort):
     if 'days_to_close' in cohort.columns:
         st.markdown("#### ⏱️ Análisis de Tiempo hasta Cierre por Geografía")
         
-        closed_cohort = cohort[cohort['days_to_close'].notna()]
-        if len(closed_cohort) > 0:
-            ttc_by_geo = closed_cohort.groupby('geo_tier')['days_to_close'].agg(['mean', 'median', 'count']).round(1)
-            ttc_by_geo.columns = ['Días Prom', 'Días Mediana', 'Conteo Cerrados']
-            
+        ttc_by_geo = benchmarks['ttc_by_geo']
+        if ttc_by_geo is not None and len(ttc_by_geo) > 0:
             col1, col2 = st.columns(2)
             
             with col1:
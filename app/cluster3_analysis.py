@@ -11,326 +11,32 @@ import plotly.graph_objects as go
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 from matplotlib.patches import FancyBboxPatch, FancyArrowPatch
-from collections import Counter
-from datetime import datetime
 from utils import (
-    hist_latest, hist_all, hist_concat_text,
+    hist_latest,
     create_segment_pie_chart, create_bar_chart,
-    calculate_close_rate, calculate_days_to_close, categorize_ttc,
-    display_metrics, create_download_button, display_dataframe_with_style
+    calculate_close_rate, calculate_days_to_close,
+    display_metrics, create_download_button, display_dataframe_with_style,
+    create_box_plot,
+    get_cohort_version, render_section_selector, memoize_section, shared_cohort,
+    shared_history, run_key
 )
+from pipeline_metrics import get_funnel_counts, format_funnel, PipelineTimer
+from segmentation_core import build_cluster3_cohort, list_value_counts, lists_contain
+import query_engine
+from path_analysis import render_path_analysis
+from benchmarks import compute_close_rate_intervals, interval_caption
 
-# APREU Activity Classification
-DIGITAL_ACTIVITIES = [
-    'sitio web', 'sitio', 'website', 'web', 
-    'formulario', 'formulario rua', 'rua', 'form',
-    'google ads', 'facebook ads', 'ads', 'paid search',
-    'organic search', 'organic', 'seo',
-    'landing page', 'lp'
-]
-
-EVENT_ACTIVITIES = [
-    'open day', 'openday', 'open house', 
-    'fogatada', 'fogata',
-    'tdla', 'tour de la admision', 'tour admisión',
-    'gira panama', 'gira panamá', 'panama', 'panamá',
-    'feria', 'feria universitaria', 'expo',
-    'evento carrera', 'eventos carreras',
-    'visita campus', 'campus tour', 'recorrido',
-    'conferencia', 'charla', 'webinar',
-    'día de puertas abiertas'
-]
-
-MESSAGING_ACTIVITIES = [
-    'whatsapp', 'whats app', 'wa', 
-    'mensaje directo', 'direct message', 'dm',
-    'chat', 'messenger',
-    'contacto directo', 'direct contact',
-    'llamada', 'phone call', 'call'
-]
-
-NICHE_ACTIVITIES = [
-    'lion leaders', 'lion leader', 'leaders',
-    'programa especial', 'special program',
-    'beca', 'scholarship', 'becas',
-    'intercambio', 'exchange',
-    'embajador', 'ambassador', 'embajadores',
-    'referido', 'referral', 'referred',
-    'alumni', 'ex-alumno'
-]
-
-def detect_activity_type(text, activity_dict):
-    """Search for activity keywords in text and return count of matches"""
-    if pd.isna(text) or text == "":
-        return 0
-    
-    text_lower = str(text).lower()
-    count = 0
-    
-    for keyword in activity_dict:
-        if keyword in text_lower:
-            count += 1
-    
-    return count
-
-def classify_entry_channel(apreu_hist, first_conv, recent_conv):
-    """Classify contact into entry channel segment (3A/3B/3C/3D)"""
-    all_text = f"{apreu_hist} {first_conv} {recent_conv}".lower()
-    
-    # Count each type of activity
-    digital_count = detect_activity_type(all_text, DIGITAL_ACTIVITIES)
-    event_count = detect_activity_type(all_text, EVENT_ACTIVITIES)
-    messaging_count = detect_activity_type(all_text, MESSAGING_ACTIVITIES)
-    niche_count = detect_activity_type(all_text, NICHE_ACTIVITIES)
-    
-    activity_scores = {
-        '3A_Digital': digital_count,
-        '3B_Event': event_count,
-        '3C_Messaging': messaging_count,
-        '3D_Niche': niche_count
-    }
-    
-    max_score = max(activity_scores.values())
-    
-    if max_score == 0:
-        return 'Unknown'
-    
-    # Priority: Event > Digital > Messaging > Niche
-    if activity_scores['3B_Event'] == max_score and max_score > 0:
-        return '3B_Event'
-    elif activity_scores['3A_Digital'] == max_score and max_score > 0:
-        return '3A_Digital'
-    elif activity_scores['3C_Messaging'] == max_score and max_score > 0:
-        return '3C_Messaging'
-    elif activity_scores['3D_Niche'] == max_score and max_score > 0:
-        return '3D_Niche'
-    else:
-        return 'Unknown'
-
-@st.cache_data
 def process_cluster3_data(_data, cache_key=None):
-    """Process data for Cluster 3 analysis
+    """Process data for Cluster 3 analysis (shared read-only cohort, see shared_cohort)
     
     Args:
-        _data: Input dataframe (underscore prevents caching on this param)
-        cache_key: String to bust cache when filters change (NO underscore = used for cache hashing)
+        _data: Input dataframe
+        cache_key: Pipeline run identifier (funnel counts are recorded under it)
     """
-    
-    df = _data.copy()
-    
-    # Column mapping
-    column_map = {
-        'Record ID': 'contact_id',
-        'Actividades de promoción APREU': 'apreu_activities',
-        'First Conversion': 'first_conversion',
-        'Recent Conversion': 'recent_conversion',
-        'First Conversion Date': 'first_conversion_date',
-        'Recent Conversion Date': 'recent_conversion_date',
-        'Preparatoria BPM': 'prep_bpm',
-        '¿Cuál es el nombre de tu preparatoria?': 'prep_name',
-        'Preparatoria donde estudia': 'prep_donde_estudia',
-        '¿Qué año de preparatoria estás cursando?': 'prep_year',
-        'Number of Sessions': 'num_sessions',
-        'Number of Pageviews': 'num_pageviews',
-        'Number of Form Submissions': 'forms_submitted',
-        'Marketing emails delivered': 'email_delivered',
-        'Marketing emails opened': 'email_opened',
-        'Marketing emails clicked': 'email_clicked',
-        'Likelihood to close': 'likelihood_to_close',
-        'Create Date': 'create_date',
-        'Close Date': 'close_date',
-        'Lifecycle Stage': 'lifecycle_stage',
-        'Propiedad del contacto': 'propiedad_del_contacto'
-    }
-    
-    df = df.rename(columns=column_map)
-    
-    # Fallback: Check if close_date wasn't renamed (column didn't exist)
-    # Try to find alternative close date column names
-    if 'close_date' not in df.columns:
-        possible_close_cols = [col for col in df.columns if 'close' in col.lower() and 'date' in col.lower()]
-        if possible_close_cols:
-            df = df.rename(columns={possible_close_cols[0]: 'close_date'})
-    
-    # Parse historical APREU activities
-    if 'apreu_activities' in df.columns:
-        df['apreu_hist_all'] = df['apreu_activities'].apply(hist_concat_text)
-        df['apreu_activities_list'] = df['apreu_activities'].apply(hist_all)
-        df['apreu_activity_count'] = df['apreu_activities_list'].apply(len)
-        df['apreu_activity_diversity'] = df['apreu_activities_list'].apply(lambda x: len(set(x)))
-    else:
-        df['apreu_hist_all'] = ""
-        df['apreu_activities_list'] = [[] for _ in range(len(df))]
-        df['apreu_activity_count'] = 0
-        df['apreu_activity_diversity'] = 0
-    
-    # Apply hist_latest to other fields
-    for col in ['first_conversion', 'recent_conversion', 'prep_bpm', 'prep_name', 
-                'prep_donde_estudia', 'prep_year', 'lifecycle_stage', 'propiedad_del_contacto']:
-        if col in df.columns:
-            df[col] = df[col].apply(hist_latest)
-    
-    # Convert numeric columns (apply hist_latest first!)
-    numeric_cols = ['num_sessions', 'num_pageviews', 'forms_submitted', 
-                   'email_delivered', 'email_opened', 'email_clicked', 'likelihood_to_close']
-    
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col].apply(hist_latest), errors='coerce').fillna(0)
-    
-    # Convert date columns (HubSpot timestamps to datetime)
-    # CRITICAL: Apply hist_latest FIRST to extract the latest date from history string!
-    def convert_hubspot_timestamp(val):
-        """Convert HubSpot timestamp (milliseconds since epoch) to datetime."""
-        if pd.isna(val):
-            return pd.NaT
-        # If already a datetime, return as-is
-        if isinstance(val, (pd.Timestamp, datetime)):
-            return val
-        # First extract latest value from history string
-        val = hist_latest(val)
-        if pd.isna(val):
-            return pd.NaT
-        try:
-            timestamp_ms = int(float(str(val).strip()))
-            return pd.to_datetime(timestamp_ms, unit='ms')
-        except (ValueError, TypeError):
-            return pd.NaT
-    
-    date_cols = ['create_date', 'close_date', 'first_conversion_date', 'recent_conversion_date']
-    for col in date_cols:
-        if col in df.columns:
-            df[col] = df[col].apply(convert_hubspot_timestamp)
-    
-    # Calculate days_to_close (matching notebook logic)
-    if 'create_date' in df.columns and 'close_date' in df.columns:
-        raw_days = (df['close_date'] - df['create_date']).dt.days
-        df['days_to_close'] = raw_days.where(raw_days >= 0)
-        df['ttc_bucket'] = df['days_to_close'].apply(categorize_ttc)
-    else:
-        df['days_to_close'] = np.nan
-        df['ttc_bucket'] = "Desconocido"
-    
-    # Filter for APREU contacts (matching Clusters 1 & 2 approach)
-    if 'propiedad_del_contacto' in df.columns:
-        df = df[df['propiedad_del_contacto'].str.upper() == 'APREU'].copy()
-    
-    # Filter out "Other" and "subscriber" lifecycle stages
-    if 'lifecycle_stage' in df.columns:
-        df = df[~df['lifecycle_stage'].str.lower().isin(['other', 'subscriber'])].copy()
-    
-    # Fill NaN values for classification
-    df['apreu_hist_all'] = df['apreu_hist_all'].fillna("")
-    df['first_conversion'] = df['first_conversion'].fillna("")
-    df['recent_conversion'] = df['recent_conversion'].fillna("")
-    
-    # Classify entry channel
-    df['entry_channel'] = df.apply(
-        lambda row: classify_entry_channel(
-            row['apreu_hist_all'], 
-            row['first_conversion'], 
-            row['recent_conversion']
-        ), 
-        axis=1
+    return shared_cohort(
+        'cluster3', _data, lambda delta: build_cluster3_cohort(_data, funnel_key=cache_key, delta=delta, history=shared_history()),
+        cache_key, funnel_key=cache_key
     )
-    
-    # Create segment labels with descriptive names
-    segment_descriptions = {
-        '3A_Digital': '3A - Canal Digital (Sitio Web, Formularios)',
-        '3B_Event': '3B - Canal Eventos (Open Day, Fogatada, TDLA)',
-        '3C_Messaging': '3C - Canal Mensajería (WhatsApp, DM)',
-        '3D_Niche': '3D - Canal Nicho (Programas Especiales)',
-        'Unknown': 'Desconocido'
-    }
-    
-    df['segment_c3'] = df['entry_channel'].map(segment_descriptions)
-    
-    # Action tags
-    action_tags = {
-        '3A_Digital': 'Embudo de admisión acelerado + secuencias de email automatizadas',
-        '3B_Event': 'Seguimiento post-evento dentro de 48h + comunicación de próximos pasos',
-        '3C_Messaging': 'WhatsApp/email personalizado + prioridad de respuesta rápida (<2h)',
-        '3D_Niche': 'Evaluar ROI + soporte especializado + considerar escalamiento',
-        'Unknown': 'Necesita clasificación - analizar manualmente'
-    }
-    
-    df['action_tag'] = df['entry_channel'].map(action_tags)
-    
-    # Consolidate preparatoria
-    def consolidate_prepa(row):
-        for field in ['prep_bpm', 'prep_name', 'prep_donde_estudia']:
-            if field in row and pd.notna(row[field]) and str(row[field]).strip() not in ['', 'nan', 'None']:
-                return str(row[field]).strip()
-                return "Desconocido"
-    
-    df['preparatoria'] = df.apply(consolidate_prepa, axis=1)
-    
-    # Normalize preparatoria year
-    if 'prep_year' in df.columns:
-        def normalize_year(val):
-            if pd.isna(val):
-                return "Desconocido"
-            s = str(val).strip().lower()
-            if any(x in s for x in ['1', 'primer', 'first', 'uno']):
-                return "1st Year"
-            elif any(x in s for x in ['2', 'segundo', 'second', 'dos']):
-                return "2nd Year"
-            elif any(x in s for x in ['3', 'tercer', 'third', 'tres']):
-                return "3rd Year"
-            else:
-                return "Desconocido"
-        
-        df['prep_year_normalized'] = df['prep_year'].apply(normalize_year)
-    else:
-        df['prep_year_normalized'] = "Desconocido"
-    
-    # Feature engineering
-    df['log_sessions'] = np.log1p(df.get('num_sessions', 0))
-    df['log_pageviews'] = np.log1p(df.get('num_pageviews', 0))
-    df['log_forms'] = np.log1p(df.get('forms_submitted', 0))
-    df['engagement_score'] = df['log_sessions'] + df['log_pageviews'] + df['log_forms']
-    
-    # Email engagement
-    email_open_rate = np.where(
-        df['email_delivered'] > 0,
-        df['email_opened'] / df['email_delivered'],
-        0
-    )
-    
-    email_click_rate = np.where(
-        df['email_opened'] > 0,
-        df['email_clicked'] / df['email_opened'],
-        0
-    )
-    
-    df['email_engagement_score'] = (email_open_rate * 0.5) + (email_click_rate * 0.5)
-    
-    # Conversion journey duration (matching notebook logic)
-    if 'first_conversion_date' in df.columns and 'recent_conversion_date' in df.columns:
-        df['conversion_journey_days'] = (
-            df['recent_conversion_date'] - df['first_conversion_date']
-        ).dt.days
-        df['conversion_journey_days'] = df['conversion_journey_days'].where(
-            df['conversion_journey_days'] >= 0
-        )
-    
-    # Normalize likelihood
-    if 'likelihood_to_close' in df.columns:
-        max_val = df['likelihood_to_close'].max()
-        if max_val > 1:
-            df['likelihood_pct'] = df['likelihood_to_close']
-        else:
-            df['likelihood_pct'] = df['likelihood_to_close'] * 100
-    else:
-        df['likelihood_pct'] = 0
-    
-    # Calculate is_closed (contacts with a close_date)
-    if 'close_date' in df.columns:
-        df['is_closed'] = df['close_date'].notna().astype(int)
-    else:
-        df['is_closed'] = 0
-    
-    return df
 
 def create_cluster3_xlsx_export(cohort):
     """Create comprehensive XLSX workbook with 30+ analysis sheets"""
@@ -338,6 +44,8 @@ def create_cluster3_xlsx_export(cohort):
     import pandas as pd
     from utils import hist_latest
     
+    timer = PipelineTimer('cluster3_export', rows_in=len(cohort))
+    
     # Apply hist_latest to get only the latest values for export
     cohort_export = cohort.copy()
     
@@ -348,6 +56,8 @@ def create_cluster3_xlsx_export(cohort):
         if col in cohort_export.columns:
             cohort_export[col] = cohort_export[col].apply(hist_latest)
     
+    timer.lap('latest_values', len(cohort_export))
+    
     output = BytesIO()
     
     with pd.ExcelWriter(output, engine='openpyxl') as writer:
@@ -447,6 +157,8 @@ def create_cluster3_xlsx_export(cohort):
                 ttc_overall.to_excel(writer, sheet_name="16_ttc_overall")
     
     output.seek(0)
+    timer.lap('write_workbook', len(cohort_export))
+    timer.finish(len(cohort_export))
     return output.getvalue()
 
 def render_cluster3(data):
@@ -493,9 +205,8 @@ def render_cluster3(data):
         st.error("⚠️ Datos no cargados.")
         return
     
-    # Process data with cache busting based on data length
-    # This ensures the cache refreshes when global filters change the data
-    cache_key = f"c3_{len(data)}_{data['Record ID'].iloc[0] if 'Record ID' in data.columns else 'na'}"
+    # Pipeline run key of this dataset and global filter selection
+    cache_key = run_key("c3")
     with st.spinner("Procesando datos del Cluster 3..."):
         cohort = process_cluster3_data(data, cache_key)
     
@@ -506,11 +217,26 @@ def render_cluster3(data):
             st.info(f"🔍 Analizando {len(cohort):,} contactos después de aplicar filtros principales (APREU, excluyendo 'other'/'subscriber') + filtros globales")
         else:
             st.info(f"📊 Analizando {len(cohort):,} contactos después de aplicar filtros principales (APREU, excluyendo 'other'/'subscriber')")
+        
+        # Stage counts recorded while the pipeline ran
+        funnel = get_funnel_counts(cache_key)
+        if funnel:
+            st.caption(f"🔻 Pipeline: {format_funnel(funnel)}")
     
     if len(cohort) == 0:
         st.warning("No hay datos disponibles después de los filtros.")
         return
     
+    # Export and sections rerun as a fragment, without reloading data or
+    # re-applying the global filters
+    render_cluster3_sections(cohort, cache_key)
+
+@st.fragment
+def render_cluster3_sections(cohort, cache_key):
+    """Render Cluster 3 export and the selected section as an isolated fragment"""
+    
+    cohort_version = get_cohort_version(cohort, cache_key)
+    
     # Export functionality
     with st.expander("📥 Exportar Datos", expanded=False):
         st.markdown("**Descargar datos filtrados:**")
@@ -572,7 +298,7 @@ def render_cluster3(data):
         with col2:
             # Export comprehensive XLSX workbook
             with st.spinner("Generando libro de trabajo Excel integral..."):
-                xlsx_data = create_cluster3_xlsx_export(cohort)
+                xlsx_data = memoize_section("c3_xlsx_export", cohort_version, lambda: create_cluster3_xlsx_export(cohort))
                 st.download_button(
                     label="📊 Descargar Libro de Trabajo Integral (XLSX) - 30+ Hojas",
                     data=xlsx_data,
@@ -582,36 +308,23 @@ def render_cluster3(data):
                     help="Libro de trabajo de análisis integral con 30+ hojas: resumen ejecutivo, rendimiento de segmentos, análisis de actividades, insights de preparatorias, compromiso por email, ¡y más!"
                 )
     
-    # Create tabs
-    tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8 = st.tabs([
-        "📊 Resumen", "🎯 Análisis de Segmento", "🎪 Análisis de Actividad",
-        "🏫 Análisis de Preparatoria", "📧 Email y Conversión", "⚡ Cerradores Rápidos/Lentos", 
-        "📅 Período Académico", "🔍 Búsqueda de Contactos"
-    ])
-    
-    with tab1:
-        render_overview_tab_c3(cohort)
-    
-    with tab2:
-        render_segment_analysis_tab_c3(cohort)
-    
-    with tab3:
-        render_activity_analysis_tab(cohort)
-    
-    with tab4:
-        render_preparatoria_analysis_tab(cohort)
-    
-    with tab5:
-        render_email_conversion_tab_c3(cohort)
-    
-    with tab6:
-        render_fast_slow_closers_c3(cohort)
-    
-    with tab7:
-        render_academic_period_tab_c3(cohort)
-    
-    with tab8:
-        render_contact_lookup_tab_c3(cohort)
+    # Section navigation: only the selected section is computed on each rerun
+    sections = {
+        "📊 Resumen": render_overview_tab_c3,
+        "🎯 Análisis de Segmento": render_segment_analysis_tab_c3,
+        "🎪 Análisis de Actividad": render_activity_analysis_tab,
+        "🔀 Rutas de Actividades": lambda c: render_path_analysis(
+            c, cohort_version, 'apreu_activities', 'segment_c3',
+            "Rutas entre Actividades APREU", "actividades APREU", "c3"
+        ),
+        "🏫 Análisis de Preparatoria": lambda c: render_preparatoria_analysis_tab(c, cohort_version),
+        "📧 Email y Conversión": render_email_conversion_tab_c3,
+        "⚡ Cerradores Rápidos/Lentos": render_fast_slow_closers_c3,
+        "📅 Período Académico": render_academic_period_tab_c3,
+        "🔍 Búsqueda de Contactos": render_contact_lookup_tab_c3,
+    }
+    selected_section = render_section_selector(list(sections.keys()), key="c3_section")
+    sections[selected_section](cohort)
 
 def render_overview_tab_c3(cohort):
     """Render overview tab for Cluster 3"""
@@ -765,18 +478,11 @@ def render_segment_analysis_tab_c3(cohort):
     with col1:
         st.markdown("#### Principales Actividades APREU")
         
-        # Extract activities for this segment
-        all_activities = []
-        for activities_list in seg_data['apreu_activities_list']:
-            if activities_list:
-                all_activities.extend(activities_list)
-        
-        if all_activities:
-            activity_counts = Counter(all_activities)
-            top_activities = pd.DataFrame(
-                activity_counts.most_common(10),
-                columns=['Actividad', 'Conteo']
-            )
+        # Count activities for this segment
+        activity_counts = list_value_counts(seg_data['apreu_activities_list'])
+        
+        if not activity_counts.empty:
+            top_activities = activity_counts.head(10).rename_axis('Actividad').reset_index(name='Conteo')
             
             fig = px.bar(
                 top_activities, x='Conteo', y='Actividad',
@@ -842,26 +548,19 @@ def render_activity_analysis_tab(cohort):
     
     st.markdown(f"**Contactos con actividades APREU:** {len(with_activities):,} de {len(cohort):,}")
     
-    # Extract all activities
-    all_activities = []
-    for activities_list in with_activities['apreu_activities_list']:
-        if activities_list:
-            all_activities.extend(activities_list)
+    # Count all activities
+    activity_counts = list_value_counts(with_activities['apreu_activities_list'])
     
-    if not all_activities:
+    if activity_counts.empty:
         st.warning("No se encontraron actividades APREU en el dataset.")
         return
     
-    st.markdown(f"**Total de instancias de actividades:** {len(all_activities):,}")
+    st.markdown(f"**Total de instancias de actividades:** {int(activity_counts.sum()):,}")
     
     # Top activities
     st.markdown("#### Top 20 Actividades APREU")
     
-    activity_counts = Counter(all_activities)
-    top_activities_df = pd.DataFrame(
-        activity_counts.most_common(20),
-        columns=['Actividad', 'Conteo']
-    )
+    top_activities_df = activity_counts.head(20).rename_axis('Actividad').reset_index(name='Conteo')
     top_activities_df['Porcentaje'] = (
         top_activities_df['Conteo'] / top_activities_df['Conteo'].sum() * 100
     ).round(2)
@@ -884,9 +583,7 @@ def render_activity_analysis_tab(cohort):
     activity_conversion = []
     for activity in top_activities_df.head(15)['Actividad']:
         contacts_with_activity = with_activities[
-            with_activities['apreu_activities_list'].apply(
-                lambda x: activity in x if x else False
-            )
+            lists_contain(with_activities['apreu_activities_list'], activity)
         ]
         
         if len(contacts_with_activity) > 0:
@@ -913,20 +610,16 @@ def render_activity_analysis_tab(cohort):
     # Activity by entry channel
     st.markdown("#### Distribución de Actividades por Canal de Entrada")
     
-    # Create mapping
-    activity_segment_map = []
+    # Create mapping (one row per activity of each contact)
     analyzed = with_activities[with_activities['segment_c3'] != 'Unknown']
+    activity_segment_df = (
+        analyzed[['apreu_activities_list', 'segment_c3']]
+        .explode('apreu_activities_list')
+        .dropna(subset=['apreu_activities_list'])
+        .set_axis(['activity', 'segment'], axis=1)
+    )
     
-    for idx, row in analyzed.iterrows():
-        activities = row['apreu_activities_list']
-        segment = row['segment_c3']
-        if activities:
-            for activity in activities:
-                activity_segment_map.append({'activity': activity, 'segment': segment})
-    
-    if activity_segment_map:
-        activity_segment_df = pd.DataFrame(activity_segment_map)
-        
+    if not activity_segment_df.empty:
         # Get top 10 activities
         top_10_activities = top_activities_df.head(10)['Actividad'].tolist()
         
@@ -950,7 +643,7 @@ def render_activity_analysis_tab(cohort):
             fig.update_layout(height=500)
             st.plotly_chart(fig, use_container_width=True)
 
-def render_preparatoria_analysis_tab(cohort):
+def render_preparatoria_analysis_tab(cohort, cohort_version=None):
     """Render preparatoria analysis tab"""
     st.markdown("### 🏫 Análisis de Preparatoria")
     
@@ -992,6 +685,8 @@ def render_preparatoria_analysis_tab(cohort):
     
     top_prepa_list = top_prepas.head(15).index.tolist()
     top_prepa_data = with_prepa[with_prepa['preparatoria'].isin(top_prepa_list)]
+    # Close-rate confidence intervals of every preparatoria, computed in one pass
+    prepa_intervals = compute_close_rate_intervals(cohort, cohort_version or get_cohort_version(cohort), 'preparatoria')
     
     prepa_performance = top_prepa_data.groupby('preparatoria').agg({
         'contact_id': 'count',
@@ -1007,6 +702,8 @@ def render_preparatoria_analysis_tab(cohort):
                                  'Avg Engagement', 'Avg Activities']
     prepa_performance['Close Rate %'] = (prepa_performance['Close Rate'] * 100).round(1)
     prepa_performance = prepa_performance.drop('Close Rate', axis=1)
+    prepa_performance['CI Low %'] = prepa_intervals['ci_low_pct'].reindex(prepa_performance.index).round(1)
+    prepa_performance['CI High %'] = prepa_intervals['ci_high_pct'].reindex(prepa_performance.index).round(1)
     
     prepa_performance = prepa_performance.sort_values('Close Rate %', ascending=False)
     
@@ -1041,6 +738,8 @@ def render_preparatoria_analysis_tab(cohort):
     prepa_conversion_enhanced['Tasa de Conversión %'] = (
         prepa_conversion_enhanced['Cerrados'] / prepa_conversion_enhanced['Total'] * 100
     ).round(1)
+    prepa_conversion_enhanced['IC Inf %'] = prepa_intervals['ci_low_pct'].reindex(prepa_conversion_enhanced.index).round(1)
+    prepa_conversion_enhanced['IC Sup %'] = prepa_intervals['ci_high_pct'].reindex(prepa_conversion_enhanced.index).round(1)
     prepa_conversion_enhanced = prepa_conversion_enhanced.sort_values('Tasa de Conversión %', ascending=False)
     
     st.dataframe(prepa_conversion_enhanced, use_container_width=True)
@@ -1052,6 +751,8 @@ def render_preparatoria_analysis_tab(cohort):
         fig = px.bar(
             x=prepa_conversion_enhanced.index,
             y=prepa_conversion_enhanced['Tasa de Conversión %'],
+            error_y=prepa_conversion_enhanced['IC Sup %'] - prepa_conversion_enhanced['Tasa de Conversión %'],
+            error_y_minus=prepa_conversion_enhanced['Tasa de Conversión %'] - prepa_conversion_enhanced['IC Inf %'],
             title="Tasa de Conversión por Preparatoria",
             labels={'x': 'Preparatoria', 'y': 'Tasa de Conversión %'},
             color=prepa_conversion_enhanced['Tasa de Conversión %'],
@@ -1059,6 +760,7 @@ def render_preparatoria_analysis_tab(cohort):
         )
         fig.update_layout(xaxis_tickangle=-45, height=400)
         st.plotly_chart(fig, use_container_width=True)
+        st.caption(interval_caption())
     
     with col2:
         if prepa_conversion_enhanced['Días Prom hasta Cierre'].notna().any():
@@ -1127,13 +829,12 @@ def render_preparatoria_analysis_tab(cohort):
         
         # Box plot for distribution
         st.markdown("**Distribución de Tiempo hasta Cierre por Canal:**")
-        fig = px.box(
+        fig = create_box_plot(
             analyzed_channels,
-            x='segment_c3',
-            y='days_to_close',
+            x_col='segment_c3',
+            y_col='days_to_close',
             title="Distribución de Días hasta Cierre por Canal de Entrada",
-            labels={'segment_c3': 'Canal de Entrada', 'days_to_close': 'Días hasta Cierre'},
-            color='segment_c3'
+            labels={'segment_c3': 'Canal de Entrada', 'days_to_close': 'Días hasta Cierre'}
         )
         fig.update_layout(xaxis_tickangle=-45, height=400)
         st.plotly_chart(fig, use_container_width=True)
@@ -1263,14 +964,10 @@ def render_preparatoria_analysis_tab(cohort):
     st.markdown("*Muestra qué porcentaje de los contactos de cada preparatoria asistió a cada actividad*")
     
     # Get top activities
-    all_activities = []
-    for activities_list in with_prepa['apreu_activities_list']:
-        if activities_list:
-            all_activities.extend(activities_list)
+    activity_counts = list_value_counts(with_prepa['apreu_activities_list'])
     
-    if all_activities:
-        activity_counts = Counter(all_activities)
-        top_activities_list = [act for act, _ in activity_counts.most_common(10)]
+    if not activity_counts.empty:
+        top_activities_list = activity_counts.head(10).index.tolist()
         
         # Calculate participation % for top 15 preparatorias
         prepa_activity_participation = []
@@ -1287,9 +984,7 @@ def render_preparatoria_analysis_tab(cohort):
             # For each activity, calculate what % of this prepa's contacts attended it
             for activity in top_activities_list:
                 contacts_with_activity = prepa_contacts[
-                    prepa_contacts['apreu_activities_list'].apply(
-                        lambda x: activity in x if x else False
-                    )
+                    lists_contain(prepa_contacts['apreu_activities_list'], activity)
                 ]
                 
                 participation_pct = (len(contacts_with_activity) / total_prepa_contacts * 100) if total_prepa_contacts > 0 else 0
@@ -1338,10 +1033,10 @@ def render_email_conversion_tab_c3(cohort):
             available_email_fields[display_name] = col_name
     
     if available_email_fields:
-        email_by_segment = cohort.groupby('segment_c3')[list(available_email_fields.values())].agg(['sum', 'mean']).round(2)
-        
-        # Flatten column names
-        email_by_segment.columns = [f'{col[0]}_{col[1]}' for col in email_by_segment.columns]
+        email_by_segment = query_engine.aggregate(cohort, 'segment_c3', {
+            f'{col}_{stat}': (col, stat)
+            for col in available_email_fields.values() for stat in ('sum', 'mean')
+        }).round(2)
         
         st.dataframe(email_by_segment, use_container_width=True)
         
@@ -1355,14 +1050,17 @@ def render_email_conversion_tab_c3(cohort):
                 for field_col in available_email_fields.values():
                     if field_col in cohort.columns:
                         email_score += cohort[field_col].fillna(0)
-                cohort_temp = cohort.copy()
-                cohort_temp['email_engagement_score'] = email_score
+                # Only the two columns the breakdown reads, not a copy of the cohort
+                cohort_temp = pd.DataFrame({'segment_c3': cohort['segment_c3'], 'email_engagement_score': email_score})
             else:
                 cohort_temp = cohort
             
             if 'email_engagement_score' in cohort_temp.columns:
-                email_dist = cohort_temp.groupby('segment_c3')['email_engagement_score'].describe()[['mean', '50%', 'max']]
-                email_dist.columns = ['Promedio', 'Mediana', 'Máximo']
+                email_dist = query_engine.aggregate(cohort_temp, 'segment_c3', {
+                    'Promedio': ('email_engagement_score', 'mean'),
+                    'Mediana': ('email_engagement_score', 'median'),
+                    'Máximo': ('email_engagement_score', 'max'),
+                })
                 st.dataframe(email_dist.round(2), use_container_width=True)
         
         st.markdown("---")
@@ -1389,7 +1087,7 @@ def render_email_conversion_tab_c3(cohort):
             
             with col1:
                 st.markdown("**Principales Eventos de Primera Conversión:**")
-                first_conv = cohort['first_conversion'].value_counts().head(10)
+                first_conv = query_engine.value_counts(cohort, 'first_conversion', limit=10)
                 st.dataframe(pd.DataFrame({
                     'Evento': first_conv.index,
                     'Conteo': first_conv.values,
@@ -1399,7 +1097,7 @@ def render_email_conversion_tab_c3(cohort):
             with col2:
                 if 'recent_conversion' in cohort.columns:
                     st.markdown("**Principales Eventos de Conversión Reciente:**")
-                    recent_conv = cohort['recent_conversion'].value_counts().head(10)
+                    recent_conv = query_engine.value_counts(cohort, 'recent_conversion', limit=10)
                     st.dataframe(pd.DataFrame({
                         'Evento': recent_conv.index,
                         'Conteo': recent_conv.values,
@@ -1411,13 +1109,15 @@ def render_email_conversion_tab_c3(cohort):
             st.markdown("---")
             st.markdown("**Análisis de Duración del Recorrido de Conversión:**")
             
-            journey_stats = cohort[cohort['conversion_journey_days'].notna()].groupby('segment_c3')['conversion_journey_days'].agg([
-                'count', 'mean', 'median', 'min', 'max'
-            ]).round(1)
-            
-            journey_stats.columns = ['Contactos', 'Días Prom', 'Días Mediana', 'Días Mín', 'Días Máx']
+            journey_stats = query_engine.aggregate(cohort[cohort['conversion_journey_days'].notna()], 'segment_c3', {
+                'Contactos': ('conversion_journey_days', 'count'),
+                'Días Prom': ('conversion_journey_days', 'mean'),
+                'Días Mediana': ('conversion_journey_days', 'median'),
+                'Días Mín': ('conversion_journey_days', 'min'),
+                'Días Máx': ('conversion_journey_days', 'max'),
+            })
             
-            st.dataframe(journey_stats, use_container_width=True)
+            st.dataframe(journey_stats.round(1), use_container_width=True)
             
             # Journey duration distribution
             col1, col2 = st.columns(2)
@@ -1449,7 +1149,7 @@ def render_email_conversion_tab_c3(cohort):
             
             with col2:
                 st.markdown("**Recorrido Promedio por Segmento:**")
-                avg_journey = cohort[cohort['conversion_journey_days'].notna()].groupby('segment_c3')['conversion_journey_days'].mean().sort_values()
+                avg_journey = journey_stats['Días Prom'].sort_values()
                 
                 # Create DataFrame for proper Plotly plotting
                 journey_df = pd.DataFrame({
@@ -1475,24 +1175,17 @@ def render_email_conversion_tab_c3(cohort):
         st.markdown("**Conversion Event Performance (Close Rates):**")
         
         if 'first_conversion' in cohort.columns and 'is_closed' in cohort.columns:
-            conv_performance = []
-            top_events = cohort['first_conversion'].value_counts().head(12).index
+            # Top 12 events by volume; mean() of is_closed like the notebook for consistency
+            conv_df = query_engine.aggregate(cohort, 'first_conversion', {
+                'Contacts': ('first_conversion', 'size'),
+                'Closed': ('is_closed', 'sum'),
+                'Close Rate %': ('is_closed', 'mean'),
+            }, sort='Contacts', ascending=False, limit=12)
             
-            for event in top_events:
-                event_contacts = cohort[cohort['first_conversion'] == event]
-                # Use mean() directly like the notebook for consistency
-                close_rate = event_contacts['is_closed'].mean() * 100 if len(event_contacts) > 0 else 0
-                closed = event_contacts['is_closed'].sum()
-                
-                conv_performance.append({
-                    'First Conversion Event': event,
-                    'Contacts': len(event_contacts),
-                    'Closed': int(closed),
-                    'Close Rate %': round(close_rate, 2)
-                })
-            
-            if conv_performance:
-                conv_df = pd.DataFrame(conv_performance).sort_values('Close Rate %', ascending=False)
+            if len(conv_df) > 0:
+                conv_df['Close Rate %'] = (conv_df['Close Rate %'] * 100).round(2)
+                conv_df = conv_df.rename_axis('First Conversion Event').reset_index()
+                conv_df = conv_df.sort_values('Close Rate %', ascending=False)
                 st.dataframe(conv_df, use_container_width=True)
     else:
         st.info("Datos de línea de tiempo de conversión no disponibles en el dataset")
@@ -1502,14 +1195,12 @@ def render_email_conversion_tab_c3(cohort):
     st.markdown("#### 🔄 Distribución de Etapa del Ciclo de Vida")
     
     if 'lifecycle_stage' in cohort.columns:
-        lifecycle_by_segment = pd.crosstab(
-            cohort['segment_c3'],
-            cohort['lifecycle_stage'],
-            normalize='index'
-        ) * 100
+        lifecycle_by_segment = query_engine.shares(cohort, 'segment_c3', 'lifecycle_stage').pivot(
+            index='segment_c3', columns='lifecycle_stage', values='percent'
+        ).fillna(0)
         
         # Show top 8 stages
-        top_stages = cohort['lifecycle_stage'].value_counts().head(8).index
+        top_stages = query_engine.value_counts(cohort, 'lifecycle_stage', limit=8).index
         lifecycle_filtered = lifecycle_by_segment[lifecycle_by_segment.columns.intersection(top_stages)]
         
         st.dataframe(lifecycle_filtered.round(1), use_container_width=True)
@@ -0,0 +1,258 @@
+"""
+Cohort Disk Cache Module
+Persistent tier under the in-memory caches: processed cohorts and benchmark
+aggregates are written as Parquet to a mounted volume, so the first session
+after a Cloud Run scale-to-zero reads them back instead of re-running the
+pipelines. The tier is off unless COHORT_CACHE_DIR is set: Cloud Run's local
+disk is memory and does not survive the instance anyway.
+
+Entries are keyed by dataset content hash + pipeline code version + context
+(geo config, filters...). Each entry is a directory written under a temporary
+name and renamed into place, so readers never see a partial entry. The
+least recently read entries are removed once the cache exceeds
+COHORT_CACHE_MAX_MB.
+"""
+
+from pathlib import Path
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+APP_DIR = Path(__file__).resolve().parent
+
+# Cache directory, e.g. a volume mount (empty, the default: no disk tier)
+COHORT_CACHE_DIR = os.getenv("COHORT_CACHE_DIR", "")
+COHORT_CACHE_MAX_MB = int(os.getenv("COHORT_CACHE_MAX_MB", "2048"))
+# Leftover temporary directories (crashed writers) older than this are removed
+STALE_TMP_SECONDS = 3600
+
+_evict_lock = threading.Lock()
+
+def _code_version():
+    """Hash of the code that produces cached frames; editing it invalidates the cache"""
+    digest = hashlib.sha1()
+    sources = sorted((APP_DIR / "segmentation_core").glob("*.py")) + [APP_DIR / "benchmarks.py", APP_DIR / "path_analysis.py"]
+    for path in sources:
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:12]
+
+PIPELINE_CODE_VERSION = _code_version()
+
+def cache_enabled():
+    return bool(COHORT_CACHE_DIR)
+
+def entry_key(kind, dataset_key, *context):
+    """Directory name of an entry: kind + hash of dataset, code version and context"""
+    digest = hashlib.sha1()
+    for part in (dataset_key, PIPELINE_CODE_VERSION, *context):
+        digest.update(repr(part).encode())
+        digest.update(b"\0")
+    return f"{kind}-{digest.hexdigest()[:24]}"
+
+def _column_meta(df):
+    """Dtype and null marker of each column, to undo the Parquet round trip"""
+    meta = {}
+    for col in df.columns:
+        values = df[col]
+        entry = {'dtype': str(values.dtype)}
+        if isinstance(values.dtype, pd.ArrowDtype):
+            # 'string[pyarrow]' also names StringDtype; rebuilt from the Arrow column
+            entry['arrow'] = True
+        elif values.dtype == object:
+            nulls = values[values.isna()]
+            entry['null'] = 'none' if any(v is None for v in nulls) else 'nan'
+            entry['list'] = bool(len(values) and values.map(lambda v: isinstance(v, list)).any())
+        meta[str(col)] = entry
+    return meta
+
+def _restore_columns(df, meta):
+    for col, entry in meta.items():
+        if col not in df.columns:
+            continue
+        dtype = entry['dtype']
+        if entry.get('arrow'):
+            continue
+        if dtype == 'object':
+            values = df[col]
+            if entry.get('list'):
+                values = values.map(lambda v: v.tolist() if isinstance(v, np.ndarray) else v)
+            df[col] = values.where(values.notna(), None if entry['null'] == 'none' else np.nan).astype(object)
+        elif str(df[col].dtype) != dtype and dtype != 'category':
+            df[col] = df[col].astype(pd.api.types.pandas_dtype(dtype))
+    return df
+
+def _write_frame(frame, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(frame, preserve_index=True)
+    pq.write_table(table, path)
+    return _column_meta(frame)
+
+def _read_frame(path, meta):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path)
+    # The pandas metadata names nested Arrow columns (list columns) with a dtype
+    # string pandas cannot parse back, so their type is mapped explicitly
+    nested = {
+        table.schema.field(col).type for col, entry in meta.items()
+        if entry.get('arrow') and col in table.column_names and pa.types.is_nested(table.schema.field(col).type)
+    }
+    df = _restore_columns(table.to_pandas(types_mapper=lambda t: pd.ArrowDtype(t) if t in nested else None), meta)
+    for col, entry in meta.items():
+        if entry.get('arrow') and col in df.columns:
+            df[col] = pd.Series(pd.arrays.ArrowExtensionArray(table.column(col)), index=df.index)
+    return df
+
+def _write_entry(value, directory):
+    """Write a frame, a Series or a dict of them (None allowed) into `directory`"""
+    items = value if isinstance(value, dict) else {'__value__': value}
+    manifest = {'dict': isinstance(value, dict), 'items': {}}
+    for i, (name, item) in enumerate(items.items()):
+        if item is None:
+            manifest['items'][name] = {'type': 'none'}
+            continue
+        is_series = isinstance(item, pd.Series)
+        if not is_series and not isinstance(item, pd.DataFrame):
+            raise TypeError(f"Cannot persist {type(item).__name__} in the cohort cache")
+        frame = item.to_frame(name='__series__') if is_series else item
+        filename = f"{i}.parquet"
+        manifest['items'][name] = {
+            'type': 'series' if is_series else 'frame',
+            'file': filename,
+            'series_name': item.name if is_series else None,
+            'columns': _write_frame(frame, directory / filename),
+        }
+    with open(directory / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, default=str)
+
+def _read_entry(directory):
+    with open(directory / "manifest.json", encoding="utf-8") as f:
+        manifest = json.load(f)
+    items = {}
+    for name, entry in manifest['items'].items():
+        if entry['type'] == 'none':
+            items[name] = None
+            continue
+        frame = _read_frame(directory / entry['file'], entry['columns'])
+        if entry['type'] == 'series':
+            series = frame['__series__']
+            series.name = entry['series_name']
+            items[name] = series
+        else:
+            items[name] = frame
+    return items if manifest['dict'] else items['__value__']
+
+def load(key):
+    """Read an entry (None on a miss or an unreadable entry)"""
+    if not cache_enabled():
+        return None
+    directory = Path(COHORT_CACHE_DIR) / key
+    if not directory.is_dir():
+        return None
+    try:
+        value = _read_entry(directory)
+        # Mark as recently used for eviction
+        os.utime(directory)
+        return value
+    except Exception:
+        # Evicted while reading or written by an incompatible version
+        return None
+
+def store(key, value, replace=False):
+    """
+    Write an entry atomically; failures (full disk, read-only volume) are ignored.
+    
+    Entries are immutable unless `replace` is set (slots such as the latest
+    incremental snapshot), in which case the previous entry is swapped out.
+    """
+    if not cache_enabled():
+        return False
+    root = Path(COHORT_CACHE_DIR)
+    tmp = root / f".tmp-{key}-{uuid.uuid4().hex[:8]}"
+    try:
+        tmp.mkdir(parents=True)
+        _write_entry(value, tmp)
+        if replace:
+            _discard(root / key)
+        try:
+            os.rename(tmp, root / key)
+        except OSError:
+            # Another process stored the same entry first
+            shutil.rmtree(tmp, ignore_errors=True)
+        evict()
+        return True
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        return False
+
+def load_or_build(key, build):
+    """Return the cached value for `key`, or build it and write it to disk"""
+    value = load(key)
+    if value is None:
+        value = build()
+        store(key, value)
+    return value
+
+def _discard(directory):
+    """Rename an entry away, then delete it, so readers never open a half-deleted entry"""
+    doomed = directory.parent / f".del-{directory.name}-{uuid.uuid4().hex[:8]}"
+    try:
+        os.rename(directory, doomed)
+    except OSError:
+        return False
+    shutil.rmtree(doomed, ignore_errors=True)
+    return True
+
+def _entry_size(directory):
+    return sum(f.stat().st_size for f in directory.iterdir() if f.is_file())
+
+def evict(max_mb=None):
+    """Remove least recently used entries until the cache fits `max_mb` (default COHORT_CACHE_MAX_MB)"""
+    if not cache_enabled():
+        return
+    limit = (COHORT_CACHE_MAX_MB if max_mb is None else max_mb) * 2**20
+    root = Path(COHORT_CACHE_DIR)
+    with _evict_lock:
+        try:
+            now = time.time()
+            for d in root.iterdir():
+                if d.name.startswith(('.tmp-', '.del-')) and now - d.stat().st_mtime > STALE_TMP_SECONDS:
+                    shutil.rmtree(d, ignore_errors=True)
+            entries = [d for d in root.iterdir() if d.is_dir() and not d.name.startswith('.')]
+            sized = sorted(((d.stat().st_mtime, _entry_size(d), d) for d in entries), key=lambda e: e[0])
+        except OSError:
+            return
+        total = sum(size for _, size, _ in sized)
+        for _, size, directory in sized:
+            if total <= limit:
+                break
+            if _discard(directory):
+                total -= size
+
+def remove(prefix):
+    """Delete every entry whose key starts with `prefix`"""
+    if not cache_enabled() or not Path(COHORT_CACHE_DIR).is_dir():
+        return
+    for directory in Path(COHORT_CACHE_DIR).iterdir():
+        if directory.is_dir() and directory.name.startswith(prefix):
+            _discard(directory)
+
+def cache_stats():
+    """Entries and size of the disk cache"""
+    if not cache_enabled() or not Path(COHORT_CACHE_DIR).is_dir():
+        return {'entries': 0, 'total_mb': 0.0, 'max_mb': COHORT_CACHE_MAX_MB, 'dir': COHORT_CACHE_DIR}
+    entries = [d for d in Path(COHORT_CACHE_DIR).iterdir() if d.is_dir() and not d.name.startswith('.')]
+    total = sum(_entry_size(d) for d in entries)
+    return {'entries': len(entries), 'total_mb': round(total / 2**20, 1),
+            'max_mb': COHORT_CACHE_MAX_MB, 'dir': COHORT_CACHE_DIR}
@@ -0,0 +1,178 @@
+"""
+Dataset Store Module
+Process-wide store for loaded datasets and the frames derived from them
+(filtered views, cluster cohorts), shared by every browser session.
+
+Datasets are keyed by a hash of their file content, so sessions that open the
+same export share one frame instead of each holding a copy. Frames in the
+store are shared and must be treated as read-only: pipelines copy before
+modifying (build_clusterN_cohort, apply_global_filters).
+
+Sessions hold a reference to the dataset they use. When the store grows past
+DATASET_STORE_BUDGET_MB, least recently used entries are evicted: derived
+frames first come back on demand, and datasets are only evicted once no
+active session references them.
+"""
+
+from collections import OrderedDict
+import base64
+import hashlib
+import os
+import threading
+import time
+
+# Memory budget for everything in the store (datasets + derived frames)
+DATASET_STORE_BUDGET_MB = int(os.getenv("DATASET_STORE_BUDGET_MB", "1024"))
+# A session that has not touched its dataset for this long no longer pins it
+DATASET_SESSION_TTL = int(os.getenv("DATASET_SESSION_TTL", "3600"))
+
+_entries = OrderedDict()
+_building = {}
+_lock = threading.RLock()
+
+def frame_nbytes(value):
+    """Approximate memory of a frame, a Series or a tuple/list/dict containing them"""
+    if hasattr(value, 'memory_usage'):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, 'sum') else usage)
+    if isinstance(value, (tuple, list)):
+        return sum(frame_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(frame_nbytes(v) for v in value.values())
+    return 0
+
+def bytes_content_key(data):
+    """Content key of in-memory file bytes (base64 MD5, the format GCS reports)"""
+    return "md5:" + base64.b64encode(hashlib.md5(data).digest()).decode()
+
+_file_keys = {}
+
+def file_content_key(path, chunk_size=8 * 2**20):
+    """Content key of a file on disk; re-hashed only when its size or mtime changes"""
+    stat = os.stat(path)
+    signature = (str(path), stat.st_size, stat.st_mtime_ns)
+    key = _file_keys.get(signature)
+    if key is None:
+        digest = hashlib.md5()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        key = "md5:" + base64.b64encode(digest.digest()).decode()
+        _file_keys[signature] = key
+    return key
+
+def _live_holders(entry, now):
+    return [h for h, seen in entry['holders'].items() if now - seen < DATASET_SESSION_TTL]
+
+def _drop(key):
+    """Remove an entry and everything derived from it (caller holds the lock)"""
+    entry = _entries.pop(key, None)
+    if entry is None:
+        return
+    for child in [k for k, e in _entries.items() if e['parent'] == key]:
+        _drop(child)
+
+def _evict(keep=None):
+    """Evict LRU entries until the store fits the budget (caller holds the lock)"""
+    budget = DATASET_STORE_BUDGET_MB * 2**20
+    now = time.monotonic()
+    # Derived frames go first (they can be rebuilt), then unreferenced datasets
+    for pinned_kinds in (('dataset',), ()):
+        for key in list(_entries):
+            if sum(e['nbytes'] for e in _entries.values()) <= budget:
+                return
+            entry = _entries.get(key)
+            if entry is None or key == keep or entry['kind'] in pinned_kinds:
+                continue
+            if entry['kind'] == 'dataset' and _live_holders(entry, now):
+                continue
+            _drop(key)
+
+def put(key, value, kind='dataset', parent=None):
+    """Store a frame (or a tuple of frames) under `key`; returns the value"""
+    nbytes = frame_nbytes(value)
+    with _lock:
+        previous = _entries.get(key)
+        _entries[key] = {
+            'value': value,
+            'kind': kind,
+            'parent': parent,
+            'nbytes': nbytes,
+            'holders': previous['holders'] if previous else {},
+            'stored_at': time.time(),
+        }
+        _entries.move_to_end(key)
+        _evict(keep=key)
+    return value
+
+def get(key, holder=None):
+    """Return the stored value (None if absent), marking it recently used"""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        _entries.move_to_end(key)
+        if holder is not None and holder in entry['holders']:
+            entry['holders'][holder] = time.monotonic()
+        return entry['value']
+
+def get_or_build(key, build, kind='dataset', parent=None):
+    """
+    Return the stored value for `key`, building and storing it if absent.
+
+    Concurrent sessions asking for the same key wait for a single build.
+    """
+    value = get(key)
+    if value is not None:
+        return value
+    with _lock:
+        key_lock = _building.setdefault(key, threading.Lock())
+    with key_lock:
+        try:
+            value = get(key)
+            if value is None:
+                value = put(key, build(), kind=kind, parent=parent)
+        finally:
+            with _lock:
+                _building.pop(key, None)
+    return value
+
+def acquire(key, holder):
+    """Record that `holder` (a session) uses the dataset, protecting it from eviction"""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            entry['holders'][holder] = time.monotonic()
+        return entry is not None
+
+def release(key, holder):
+    """Drop the reference of `holder`; the dataset becomes evictable when unreferenced"""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            entry['holders'].pop(holder, None)
+        _evict()
+
+def store_stats():
+    """One row per entry (most recently used last) plus totals, for diagnostics"""
+    now = time.monotonic()
+    with _lock:
+        entries = [
+            {
+                'key': str(key),
+                'kind': entry['kind'],
+                'mb': round(entry['nbytes'] / 2**20, 1),
+                'sessions': len(_live_holders(entry, now)),
+            }
+            for key, entry in _entries.items()
+        ]
+    return {
+        'entries': entries,
+        'total_mb': round(sum(e['mb'] for e in entries), 1),
+        'budget_mb': DATASET_STORE_BUDGET_MB,
+    }
+
+def clear():
+    """Remove every entry"""
+    with _lock:
+        _entries.clear()
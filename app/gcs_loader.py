@@ -0,0 +1,292 @@
+"""
+GCS Loader Module
+Streams Cloud Storage objects in ranged chunks instead of holding the whole
+download in memory (download_as_bytes + BytesIO kept two copies next to the
+parsed frame).
+
+By default the chunks are streamed straight into the parser. With
+GCS_CACHE_DIR set (a mounted volume: Cloud Run's local disk is memory),
+objects are streamed into a cache file named after their generation: an
+unchanged object is revalidated with a metadata request and read from disk,
+a new generation replaces the cached file, and the least recently read
+files are removed once the cache exceeds GCS_CACHE_MAX_MB.
+
+Uploads go through the same backends as resumable chunked writes; tee_upload
+lets the CSV parser read an uploaded file while its bytes are sent to the
+bucket, so a large upload is transferred once instead of uploaded and then
+downloaded again.
+
+GCS_LOCAL_BUCKETS_DIR replaces Cloud Storage with a local directory
+(<dir>/<bucket>/<object>), for development and testing without credentials.
+"""
+
+from pathlib import Path
+import hashlib
+import io
+import os
+import uuid
+
+# Try to import Google Cloud Storage (optional, for Cloud Storage support)
+try:
+    from google.cloud import storage
+    GCS_AVAILABLE = True
+except ImportError:
+    GCS_AVAILABLE = False
+
+# Local cache of downloaded objects (empty, the default: stream straight into the parser)
+GCS_CACHE_DIR = os.getenv("GCS_CACHE_DIR", "")
+GCS_CACHE_MAX_MB = int(os.getenv("GCS_CACHE_MAX_MB", "2048"))
+GCS_CHUNK_MB = int(os.getenv("GCS_CHUNK_MB", "8"))
+# Local stand-in for Cloud Storage: buckets are subdirectories of this directory
+GCS_LOCAL_BUCKETS_DIR = os.getenv("GCS_LOCAL_BUCKETS_DIR", "")
+
+class ObjectInfo:
+    """Metadata used to revalidate an object (no content is downloaded)"""
+
+    def __init__(self, bucket, name, generation, size, md5_hash=None, etag=None):
+        self.bucket = bucket
+        self.name = name
+        self.generation = generation
+        self.size = size
+        self.md5_hash = md5_hash
+        self.etag = etag
+
+    @property
+    def uri(self):
+        return f"gs://{self.bucket}/{self.name}"
+
+class GCSBackend:
+    """Cloud Storage through google-cloud-storage"""
+
+    def __init__(self):
+        if not GCS_AVAILABLE:
+            raise ImportError("google-cloud-storage no está instalado. Instálalo con: pip install google-cloud-storage")
+        self.client = storage.Client()
+
+    def stat(self, bucket_name, name):
+        blob = self.client.bucket(bucket_name).get_blob(name)
+        if blob is None:
+            raise FileNotFoundError(f"No existe gs://{bucket_name}/{name}")
+        return ObjectInfo(bucket_name, name, blob.generation, blob.size, blob.md5_hash, blob.etag)
+
+    def read_range(self, info, start, end):
+        """Bytes [start, end) of the exact generation described by `info`"""
+        blob = self.client.bucket(info.bucket).blob(info.name, generation=info.generation)
+        # download_as_bytes treats `end` as inclusive
+        return blob.download_as_bytes(start=start, end=end - 1, checksum=None)
+
+    def open_writer(self, bucket_name, name, content_type):
+        """Resumable upload sending GCS_CHUNK_MB per request (a multiple of 256 KB)"""
+        blob = self.client.bucket(bucket_name).blob(name, chunk_size=GCS_CHUNK_MB * 2**20)
+        return blob.open('wb', content_type=content_type, ignore_flush=True)
+
+class LocalBucketBackend:
+    """Directory stand-in for Cloud Storage; the file's mtime plays the generation"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def _path(self, bucket_name, name):
+        return self.root / bucket_name / name
+
+    def stat(self, bucket_name, name):
+        path = self._path(bucket_name, name)
+        if not path.is_file():
+            raise FileNotFoundError(f"No existe gs://{bucket_name}/{name}")
+        stat = path.stat()
+        return ObjectInfo(bucket_name, name, stat.st_mtime_ns, stat.st_size, etag=f"{stat.st_size}-{stat.st_mtime_ns}")
+
+    def read_range(self, info, start, end):
+        path = self._path(info.bucket, info.name)
+        with open(path, 'rb') as f:
+            # Same guarantee as a generation-pinned GCS read
+            if os.fstat(f.fileno()).st_mtime_ns != info.generation:
+                raise FileNotFoundError(f"{info.uri} cambió durante la descarga (generación {info.generation})")
+            f.seek(start)
+            return f.read(end - start)
+
+    def open_writer(self, bucket_name, name, content_type):
+        return _LocalObjectWriter(self._path(bucket_name, name))
+
+class _LocalObjectWriter:
+    """Writes to a temporary file; the object only appears on close, like a finished upload"""
+
+    def __init__(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.tmp = path.parent / f".tmp-{path.name}-{uuid.uuid4().hex[:8]}"
+        self._file = open(self.tmp, 'wb')
+
+    def write(self, data):
+        return self._file.write(data)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+            os.replace(self.tmp, self.path)
+
+def get_backend():
+    """The local stand-in when GCS_LOCAL_BUCKETS_DIR is set, otherwise Cloud Storage"""
+    if GCS_LOCAL_BUCKETS_DIR:
+        return LocalBucketBackend(GCS_LOCAL_BUCKETS_DIR)
+    return GCSBackend()
+
+def stat_object(bucket_name, name, backend=None):
+    """Current generation, size and checksums of an object"""
+    return (backend or get_backend()).stat(bucket_name, name)
+
+def iter_chunks(info, backend=None, chunk_size=None):
+    """Yield the object's content in ranged chunks, pinned to `info.generation`"""
+    backend = backend or get_backend()
+    chunk_size = chunk_size or GCS_CHUNK_MB * 2**20
+    for start in range(0, info.size, chunk_size):
+        chunk = backend.read_range(info, start, min(start + chunk_size, info.size))
+        if not chunk:
+            raise IOError(f"Descarga incompleta de {info.uri} en el byte {start}")
+        yield chunk
+
+class ChunkStream(io.RawIOBase):
+    """Readable file object over iter_chunks, so a parser consumes the object as it arrives"""
+
+    def __init__(self, chunks, size=None):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+        # Total length, for readers that size their work up front (out_of_core)
+        self.size = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+def _cache_path(info):
+    """Cache file of this generation: <hash of bucket/name>-<generation><suffix>"""
+    prefix = hashlib.sha1(f"{info.bucket}/{info.name}".encode()).hexdigest()[:20]
+    return Path(GCS_CACHE_DIR) / f"{prefix}-{info.generation}{Path(info.name).suffix}", prefix
+
+def cache_object(info, backend=None):
+    """
+    Path of a local copy of the object's generation, downloading it only if missing.
+
+    The download is streamed to a temporary file and renamed into place;
+    older generations of the same object are removed, then the least
+    recently read objects until the cache fits GCS_CACHE_MAX_MB.
+    """
+    path, prefix = _cache_path(info)
+    if path.is_file() and path.stat().st_size == info.size:
+        # Mark as recently used for eviction
+        os.utime(path)
+        return path
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.parent / f".tmp-{path.name}-{uuid.uuid4().hex[:8]}"
+    try:
+        with open(tmp, 'wb') as f:
+            for chunk in iter_chunks(info, backend):
+                f.write(chunk)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+    for stale in path.parent.glob(f"{prefix}-*"):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+    evict(keep=path)
+    return path
+
+def evict(max_mb=None, keep=None):
+    """Remove least recently read cached objects until the cache fits `max_mb` (default GCS_CACHE_MAX_MB)"""
+    if not GCS_CACHE_DIR:
+        return
+    limit = (GCS_CACHE_MAX_MB if max_mb is None else max_mb) * 2**20
+    try:
+        files = [f for f in Path(GCS_CACHE_DIR).iterdir() if f.is_file() and not f.name.startswith('.')]
+        sized = sorted(((f.stat().st_mtime, f.stat().st_size, f) for f in files), key=lambda e: e[0])
+    except OSError:
+        return
+    total = sum(size for _, size, _ in sized)
+    for _, size, path in sized:
+        if total <= limit:
+            break
+        # The object about to be read stays, even if it alone exceeds the cap
+        if path != keep:
+            path.unlink(missing_ok=True)
+            total -= size
+
+def open_object(bucket_name, name, backend=None):
+    """
+    Revalidate an object and return something pandas can read: the cached file's
+    path, or (with GCS_CACHE_DIR empty) a buffered stream of ranged chunks.
+    """
+    backend = backend or get_backend()
+    info = backend.stat(bucket_name, name)
+    if GCS_CACHE_DIR:
+        return cache_object(info, backend)
+    return io.BufferedReader(ChunkStream(iter_chunks(info, backend), info.size), buffer_size=2**20)
+
+def upload_object(source, bucket_name, name, content_type='text/csv', backend=None, chunk_size=None):
+    """Copy a readable file object to the bucket in chunks"""
+    backend = backend or get_backend()
+    chunk_size = chunk_size or GCS_CHUNK_MB * 2**20
+    writer = backend.open_writer(bucket_name, name, content_type)
+    for chunk in iter(lambda: source.read(chunk_size), b''):
+        writer.write(chunk)
+    writer.close()
+
+class TeeUpload(io.RawIOBase):
+    """
+    Readable file object over `source` that also writes every chunk read to an upload.
+
+    Call finish() once the reader is done: it sends whatever the reader did
+    not consume and completes the upload.
+    """
+
+    def __init__(self, source, writer, name=None):
+        self._source = source
+        self._writer = writer
+        self.name = name or getattr(source, 'name', 'upload')
+        self.size = getattr(source, 'size', None)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self._source.read(len(b))
+        if not data:
+            return 0
+        self._writer.write(data)
+        n = len(data)
+        b[:n] = data
+        return n
+
+    def finish(self, chunk_size=None):
+        chunk_size = chunk_size or GCS_CHUNK_MB * 2**20
+        for chunk in iter(lambda: self._source.read(chunk_size), b''):
+            self._writer.write(chunk)
+        self._writer.close()
+
+def tee_upload(source, bucket_name, name, parse, content_type='text/csv', backend=None):
+    """
+    Run `parse(stream)` on `source` while uploading it to gs://bucket_name/name.
+
+    The upload is completed even when parsing fails (the file is stored as
+    uploaded, as with a plain upload), then the parse error is raised.
+    """
+    backend = backend or get_backend()
+    source.seek(0)
+    tee = TeeUpload(source, backend.open_writer(bucket_name, name, content_type))
+    try:
+        result = parse(io.BufferedReader(tee, buffer_size=GCS_CHUNK_MB * 2**20))
+    finally:
+        tee.finish()
+    return result
@@ -4,17 +4,7 @@ Allows users to define their own domestic/local regions dynamically
 """
 
 import streamlit as st
-import pandas as pd
-from utils import normalize_text
-
-# Default configuration (Mexico/Querétaro)
-DEFAULT_CONFIG = {
-    'home_country': 'Mexico',
-    'home_country_aliases': ['mexico', 'mx', 'mex'],
-    'local_city': 'Querétaro',
-    'local_region': 'Querétaro',
-    'local_aliases': ['queretaro', 'qro', 'santiago de queretaro'],
-}
+from segmentation_core.geography import DEFAULT_CONFIG, EXAMPLE_CONFIGS, is_home_country, is_local_region, classify_geo_tier_dynamic
 
 def render_geo_config_ui():
     """Render the geographic configuration interface in sidebar"""
@@ -87,8 +77,8 @@ def render_geo_config_ui():
                 st.session_state['geo_local_aliases_list'] = local_aliases_list
                 st.session_state['geo_config_applied'] = True
                 
-                # Clear cached data to force re-analysis
-                st.cache_data.clear()
+                # Cluster 2 results are keyed by the configuration: the next run
+                # re-applies it to the cached geo-independent base, nothing is cleared
                 
                 st.success(f"✅ ¡Configuración aplicada! País: {home_country}, Local: {local_region}")
                 st.rerun()
@@ -100,8 +90,10 @@ def render_geo_config_ui():
                 st.session_state['geo_home_aliases'] = 'mexico, mx, mex'
                 st.session_state['geo_local_region'] = 'Querétaro'
                 st.session_state['geo_local_aliases'] = 'queretaro, qro, queretaro de arteaga'
+                # The parsed lists are part of the configuration that keys Cluster 2 results
+                st.session_state['geo_home_aliases_list'] = ['mexico', 'mx', 'mex']
+                st.session_state['geo_local_aliases_list'] = ['queretaro', 'qro', 'queretaro de arteaga']
                 st.session_state['geo_config_applied'] = True
-                st.cache_data.clear()
                 st.success("✅ Restablecido a valores predeterminados de México/Querétaro")
                 st.rerun()
         
@@ -133,59 +125,6 @@ def get_geo_config():
     
     return config
 
-def is_home_country(country_txt, config):
-    """Check if a country value matches the configured home country"""
-    if pd.isna(country_txt) or country_txt == "unknown":
-        return False
-    
-    country_lower = str(country_txt).lower().strip()
-    
-    # Check against home country name and aliases
-    if country_lower == config['home_country'].lower():
-        return True
-    
-    for alias in config['home_country_aliases']:
-        if country_lower == alias.lower() or alias.lower() in country_lower:
-            return True
-    
-    return False
-
-def is_local_region(location_txt, config):
-    """Check if a location value matches the configured local region"""
-    if pd.isna(location_txt) or location_txt == "unknown":
-        return False
-    
-    location_lower = str(location_txt).lower().strip()
-    
-    # Check against local region name and aliases
-    for alias in config['local_aliases']:
-        if alias.lower() in location_lower:
-            return True
-    
-    return False
-
-def classify_geo_tier_dynamic(row, config):
-    """Classify geographic tier using dynamic configuration"""
-    
-    country = row.get('country_any', 'unknown')
-    state = row.get('state_any', 'unknown')
-    city = row.get('city_any', 'unknown')
-    
-    # Check local first (most specific)
-    if is_local_region(city, config) or is_local_region(state, config):
-        return 'local'
-    
-    # Check domestic (home country)
-    if is_home_country(country, config):
-        return 'domestic_non_local'
-    
-    # International (has country data but not home country)
-    if country != 'unknown':
-        return 'international'
-    
-    # Unknown (no location data)
-    return 'unknown'
-
 def get_geo_display_names(config):
     """Get display names for the UI based on configuration"""
     return {
@@ -201,34 +140,6 @@ def get_geo_display_names(config):
         'segment_2F': f"2F: Local ({config['local_region']}), Low Engagement",
     }
 
-# Examples for different organizations
-EXAMPLE_CONFIGS = {
-    'Mexico (Querétaro)': {
-        'home_country': 'Mexico',
-        'home_aliases': 'mexico, mx, mex',
-        'local_region': 'Querétaro',
-        'local_aliases': 'queretaro, qro, queretaro de arteaga',
-    },
-    'USA (California)': {
-        'home_country': 'United States',
-        'home_aliases': 'usa, us, united states, america',
-        'local_region': 'California',
-        'local_aliases': 'california, ca, san francisco, sf, los angeles, la',
-    },
-    'Brazil (São Paulo)': {
-        'home_country': 'Brazil',
-        'home_aliases': 'brazil, brasil, br',
-        'local_region': 'São Paulo',
-        'local_aliases': 'sao paulo, são paulo, sp, sampa',
-    },
-    'Spain (Madrid)': {
-        'home_country': 'Spain',
-        'home_aliases': 'spain, españa, es',
-        'local_region': 'Madrid',
-        'local_aliases': 'madrid, comunidad de madrid',
-    },
-}
-
 def show_example_configs():
     """Show example configurations for different regions"""
     st.markdown("#### 📝 Configuraciones de Ejemplo")
@@ -0,0 +1,133 @@
+"""
+Input Formats Module
+Reads contact exports as CSV, gzip/zip/zstd-compressed CSV, Parquet or
+Feather. The format comes from the file's first bytes, not its name, so a
+renamed or extension-less object still loads.
+
+Compressed CSVs are decompressed as a stream while pandas parses them
+(HubSpot exports compress 8-10x, which keeps most uploads under the 32MB
+Cloud Run request limit). Every format produces the same pyarrow-backed
+dtypes as the plain CSV path.
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+import gzip
+import shutil
+import tempfile
+import zipfile
+
+import pandas as pd
+
+# Magic bytes → format (checked in order)
+MAGIC_BYTES = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'PK\x03\x04', 'zip'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+    (b'PAR1', 'parquet'),
+    (b'ARROW1', 'feather'),
+]
+
+# Extensions offered by the uploader (the format itself is detected from content)
+UPLOAD_EXTENSIONS = ['csv', 'gz', 'zip', 'zst', 'parquet', 'feather', 'arrow']
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'gzip': 'application/gzip',
+    'zip': 'application/zip',
+    'zstd': 'application/zstd',
+    'parquet': 'application/vnd.apache.parquet',
+    'feather': 'application/vnd.apache.arrow.file',
+}
+
+CSV_OPTIONS = dict(low_memory=True, dtype_backend='pyarrow')
+
+def detect_format(head):
+    """Format of a file from its first bytes ('csv' when no signature matches)"""
+    for magic, name in MAGIC_BYTES:
+        if head.startswith(magic):
+            return name
+    return 'csv'
+
+def _peek(source, n=8):
+    """First bytes of a path or file object, without consuming them"""
+    if isinstance(source, (str, Path)):
+        with open(source, 'rb') as f:
+            return f.read(n)
+    if hasattr(source, 'peek'):
+        # Buffered streams (GCS chunks, tee uploads) cannot seek back
+        return source.peek(n)[:n]
+    position = source.tell()
+    head = source.read(n)
+    source.seek(position)
+    return head
+
+def sniff_format(source):
+    return detect_format(_peek(source))
+
+def _seekable(source):
+    """A seekable version of `source` (zip and columnar readers need random access)"""
+    if isinstance(source, (str, Path)) or (hasattr(source, 'seekable') and source.seekable()):
+        return source
+    spill = tempfile.TemporaryFile()
+    shutil.copyfileobj(source, spill, 8 * 2**20)
+    spill.seek(0)
+    return spill
+
+def _zip_member(archive):
+    """The CSV inside a zip export (the largest .csv, or the only file)"""
+    members = [m for m in archive.infolist() if not m.is_dir() and not m.filename.startswith('__MACOSX/')]
+    csvs = [m for m in members if m.filename.lower().endswith('.csv')] or members
+    if not csvs:
+        raise ValueError("El archivo ZIP no contiene ningún CSV")
+    return max(csvs, key=lambda m: m.file_size)
+
+CSV_FORMATS = ('csv', 'gzip', 'zstd', 'zip')
+
+@contextmanager
+def open_csv_stream(source, fmt):
+    """Binary stream of the CSV text inside a plain or compressed export"""
+    if fmt == 'csv':
+        if isinstance(source, (str, Path)):
+            with open(source, 'rb') as stream:
+                yield stream
+        else:
+            yield source
+    elif fmt == 'gzip':
+        with gzip.open(source, 'rb') as stream:
+            yield stream
+    elif fmt == 'zstd':
+        import pyarrow as pa
+
+        raw = source if isinstance(source, (str, Path)) else pa.PythonFile(source, mode='r')
+        with pa.CompressedInputStream(raw, 'zstd') as stream:
+            yield stream
+    elif fmt == 'zip':
+        with zipfile.ZipFile(_seekable(source)) as archive:
+            with archive.open(_zip_member(archive)) as stream:
+                yield stream
+    else:
+        raise ValueError(f"{fmt} no es un formato CSV")
+
+def read_table(source, fmt=None):
+    """
+    Read an export from a path or a binary file object.
+
+    Returns (DataFrame, format name).
+    """
+    fmt = fmt or sniff_format(source)
+
+    if fmt == 'csv':
+        return pd.read_csv(source, **CSV_OPTIONS), fmt
+    if fmt in CSV_FORMATS:
+        with open_csv_stream(source, fmt) as stream:
+            return pd.read_csv(stream, **CSV_OPTIONS), fmt
+    if fmt == 'parquet':
+        return pd.read_parquet(_seekable(source), dtype_backend='pyarrow'), fmt
+    if fmt == 'feather':
+        return pd.read_feather(_seekable(source), dtype_backend='pyarrow'), fmt
+    raise ValueError(f"Formato de archivo no soportado: {fmt}")
+
+def content_type_for(source):
+    """MIME type of an upload, from its content"""
+    return CONTENT_TYPES[sniff_format(source)]
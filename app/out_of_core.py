@@ -0,0 +1,353 @@
+"""
+Out-of-Core Module
+Loads exports that would not fit in memory once parsed and copied by the
+cluster pipelines (peak usage is roughly CSV_PEAK_FACTOR times the CSV size).
+
+The export is streamed in Arrow record batches instead of parsed whole:
+each batch is projected to the columns the pipelines read and reduced to
+the contacts every cluster keeps (APREU property, lifecycle not
+other/subscriber). The surviving rows are spilled to a temporary CSV and
+parsed once at the end, so they get the same dtypes as a normal load.
+
+Contacts dropped while streaming are kept as counts grouped by the global
+filter values (periodo, closure, lifecycle), in the frame's `attrs`, so the
+funnel totals stay exact under any filter selection.
+
+The mode switches on when the estimated peak exceeds the memory budget
+(MEMORY_BUDGET_MB, by default a share of the container's memory limit).
+"""
+
+from pathlib import Path
+import csv
+import io
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import input_formats
+from pipeline_metrics import PipelineTimer
+from segmentation_core.history import convert_hubspot_timestamp, hist_latest_series
+from segmentation_core import cluster1, cluster2, cluster3
+
+# auto: stream when the estimate exceeds the budget; always / never force the choice
+OUT_OF_CORE_MODE = os.getenv("OUT_OF_CORE_MODE", "auto")
+# Memory available to one dataset's pipelines; 0 derives it from the container limit
+MEMORY_BUDGET_MB = int(os.getenv("MEMORY_BUDGET_MB", "0"))
+MEMORY_BUDGET_SHARE = float(os.getenv("MEMORY_BUDGET_SHARE", "0.6"))
+OUT_OF_CORE_BLOCK_MB = int(os.getenv("OUT_OF_CORE_BLOCK_MB", "4"))
+# Where the reduced rows are spilled (empty: the system temporary directory)
+OUT_OF_CORE_SPILL_DIR = os.getenv("OUT_OF_CORE_SPILL_DIR", "")
+
+# HubSpot timestamp columns converted on load
+DATE_COLUMNS = ['Create Date', 'Close Date', 'First Conversion Date', 'Recent Conversion Date']
+
+# Peak pipeline memory per MB of CSV: load_data frame plus the cluster builders' copies
+CSV_PEAK_FACTOR = 9
+# MB of CSV per MB of each input format
+CSV_EXPANSION = {'csv': 1, 'gzip': 8, 'zip': 8, 'zstd': 8, 'parquet': 6, 'feather': 2}
+
+# Raw columns read by the global filters, in the order apply_global_filters looks for them
+PERIODO_FIELDS = ['Periodo de ingreso a licenciatura (MQL)', 'Periodo de ingreso',
+                  'periodo_de_ingreso', 'PERIODO DE INGRESO']
+CLOSE_FIELDS = ['close_date', 'Close Date']
+LIFECYCLE_FIELDS = ['Lifecycle Stage', 'lifecycle_stage']
+PROPIEDAD_FIELDS = ['Propiedad del contacto', 'propiedad_del_contacto']
+
+PIPELINE_COLUMNS = list(dict.fromkeys(
+    list(cluster1.COLUMN_MAP) + list(cluster2.COLUMN_MAP) + list(cluster3.COLUMN_MAP)
+    + PERIODO_FIELDS + CLOSE_FIELDS + LIFECYCLE_FIELDS + PROPIEDAD_FIELDS
+))
+
+# Largest CSV header looked for in the stream's buffer
+HEADER_BYTES = 2**20
+
+def _container_memory_mb():
+    """Memory limit of the container (cgroup v2/v1), else the machine's RAM; None if unknown"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            value = Path(path).read_text().strip()
+        except OSError:
+            continue
+        # 'max' (v2) or a huge number (v1) means no limit
+        if value.isdigit() and int(value) < 2**60:
+            return int(value) / 2**20
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 2**20
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def memory_budget_mb():
+    """MB a dataset's pipelines may use before loads switch to out-of-core (None if unknown)"""
+    if MEMORY_BUDGET_MB > 0:
+        return MEMORY_BUDGET_MB
+    limit = _container_memory_mb()
+    return limit * MEMORY_BUDGET_SHARE if limit else None
+
+def source_size(source):
+    """Size in bytes of a path or file object, None when it cannot be known without reading"""
+    if isinstance(source, (str, Path)):
+        return os.path.getsize(source)
+    if isinstance(getattr(source, 'size', None), int):
+        # Streamlit uploads and the gcs_loader streams
+        return source.size
+    if hasattr(source, 'seekable') and source.seekable():
+        position = source.tell()
+        size = source.seek(0, io.SEEK_END)
+        source.seek(position)
+        return size
+    raw = getattr(source, 'raw', None)
+    return source_size(raw) if raw is not None else None
+
+def estimate_peak_mb(size, fmt):
+    """Estimated peak memory of loading and processing an export of `size` bytes"""
+    return size / 2**20 * CSV_EXPANSION.get(fmt, 1) * CSV_PEAK_FACTOR
+
+def use_out_of_core(source, fmt):
+    if OUT_OF_CORE_MODE == 'always':
+        return True
+    if OUT_OF_CORE_MODE == 'never':
+        return False
+    size = source_size(source)
+    budget = memory_budget_mb()
+    return size is not None and budget is not None and estimate_peak_mb(size, fmt) > budget
+
+def read_export(source):
+    """
+    Read an export like input_formats.read_table, streaming it when it would not fit in memory.
+
+    Returns (DataFrame, format name); streamed frames carry a summary() in their attrs.
+    """
+    fmt = input_formats.sniff_format(source)
+    if use_out_of_core(source, fmt):
+        return stream_export(source, fmt), fmt
+    return input_formats.read_table(source, fmt)
+
+def load_export(source, label=None):
+    """
+    Read an export (see read_export) and convert its HubSpot timestamps.
+
+    The read and conversion stages are timed as a 'load_data' run under
+    `label` (default: the source's name). Streamlit-free, so batch jobs load
+    exports exactly like the app.
+    """
+    timer = PipelineTimer('load_data', label or getattr(source, 'name', str(source)))
+    df, fmt = read_export(source)
+    timer.lap(f"{'stream' if summary(df) else 'read'}_{fmt}", len(df))
+    
+    # Convert HubSpot timestamps
+    for col in DATE_COLUMNS:
+        # Columnar inputs may already store them as datetimes
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = convert_hubspot_timestamp(df[col])
+    timer.lap('convert_timestamps', len(df))
+    timer.finish(len(df))
+    return df
+
+def _first_present(columns, candidates):
+    return next((c for c in candidates if c in columns), None)
+
+def _latest(frame, col):
+    return hist_latest_series(frame[col]) if col is not None else None
+
+class _Reducer:
+    """Keeps the contacts the pipelines use and counts the others by global filter values"""
+
+    def __init__(self, columns):
+        self.periodo_col = _first_present(columns, PERIODO_FIELDS)
+        self.close_col = _first_present(columns, CLOSE_FIELDS)
+        self.lifecycle_col = _first_present(columns, LIFECYCLE_FIELDS)
+        self.propiedad_col = _first_present(columns, PROPIEDAD_FIELDS)
+        self.rows = 0
+        self.apreu = 0
+        self.kept = 0
+        self.excluded = {}
+
+    def keep_mask(self, batch):
+        """Boolean array of the batch's rows that survive the APREU and lifecycle filters"""
+        cols = [c for c in (self.periodo_col, self.close_col, self.lifecycle_col, self.propiedad_col) if c]
+        frame = batch.select(list(dict.fromkeys(cols))).to_pandas(types_mapper=pd.ArrowDtype)
+        n = len(frame)
+
+        apreu = pd.Series(True, index=frame.index)
+        if self.propiedad_col:
+            apreu = _latest(frame, self.propiedad_col).str.upper().eq('APREU').fillna(False).astype(bool)
+        keep = apreu.copy()
+        lifecycle = _latest(frame, self.lifecycle_col)
+        if lifecycle is not None:
+            keep &= ~lifecycle.str.lower().isin(['other', 'subscriber'])
+
+        self.rows += n
+        self.apreu += int(apreu.sum())
+        self.kept += int(keep.sum())
+        dropped = ~keep
+        if dropped.any():
+            periodo = _latest(frame, self.periodo_col)
+            close = _latest(frame, self.close_col)
+            groups = pd.DataFrame({
+                'periodo': periodo[dropped] if periodo is not None else None,
+                'closed': close[dropped].notna() if close is not None else False,
+                'lifecycle': lifecycle[dropped] if lifecycle is not None else None,
+                'apreu': apreu[dropped],
+            })
+            counts = groups.groupby(list(groups.columns), dropna=False).size()
+            for key, count in counts.items():
+                key = tuple(None if pd.isna(v) else (bool(v) if isinstance(v, (bool, np.bool_)) else v)
+                            for v in key)
+                self.excluded[key] = self.excluded.get(key, 0) + int(count)
+        return keep.to_numpy()
+
+    def summary(self, columns):
+        return {
+            'rows': self.rows,
+            'apreu': self.apreu,
+            'kept': self.kept,
+            'columns': columns,
+            # (periodo latest, closed, lifecycle latest, is APREU, contacts)
+            'excluded': tuple(key + (count,) for key, count in sorted(self.excluded.items(), key=repr)),
+        }
+
+def _csv_header(stream):
+    """Column names of a buffered CSV stream, read without consuming it (None if not buffered)"""
+    head = stream.peek(HEADER_BYTES)
+    end = head.find(b'\n')
+    if end < 0:
+        return None
+    return next(csv.reader([head[:end].decode('utf-8-sig').rstrip('\r')]))
+
+def _stream_csv_batches(source, fmt, reduce):
+    """Yield (projected batch, keep mask) over a plain or compressed CSV export"""
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    with input_formats.open_csv_stream(source, fmt) as raw:
+        stream = raw if hasattr(raw, 'peek') else io.BufferedReader(raw, buffer_size=HEADER_BYTES)
+        header = _csv_header(stream)
+        columns = [c for c in PIPELINE_COLUMNS if c in header] if header else None
+        # Text everywhere: type inference per block could disagree between blocks
+        convert = pacsv.ConvertOptions(
+            include_columns=columns,
+            column_types={c: pa.string() for c in (columns or PIPELINE_COLUMNS)},
+            strings_can_be_null=True,
+        )
+        reader = pacsv.open_csv(stream, read_options=pacsv.ReadOptions(block_size=OUT_OF_CORE_BLOCK_MB * 2**20),
+                                convert_options=convert)
+        reduce.start(reader.schema, len(header) if header else len(reader.schema))
+        for batch in reader:
+            yield batch
+
+def _stream_columnar_batches(source, fmt, reduce):
+    """Yield projected record batches of a Parquet or Feather export"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    source = input_formats._seekable(source)
+    if fmt == 'parquet':
+        parquet = pq.ParquetFile(source)
+        names = parquet.schema_arrow.names
+        columns = [c for c in PIPELINE_COLUMNS if c in names]
+        reduce.start(parquet.schema_arrow, len(names))
+        yield from parquet.iter_batches(batch_size=64_000, columns=columns)
+    else:
+        if isinstance(source, (str, Path)):
+            source = pa.memory_map(str(source))
+        feather = pa.ipc.open_file(source)
+        names = feather.schema.names
+        columns = [c for c in PIPELINE_COLUMNS if c in names]
+        reduce.start(feather.schema, len(names))
+        for i in range(feather.num_record_batches):
+            yield feather.get_batch(i).select(columns)
+
+class _Spill:
+    """Collects kept rows: CSV batches go to a temporary file, columnar ones stay in Arrow"""
+
+    def __init__(self, fmt):
+        self.fmt = fmt
+        self.reducer = None
+        self.columns = 0
+        self.names = []
+        self.writer = None
+        self.file = None
+        self.batches = []
+
+    def start(self, schema, columns):
+        self.columns = columns
+        self.names = [c for c in PIPELINE_COLUMNS if c in schema.names]
+        self.reducer = _Reducer(self.names)
+        if self.fmt in input_formats.CSV_FORMATS:
+            import pyarrow.csv as pacsv
+
+            self.file = tempfile.TemporaryFile(dir=OUT_OF_CORE_SPILL_DIR or None)
+            self.writer = pacsv.CSVWriter(self.file, schema)
+
+    def add(self, batch):
+        import pyarrow as pa
+
+        kept = batch.filter(pa.array(self.reducer.keep_mask(batch)))
+        if self.writer is not None:
+            self.writer.write_batch(kept)
+        elif kept.num_rows:
+            self.batches.append(kept)
+
+    def frame(self):
+        import pyarrow as pa
+
+        if self.writer is not None:
+            self.writer.close()
+            self.file.seek(0)
+            try:
+                return pd.read_csv(self.file, **input_formats.CSV_OPTIONS)
+            finally:
+                self.file.close()
+        if not self.batches:
+            return pd.DataFrame(columns=self.names)
+        return pa.Table.from_batches(self.batches).to_pandas(types_mapper=pd.ArrowDtype)
+
+def stream_export(source, fmt=None):
+    """
+    Load only the contacts and columns the cluster pipelines use, streaming the export in batches.
+
+    The frame's attrs['out_of_core'] holds the streamed totals (see summary()).
+    """
+    fmt = fmt or input_formats.sniff_format(source)
+    spill = _Spill(fmt)
+    if fmt in input_formats.CSV_FORMATS:
+        batches = _stream_csv_batches(source, fmt, spill)
+    elif fmt in ('parquet', 'feather'):
+        batches = _stream_columnar_batches(source, fmt, spill)
+    else:
+        raise ValueError(f"Formato de archivo no soportado: {fmt}")
+
+    for batch in batches:
+        spill.add(batch)
+    df = spill.frame()
+    df.attrs['out_of_core'] = spill.reducer.summary(spill.columns)
+    return df
+
+def summary(df):
+    """
+    Streaming summary of an out-of-core frame (None for frames loaded whole):
+    rows and APREU contacts in the export, rows and columns kept, and the
+    excluded contacts by global filter values.
+    """
+    if df is None:
+        return None
+    return df.attrs.get('out_of_core')
+
+def excluded_rows(df):
+    """(periodo, closed, lifecycle, is APREU, contacts) groups dropped while streaming, or None"""
+    info = summary(df)
+    return list(info['excluded']) if info else None
+
+def with_excluded(df, excluded):
+    """Attach the excluded groups that match `df`'s filters"""
+    info = summary(df)
+    if info is not None:
+        df.attrs['out_of_core'] = dict(info, excluded=tuple(excluded))
+    return df
+
+def excluded_counts(df):
+    """(contacts, APREU contacts) dropped while streaming that match `df`'s filters"""
+    excluded = excluded_rows(df) or []
+    return sum(r[-1] for r in excluded), sum(r[-1] for r in excluded if r[3])
@@ -0,0 +1,176 @@
+"""
+Path Analysis
+Cohort-level journeys through a history field (traffic sources in Cluster 1,
+APREU activities in Cluster 3): a step-by-step Sankey, the most frequent
+transitions and paths, and the close rate of the contacts behind each one
+"""
+
+import streamlit as st
+import pandas as pd
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+
+from utils import shared_history, shared_aggregate, display_metrics
+from segmentation_core.history_table import cohort_history
+from segmentation_core.paths import journey_steps, transition_counts, path_counts
+
+# Journey steps shown in the Sankey
+SANKEY_STEPS = 4
+# Values shown at each Sankey step; the rest are grouped as OTHER_LABEL
+SANKEY_TOP_VALUES = 8
+OTHER_LABEL = "Otros"
+
+COLUMN_LABELS = {
+    'group': 'Segmento',
+    'path': 'Ruta',
+    'source': 'Origen',
+    'target': 'Destino',
+    'occurrences': 'Ocurrencias',
+    'contacts': 'Contactos',
+    'closed': 'Cerrados',
+    'close_rate': 'Tasa de Cierre (%)',
+}
+
+def _sankey_steps(steps):
+    """First SANKEY_STEPS steps, values outside the SANKEY_TOP_VALUES most frequent grouped as OTHER_LABEL"""
+    steps = steps[steps['step'] < SANKEY_STEPS]
+    top = steps['value'].value_counts().head(SANKEY_TOP_VALUES).index
+    values = steps['value'].astype(object).where(steps['value'].isin(top), OTHER_LABEL)
+    return steps.assign(value=pd.Categorical(values))
+
+def _path_tables(cohort, field, segment_col, length):
+    history = cohort_history(shared_history(), cohort, [field])
+    closed = cohort['close_date'].notna().to_numpy() if 'close_date' in cohort.columns else np.zeros(len(cohort), dtype=bool)
+    steps = journey_steps(history, field, cohort.index)
+
+    transitions = transition_counts(steps, outcome=closed)
+    steps_per_contact = np.bincount(steps['contact'].to_numpy(), minlength=len(cohort))
+    summary = pd.DataFrame([{
+        'contacts': int((steps_per_contact > 0).sum()),
+        'mean_steps': float(steps_per_contact[steps_per_contact > 0].mean()) if (steps_per_contact > 0).any() else 0.0,
+        'transitions': int(transitions['occurrences'].sum()),
+        'distinct_transitions': len(transitions),
+    }])
+    groups = cohort[segment_col].to_numpy() if segment_col in cohort.columns else None
+    tables = {
+        'summary': summary,
+        'sankey': transition_counts(_sankey_steps(steps), by_step=True),
+        'transitions': transitions,
+        'paths': path_counts(steps, length, outcome=closed),
+        'segment_paths': path_counts(steps, length, outcome=closed, groups=groups) if groups is not None else pd.DataFrame(),
+    }
+    # Plain strings for display and the disk cache
+    for table in tables.values():
+        for col in ('source', 'target'):
+            if col in table.columns:
+                table[col] = table[col].astype(str)
+    return tables
+
+def compute_path_tables(cohort, version, field, segment_col, length):
+    """Path tables of a cohort (summary, sankey, transitions, paths, segment_paths), cached per dataset and cohort version"""
+    return shared_aggregate(
+        f'paths_{field}', (version, segment_col, length),
+        lambda: _path_tables(cohort, field, segment_col, length)
+    )
+
+def _sankey_figure(links, title):
+    """Step-layered Sankey: one node per (step, value), so journeys never loop back"""
+    nodes = pd.concat([
+        links[['step', 'source']].set_axis(['step', 'value'], axis=1),
+        links[['step', 'target']].set_axis(['step', 'value'], axis=1).assign(step=links['step'] + 1),
+    ]).drop_duplicates().sort_values(['step', 'value']).reset_index(drop=True)
+    node_ids = {(step, value): i for i, (step, value) in enumerate(zip(nodes['step'], nodes['value']))}
+
+    fig = go.Figure(go.Sankey(
+        arrangement='snap',
+        node=dict(
+            label=nodes['value'].tolist(),
+            customdata=(nodes['step'] + 1).tolist(),
+            hovertemplate="Paso %{customdata}: %{label}<br>%{value:,} contactos<extra></extra>",
+            pad=12,
+        ),
+        link=dict(
+            source=[node_ids[(s, v)] for s, v in zip(links['step'], links['source'])],
+            target=[node_ids[(s + 1, v)] for s, v in zip(links['step'], links['target'])],
+            value=links['occurrences'].tolist(),
+            hovertemplate="%{source.label} → %{target.label}<br>%{value:,} contactos<extra></extra>",
+        ),
+    ))
+    fig.update_layout(title=title, height=550)
+    return fig
+
+def render_path_analysis(cohort, cohort_version, field, segment_col, title, item_label, key):
+    """
+    Render the path analysis section of a cluster page.
+
+    Args:
+        cohort: Cluster cohort
+        cohort_version: Cohort version from get_cohort_version
+        field: History field the journeys follow (a HistoryTable field)
+        segment_col: Segment column for the top paths by segment
+        title: Section title
+        item_label: Plural name of the journey steps (e.g. "fuentes")
+        key: Widget key prefix
+    """
+    st.markdown(f"### 🔀 {title}")
+    st.markdown(
+        f"Recorridos de todos los contactos del cohorte a través de sus {item_label} registradas en el historial "
+        "(valores repetidos consecutivos se cuentan una vez)."
+    )
+
+    col1, col2 = st.columns(2)
+    with col1:
+        length = st.selectbox("Pasos por ruta:", [2, 3, 4], index=1, key=f"{key}_path_length")
+    with col2:
+        top_k = st.slider("Rutas por segmento:", min_value=3, max_value=15, value=5, key=f"{key}_path_top")
+
+    tables = compute_path_tables(cohort, cohort_version, field, segment_col, length)
+    summary = tables['summary'].iloc[0]
+    if summary['contacts'] == 0:
+        st.info(f"No hay {item_label} registradas en el historial de este cohorte.")
+        return
+
+    display_metrics({
+        "Contactos con Recorrido": f"{int(summary['contacts']):,}",
+        "Pasos Promedio": f"{summary['mean_steps']:.1f}",
+        "Transiciones": f"{int(summary['transitions']):,}",
+        "Transiciones Distintas": f"{int(summary['distinct_transitions']):,}",
+    })
+
+    st.markdown("---")
+    if tables['sankey'].empty:
+        st.info("Ningún contacto tiene más de un paso en su recorrido.")
+    else:
+        st.plotly_chart(
+            _sankey_figure(tables['sankey'], f"Primeros {SANKEY_STEPS} pasos del recorrido"),
+            use_container_width=True
+        )
+        st.caption(f"Se muestran los {SANKEY_TOP_VALUES} valores más frecuentes en estos pasos; el resto se agrupa en \"{OTHER_LABEL}\".")
+
+    st.markdown("#### 🔁 Transiciones Más Frecuentes")
+    st.dataframe(
+        tables['transitions'].head(20).rename(columns=COLUMN_LABELS).round(1),
+        hide_index=True, use_container_width=True
+    )
+
+    st.markdown(f"#### 🧭 Rutas de {length} Pasos y Tasa de Cierre")
+    paths = tables['paths'].head(20)
+    if paths.empty:
+        st.info(f"Ningún contacto tiene {length} pasos en su recorrido.")
+    else:
+        fig = px.bar(
+            paths.sort_values('contacts'), x='contacts', y='path', orientation='h',
+            color='close_rate', color_continuous_scale='RdYlGn',
+            labels={**COLUMN_LABELS, 'contacts': 'Contactos'},
+            title=f"Top {len(paths)} Rutas por Contactos (color: tasa de cierre)"
+        )
+        fig.update_layout(height=max(400, 28 * len(paths)))
+        st.plotly_chart(fig, use_container_width=True)
+        st.dataframe(paths.rename(columns=COLUMN_LABELS).round(1), hide_index=True, use_container_width=True)
+
+    segment_paths = tables['segment_paths']
+    if not segment_paths.empty:
+        st.markdown(f"#### 🎯 Top {top_k} Rutas por Segmento")
+        top = segment_paths.groupby('group', sort=True).head(top_k)
+        st.dataframe(top.rename(columns=COLUMN_LABELS).round(1), hide_index=True, use_container_width=True)
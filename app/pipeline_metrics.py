@@ -0,0 +1,208 @@
+"""
+Pipeline Metrics Module
+Records contact counts at each stage of the data pipeline so the overview
+and cluster headers can show the funnel without re-scanning the data, and
+per-stage timings (wall time, rows in/out, memory delta) for diagnostics
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+# Optional: psutil gives RSS on every platform; /proc is used otherwise (Linux)
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+# Funnel stages shared by every pipeline, in order
+FUNNEL_STAGES = ['total', 'apreu', 'cleaned', 'closed']
+
+FUNNEL_LABELS = {
+    'total': 'Total Contactos',
+    'apreu': 'Contactos APREU',
+    'cleaned': 'Después de Limpieza',
+    'closed': 'Tratos Cerrados',
+    'cohort': 'Cohorte del Cluster',
+}
+
+# Maximum number of pipeline runs kept in memory
+MAX_FUNNELS = 256
+# Maximum number of timed pipeline runs kept for the diagnostics panel
+MAX_TIMED_RUNS = 64
+
+# Emit one JSON log line per timed stage (on by default on Cloud Run)
+PIPELINE_LOG_JSON = os.getenv("PIPELINE_LOG_JSON", "1" if os.getenv("K_SERVICE") else "0") == "1"
+
+_funnels = OrderedDict()
+_lock = threading.Lock()
+
+_timed_runs = OrderedDict()
+_run_ids = itertools.count(1)
+
+_logger = logging.getLogger("pipeline_metrics")
+if PIPELINE_LOG_JSON and not _logger.handlers:
+    # Bare JSON on stdout: Cloud Run turns each line into a structured log entry
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(_handler)
+    _logger.setLevel(logging.INFO)
+    _logger.propagate = False
+
+def record_funnel_stage(funnel_key, stage, count):
+    """
+    Record the row count reached at a pipeline stage.
+
+    Args:
+        funnel_key: Identifier of the pipeline run (e.g. the cluster cache_key)
+        stage: Stage name (see FUNNEL_STAGES; cluster pipelines may add their own)
+        count: Number of contacts remaining after the stage
+    """
+    with _lock:
+        funnel = _funnels.setdefault(funnel_key, OrderedDict())
+        funnel[stage] = int(count)
+        _funnels.move_to_end(funnel_key)
+        while len(_funnels) > MAX_FUNNELS:
+            _funnels.popitem(last=False)
+
+def get_funnel_counts(funnel_key):
+    """Return the recorded stage counts for a pipeline run (empty dict if unknown)"""
+    with _lock:
+        return dict(_funnels.get(funnel_key, {}))
+
+def record_cleaned_stage(funnel_key, df, close_col='close_date'):
+    """Record the 'cleaned' stage and the closed contacts within it"""
+    record_funnel_stage(funnel_key, 'cleaned', len(df))
+    closed = df[close_col].notna().sum() if close_col in df.columns else 0
+    record_funnel_stage(funnel_key, 'closed', closed)
+
+def format_funnel(funnel):
+    """Format a funnel as 'Total Contactos: 1,000 → Contactos APREU: 800 → ... | Tratos Cerrados: 90'"""
+    parts = [
+        f"{FUNNEL_LABELS.get(stage, stage)}: {count:,}"
+        for stage, count in funnel.items() if stage != 'closed'
+    ]
+    text = " → ".join(parts)
+    # Closed contacts are a subset of the cleaned stage, not a step of the chain
+    if 'closed' in funnel:
+        text += f" | {FUNNEL_LABELS['closed']}: {funnel['closed']:,}"
+    return text
+
+def _rss_mb():
+    """Resident memory of this process in MB (None if it cannot be read)"""
+    if PSUTIL_AVAILABLE:
+        return psutil.Process().memory_info().rss / 2**20
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+class PipelineTimer:
+    """
+    Lap timer for the named stages of one pipeline run.
+
+    Each `lap()` closes the stage that started at the previous lap, recording
+    wall time, rows in/out and the change in process RSS. Memory is measured
+    for the whole process, so concurrent sessions make the delta approximate.
+
+    Usage:
+        timer = PipelineTimer('cluster1', funnel_key, rows_in=len(data))
+        df = data.rename(columns=column_map)
+        timer.lap('rename', len(df))
+        ...
+        timer.finish(len(cohort))
+    """
+
+    def __init__(self, pipeline, run_key=None, rows_in=None):
+        self.pipeline = pipeline
+        self.run_key = run_key
+        self.rows = rows_in
+        self.run = {
+            'run_id': next(_run_ids),
+            'pipeline': pipeline,
+            'run_key': None if run_key is None else str(run_key),
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'rows_in': rows_in,
+            'stages': [],
+        }
+        self._run_start = self._lap_start = time.perf_counter()
+        self._run_rss = self._lap_rss = _rss_mb()
+        with _lock:
+            _timed_runs[self.run['run_id']] = self.run
+            while len(_timed_runs) > MAX_TIMED_RUNS:
+                _timed_runs.popitem(last=False)
+
+    def lap(self, stage, rows_out=None):
+        """Record the stage that ran since the previous lap"""
+        now = time.perf_counter()
+        rss = _rss_mb()
+        record = {
+            'stage': stage,
+            'seconds': round(now - self._lap_start, 4),
+            'rows_in': self.rows,
+            'rows_out': None if rows_out is None else int(rows_out),
+            'mem_delta_mb': None if rss is None or self._lap_rss is None else round(rss - self._lap_rss, 1),
+        }
+        with _lock:
+            self.run['stages'].append(record)
+        _log_stage(self.run, record, rss)
+
+        if rows_out is not None:
+            self.rows = int(rows_out)
+        self._lap_start = time.perf_counter()
+        self._lap_rss = rss
+        return record
+
+    def finish(self, rows_out=None):
+        """Close the run with a 'total' record covering every stage"""
+        rss = _rss_mb()
+        record = {
+            'stage': 'total',
+            'seconds': round(time.perf_counter() - self._run_start, 4),
+            'rows_in': self.run['rows_in'],
+            'rows_out': None if rows_out is None else int(rows_out),
+            'mem_delta_mb': None if rss is None or self._run_rss is None else round(rss - self._run_rss, 1),
+        }
+        with _lock:
+            self.run['total'] = record
+        _log_stage(self.run, record, rss)
+        return record
+
+def _log_stage(run, record, rss):
+    if not PIPELINE_LOG_JSON:
+        return
+    entry = {
+        'severity': 'INFO',
+        'message': f"{run['pipeline']}.{record['stage']} {record['seconds']:.3f}s",
+        'event': 'pipeline_stage',
+        'pipeline': run['pipeline'],
+        'run_key': run['run_key'],
+        'run_id': run['run_id'],
+        **record,
+        'rss_mb': None if rss is None else round(rss, 1),
+        'pid': os.getpid(),
+    }
+    _logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+def get_timed_runs(pipeline=None, limit=None):
+    """Most recent timed runs first, optionally for one pipeline only"""
+    with _lock:
+        runs = [
+            {**run, 'stages': list(run['stages'])}
+            for run in reversed(_timed_runs.values())
+            if pipeline is None or run['pipeline'] == pipeline
+        ]
+    return runs[:limit] if limit else runs
+
+def clear_timed_runs():
+    """Forget every recorded timing (the funnel counts are kept)"""
+    with _lock:
+        _timed_runs.clear()
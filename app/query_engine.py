@@ -0,0 +1,170 @@
+"""
+Query Engine Module
+Group aggregations of the analysis tabs, run by an embedded DuckDB for
+large cohorts and by pandas otherwise.
+
+Tabs describe a breakdown once, as named aggregations
+({'Total': ('contact_id', 'count'), ...}, the same spec as pandas'
+groupby().agg) or as value shares within groups. For cohorts of at least
+QUERY_DUCKDB_MIN_ROWS rows the spec is compiled to SQL and DuckDB scans the
+cohort in place (Arrow-backed columns without a copy), with vectorized,
+multi-threaded execution. Smaller cohorts, or environments without duckdb,
+run the equivalent pandas groupby. Both give the same table.
+
+`sql()` runs ad-hoc SQL over cohorts for breakdowns that have no spec
+(DuckDB only).
+"""
+
+import os
+import threading
+
+import pandas as pd
+
+# Optional: embedded columnar SQL engine
+try:
+    import duckdb
+    DUCKDB_AVAILABLE = True
+except ImportError:
+    DUCKDB_AVAILABLE = False
+
+# auto: DuckDB for cohorts of QUERY_DUCKDB_MIN_ROWS rows or more; duckdb / pandas force the engine
+QUERY_ENGINE = os.getenv("QUERY_ENGINE", "auto")
+# Below this size pandas is faster than registering the cohort in DuckDB
+QUERY_DUCKDB_MIN_ROWS = int(os.getenv("QUERY_DUCKDB_MIN_ROWS", "100000"))
+# DuckDB worker threads (0: one per CPU)
+QUERY_THREADS = int(os.getenv("QUERY_THREADS", "0"))
+
+AGGREGATE_SQL = {
+    'size': 'COUNT(*)',
+    'count': 'COUNT({col})',
+    'sum': 'COALESCE(SUM({col}), 0)',
+    'mean': 'AVG({col})',
+    'median': 'MEDIAN({col})',
+    'min': 'MIN({col})',
+    'max': 'MAX({col})',
+    'std': 'STDDEV_SAMP({col})',
+    'nunique': 'COUNT(DISTINCT {col})',
+}
+
+_local = threading.local()
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _connection():
+    """This thread's DuckDB connection (connections are not shared between threads)"""
+    con = getattr(_local, 'con', None)
+    if con is None:
+        con = duckdb.connect(':memory:')
+        if QUERY_THREADS > 0:
+            con.execute(f"SET threads TO {QUERY_THREADS}")
+        _local.con = con
+    return con
+
+def use_duckdb(df):
+    """Whether aggregations over `df` run in DuckDB"""
+    if QUERY_ENGINE == 'pandas':
+        return False
+    if QUERY_ENGINE == 'duckdb':
+        if not DUCKDB_AVAILABLE:
+            raise ImportError("duckdb no está instalado. Instálalo con: pip install duckdb")
+        return True
+    return DUCKDB_AVAILABLE and len(df) >= QUERY_DUCKDB_MIN_ROWS
+
+def sql(query, **tables):
+    """
+    Run SQL over DataFrames passed as keyword arguments (the names used in the query).
+
+    Select only the columns the query reads before passing a cohort: DuckDB
+    infers the type of every object column it scans.
+    """
+    if not DUCKDB_AVAILABLE:
+        raise ImportError("duckdb no está instalado. Instálalo con: pip install duckdb")
+    con = _connection()
+    for name, frame in tables.items():
+        con.register(name, frame)
+    try:
+        return con.execute(query).df()
+    finally:
+        for name in tables:
+            con.unregister(name)
+
+def _keys(by):
+    return [by] if isinstance(by, str) else list(by)
+
+def _column_sql(df, col):
+    # Booleans (is_closed) are summed and averaged as integers, like pandas
+    if pd.api.types.is_bool_dtype(df[col]):
+        return f"CAST({_quote(col)} AS INTEGER)"
+    return _quote(col)
+
+def _aggregate_sql(df, keys, aggs, sort, ascending, limit):
+    selects = [_quote(k) for k in keys]
+    for out, (col, func) in aggs.items():
+        expr = AGGREGATE_SQL[func].format(col=_column_sql(df, col) if func != 'size' else '')
+        if func == 'sum' and (pd.api.types.is_integer_dtype(df[col]) or pd.api.types.is_bool_dtype(df[col])):
+            # SUM of integers is a HUGEINT, which would come back as float
+            expr = f"CAST({expr} AS BIGINT)"
+        selects.append(f"{expr} AS {_quote(out)}")
+    group = ", ".join(_quote(k) for k in keys)
+    # pandas drops missing keys
+    where = " AND ".join(f"{_quote(k)} IS NOT NULL" for k in keys)
+    order = group if sort is None else f"{_quote(sort)} {'ASC' if ascending else 'DESC'}, {group}"
+    query = f"SELECT {', '.join(selects)} FROM cohort WHERE {where} GROUP BY {group} ORDER BY {order}"
+    if limit is not None:
+        query += f" LIMIT {int(limit)}"
+    return query
+
+def aggregate(df, by, aggs, sort=None, ascending=True, limit=None):
+    """
+    Grouped named aggregations, indexed by `by` (a column or list of columns).
+
+    Args:
+        df: Cohort dataframe
+        by: Group key column(s); rows with a missing key are left out, like pandas
+        aggs: {output name: (column, function)}; functions are size, count
+            (non-missing values), sum, mean, median, min, max, std and nunique
+        sort: Output column to order the groups by (default: the keys)
+        ascending: Sort direction for `sort`
+        limit: Keep only the first `limit` groups after sorting
+    """
+    keys = _keys(by)
+    columns = list(dict.fromkeys(keys + [col for col, func in aggs.values() if func != 'size']))
+    if use_duckdb(df):
+        result = sql(_aggregate_sql(df, keys, aggs, sort, ascending, limit), cohort=df[columns])
+        return result.set_index(keys if len(keys) > 1 else keys[0])
+
+    named = {out: (keys[0] if func == 'size' else col, func) for out, (col, func) in aggs.items()}
+    result = df[columns].groupby(keys if len(keys) > 1 else keys[0], observed=True, sort=True).agg(**named)
+    if sort is not None:
+        result = result.sort_values(sort, ascending=ascending, kind='stable')
+    return result if limit is None else result.head(limit)
+
+def value_counts(df, col, limit=None):
+    """Rows per value of `col`, most frequent first (missing values left out)"""
+    return aggregate(df, col, {'count': (col, 'size')}, sort='count', ascending=False, limit=limit)['count']
+
+def shares(df, by, col, limit=None):
+    """
+    Percent of each `col` value within each `by` group, as a long table.
+
+    Returns columns [by, col, 'percent'], ordered by group and then by
+    percent (highest first); `limit` keeps the top values of each group.
+    """
+    if use_duckdb(df):
+        b, c = _quote(by), _quote(col)
+        query = (
+            f"SELECT {b}, {c}, 100.0 * COUNT(*) / SUM(COUNT(*)) OVER (PARTITION BY {b}) AS percent "
+            f"FROM cohort WHERE {b} IS NOT NULL AND {c} IS NOT NULL GROUP BY {b}, {c}"
+        )
+        if limit is not None:
+            query += f" QUALIFY ROW_NUMBER() OVER (PARTITION BY {b} ORDER BY COUNT(*) DESC, {c}) <= {int(limit)}"
+        query += f" ORDER BY {b}, percent DESC, {c}"
+        return sql(query, cohort=df[[by, col]])
+
+    counts = df.groupby(by, observed=True)[col].value_counts(normalize=True).mul(100)
+    result = counts.rename('percent').reset_index()
+    result = result.sort_values([by, 'percent', col], ascending=[True, False, True], kind='stable')
+    if limit is not None:
+        result = result.groupby(by, observed=True).head(limit)
+    return result.reset_index(drop=True)
@@ -0,0 +1,39 @@
+"""
+Segmentation Core
+Pure compute layer shared by the Streamlit app, notebooks and batch jobs:
+history parsing, platform/geo/activity classification, feature engineering,
+clustering and closure metrics.
+
+Nothing here imports Streamlit, plotly or matplotlib, and sklearn is only
+imported when Cluster 1 runs its KMeans step, so `import segmentation_core`
+stays cheap.
+"""
+
+from .history import (
+    convert_hubspot_timestamp, hist_latest, hist_latest_series,
+    hist_all, hist_concat_text, normalize_text
+)
+from .metrics import (
+    calculate_close_rate, calculate_days_to_close, categorize_ttc, convert_academic_period, group_kpis
+)
+from .platforms import (
+    PLATFORM_KEYWORDS, detect_platforms_in_text, extract_platform_signals,
+    detect_offline_source, count_offline_mentions
+)
+from .geography import (
+    MX_ALIASES, QRO_TOKENS, MEXICAN_STATES, STATE_NORMALIZATION, DEFAULT_CONFIG, EXAMPLE_CONFIGS,
+    is_home_country, is_local_region, classify_geo_tier_dynamic
+)
+from .activities import (
+    DIGITAL_ACTIVITIES, EVENT_ACTIVITIES, MESSAGING_ACTIVITIES, NICHE_ACTIVITIES,
+    detect_activity_type, classify_entry_channel
+)
+from .history_table import HistoryTable, export_history_table, list_value_counts, lists_contain
+from .paths import journey_steps, transition_counts, path_counts
+from .intervals import wilson_interval, bootstrap_means, group_intervals, close_rate_intervals, add_close_rate_intervals
+from .model_selection import parse_k_values, stratified_sample, sweep_k, choose_k
+from .partition import run_partitioned
+from .incremental import DeltaState
+from .cluster1 import build_cluster1_cohort
+from .cluster2 import build_cluster2_cohort, build_cluster2_base, apply_geo_config
+from .cluster3 import build_cluster3_cohort
@@ -0,0 +1,93 @@
+"""
+APREU activity classification
+Keyword lists for promotional activities and the 3A-3D entry channel rules
+"""
+
+import pandas as pd
+
+# APREU Activity Classification
+DIGITAL_ACTIVITIES = [
+    'sitio web', 'sitio', 'website', 'web', 
+    'formulario', 'formulario rua', 'rua', 'form',
+    'google ads', 'facebook ads', 'ads', 'paid search',
+    'organic search', 'organic', 'seo',
+    'landing page', 'lp'
+]
+
+EVENT_ACTIVITIES = [
+    'open day', 'openday', 'open house', 
+    'fogatada', 'fogata',
+    'tdla', 'tour de la admision', 'tour admisión',
+    'gira panama', 'gira panamá', 'panama', 'panamá',
+    'feria', 'feria universitaria', 'expo',
+    'evento carrera', 'eventos carreras',
+    'visita campus', 'campus tour', 'recorrido',
+    'conferencia', 'charla', 'webinar',
+    'día de puertas abiertas'
+]
+
+MESSAGING_ACTIVITIES = [
+    'whatsapp', 'whats app', 'wa', 
+    'mensaje directo', 'direct message', 'dm',
+    'chat', 'messenger',
+    'contacto directo', 'direct contact',
+    'llamada', 'phone call', 'call'
+]
+
+NICHE_ACTIVITIES = [
+    'lion leaders', 'lion leader', 'leaders',
+    'programa especial', 'special program',
+    'beca', 'scholarship', 'becas',
+    'intercambio', 'exchange',
+    'embajador', 'ambassador', 'embajadores',
+    'referido', 'referral', 'referred',
+    'alumni', 'ex-alumno'
+]
+
+def detect_activity_type(text, activity_dict):
+    """Search for activity keywords in text and return count of matches"""
+    if pd.isna(text) or text == "":
+        return 0
+    
+    text_lower = str(text).lower()
+    count = 0
+    
+    for keyword in activity_dict:
+        if keyword in text_lower:
+            count += 1
+    
+    return count
+
+def classify_entry_channel(apreu_hist, first_conv, recent_conv):
+    """Classify contact into entry channel segment (3A/3B/3C/3D)"""
+    all_text = f"{apreu_hist} {first_conv} {recent_conv}".lower()
+    
+    # Count each type of activity
+    digital_count = detect_activity_type(all_text, DIGITAL_ACTIVITIES)
+    event_count = detect_activity_type(all_text, EVENT_ACTIVITIES)
+    messaging_count = detect_activity_type(all_text, MESSAGING_ACTIVITIES)
+    niche_count = detect_activity_type(all_text, NICHE_ACTIVITIES)
+    
+    activity_scores = {
+        '3A_Digital': digital_count,
+        '3B_Event': event_count,
+        '3C_Messaging': messaging_count,
+        '3D_Niche': niche_count
+    }
+    
+    max_score = max(activity_scores.values())
+    
+    if max_score == 0:
+        return 'Unknown'
+    
+    # Priority: Event > Digital > Messaging > Niche
+    if activity_scores['3B_Event'] == max_score and max_score > 0:
+        return '3B_Event'
+    elif activity_scores['3A_Digital'] == max_score and max_score > 0:
+        return '3A_Digital'
+    elif activity_scores['3C_Messaging'] == max_score and max_score > 0:
+        return '3C_Messaging'
+    elif activity_scores['3D_Niche'] == max_score and max_score > 0:
+        return '3D_Niche'
+    else:
+        return 'Unknown'
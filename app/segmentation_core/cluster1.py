@@ -0,0 +1,392 @@
+"""
+Cluster 1 pipeline: Prospectos Socialmente Comprometidos
+Builds the socially engaged cohort, KMeans engagement segments and platform tags
+"""
+
+import pandas as pd
+import numpy as np
+from pipeline_metrics import record_funnel_stage, record_cleaned_stage, PipelineTimer
+from .history import hist_latest
+from .history_table import cohort_history
+from .metrics import calculate_days_to_close, categorize_ttc
+from .platforms import PLATFORM_KEYWORDS, extract_platform_signals, count_offline_mentions
+from .incremental import run_stage, signature
+
+TEXT_COLS = ['original_source', 'original_source_d1', 'original_source_d2',
+             'canal_de_adquisicion', 'latest_source', 'last_referrer']
+
+NUMERIC_COLS = ['broadcast_clicks', 'linkedin_clicks', 'twitter_clicks', 'facebook_clicks',
+                'num_sessions', 'num_pageviews', 'forms_submitted', 'likelihood_to_close']
+
+SOCIAL_KEYWORDS = ['facebook', 'instagram', 'linkedin', 'twitter', 'tiktok', 'youtube',
+                   'social', 'fb', 'ig', 'ads', 'eventbrite', 'make', 'atomchat']
+
+SOURCE_LATEST_COLS = ['original_source_latest', 'original_source_d1_latest', 'original_source_d2_latest',
+                      'canal_de_adquisicion_latest', 'latest_source_latest', 'last_referrer_latest']
+
+# Raw export columns → pipeline names
+COLUMN_MAP = {
+    'Record ID': 'contact_id',
+    'Broadcast Clicks': 'broadcast_clicks',
+    'LinkedIn Clicks': 'linkedin_clicks',
+    'Twitter Clicks': 'twitter_clicks',
+    'Facebook Clicks': 'facebook_clicks',
+    'Number of Sessions': 'num_sessions',
+    'Number of Pageviews': 'num_pageviews',
+    'Number of Form Submissions': 'forms_submitted',
+    'Original Source': 'original_source',
+    'Original Source Drill-Down 1': 'original_source_d1',
+    'Original Source Drill-Down 2': 'original_source_d2',
+    'Canal de adquisición': 'canal_de_adquisicion',
+    'Latest Traffic Source': 'latest_source',
+    'Last Referring Site': 'last_referrer',
+    'Likelihood to close': 'likelihood_to_close',
+    'Create Date': 'create_date',
+    'Close Date': 'close_date',
+    'Lifecycle Stage': 'lifecycle_stage',
+    'Propiedad del contacto': 'propiedad_del_contacto'
+}
+
+def parse_history_rows(chunk):
+    """Row-level stage: latest text values, numeric columns and APREU/lifecycle values"""
+    out = pd.DataFrame(index=chunk.index)
+    for col in TEXT_COLS:
+        if col in chunk.columns:
+            out[f'{col}_latest'] = chunk[col].apply(hist_latest)
+    
+    for col in NUMERIC_COLS:
+        if col in chunk.columns:
+            out[col] = pd.to_numeric(chunk[col].apply(hist_latest), errors='coerce').fillna(0)
+    
+    for col in ['propiedad_del_contacto', 'lifecycle_stage']:
+        if col in chunk.columns:
+            out[col] = chunk[col].apply(hist_latest)
+    return out
+
+def platform_signal_rows(chunk):
+    """Row-level stage: platform keyword counts and the social source flag"""
+    search_columns = [f'{c}_hist_all' for c in TEXT_COLS if f'{c}_hist_all' in chunk.columns]
+    search_columns += [f'{c}_latest' for c in TEXT_COLS if f'{c}_latest' in chunk.columns]
+    
+    platform_signals = chunk.apply(
+        lambda row: extract_platform_signals(row, search_columns), 
+        axis=1
+    )
+    
+    out = pd.DataFrame(index=chunk.index)
+    for platform in PLATFORM_KEYWORDS.keys():
+        out[f'platform_count_{platform}'] = platform_signals.apply(
+            lambda counter: counter.get(platform, 0)
+        )
+    
+    def is_social_source(val):
+        if pd.isna(val):
+            return False
+        val_lower = str(val).lower()
+        return any(kw in val_lower for kw in SOCIAL_KEYWORDS)
+    
+    has_social_source = pd.Series(False, index=chunk.index)
+    for col in SOURCE_LATEST_COLS:
+        if col in chunk.columns:
+            has_social_source = has_social_source | chunk[col].apply(is_social_source)
+    out['has_social_source'] = has_social_source
+    return out
+
+def platform_tag_rows(chunk):
+    """Row-level stage: dominant platform per contact"""
+    def platform_tag(row):
+        platform_scores = {}
+        for platform in ['Facebook', 'Instagram', 'LinkedIn', 'Twitter', 'TikTok',
+                       'YouTube', 'Google_Ads', 'Eventbrite', 'WhatsApp', 'MAKE']:
+            count_col = f'platform_count_{platform}'
+            if count_col in row.index:
+                platform_scores[platform] = row[count_col]
+        
+        if platform_scores:
+            dominant = max(platform_scores.items(), key=lambda x: x[1])
+            if dominant[1] > 0:
+                return dominant[0]
+        
+        return 'Mixed'
+    
+    return pd.DataFrame({'platform_tag': chunk.apply(platform_tag, axis=1)}, index=chunk.index)
+
+def journey_rows(chunk):
+    """Row-level stage: offline mentions in the source history and time to close"""
+    out = pd.DataFrame(index=chunk.index)
+    out['offline_count_original'] = 0
+    out['offline_count_latest'] = 0
+    
+    # Check original source fields (full history)
+    for col in ['original_source_hist_all', 'original_source_d1_hist_all', 'original_source_d2_hist_all']:
+        if col in chunk.columns:
+            out['offline_count_original'] = out['offline_count_original'] + chunk[col].apply(count_offline_mentions)
+    
+    # Check latest source fields (full history) 
+    for col in ['latest_source_hist_all', 'last_referrer_hist_all']:
+        if col in chunk.columns:
+            out['offline_count_latest'] = out['offline_count_latest'] + chunk[col].apply(count_offline_mentions)
+    
+    # Calculate days to close and TTC bucket
+    if 'create_date' in chunk.columns and 'close_date' in chunk.columns:
+        out['days_to_close'] = chunk.apply(
+            lambda row: calculate_days_to_close(row['create_date'], row['close_date']),
+            axis=1
+        )
+        out['ttc_bucket'] = out['days_to_close'].apply(categorize_ttc)
+    return out
+
+def engagement_model_frame(scaler, kmeans, feature_cols, label_map):
+    """Scaler and KMeans centers as a frame (rows mean, scale, center_<k>), to store with a DeltaState"""
+    model = pd.DataFrame(
+        np.vstack([scaler.mean_, scaler.scale_, kmeans.cluster_centers_]),
+        index=['mean', 'scale'] + [f'center_{k}' for k in range(len(kmeans.cluster_centers_))],
+        columns=feature_cols
+    )
+    model['label'] = [None, None] + [label_map.get(k) for k in range(len(kmeans.cluster_centers_))]
+    return model
+
+def engagement_label_map(combined):
+    """
+    Segment label of each cluster from its combined engagement + social
+    intensity: 1A is the highest, 1B the lowest, and clusters in between
+    (k > 2) are 1M1, 1M2... from high to low.
+    """
+    ranked = combined.sort_values(ascending=False, kind='stable').index.tolist()
+    middle = ranked[1:-1]
+    label_map = {ranked[0]: '1A - Alto Compromiso', ranked[-1]: '1B - Bajo Compromiso'}
+    for i, cluster in enumerate(middle, start=1):
+        label_map[cluster] = '1M - Compromiso Medio' if len(middle) == 1 else f'1M{i} - Compromiso Medio {i}'
+    return label_map
+
+def predict_engagement_clusters(model, X):
+    """Nearest stored KMeans center of each row (what KMeans.predict returns)"""
+    features = [c for c in model.columns if c != 'label']
+    X_scaled = (X[features].to_numpy(dtype='float64') - model.loc['mean', features].to_numpy(dtype='float64')) \
+        / model.loc['scale', features].to_numpy(dtype='float64')
+    centers = model.loc[model.index.str.startswith('center_'), features].to_numpy(dtype='float64')
+    # ‖x − c‖² = ‖x‖² − 2·x·c + ‖c‖², as an n×k array (no n×k×d difference
+    # tensor); ‖x‖² is the same for every center, so it does not change the argmin
+    distances = (centers ** 2).sum(axis=1) - 2 * (X_scaled @ centers.T)
+    return distances.argmin(axis=1).astype('int32')
+
+def build_cluster1_cohort(data, funnel_key=None, delta=None, history=None, k_values=None, models=None):
+    """Build the Cluster 1 cohort from a raw HubSpot export
+
+    Args:
+        data: Raw contacts dataframe (not modified)
+        funnel_key: Identifier under which the funnel stage counts are recorded
+        delta: Optional incremental.DeltaState; unchanged contacts reuse its stored
+            stage outputs and the stored KMeans model scores the cohort
+        history: Optional HistoryTable of the dataset `data` comes from
+            (export_history_table); split from `data` when not given
+        k_values: Candidate numbers of engagement clusters; when given, k is
+            chosen by model_selection.sweep_k instead of the fixed k=2
+        models: Optional store for the swept model and its diagnostics
+            (stored_model/save_model, e.g. a DeltaState kept per dataset
+            version); a stored model scores the cohort instead of a new sweep.
+            `delta` takes its place in incremental runs
+    """
+
+    timer = PipelineTimer('cluster1', funnel_key, rows_in=len(data))
+    df = data.copy()
+    
+    # Rename columns
+    df = df.rename(columns=COLUMN_MAP)
+    record_funnel_stage(funnel_key, 'total', len(df))
+    timer.lap('copy_rename', len(df))
+    
+    # Apply hist_latest to get latest values and numeric columns
+    # (row-level, partitioned across worker processes for large exports);
+    # full-history text is gathered from the long-format history table
+    parsed = run_stage(delta, 'parse_history', df, parse_history_rows, TEXT_COLS + NUMERIC_COLS + ['propiedad_del_contacto', 'lifecycle_stage'])
+    history = cohort_history(history, df, TEXT_COLS)
+    for col in parsed.columns:
+        df[col] = parsed[col]
+        field = col[:-len('_latest')]
+        if col.endswith('_latest') and field in TEXT_COLS:
+            df[f'{field}_hist_all'] = history.text(field, df.index)
+    
+    # Calculate total social clicks
+    click_cols = ['broadcast_clicks', 'linkedin_clicks', 'twitter_clicks', 'facebook_clicks']
+    df['social_clicks_total'] = df[[c for c in click_cols if c in df.columns]].sum(axis=1)
+    timer.lap('parse_history', len(df))
+    
+    # Filter for APREU contacts only
+    if 'propiedad_del_contacto' in df.columns:
+        df = df[df['propiedad_del_contacto'].str.upper() == 'APREU'].copy()
+    record_funnel_stage(funnel_key, 'apreu', len(df))
+    
+    # Filter out "Other" and "subscriber" lifecycle stages
+    if 'lifecycle_stage' in df.columns:
+        df = df[~df['lifecycle_stage'].str.lower().isin(['other', 'subscriber'])].copy()
+    record_cleaned_stage(funnel_key, df)
+    
+    # Filter for paid_social and paid_search only
+    if 'original_source_latest' in df.columns:
+        df = df[df['original_source_latest'].str.lower().isin(['paid_social', 'paid_search'])].copy()
+    timer.lap('filter_apreu_lifecycle_source', len(df))
+    
+    # Extract platform signals from historical data
+    search_columns = [f'{c}_hist_all' for c in TEXT_COLS] + [f'{c}_latest' for c in TEXT_COLS]
+    signals = run_stage(delta, 'platform_signals', df, platform_signal_rows, search_columns)
+    has_social_source = signals.pop('has_social_source')
+    
+    # Create platform count columns
+    for col in signals.columns:
+        df[col] = signals[col]
+    
+    # Total platform mentions and diversity
+    platform_count_cols = [f'platform_count_{p}' for p in PLATFORM_KEYWORDS.keys()]
+    df['platform_mentions_total'] = df[platform_count_cols].sum(axis=1)
+    df['platform_diversity'] = (df[platform_count_cols] > 0).sum(axis=1)
+    
+    # Define socially engaged cohort
+    has_clicks = df['social_clicks_total'] > 0
+    has_platform_mentions = df['platform_mentions_total'] > 0
+    
+    df['is_socially_engaged'] = has_clicks | has_platform_mentions | has_social_source
+    
+    # Filter to socially engaged cohort
+    cohort = df[df['is_socially_engaged']].copy()
+    timer.lap('platform_detection', len(cohort))
+    
+    # Feature engineering
+    for col in ['social_clicks_total', 'num_sessions', 'num_pageviews', 'forms_submitted']:
+        if col in cohort.columns:
+            cohort[f'log_{col}'] = np.log1p(cohort[col])
+    
+    # Ratios
+    cohort['pageviews_per_session'] = cohort['num_pageviews'] / (1 + cohort['num_sessions'])
+    cohort['forms_per_session'] = cohort['forms_submitted'] / (1 + cohort['num_sessions'])
+    cohort['forms_per_click'] = cohort['forms_submitted'] / (1 + cohort['social_clicks_total'])
+    
+    # Replace inf/nan
+    for c in ['pageviews_per_session', 'forms_per_session', 'forms_per_click']:
+        cohort[c] = cohort[c].replace([np.inf, -np.inf], np.nan).fillna(0)
+    
+    # Clustering
+    feature_cols = [
+        'log_social_clicks_total', 'log_num_sessions',
+        'log_num_pageviews', 'log_forms_submitted',
+        'pageviews_per_session', 'forms_per_session', 'forms_per_click'
+    ]
+    
+    feature_cols = [c for c in feature_cols if c in cohort.columns]
+    
+    if len(cohort) > 0 and len(feature_cols) > 0:
+        # sklearn is only needed here, so importing the core stays fast
+        from sklearn.cluster import KMeans
+        from sklearn.preprocessing import StandardScaler
+
+        X_num = cohort[feature_cols].fillna(0)
+        if k_values:
+            model_name = f'kmeans_sweep_{signature((feature_cols, tuple(sorted(k_values))))}'
+            store = delta if delta is not None else models
+        else:
+            model_name = f'kmeans_{signature(feature_cols)}'
+            store = delta
+        model = store.stored_model(model_name) if store is not None else None
+        if model is not None and k_values:
+            # Keep the sweep diagnostics with the reused model
+            store.stored_model(f'diagnostics_{model_name}')
+        if model is not None:
+            # Incremental run (or a dataset version swept before): score with
+            # the stored model instead of refitting
+            cohort['cluster'] = predict_engagement_clusters(model, X_num)
+        else:
+            scaler = StandardScaler()
+            X_scaled = scaler.fit_transform(X_num)
+            
+            if k_values:
+                from .model_selection import sweep_k
+                diagnostics, kmeans, labels = sweep_k(X_scaled, k_values)
+                cohort['cluster'] = labels
+                if store is not None:
+                    store.save_model(f'diagnostics_{model_name}', diagnostics)
+            else:
+                kmeans = KMeans(n_clusters=2, random_state=42, n_init=10)
+                cohort['cluster'] = kmeans.fit_predict(X_scaled)
+        timer.lap('kmeans', len(cohort))
+        
+        # Calculate engagement scores
+        cohort['engagement_score'] = (
+            cohort.get('log_num_sessions', 0) +
+            cohort.get('log_num_pageviews', 0) +
+            cohort.get('log_forms_submitted', 0)
+        )
+        cohort['social_intensity'] = cohort.get('log_social_clicks_total', 0)
+        
+        # Label clusters
+        cluster_stats = (
+            cohort.groupby('cluster')[['engagement_score', 'social_intensity']]
+            .mean()
+            .assign(combined=lambda df: df['engagement_score'] + df['social_intensity'])
+        )
+        
+        if model is not None:
+            label_map = model['label'].dropna().rename(index=lambda c: int(c.split('_')[1])).to_dict()
+        else:
+            label_map = engagement_label_map(cluster_stats['combined'])
+            if store is not None:
+                store.save_model(model_name, engagement_model_frame(scaler, kmeans, feature_cols, label_map))
+        cohort['segment_engagement'] = cohort['cluster'].map(label_map)
+        
+        # Platform tagging
+        platform_count_cols = [f'platform_count_{p}' for p in PLATFORM_KEYWORDS.keys()]
+        cohort['platform_tag'] = run_stage(delta, 'platform_tag', cohort, platform_tag_rows, platform_count_cols)['platform_tag']
+        cohort['segment_overlay'] = cohort['segment_engagement'] + ' + ' + cohort['platform_tag']
+        timer.lap('segment_labels', len(cohort))
+    else:
+        cohort['segment_engagement'] = 'Unknown'
+        cohort['platform_tag'] = 'Unknown'
+        cohort['segment_overlay'] = 'Unknown'
+    
+    # Detect offline sources - using FULL HISTORICAL DATA for richer analysis
+    # Instead of just latest, we count ALL offline mentions across interaction history
+    
+    # Extract offline mention counts (and time to close) from historical data
+    journey = run_stage(delta, 'journey', cohort, journey_rows, [
+        'original_source_hist_all', 'original_source_d1_hist_all', 'original_source_d2_hist_all',
+        'latest_source_hist_all', 'last_referrer_hist_all', 'create_date', 'close_date'
+    ])
+    offline_count_original = journey['offline_count_original']
+    offline_count_latest = journey['offline_count_latest']
+    
+    # Total offline mentions across all history
+    cohort['offline_mentions_total'] = offline_count_original + offline_count_latest
+    cohort['has_offline_source'] = cohort['offline_mentions_total'] > 0
+    
+    # Classification based on where offline appears in journey
+    cohort['offline_type'] = 'Online'
+    cohort['offline_intensity'] = 'None'
+    
+    # Classify by offline touchpoints
+    has_original_offline = offline_count_original > 0
+    has_latest_offline = offline_count_latest > 0
+    
+    cohort.loc[has_original_offline & ~has_latest_offline, 'offline_type'] = 'Offline (Original Only)'
+    cohort.loc[~has_original_offline & has_latest_offline, 'offline_type'] = 'Offline (Latest Only)'
+    cohort.loc[has_original_offline & has_latest_offline, 'offline_type'] = 'Offline (Throughout)'
+    
+    # Intensity based on total mentions
+    cohort['offline_intensity'] = cohort['offline_mentions_total'].apply(
+        lambda x: 'None' if x == 0 else ('Low (1-2)' if x <= 2 else ('Medium (3-5)' if x <= 5 else 'High (6+)'))
+    )
+    
+    # Days to close and TTC bucket
+    for col in ['days_to_close', 'ttc_bucket']:
+        if col in journey.columns:
+            cohort[col] = journey[col]
+    
+    # Normalize likelihood to close
+    if 'likelihood_to_close' in cohort.columns:
+        s = cohort['likelihood_to_close']
+        s = np.where(s > 1, s / 100.0, s)
+        cohort['likelihood_to_close_norm'] = pd.Series(s, index=cohort.index).clip(0, 1)
+    
+    record_funnel_stage(funnel_key, 'cohort', len(cohort))
+    timer.lap('offline_journey', len(cohort))
+    timer.finish(len(cohort))
+    
+    return cohort
@@ -0,0 +1,329 @@
+"""
+Cluster 2 pipeline: Segmentación por Geografía y Compromiso
+Builds geo tiers (Local/Foráneo/Internacional) and 2A-2F engagement segments
+
+Split in two phases so a geo configuration change only re-runs what depends
+on it: build_cluster2_base (history parsing, APREU/lifecycle filters,
+consolidated geography fields, engagement score, time to close) and
+apply_geo_config (tiering, rescue, per-tier thresholds, 2A-2F labels).
+"""
+
+import pandas as pd
+import numpy as np
+from pipeline_metrics import record_funnel_stage, record_cleaned_stage, PipelineTimer
+from .history import hist_latest, normalize_text
+from .metrics import calculate_days_to_close, categorize_ttc
+from .geography import STATE_NORMALIZATION, classify_geo_tier_dynamic
+from .incremental import run_stage, signature
+
+NUMERIC_COLS = ['num_sessions', 'num_pageviews', 'forms_submitted', 'likelihood_to_close']
+
+GEO_COLS = ['ip_country', 'ip_state_region', 'prep_city_bpm', 'prep_school_bpm',
+            'prep_state_bpm', 'prep_country_bpm', 'estado_de_procedencia']
+
+# Raw export columns → pipeline names
+COLUMN_MAP = {
+    'Record ID': 'contact_id',
+    'Number of Sessions': 'num_sessions',
+    'Number of Pageviews': 'num_pageviews',
+    'Number of Form Submissions': 'forms_submitted',
+    'IP Country': 'ip_country',
+    'IP State/Region': 'ip_state_region',
+    'Ciudad preparatoria BPM': 'prep_city_bpm',
+    'Preparatoria BPM': 'prep_school_bpm',
+    'Estado de preparatoria BPM': 'prep_state_bpm',
+    'Estado de procedencia': 'estado_de_procedencia',
+    'País preparatoria BPM': 'prep_country_bpm',
+    'Likelihood to close': 'likelihood_to_close',
+    'Create Date': 'create_date',
+    'Close Date': 'close_date',
+    'Lifecycle Stage': 'lifecycle_stage',
+    'Propiedad del contacto': 'propiedad_del_contacto',
+    'Original Source': 'original_source',
+    'Latest Traffic Source': 'latest_source',
+    'Last Referring Site': 'last_referrer',
+    'Periodo de ingreso a licenciatura (MQL)': 'periodo_de_ingreso',
+    'Periodo de ingreso': 'periodo_de_ingreso',
+    'PERIODO DE INGRESO': 'periodo_de_ingreso'
+}
+
+def parse_history_rows(chunk):
+    """Row-level stage: latest value of every history column, geography text normalized"""
+    out = pd.DataFrame(index=chunk.index)
+    for col in chunk.columns:
+        if col in NUMERIC_COLS:
+            out[col] = pd.to_numeric(chunk[col].apply(hist_latest), errors='coerce').fillna(0)
+        elif col not in ['create_date', 'close_date']:
+            out[col] = chunk[col].apply(hist_latest)
+    
+    for col in GEO_COLS:
+        if col in out.columns:
+            out[col] = out[col].apply(normalize_text)
+    return out
+
+def classify_geography_rows(chunk, geo_config):
+    """Row-level stage: normalized country and geo tier for the configured home country/region"""
+    # Normalize United States variations to a single format
+    def normalize_united_states(country):
+        if pd.isna(country) or country == "unknown" or country == "":
+            return country
+        country_lower = str(country).lower().strip()
+        # Normalize variations of United States
+        us_variations = [
+            "estados unidos de america",
+            "estados unidos de américa", 
+            "united states of america",
+            "united states",
+            "usa",
+            "us",
+            "u.s.a.",
+            "u.s."
+        ]
+        if country_lower in us_variations:
+            return "estados unidos"
+        return country
+    
+    out = pd.DataFrame(index=chunk.index)
+    out['country_any'] = chunk['country_any'].apply(normalize_united_states)
+    
+    geo = chunk.assign(country_any=out['country_any'])
+    out['geo_tier'] = geo.apply(lambda row: classify_geo_tier_dynamic(row, geo_config), axis=1)
+    return out
+
+def segment_rows(chunk):
+    """Row-level stage: 2A-2F segment from the geo tier and the engagement flag"""
+    out = pd.DataFrame(index=chunk.index)
+    
+    # Assign 2A-2F segments with descriptive names
+    def assign_c2(row):
+        tier = row['geo_tier']
+        hi = bool(row['is_high_engager'])
+        if tier == 'domestic_non_local':
+            return '2A - Foráneo, Alto Compromiso' if hi else '2B - Foráneo, Bajo Compromiso'
+        if tier == 'international':
+            return '2C - Internacional, Alto Compromiso' if hi else '2D - Internacional, Bajo Compromiso'
+        if tier == 'local':
+            return '2E - Local, Alto Compromiso' if hi else '2F - Local, Bajo Compromiso'
+        return '2Z - Sin Geografía'
+    
+    out['segment_c2'] = chunk.apply(assign_c2, axis=1)
+    return out
+
+def timing_rows(chunk):
+    """Row-level stage: time to close and academic period labels"""
+    out = pd.DataFrame(index=chunk.index)
+    
+    # Calculate days to close
+    if 'create_date' in chunk.columns and 'close_date' in chunk.columns:
+        out['days_to_close'] = chunk.apply(
+            lambda row: calculate_days_to_close(row['create_date'], row['close_date']),
+            axis=1
+        )
+        out['ttc_bucket'] = out['days_to_close'].apply(categorize_ttc)
+    
+    # Convert academic period codes to readable formats (YYYYMM -> "Year Semester")
+    def convert_academic_period(period_code):
+        """Convert YYYYMM period codes to readable format"""
+        if pd.isna(period_code) or period_code == "" or period_code == "unknown":
+            return "Desconocido"
+        
+        try:
+            period_str = str(period_code).strip()
+            if len(period_str) != 6:
+                return f"Invalid: {period_code}"
+            
+            year = int(period_str[:4])
+            period = int(period_str[4:])
+            
+            # Map period codes to semester names
+            period_map = {
+                5: "Especial",
+                10: "Primavera", 
+                35: "Verano",
+                60: "Otoño",
+                75: "Invierno/Especial"
+            }
+            
+            semester = period_map.get(period, f"Desconocido({period})")
+            return f"{year} {semester}"
+            
+        except (ValueError, IndexError):
+            return f"Inválido: {period_code}"
+    
+    if 'periodo_de_ingreso' in chunk.columns:
+        out['periodo_ingreso'] = chunk['periodo_de_ingreso'].apply(convert_academic_period)
+    return out
+
+def build_cluster2_cohort(data, geo_config, funnel_key=None, delta=None):
+    """Build the Cluster 2 cohort from a raw HubSpot export
+
+    Args:
+        data: Raw contacts dataframe (not modified)
+        geo_config: Geographic configuration dict (see geography.DEFAULT_CONFIG)
+        funnel_key: Identifier under which the funnel stage counts are recorded
+        delta: Optional incremental.DeltaState; unchanged contacts reuse its stored
+            stage outputs and the stored per-tier thresholds mark high engagers
+    """
+    base = build_cluster2_base(data, funnel_key, delta)
+    return apply_geo_config(base, geo_config, funnel_key, delta)
+
+def build_cluster2_base(data, funnel_key=None, delta=None):
+    """Geo-independent part of the Cluster 2 pipeline (input of apply_geo_config)
+
+    Args:
+        data: Raw contacts dataframe (not modified)
+        funnel_key: Identifier under which the funnel stage counts are recorded
+        delta: Optional incremental.DeltaState
+    """
+
+    timer = PipelineTimer('cluster2_base', funnel_key, rows_in=len(data))
+    df = data.copy()
+    
+    df = df.rename(columns=COLUMN_MAP)
+    record_funnel_stage(funnel_key, 'total', len(df))
+    timer.lap('copy_rename', len(df))
+    
+    # Apply hist_latest and normalize geography text
+    # (row-level, partitioned across worker processes for large exports)
+    parsed = run_stage(delta, 'parse_history', df, parse_history_rows)
+    for col in parsed.columns:
+        df[col] = parsed[col]
+    timer.lap('parse_history', len(df))
+    
+    # Filter for APREU contacts
+    if 'propiedad_del_contacto' in df.columns:
+        df = df[df['propiedad_del_contacto'].str.upper() == 'APREU'].copy()
+    record_funnel_stage(funnel_key, 'apreu', len(df))
+    
+    # Filter out "Other" and "subscriber" lifecycle stages
+    if 'lifecycle_stage' in df.columns:
+        df = df[~df['lifecycle_stage'].str.lower().isin(['other', 'subscriber'])].copy()
+    record_cleaned_stage(funnel_key, df)
+    timer.lap('filter_apreu_lifecycle', len(df))
+    
+    # Normalize state names
+    for col in ['ip_state_region', 'prep_state_bpm', 'estado_de_procedencia']:
+        if col in df.columns:
+            df[col] = df[col].map(STATE_NORMALIZATION).fillna(df[col])
+    
+    # Consolidate geography fields
+    def coalesce_non_unknown(series_list):
+        cleaned = [s.replace({"unknown": np.nan}) if isinstance(s, pd.Series) else s 
+                  for s in series_list]
+        if cleaned:
+            out = pd.concat(cleaned, axis=1).bfill(axis=1).iloc[:, 0]
+            return out.fillna("unknown")
+        return pd.Series("unknown", index=df.index)
+    
+    country_series = [df.get(col, pd.Series("unknown", index=df.index)) 
+                     for col in ['prep_country_bpm', 'ip_country']]
+    df['country_any'] = coalesce_non_unknown(country_series)
+    
+    state_series = [df.get(col, pd.Series("unknown", index=df.index)) 
+                   for col in ['prep_state_bpm', 'estado_de_procedencia', 'ip_state_region']]
+    df['state_any'] = coalesce_non_unknown(state_series)
+    
+    city_series = [df.get(col, pd.Series("unknown", index=df.index)) 
+                  for col in ['prep_city_bpm']]
+    df['city_any'] = coalesce_non_unknown(city_series)
+    timer.lap('geo_fields', len(df))
+    
+    # Engagement features
+    df['log_sessions'] = np.log1p(df.get('num_sessions', 0))
+    df['log_pageviews'] = np.log1p(df.get('num_pageviews', 0))
+    df['log_forms'] = np.log1p(df.get('forms_submitted', 0))
+    df['engagement_score'] = df['log_sessions'] + df['log_pageviews'] + df['log_forms']
+    timer.lap('engagement_score', len(df))
+    
+    # Days to close and academic periods
+    timing = run_stage(delta, 'timing', df, timing_rows, ['create_date', 'close_date', 'periodo_de_ingreso'])
+    for col in timing.columns:
+        df[col] = timing[col]
+    timer.lap('timing', len(df))
+    timer.finish(len(df))
+    
+    return df
+
+def apply_geo_config(base, geo_config, funnel_key=None, delta=None):
+    """Geo-dependent part of the Cluster 2 pipeline: tiers, rescue, thresholds and 2A-2F segments
+
+    Args:
+        base: Output of build_cluster2_base (not modified)
+        geo_config: Geographic configuration dict (see geography.DEFAULT_CONFIG)
+        funnel_key: Identifier under which the cohort count is recorded
+        delta: Optional incremental.DeltaState
+    """
+
+    timer = PipelineTimer('cluster2', funnel_key, rows_in=len(base))
+    # Time-to-close columns go back after the segments, where the cohort has always had them
+    df = base.drop(columns=[c for c in ['days_to_close', 'ttc_bucket', 'periodo_ingreso'] if c in base.columns])
+    
+    # Normalize United States variations and classify geo tier using dynamic configuration
+    geography = run_stage(delta, 'geography', df, classify_geography_rows, ['country_any', 'state_any', 'city_any'], args=(geo_config,))
+    df['country_any'] = geography['country_any']
+    # Ahead of the engagement features computed in the base, like a single-pass cohort
+    df.insert(df.columns.get_loc('log_sessions'), 'geo_tier', geography['geo_tier'])
+    
+    # Rescue contacts with domestic indicators but no country
+    rescued_mask = (df['country_any'] == 'unknown') & (df['geo_tier'].isin(['local', 'domestic_non_local']))
+    df.loc[rescued_mask, 'country_any'] = geo_config['home_country'].lower()
+    timer.lap('geo_tiering', len(df))
+    
+    # Mark high/low per geo tier using quantile threshold
+    HIGH_ENG_Q = 0.70
+    model_name = f'engagement_thresholds_{signature(sorted(geo_config.items()))}'
+    stored = delta.stored_model(model_name) if delta is not None else None
+    thresholds = {} if stored is None else stored['threshold'].to_dict()
+    df['is_high_engager'] = False
+    for tier, grp in df.groupby('geo_tier'):
+        if len(grp) > 0:
+            # Incremental runs keep the stored threshold of each tier
+            thr = thresholds.get(tier)
+            if thr is None:
+                thr = thresholds[tier] = grp['engagement_score'].quantile(HIGH_ENG_Q)
+            df.loc[grp.index, 'is_high_engager'] = grp['engagement_score'] >= thr
+    if delta is not None and (stored is None or len(thresholds) > len(stored)):
+        delta.save_model(model_name, pd.DataFrame({'threshold': pd.Series(thresholds, dtype='float64')}))
+    timer.lap('engagement', len(df))
+    
+    # Assign 2A-2F segments
+    segments = run_stage(delta, 'segments', df, segment_rows, ['geo_tier', 'is_high_engager'])
+    df['segment_c2'] = segments['segment_c2']
+    
+    # Dynamic action map based on geo config
+    local_name = geo_config['local_region']
+    country_name = geo_config['home_country']
+    
+    ACTION_MAP = {
+        '2A - Foráneo, Alto Compromiso': f'Compromiso digital + eventos virtuales ({country_name} fuera de {local_name})',
+        '2B - Foráneo, Bajo Compromiso': f'Empuje WhatsApp/email ({country_name} fuera de {local_name})',
+        '2C - Internacional, Alto Compromiso': 'Webinars + Q&A virtual (Internacional)',
+        '2D - Internacional, Bajo Compromiso': 'Campañas de concientización (Internacional)',
+        '2E - Local, Alto Compromiso': f'Eventos presenciales + compromiso local (Local {local_name})',
+        '2F - Local, Bajo Compromiso': f'Nutrición local + WhatsApp (Local {local_name})',
+        '2Z - Sin Geografía': 'Investigar geografía faltante'
+    }
+    df['segment_c2_action'] = df['segment_c2'].map(ACTION_MAP)
+    
+    # Days to close and TTC bucket
+    for col in ['days_to_close', 'ttc_bucket']:
+        if col in base.columns:
+            df[col] = base[col]
+    
+    # Apply period conversion
+    if 'periodo_de_ingreso' in df.columns:
+        df['periodo_ingreso'] = base['periodo_ingreso']
+        # Drop the old column to avoid confusion
+        df = df.drop(columns=['periodo_de_ingreso'])
+    
+    # Normalize likelihood
+    if 'likelihood_to_close' in df.columns:
+        s = df['likelihood_to_close']
+        s = np.where(s > 1, s / 100.0, s)
+        df['likelihood_pct'] = pd.Series(s, index=df.index).clip(0, 1) * 100
+    
+    record_funnel_stage(funnel_key, 'cohort', len(df))
+    timer.lap('segments', len(df))
+    timer.finish(len(df))
+    
+    return df
@@ -0,0 +1,280 @@
+"""
+Cluster 3 pipeline: Convertidores Impulsados por Promoción
+Builds entry channel segments (3A-3D), preparatoria and email engagement features
+"""
+
+import pandas as pd
+import numpy as np
+from datetime import datetime
+from pipeline_metrics import record_funnel_stage, record_cleaned_stage, PipelineTimer
+from .history import hist_latest
+from .history_table import cohort_history
+from .metrics import categorize_ttc
+from .activities import classify_entry_channel
+from .incremental import run_stage
+
+LATEST_COLS = ['first_conversion', 'recent_conversion', 'prep_bpm', 'prep_name',
+               'prep_donde_estudia', 'prep_year', 'lifecycle_stage', 'propiedad_del_contacto']
+
+NUMERIC_COLS = ['num_sessions', 'num_pageviews', 'forms_submitted',
+                'email_delivered', 'email_opened', 'email_clicked', 'likelihood_to_close']
+
+DATE_COLS = ['create_date', 'close_date', 'first_conversion_date', 'recent_conversion_date']
+
+PARSED_COLS = LATEST_COLS + NUMERIC_COLS + DATE_COLS
+
+# Raw export columns → pipeline names
+COLUMN_MAP = {
+    'Record ID': 'contact_id',
+    'Actividades de promoción APREU': 'apreu_activities',
+    'First Conversion': 'first_conversion',
+    'Recent Conversion': 'recent_conversion',
+    'First Conversion Date': 'first_conversion_date',
+    'Recent Conversion Date': 'recent_conversion_date',
+    'Preparatoria BPM': 'prep_bpm',
+    '¿Cuál es el nombre de tu preparatoria?': 'prep_name',
+    'Preparatoria donde estudia': 'prep_donde_estudia',
+    '¿Qué año de preparatoria estás cursando?': 'prep_year',
+    'Number of Sessions': 'num_sessions',
+    'Number of Pageviews': 'num_pageviews',
+    'Number of Form Submissions': 'forms_submitted',
+    'Marketing emails delivered': 'email_delivered',
+    'Marketing emails opened': 'email_opened',
+    'Marketing emails clicked': 'email_clicked',
+    'Likelihood to close': 'likelihood_to_close',
+    'Create Date': 'create_date',
+    'Close Date': 'close_date',
+    'Lifecycle Stage': 'lifecycle_stage',
+    'Propiedad del contacto': 'propiedad_del_contacto'
+}
+
+def parse_history_rows(chunk):
+    """Row-level stage: latest values, numbers, dates and days to close"""
+    df = chunk.copy()
+    
+    # Apply hist_latest to text fields
+    for col in LATEST_COLS:
+        if col in df.columns:
+            df[col] = df[col].apply(hist_latest)
+    
+    # Convert numeric columns (apply hist_latest first!)
+    for col in NUMERIC_COLS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col].apply(hist_latest), errors='coerce').fillna(0)
+    
+    # Convert date columns (HubSpot timestamps to datetime)
+    # CRITICAL: Apply hist_latest FIRST to extract the latest date from history string!
+    def convert_hubspot_timestamp(val):
+        """Convert HubSpot timestamp (milliseconds since epoch) to datetime."""
+        if pd.isna(val):
+            return pd.NaT
+        # If already a datetime, return as-is
+        if isinstance(val, (pd.Timestamp, datetime)):
+            return val
+        # First extract latest value from history string
+        val = hist_latest(val)
+        if pd.isna(val):
+            return pd.NaT
+        try:
+            timestamp_ms = int(float(str(val).strip()))
+            return pd.to_datetime(timestamp_ms, unit='ms')
+        except (ValueError, TypeError):
+            return pd.NaT
+    
+    for col in DATE_COLS:
+        if col in df.columns:
+            df[col] = df[col].apply(convert_hubspot_timestamp)
+    
+    # Calculate days_to_close (matching notebook logic)
+    if 'create_date' in df.columns and 'close_date' in df.columns:
+        raw_days = (df['close_date'] - df['create_date']).dt.days
+        df['days_to_close'] = raw_days.where(raw_days >= 0)
+        df['ttc_bucket'] = df['days_to_close'].apply(categorize_ttc)
+    else:
+        df['days_to_close'] = np.nan
+        df['ttc_bucket'] = "Desconocido"
+    
+    return df
+
+def classify_rows(chunk):
+    """Row-level stage: entry channel, consolidated preparatoria and preparatoria year"""
+    out = pd.DataFrame(index=chunk.index)
+    
+    # Classify entry channel
+    out['entry_channel'] = chunk.apply(
+        lambda row: classify_entry_channel(
+            row['apreu_hist_all'], 
+            row['first_conversion'], 
+            row['recent_conversion']
+        ), 
+        axis=1
+    )
+    
+    # Consolidate preparatoria
+    def consolidate_prepa(row):
+        for field in ['prep_bpm', 'prep_name', 'prep_donde_estudia']:
+            if field in row and pd.notna(row[field]) and str(row[field]).strip() not in ['', 'nan', 'None']:
+                return str(row[field]).strip()
+                return "Desconocido"
+    
+    out['preparatoria'] = chunk.apply(consolidate_prepa, axis=1)
+    
+    # Normalize preparatoria year
+    if 'prep_year' in chunk.columns:
+        def normalize_year(val):
+            if pd.isna(val):
+                return "Desconocido"
+            s = str(val).strip().lower()
+            if any(x in s for x in ['1', 'primer', 'first', 'uno']):
+                return "1st Year"
+            elif any(x in s for x in ['2', 'segundo', 'second', 'dos']):
+                return "2nd Year"
+            elif any(x in s for x in ['3', 'tercer', 'third', 'tres']):
+                return "3rd Year"
+            else:
+                return "Desconocido"
+        
+        out['prep_year_normalized'] = chunk['prep_year'].apply(normalize_year)
+    else:
+        out['prep_year_normalized'] = "Desconocido"
+    return out
+
+def build_cluster3_cohort(data, funnel_key=None, delta=None, history=None):
+    """Build the Cluster 3 cohort from a raw HubSpot export
+
+    Args:
+        data: Raw contacts dataframe (not modified)
+        funnel_key: Identifier under which the funnel stage counts are recorded
+        delta: Optional incremental.DeltaState; unchanged contacts reuse its stored
+            stage outputs
+        history: Optional HistoryTable of the dataset `data` comes from
+            (export_history_table); split from `data` when not given
+    """
+
+    timer = PipelineTimer('cluster3', funnel_key, rows_in=len(data))
+    df = data.copy()
+    
+    df = df.rename(columns=COLUMN_MAP)
+    
+    # Fallback: Check if close_date wasn't renamed (column didn't exist)
+    # Try to find alternative close date column names
+    if 'close_date' not in df.columns:
+        possible_close_cols = [col for col in df.columns if 'close' in col.lower() and 'date' in col.lower()]
+        if possible_close_cols:
+            df = df.rename(columns={possible_close_cols[0]: 'close_date'})
+    record_funnel_stage(funnel_key, 'total', len(df))
+    timer.lap('copy_rename', len(df))
+    
+    # APREU activity history, gathered from the long-format history table
+    history = cohort_history(history, df, ['apreu_activities'])
+    df['apreu_hist_all'] = history.text('apreu_activities', df.index)
+    df['apreu_activities_list'] = history.lists('apreu_activities', df.index)
+    df['apreu_activity_count'], df['apreu_activity_diversity'] = history.counts('apreu_activities', df.index)
+    
+    # Parse numeric and date columns, days to close
+    # (row-level, partitioned across worker processes for large exports)
+    parsed = run_stage(delta, 'parse_history', df, parse_history_rows, PARSED_COLS)
+    for col in parsed.columns:
+        df[col] = parsed[col]
+    timer.lap('parse_history', len(df))
+    
+    # Filter for APREU contacts (matching Clusters 1 & 2 approach)
+    if 'propiedad_del_contacto' in df.columns:
+        df = df[df['propiedad_del_contacto'].str.upper() == 'APREU'].copy()
+    record_funnel_stage(funnel_key, 'apreu', len(df))
+    
+    # Filter out "Other" and "subscriber" lifecycle stages
+    if 'lifecycle_stage' in df.columns:
+        df = df[~df['lifecycle_stage'].str.lower().isin(['other', 'subscriber'])].copy()
+    record_cleaned_stage(funnel_key, df)
+    timer.lap('filter_apreu_lifecycle', len(df))
+    
+    # Fill NaN values for classification
+    df['apreu_hist_all'] = df['apreu_hist_all'].fillna("")
+    df['first_conversion'] = df['first_conversion'].fillna("")
+    df['recent_conversion'] = df['recent_conversion'].fillna("")
+    
+    # Classify entry channel, consolidate preparatoria and its year
+    channels = run_stage(delta, 'classify', df, classify_rows, [
+        'apreu_hist_all', 'first_conversion', 'recent_conversion',
+        'prep_bpm', 'prep_name', 'prep_donde_estudia', 'prep_year'
+    ])
+    df['entry_channel'] = channels['entry_channel']
+    timer.lap('entry_channel', len(df))
+    
+    # Create segment labels with descriptive names
+    segment_descriptions = {
+        '3A_Digital': '3A - Canal Digital (Sitio Web, Formularios)',
+        '3B_Event': '3B - Canal Eventos (Open Day, Fogatada, TDLA)',
+        '3C_Messaging': '3C - Canal Mensajería (WhatsApp, DM)',
+        '3D_Niche': '3D - Canal Nicho (Programas Especiales)',
+        'Unknown': 'Desconocido'
+    }
+    
+    df['segment_c3'] = df['entry_channel'].map(segment_descriptions)
+    
+    # Action tags
+    action_tags = {
+        '3A_Digital': 'Embudo de admisión acelerado + secuencias de email automatizadas',
+        '3B_Event': 'Seguimiento post-evento dentro de 48h + comunicación de próximos pasos',
+        '3C_Messaging': 'WhatsApp/email personalizado + prioridad de respuesta rápida (<2h)',
+        '3D_Niche': 'Evaluar ROI + soporte especializado + considerar escalamiento',
+        'Unknown': 'Necesita clasificación - analizar manualmente'
+    }
+    
+    df['action_tag'] = df['entry_channel'].map(action_tags)
+    
+    df['preparatoria'] = channels['preparatoria']
+    df['prep_year_normalized'] = channels['prep_year_normalized']
+    
+    # Feature engineering
+    df['log_sessions'] = np.log1p(df.get('num_sessions', 0))
+    df['log_pageviews'] = np.log1p(df.get('num_pageviews', 0))
+    df['log_forms'] = np.log1p(df.get('forms_submitted', 0))
+    df['engagement_score'] = df['log_sessions'] + df['log_pageviews'] + df['log_forms']
+    
+    # Email engagement
+    email_open_rate = np.where(
+        df['email_delivered'] > 0,
+        df['email_opened'] / df['email_delivered'],
+        0
+    )
+    
+    email_click_rate = np.where(
+        df['email_opened'] > 0,
+        df['email_clicked'] / df['email_opened'],
+        0
+    )
+    
+    df['email_engagement_score'] = (email_open_rate * 0.5) + (email_click_rate * 0.5)
+    
+    # Conversion journey duration (matching notebook logic)
+    if 'first_conversion_date' in df.columns and 'recent_conversion_date' in df.columns:
+        df['conversion_journey_days'] = (
+            df['recent_conversion_date'] - df['first_conversion_date']
+        ).dt.days
+        df['conversion_journey_days'] = df['conversion_journey_days'].where(
+            df['conversion_journey_days'] >= 0
+        )
+    
+    # Normalize likelihood
+    if 'likelihood_to_close' in df.columns:
+        max_val = df['likelihood_to_close'].max()
+        if max_val > 1:
+            df['likelihood_pct'] = df['likelihood_to_close']
+        else:
+            df['likelihood_pct'] = df['likelihood_to_close'] * 100
+    else:
+        df['likelihood_pct'] = 0
+    
+    # Calculate is_closed (contacts with a close_date)
+    if 'close_date' in df.columns:
+        df['is_closed'] = df['close_date'].notna().astype(int)
+    else:
+        df['is_closed'] = 0
+    
+    record_funnel_stage(funnel_key, 'cohort', len(df))
+    timer.lap('features', len(df))
+    timer.finish(len(df))
+    
+    return df
@@ -0,0 +1,154 @@
+"""
+Geographic classification
+State normalization and Local/Foráneo/Internacional tiers for a configurable home country and region
+"""
+
+import pandas as pd
+
+# Mexican states and cities
+MX_ALIASES = {"mexico", "mx", "mex", "cdmx", "mexico."}
+QRO_TOKENS = {
+    "queretaro", "queretaro de arteaga", "santiago de queretaro", "qro", "qro.",
+    "queretaro, qro", "queretaro qro"
+}
+
+MEXICAN_STATES = {
+    "aguascalientes", "baja california", "baja california sur", "campeche", "chiapas",
+    "chihuahua", "coahuila", "colima", "durango", "guanajuato", "guerrero", "hidalgo",
+    "jalisco", "michoacan", "morelos", "nayarit", "nuevo leon", "oaxaca", "puebla", 
+    "queretaro", "quintana roo", "san luis potosi", "sinaloa", "sonora", "tabasco", 
+    "tamaulipas", "tlaxcala", "veracruz", "yucatan", "zacatecas",
+    "ags", "bc", "bcs", "camp", "chis", "chih", "coah", "col", "dgo", "gto", "gro", "hgo",
+    "jal", "mich", "mor", "nay", "nl", "oax", "pue", "qro", "q.roo", "slp",
+    "sin", "son", "tab", "tamps", "tlax", "ver", "yuc", "zac",
+    "edo mex", "estado de mexico", "edo. mex.", "edomex", "mexico",
+    "cdmx", "ciudad de mexico", "df", "distrito federal", "cuidad de mexico"
+}
+
+STATE_NORMALIZATION = {
+    "aguascalientes": "Aguascalientes", "ags": "Aguascalientes",
+    "baja california": "Baja California", "bc": "Baja California",
+    "baja california sur": "Baja California Sur", "bcs": "Baja California Sur",
+    "campeche": "Campeche", "camp": "Campeche",
+    "chiapas": "Chiapas", "chis": "Chiapas",
+    "chihuahua": "Chihuahua", "chih": "Chihuahua",
+    "coahuila": "Coahuila", "coah": "Coahuila",
+    "colima": "Colima", "col": "Colima",
+    "durango": "Durango", "dgo": "Durango",
+    "guanajuato": "Guanajuato", "gto": "Guanajuato",
+    "guerrero": "Guerrero", "gro": "Guerrero",
+    "hidalgo": "Hidalgo", "hgo": "Hidalgo",
+    "jalisco": "Jalisco", "jal": "Jalisco",
+    "estado de mexico": "Estado de Mexico", "edo mex": "Estado de Mexico",
+    "edo. mex.": "Estado de Mexico", "edomex": "Estado de Mexico",
+    "ciudad de mexico": "Ciudad de Mexico", "cdmx": "Ciudad de Mexico",
+    "df": "Ciudad de Mexico", "distrito federal": "Ciudad de Mexico",
+    "michoacan": "Michoacan", "mich": "Michoacan",
+    "morelos": "Morelos", "mor": "Morelos",
+    "nayarit": "Nayarit", "nay": "Nayarit",
+    "nuevo leon": "Nuevo Leon", "nl": "Nuevo Leon",
+    "oaxaca": "Oaxaca", "oax": "Oaxaca",
+    "puebla": "Puebla", "pue": "Puebla",
+    "queretaro": "Queretaro", "qro": "Queretaro",
+    "quintana roo": "Quintana Roo", "q.roo": "Quintana Roo",
+    "san luis potosi": "San Luis Potosi", "slp": "San Luis Potosi",
+    "sinaloa": "Sinaloa", "sin": "Sinaloa",
+    "sonora": "Sonora", "son": "Sonora",
+    "tabasco": "Tabasco", "tab": "Tabasco",
+    "tamaulipas": "Tamaulipas", "tamps": "Tamaulipas",
+    "tlaxcala": "Tlaxcala", "tlax": "Tlaxcala",
+    "veracruz": "Veracruz", "ver": "Veracruz",
+    "yucatan": "Yucatan", "yuc": "Yucatan",
+    "zacatecas": "Zacatecas", "zac": "Zacatecas",
+    "mexico": "Estado de Mexico",
+}
+
+# Default configuration (Mexico/Querétaro)
+DEFAULT_CONFIG = {
+    'home_country': 'Mexico',
+    'home_country_aliases': ['mexico', 'mx', 'mex'],
+    'local_city': 'Querétaro',
+    'local_region': 'Querétaro',
+    'local_aliases': ['queretaro', 'qro', 'santiago de queretaro'],
+}
+
+# Examples for different organizations
+EXAMPLE_CONFIGS = {
+    'Mexico (Querétaro)': {
+        'home_country': 'Mexico',
+        'home_aliases': 'mexico, mx, mex',
+        'local_region': 'Querétaro',
+        'local_aliases': 'queretaro, qro, queretaro de arteaga',
+    },
+    'USA (California)': {
+        'home_country': 'United States',
+        'home_aliases': 'usa, us, united states, america',
+        'local_region': 'California',
+        'local_aliases': 'california, ca, san francisco, sf, los angeles, la',
+    },
+    'Brazil (São Paulo)': {
+        'home_country': 'Brazil',
+        'home_aliases': 'brazil, brasil, br',
+        'local_region': 'São Paulo',
+        'local_aliases': 'sao paulo, são paulo, sp, sampa',
+    },
+    'Spain (Madrid)': {
+        'home_country': 'Spain',
+        'home_aliases': 'spain, españa, es',
+        'local_region': 'Madrid',
+        'local_aliases': 'madrid, comunidad de madrid',
+    },
+}
+
+def is_home_country(country_txt, config):
+    """Check if a country value matches the configured home country"""
+    if pd.isna(country_txt) or country_txt == "unknown":
+        return False
+    
+    country_lower = str(country_txt).lower().strip()
+    
+    # Check against home country name and aliases
+    if country_lower == config['home_country'].lower():
+        return True
+    
+    for alias in config['home_country_aliases']:
+        if country_lower == alias.lower() or alias.lower() in country_lower:
+            return True
+    
+    return False
+
+def is_local_region(location_txt, config):
+    """Check if a location value matches the configured local region"""
+    if pd.isna(location_txt) or location_txt == "unknown":
+        return False
+    
+    location_lower = str(location_txt).lower().strip()
+    
+    # Check against local region name and aliases
+    for alias in config['local_aliases']:
+        if alias.lower() in location_lower:
+            return True
+    
+    return False
+
+def classify_geo_tier_dynamic(row, config):
+    """Classify geographic tier using dynamic configuration"""
+    
+    country = row.get('country_any', 'unknown')
+    state = row.get('state_any', 'unknown')
+    city = row.get('city_any', 'unknown')
+    
+    # Check local first (most specific)
+    if is_local_region(city, config) or is_local_region(state, config):
+        return 'local'
+    
+    # Check domestic (home country)
+    if is_home_country(country, config):
+        return 'domestic_non_local'
+    
+    # International (has country data but not home country)
+    if country != 'unknown':
+        return 'international'
+    
+    # Unknown (no location data)
+    return 'unknown'
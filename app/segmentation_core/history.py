@@ -0,0 +1,70 @@
+"""
+HubSpot history parsing
+Helpers for '//'-delimited property histories, millisecond timestamps and text normalization
+"""
+
+import pandas as pd
+import numpy as np
+import unicodedata
+
+def convert_hubspot_timestamp(series):
+    """Convert HubSpot timestamps (milliseconds) to datetime"""
+    def convert_single(val):
+        if pd.isna(val):
+            return pd.NaT
+        try:
+            timestamp_ms = int(float(str(val).strip()))
+            return pd.to_datetime(timestamp_ms, unit='ms')
+        except (ValueError, TypeError):
+            return pd.NaT
+    
+    return series.apply(convert_single)
+
+def hist_latest(val):
+    """Extract the latest value from HubSpot history string (// delimited)"""
+    if pd.isna(val):
+        return np.nan
+    s = str(val).strip()
+    if s == "":  # Handle empty strings
+        return np.nan
+    if "//" in s:
+        parts = [p.strip() for p in s.split("//") if p.strip() != ""]
+        if not parts:
+            return np.nan
+        return parts[-1]
+    return s
+
+def hist_latest_series(series):
+    """Vectorized hist_latest over a whole column (same results, no per-row Python calls)"""
+    s = series.astype('string').str.strip()
+    # Drop trailing empty history entries ("a // b //" -> "a // b")
+    s = s.str.replace(r'(?:\s*//\s*)+$', '', regex=True)
+    latest = s.str.rsplit('//', n=1).str[-1].str.strip()
+    latest = latest.mask(latest == '')
+    return pd.Series(latest.to_numpy(dtype=object, na_value=np.nan), index=series.index, name=series.name)
+
+def hist_all(val):
+    """Parse HubSpot history string and return ALL values as a list"""
+    if pd.isna(val):
+        return []
+    s = str(val).strip()
+    if "//" in s:
+        parts = [p.strip() for p in s.split("//") if p.strip() != ""]
+        return [p for p in parts if p.lower() not in ['nan', 'none', '']]
+    return [s] if s.lower() not in ['nan', 'none', ''] else []
+
+def hist_concat_text(val):
+    """Concatenate all historical text values with space separator"""
+    values = hist_all(val)
+    return " ".join(values)
+
+def normalize_text(s):
+    """Normalize text by removing accents and converting to lowercase"""
+    if pd.isna(s):
+        return "unknown"
+    s = str(s).strip()
+    if s == "":
+        return "unknown"
+    s = unicodedata.normalize("NFKD", s)
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return s.lower()
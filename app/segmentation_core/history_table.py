@@ -0,0 +1,178 @@
+"""
+Long-format history table
+Every '//' history column the pipelines read in full, split once per dataset
+into one Arrow table of (row, contact_id, field, position, value), with the
+field and value columns dictionary-encoded.
+
+Rows are grouped by field, so each field is a contiguous zero-copy slice of
+the table. Consumers gather the entries of the rows they need from that
+slice (full-history text, value lists, counts) instead of re-splitting the
+raw strings; the entries follow hist_all's rules (values stripped, empty,
+'nan' and 'none' dropped).
+"""
+
+import numpy as np
+import pandas as pd
+
+# Entries hist_all drops
+_EMPTY_VALUES = ['', 'nan', 'none']
+
+def run_positions(groups):
+    """Position of each element within its run of equal, consecutive `groups` values"""
+    if not len(groups):
+        return np.empty(0, dtype='int64')
+    firsts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    return np.arange(len(groups)) - np.repeat(firsts, np.diff(np.r_[firsts, len(groups)]))
+
+class HistoryTable:
+    """Split history entries of a frame, looked up by the frame's index labels"""
+
+    def __init__(self, table, index, fields):
+        self.table = table
+        self.index = index
+        # field -> (first entry, number of entries)
+        self.fields = fields
+
+    @classmethod
+    def build(cls, frame, columns, id_col=None):
+        """
+        Split the history columns of `frame`.
+
+        Args:
+            frame: Frame with a unique index (the dataset, or a cohort built from it)
+            columns: {frame column: field name}; missing columns are skipped
+            id_col: Optional column stored as contact_id
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        parts = []
+        fields = {}
+        start = 0
+        for column, name in columns.items():
+            if column not in frame.columns:
+                continue
+            text = pa.array(frame[column].astype('string[pyarrow]').array)
+            split = pc.split_pattern(text, '//')
+            entries = pc.utf8_trim_whitespace(pc.list_flatten(split)).cast(pa.string())
+            rows = pc.list_parent_indices(split)
+            keep = pc.invert(pc.is_in(pc.utf8_lower(entries), pa.array(_EMPTY_VALUES)))
+            entries, rows = entries.filter(keep), rows.filter(keep).to_numpy().astype('int64')
+            parts.append((name, rows, run_positions(rows), entries))
+            fields[name] = (start, len(rows))
+            start += len(rows)
+
+        rows = np.concatenate([p[1] for p in parts] or [np.empty(0, dtype='int64')])
+        if id_col in frame.columns:
+            ids = pd.to_numeric(frame[id_col], errors='coerce').astype('Int64').array
+            contact_ids = pa.array(ids[rows], type=pa.int64())
+        else:
+            contact_ids = pa.nulls(len(rows), type=pa.int64())
+        arrays = {
+            'row': pa.array(rows, type=pa.int64()),
+            'contact_id': contact_ids,
+            'field': pa.DictionaryArray.from_arrays(
+                pa.array(np.repeat(np.arange(len(parts)), [len(p[1]) for p in parts]), type=pa.int32()),
+                pa.array([p[0] for p in parts], type=pa.string())
+            ),
+            'position': pa.array(np.concatenate([p[2] for p in parts] or [np.empty(0)]).astype('int32')),
+            'value': pa.concat_arrays([p[3] for p in parts]).dictionary_encode() if parts
+                     else pa.array([], type=pa.string()).dictionary_encode(),
+        }
+        return cls(pa.table(arrays), frame.index, fields)
+
+    def __contains__(self, field):
+        return field in self.fields
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    def memory_usage(self, deep=True):
+        """Bytes held (the interface dataset_store uses to size entries)"""
+        return self.table.nbytes + self.index.memory_usage(deep=deep)
+
+    def field(self, name):
+        """Zero-copy slice of the entries of one field"""
+        start, length = self.fields.get(name, (0, 0))
+        return self.table.slice(start, length)
+
+    def entries(self, name, index):
+        """(list offsets, dictionary-encoded entry values) of `name` for the rows labelled `index`, in that order"""
+        entries = self.field(name)
+        positions = self.index.get_indexer(index)
+        if (positions < 0).any():
+            raise ValueError("Rows not found in the history table (built from another dataset?)")
+        rows = entries.column('row').to_numpy()
+        starts = np.searchsorted(rows, positions, side='left')
+        lengths = np.searchsorted(rows, positions, side='right') - starts
+        offsets = np.zeros(len(positions) + 1, dtype='int32')
+        np.cumsum(lengths, out=offsets[1:])
+        values = entries.column('value').combine_chunks()
+        total = int(offsets[-1])
+        take = np.arange(total) - np.repeat(offsets[:-1] - starts, lengths)
+        if total and take[-1] - take[0] + 1 == total:
+            # Every entry of a contiguous run of rows: no copy
+            values = values.slice(int(take[0]), total)
+        else:
+            values = values.take(take)
+        return offsets, values
+
+    def lists(self, name, index):
+        """hist_all of each row: a list column (Arrow-backed) aligned with `index`"""
+        import pyarrow as pa
+
+        offsets, values = self.entries(name, index)
+        lists = pa.ListArray.from_arrays(pa.array(offsets), values.dictionary_decode())
+        return pd.Series(pd.arrays.ArrowExtensionArray(lists), index=index)
+
+    def text(self, name, index):
+        """hist_concat_text of each row: the entries joined with spaces"""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        offsets, values = self.entries(name, index)
+        lists = pa.ListArray.from_arrays(pa.array(offsets), values.dictionary_decode())
+        joined = pc.binary_join(lists, ' ')
+        return pd.Series(joined.to_numpy(zero_copy_only=False), index=index, dtype=object)
+
+    def counts(self, name, index):
+        """(entries, distinct entries) of each row as integer arrays"""
+        offsets, values = self.entries(name, index)
+        lengths = np.diff(offsets).astype('int64')
+        codes = values.indices.to_numpy() if len(values) else np.empty(0, dtype='int64')
+        owners = np.repeat(np.arange(len(lengths)), lengths)
+        # Distinct (row, value) pairs per row
+        pairs = np.unique(owners * (len(values.dictionary) + 1) + codes) if len(codes) else np.empty(0, dtype='int64')
+        distinct = np.bincount(pairs // (len(values.dictionary) + 1), minlength=len(lengths)) if len(codes) else np.zeros(len(lengths), dtype='int64')
+        return lengths, distinct
+
+def export_history_table(data):
+    """History table of every '//' history column the pipelines read in full, from a raw export"""
+    from .cluster1 import COLUMN_MAP as CLUSTER1_COLUMNS, TEXT_COLS
+    from .cluster3 import COLUMN_MAP as CLUSTER3_COLUMNS
+
+    fields = TEXT_COLS + ['apreu_activities']
+    columns = {raw: name for raw, name in {**CLUSTER1_COLUMNS, **CLUSTER3_COLUMNS}.items() if name in fields}
+    return HistoryTable.build(data, columns, id_col='Record ID')
+
+def cohort_history(history, df, fields, id_col='contact_id'):
+    """`history` when it covers `df`'s rows and fields, else a table split from `df` itself"""
+    present = [f for f in fields if f in df.columns]
+    if history is not None and all(f in history for f in present) and df.index.isin(history.index).all():
+        return history
+    return HistoryTable.build(df, {f: f for f in present}, id_col=id_col)
+
+def list_value_counts(lists):
+    """Occurrences of each value in a list column, most frequent first (ties in order of first appearance, like Counter.most_common)"""
+    flat = lists.explode().dropna()
+    if flat.empty:
+        return pd.Series(dtype='int64')
+    counts = pd.Series(flat.to_numpy(dtype=object)).value_counts(sort=False)
+    return counts.sort_values(ascending=False, kind='stable')
+
+def lists_contain(lists, value):
+    """Boolean Series: whether each row's list contains `value`"""
+    flat = lists.explode()
+    hits = flat.index[(flat == value).fillna(False).to_numpy(dtype=bool)]
+    return pd.Series(lists.index.isin(hits), index=lists.index)
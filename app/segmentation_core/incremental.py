@@ -0,0 +1,116 @@
+"""
+Incremental (delta) processing
+Every HubSpot export is a full dump, but between two exports most contacts
+do not change. A DeltaState carries the outputs of each row-level stage from
+the previous run, keyed by Record ID and a hash of the row's stage inputs:
+rows whose inputs are unchanged reuse the stored outputs, and only new or
+changed contacts go through the stage again.
+
+Fitted models (Cluster 1 KMeans, Cluster 2 engagement thresholds) are kept
+in the same state, so new contacts are scored with the stored model instead
+of refitting on the new export. A DeltaState without a snapshot runs every
+stage in full and fits the models, exactly like a normal run.
+
+Snapshots are plain dicts of DataFrames, so callers can persist them
+(see cohort_cache in the app).
+"""
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from .partition import run_partitioned
+
+ID_COL = 'contact_id'
+# Bookkeeping columns of stored stage outputs
+ROW_ID = '__delta_id__'
+ROW_HASH = '__delta_hash__'
+MODEL_PREFIX = 'model:'
+
+def row_hashes(df, salt=''):
+    """64-bit hash of each row's values, combined with `salt` (stage columns and arguments)"""
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    salt_value = np.uint64(int(hashlib.md5(salt.encode()).hexdigest()[:16], 16))
+    return hashes ^ salt_value
+
+def signature(value):
+    """Short stable hash of a configuration value, for model names"""
+    return hashlib.md5(repr(value).encode()).hexdigest()[:10]
+
+class DeltaState:
+    """Stage outputs and models from a previous run, and those of the current run"""
+
+    def __init__(self, snapshot=None):
+        self.previous = dict(snapshot or {})
+        self.current = {}
+        self.stats = {}
+
+    def run(self, name, df, stage, columns=None, args=()):
+        """
+        run_partitioned(df, stage, columns, args), recomputing only new or changed rows.
+
+        Rows are matched to the previous run by df[ID_COL]; without a unique
+        Record ID every row is computed.
+        """
+        inputs = df[[c for c in columns if c in df.columns]] if columns is not None else df
+        ids = df[ID_COL] if ID_COL in df.columns else None
+        if ids is None or not ids.is_unique:
+            self.stats[name] = {'rows': len(df), 'reused': 0}
+            return run_partitioned(inputs, stage, args=args)
+
+        hashes = row_hashes(inputs, repr((list(inputs.columns), args)))
+        previous = self.previous.get(name)
+        reuse = np.zeros(len(df), dtype=bool)
+        positions = np.full(len(df), -1)
+        if previous is not None and len(previous):
+            positions = pd.Index(previous[ROW_ID]).get_indexer(ids)
+            found = positions >= 0
+            reuse[found] = previous[ROW_HASH].to_numpy()[positions[found]] == hashes[found]
+
+        parts = []
+        if reuse.any():
+            reused = previous.iloc[positions[reuse]].drop(columns=[ROW_ID, ROW_HASH])
+            parts.append(reused)
+        if not reuse.all():
+            parts.append(run_partitioned(inputs[~reuse], stage, args=args))
+
+        # Reused rows first, then computed ones: put them back in input order
+        order = np.concatenate([np.flatnonzero(reuse), np.flatnonzero(~reuse)])
+        result = pd.concat(parts) if len(parts) > 1 else parts[0]
+        result = result.iloc[np.argsort(order, kind='stable')]
+        result.index = df.index
+
+        stored = result.reset_index(drop=True)
+        stored[ROW_ID] = ids.to_numpy()
+        stored[ROW_HASH] = hashes
+        if previous is not None:
+            # Contacts filtered out of this run stay available for the next one
+            unseen = previous[~previous[ROW_ID].isin(ids)]
+            if len(unseen):
+                stored = pd.concat([stored, unseen], ignore_index=True)
+        self.current[name] = stored
+        self.stats[name] = {'rows': len(df), 'reused': int(reuse.sum())}
+        return result
+
+    def stored_model(self, name):
+        """Model frame saved by a previous run (None when it has to be fitted)"""
+        model = self.previous.get(MODEL_PREFIX + name)
+        if model is not None:
+            self.current[MODEL_PREFIX + name] = model
+            self.stats[MODEL_PREFIX + name] = 'reused'
+        return model
+
+    def save_model(self, name, model):
+        self.current[MODEL_PREFIX + name] = model
+        self.stats[MODEL_PREFIX + name] = 'fitted'
+
+    def snapshot(self):
+        """Dict of frames to pass as `snapshot` to the next run"""
+        return dict(self.current)
+
+def run_stage(delta, name, df, stage, columns=None, args=()):
+    """run_partitioned, or DeltaState.run when an incremental state is given"""
+    if delta is None:
+        return run_partitioned(df, stage, columns, args=args)
+    return delta.run(name, df, stage, columns, args)
@@ -0,0 +1,197 @@
+"""
+Confidence intervals for group rates and means
+Wilson score intervals and percentile bootstrap intervals for every group of
+a cohort at once (segments, platforms, countries, preparatorias).
+
+The bootstrap sorts the rows by group once and resamples all groups
+together: each batch of resamples draws, for every row, a position inside
+its own group's index range, and per-group sums come from one reduceat over
+the resampled values. Resampling a 0/1 outcome (a close rate) with
+replacement is the same as drawing the number of successes from a binomial
+with the group's size and observed rate, so rates skip the row draws and
+cost one binomial draw per distinct (size, closed) pair and resample.
+Batches have fixed seeds, so results are the same with or without worker
+threads.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+# wilson (closed form, default) or bootstrap
+CI_METHOD = os.getenv("CI_METHOD", "wilson")
+CI_CONFIDENCE = float(os.getenv("CI_CONFIDENCE", "0.95"))
+CI_RESAMPLES = int(os.getenv("CI_RESAMPLES", "1000"))
+# Threads sharing the bootstrap batches (NumPy releases the GIL while drawing)
+CI_WORKERS = int(os.getenv("CI_WORKERS", "1"))
+# Resampled values per batch (bounds the memory of one batch to ~8 bytes each)
+BATCH_ELEMENTS = 4_000_000
+
+def interval_settings():
+    """Settings that change interval results (part of the cache key of tables that show them)"""
+    return (CI_METHOD, CI_CONFIDENCE, CI_RESAMPLES if CI_METHOD == 'bootstrap' else None)
+
+def wilson_interval(successes, totals, confidence=None):
+    """
+    Wilson score interval of successes / totals, elementwise.
+
+    Returns:
+        (low, high) arrays of proportions; NaN where totals is 0
+    """
+    confidence = CI_CONFIDENCE if confidence is None else confidence
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    successes = np.asarray(successes, dtype='float64')
+    totals = np.asarray(totals, dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = successes / totals
+        denominator = 1 + z ** 2 / totals
+        center = (p + z ** 2 / (2 * totals)) / denominator
+        half = z * np.sqrt(p * (1 - p) / totals + z ** 2 / (4 * totals ** 2)) / denominator
+    low, high = np.clip(center - half, 0, 1), np.clip(center + half, 0, 1)
+    empty = totals <= 0
+    return np.where(empty, np.nan, low), np.where(empty, np.nan, high)
+
+def _batches(resamples, size, seed):
+    """(resamples in batch, seed sequence) of each fixed-size batch"""
+    per_batch = max(1, min(resamples, BATCH_ELEMENTS // max(size, 1)))
+    counts = [per_batch] * (resamples // per_batch)
+    if resamples % per_batch:
+        counts.append(resamples % per_batch)
+    return list(zip(counts, np.random.SeedSequence(seed).spawn(len(counts))))
+
+def _run_batches(draw, batches, workers):
+    if workers > 1 and len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return np.concatenate(list(pool.map(lambda batch: draw(*batch), batches)))
+    return np.concatenate([draw(*batch) for batch in batches])
+
+def bootstrap_means(values, codes, groups, resamples=None, seed=0, workers=None):
+    """
+    Bootstrap distribution of the mean of `values` within each group.
+
+    Args:
+        values: Float array (no missing values)
+        codes: Group code of each value, 0..groups-1
+        groups: Number of groups
+        resamples: Bootstrap resamples (default CI_RESAMPLES)
+        seed: Seed of the resampling
+        workers: Threads for the batches (default CI_WORKERS)
+
+    Returns:
+        (resamples x groups) array of resampled means; NaN for empty groups
+    """
+    resamples = CI_RESAMPLES if resamples is None else resamples
+    workers = CI_WORKERS if workers is None else workers
+    values = np.asarray(values, dtype='float64')
+    codes = np.asarray(codes, dtype='int64')
+    sizes = np.bincount(codes, minlength=groups)
+    present = np.flatnonzero(sizes)
+
+    columns = None
+    if np.isin(values, (0.0, 1.0)).all():
+        # 0/1 outcome: the resampled success count is binomial, and its
+        # distribution depends only on (size, successes), which many small
+        # groups share; each distinct pair is drawn once
+        successes = np.bincount(codes, weights=values, minlength=groups)[present].astype('int64')
+        pairs, columns = np.unique(np.stack([sizes[present], successes], axis=1), axis=0, return_inverse=True)
+        columns = columns.reshape(-1)
+
+        def draw(count, sequence):
+            rng = np.random.default_rng(sequence)
+            return rng.binomial(pairs[:, 0], pairs[:, 1] / pairs[:, 0], size=(count, len(pairs))) / pairs[:, 0]
+
+        size = len(pairs)
+    else:
+        order = np.argsort(codes, kind='stable')
+        values = values[order]
+        starts = np.r_[0, np.cumsum(sizes)[:-1]][present]
+        # Index range of each row's group
+        row_start = np.repeat(starts, sizes[present])
+        row_size = np.repeat(sizes[present], sizes[present])
+
+        def draw(count, sequence):
+            rng = np.random.default_rng(sequence)
+            positions = row_start + (rng.random((count, len(values))) * row_size).astype('int64')
+            return np.add.reduceat(values[positions], starts, axis=1) / sizes[present]
+
+        size = len(values)
+
+    means = np.full((resamples, groups), np.nan)
+    if len(present) and resamples:
+        drawn = _run_batches(draw, _batches(resamples, size, seed), workers)
+        means[:, present] = drawn if columns is None else drawn[:, columns]
+    return means
+
+def group_intervals(values, groups, method=None, confidence=None, resamples=None, seed=0, workers=None):
+    """
+    Mean of `values` and its confidence interval for every group at once.
+
+    Args:
+        values: Per-row values (a 0/1 outcome gives rates); missing values are skipped
+        groups: Per-row group labels (array or Series aligned with `values`);
+            rows without a group are skipped
+        method: 'wilson' (0/1 outcomes only) or 'bootstrap' (default CI_METHOD;
+            non-binary values always use the bootstrap)
+        confidence: Interval coverage (default CI_CONFIDENCE)
+        resamples, seed, workers: Bootstrap settings (see bootstrap_means)
+
+    Returns:
+        DataFrame indexed by group (in sorted order) with n, sum, mean, low, high
+    """
+    method = CI_METHOD if method is None else method
+    confidence = CI_CONFIDENCE if confidence is None else confidence
+    values = pd.to_numeric(pd.Series(np.asarray(values)), errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    codes, labels = pd.factorize(pd.Series(np.asarray(groups, dtype=object)), sort=True)
+    keep = (codes >= 0) & ~np.isnan(values)
+    values, codes = values[keep], codes[keep]
+
+    n = np.bincount(codes, minlength=len(labels))
+    sums = np.bincount(codes, weights=values, minlength=len(labels))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = sums / n
+    if method == 'wilson' and np.isin(values, (0.0, 1.0)).all():
+        low, high = wilson_interval(sums, n, confidence)
+    else:
+        resampled = bootstrap_means(values, codes, len(labels), resamples, seed, workers)
+        alpha = (1 - confidence) / 2
+        low, high = np.full(len(labels), np.nan), np.full(len(labels), np.nan)
+        present = np.flatnonzero(n)
+        if len(present):
+            low[present], high[present] = np.quantile(resampled[:, present], [alpha, 1 - alpha], axis=0)
+    return pd.DataFrame({'n': n, 'sum': sums, 'mean': means, 'low': low, 'high': high}, index=pd.Index(labels))
+
+def close_rate_intervals(cohort, group_col, **kwargs):
+    """
+    Close rate and its confidence interval per group, in percent.
+
+    `group_col` is a column of `cohort` or a Series aligned with it. Closed
+    contacts are `is_closed`, or those with a close date (as in
+    calculate_close_rate). Returns count, closed, close_rate_pct,
+    ci_low_pct and ci_high_pct per group.
+    """
+    if 'is_closed' in cohort.columns:
+        closed = cohort['is_closed'].astype('float64')
+    else:
+        closed = cohort['close_date'].notna().astype('float64')
+    groups = cohort[group_col] if isinstance(group_col, str) else group_col
+    table = group_intervals(closed.to_numpy(), groups.to_numpy(), **kwargs)
+    return pd.DataFrame({
+        'count': table['n'],
+        'closed': table['sum'].round().astype('int64'),
+        'close_rate_pct': table['mean'] * 100,
+        'ci_low_pct': table['low'] * 100,
+        'ci_high_pct': table['high'] * 100,
+    })
+
+def add_close_rate_intervals(table, cohort, group_col, columns):
+    """
+    Add the close-rate confidence interval of each group of `table` (indexed
+    by the groups of `group_col`) as two percent columns named `columns`.
+    """
+    intervals = close_rate_intervals(cohort, group_col).reindex(table.index)
+    table[columns[0]] = intervals['ci_low_pct'].round(1).to_numpy()
+    table[columns[1]] = intervals['ci_high_pct'].round(1).to_numpy()
+    return table
@@ -0,0 +1,90 @@
+"""
+Closure metrics
+Close rate, time-to-close buckets, academic period labels and per-group KPIs
+"""
+
+import pandas as pd
+import numpy as np
+
+from .intervals import add_close_rate_intervals
+
+def calculate_close_rate(df):
+    """Calculate close rate from dataframe using mean() for consistency with notebooks"""
+    # Prefer is_closed field (binary 0/1) for consistency with notebook calculations
+    if 'is_closed' in df.columns:
+        return df['is_closed'].mean() * 100 if len(df) > 0 else 0
+    # Fall back to close_date if is_closed not available
+    close_col = 'close_date' if 'close_date' in df.columns else 'Close Date'
+    if close_col in df.columns:
+        closed = df[close_col].notna().sum()
+        total = len(df)
+        return (closed / total * 100) if total > 0 else 0
+    return 0
+
+def calculate_days_to_close(create_date, close_date):
+    """Calculate days to close, filtering out negative values"""
+    if pd.isna(create_date) or pd.isna(close_date):
+        return np.nan
+    
+    days = (close_date - create_date).days
+    return days if days >= 0 else np.nan
+
+def categorize_ttc(days):
+    """Categorize time-to-close into buckets"""
+    if pd.isna(days):
+        return "Still Open"
+    elif days <= 30:
+        return "Early (≤30 days)"
+    elif days <= 60:
+        return "Medium (31-60 days)"
+    elif days <= 120:
+        return "Late (61-120 days)"
+    else:
+        return "Very Late (>120 days)"
+
+def convert_academic_period(period_code):
+    """Convert YYYYMM academic period codes to readable format"""
+    if pd.isna(period_code) or period_code == "":
+        return "Unknown"
+    
+    try:
+        period_str = str(period_code).strip()
+        if len(period_str) != 6:
+            return f"Invalid: {period_code}"
+        
+        year = int(period_str[:4])
+        period = int(period_str[4:])
+        
+        period_map = {
+            5: "Special",
+            10: "Spring", 
+            35: "Summer",
+            60: "Fall",
+            75: "Winter/Special"
+        }
+        
+        semester = period_map.get(period, f"Unknown({period})")
+        return f"{year} {semester}"
+        
+    except (ValueError, IndexError):
+        return f"Invalid: {period_code}"
+
+def group_kpis(cohort, group_col, stats_cols, stats=('mean', 'median', 'std')):
+    """
+    Compute per-group KPIs with named aggregations (no Python lambdas).
+
+    Returns one row per group with `contact_id_count`, `<col>_<stat>` for each
+    stats column, `closed_count`, `close_rate_pct` and its confidence interval
+    (`close_rate_ci_low_pct`, `close_rate_ci_high_pct`).
+    """
+    named_aggs = {'contact_id_count': ('contact_id', 'count')}
+    for col in stats_cols:
+        if col in cohort.columns:
+            for stat in stats:
+                named_aggs[f'{col}_{stat}'] = (col, stat)
+    # 'count' skips missing values, so it counts contacts with a close date
+    named_aggs['closed_count'] = ('close_date', 'count')
+
+    kpis = cohort.groupby(group_col, observed=True).agg(**named_aggs).round(2)
+    kpis['close_rate_pct'] = (kpis['closed_count'] / kpis['contact_id_count'] * 100).round(1)
+    return add_close_rate_intervals(kpis, cohort, group_col, ['close_rate_ci_low_pct', 'close_rate_ci_high_pct'])
@@ -0,0 +1,124 @@
+"""
+Number of clusters (k) selection
+Fits MiniBatchKMeans for every candidate k in parallel and scores each
+partition, so the Cluster 1 engagement clustering can pick k from the data
+instead of the fixed KMeans(n_clusters=2).
+
+The silhouette is O(n²), so it is computed on a sample stratified by the
+candidate's own clusters (every cluster in proportion, small ones kept);
+Davies-Bouldin is linear and uses every row.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .history_table import run_positions
+
+# Rows scored by the silhouette of each candidate
+K_SWEEP_SAMPLE = int(os.getenv("K_SWEEP_SAMPLE", "5000"))
+# Candidates fitted at once (sklearn releases the GIL while fitting)
+K_SWEEP_WORKERS = int(os.getenv("K_SWEEP_WORKERS", str(min(4, os.cpu_count() or 1))))
+MINIBATCH_SIZE = 4096
+# Rows of each cluster kept in the silhouette sample (all of a smaller cluster)
+MIN_SAMPLE_PER_CLUSTER = 50
+
+def parse_k_values(text):
+    """Candidate k values from '3-6' or '2,3,5' (empty tuple for an empty string)"""
+    values = set()
+    for part in str(text or '').replace(' ', '').split(','):
+        if not part:
+            continue
+        low, _, high = part.partition('-')
+        values.update(range(int(low), int(high or low) + 1))
+    return tuple(sorted(k for k in values if k >= 2))
+
+def stratified_sample(labels, size, seed=0):
+    """Sorted positions of about `size` rows, each label in proportion (at least MIN_SAMPLE_PER_CLUSTER rows)"""
+    labels = np.asarray(labels)
+    if len(labels) <= size:
+        return np.arange(len(labels))
+    rng = np.random.default_rng(seed)
+    _, codes, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    codes = codes.reshape(-1)
+    quota = np.minimum(counts, np.maximum(np.round(counts * size / len(labels)).astype('int64'), MIN_SAMPLE_PER_CLUSTER))
+    # Random order within each label, keep the first `quota` rows of each
+    order = np.lexsort((rng.random(len(labels)), codes))
+    keep = order[run_positions(codes[order]) < quota[codes[order]]]
+    return np.sort(keep)
+
+def _fit_candidate(X, k, sample_size, seed):
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.metrics import davies_bouldin_score, silhouette_score
+
+    start = time.perf_counter()
+    model = MiniBatchKMeans(n_clusters=k, random_state=seed, n_init=3, batch_size=MINIBATCH_SIZE)
+    labels = model.fit_predict(X)
+    fit_seconds = time.perf_counter() - start
+
+    present = np.unique(labels)
+    silhouette = davies_bouldin = np.nan
+    if 1 < len(present) < len(X):
+        sample = stratified_sample(labels, sample_size, seed)
+        if len(np.unique(labels[sample])) > 1:
+            silhouette = silhouette_score(X[sample], labels[sample])
+        davies_bouldin = davies_bouldin_score(X, labels)
+    row = {
+        'k': k,
+        'inertia': model.inertia_,
+        'silhouette': silhouette,
+        'davies_bouldin': davies_bouldin,
+        'smallest_cluster_pct': np.bincount(labels, minlength=k).min() / len(labels) * 100,
+        'fit_seconds': fit_seconds,
+        'score_seconds': time.perf_counter() - start - fit_seconds,
+    }
+    return model, labels, row
+
+def choose_k(diagnostics):
+    """
+    k with the best combined rank: silhouette (higher is better) plus
+    Davies-Bouldin (lower is better); ties go to the higher silhouette,
+    then the smaller k.
+    """
+    scored = diagnostics.dropna(subset=['silhouette', 'davies_bouldin'])
+    if scored.empty:
+        return int(diagnostics['k'].min())
+    rank = scored['silhouette'].rank(ascending=False) + scored['davies_bouldin'].rank(ascending=True)
+    ordered = scored.assign(rank=rank).sort_values(['rank', 'silhouette', 'k'], ascending=[True, False, True])
+    return int(ordered['k'].iloc[0])
+
+def sweep_k(X, k_values, sample_size=None, seed=42, workers=None):
+    """
+    Fit and score MiniBatchKMeans for every k in `k_values`.
+
+    Args:
+        X: Scaled feature matrix (rows x features)
+        k_values: Candidate numbers of clusters
+        sample_size: Rows scored by the silhouette (default K_SWEEP_SAMPLE)
+        seed: Seed of the fits and the sample
+        workers: Candidates fitted at once (default K_SWEEP_WORKERS)
+
+    Returns:
+        (diagnostics, model, labels): one diagnostics row per k (k, inertia,
+        silhouette, davies_bouldin, smallest_cluster_pct, fit_seconds,
+        score_seconds, chosen) and the chosen k's fitted model and labels
+    """
+    sample_size = K_SWEEP_SAMPLE if sample_size is None else sample_size
+    workers = K_SWEEP_WORKERS if workers is None else workers
+    X = np.asarray(X, dtype='float64')
+    k_values = [k for k in sorted(set(k_values)) if 2 <= k < len(X)] or [min(2, len(X))]
+
+    if workers > 1 and len(k_values) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            fits = list(pool.map(lambda k: _fit_candidate(X, k, sample_size, seed), k_values))
+    else:
+        fits = [_fit_candidate(X, k, sample_size, seed) for k in k_values]
+
+    diagnostics = pd.DataFrame([row for _, _, row in fits])
+    best = choose_k(diagnostics)
+    diagnostics['chosen'] = diagnostics['k'] == best
+    model, labels, _ = fits[k_values.index(best)]
+    return diagnostics, model, labels
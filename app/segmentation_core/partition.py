@@ -0,0 +1,208 @@
+"""
+Partitioned execution
+Runs row-level pipeline stages (history parsing, keyword matching, text
+normalization) over row chunks on a process pool. Chunks travel to and from
+the workers as Arrow IPC streams in shared memory, and results are
+concatenated back in chunk order, so the output does not depend on timing.
+"""
+
+import atexit
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+# Frames smaller than this run in-process (pool overhead outweighs the gain)
+PARTITION_MIN_ROWS = int(os.getenv("PARTITION_MIN_ROWS", "50000"))
+# Worker processes; 0 = one per CPU, 1 = disable partitioning
+PARTITION_WORKERS = int(os.getenv("PARTITION_WORKERS", "0"))
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+def _write_shared(df):
+    """Serialize a frame as an Arrow IPC stream into a new shared memory block"""
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    buf = sink.getvalue()
+
+    shm = shared_memory.SharedMemory(create=True, size=max(buf.size, 1))
+    try:
+        shm.buf[:buf.size] = memoryview(buf).cast('B')
+    except Exception:
+        shm.close()
+        shm.unlink()
+        raise
+    name = shm.name
+    shm.close()
+    return name, buf.size
+
+def _unlink_shared(name):
+    """Free a shared memory block (no-op if it is already gone)"""
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+        shm.close()
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+def _read_shared(name, size, unlink=False):
+    """Read a frame back from a shared memory Arrow IPC stream"""
+    import pyarrow as pa
+
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # Copy out of the block so no pandas/Arrow buffer keeps it mapped
+        data = bytes(shm.buf[:size])
+    finally:
+        shm.close()
+        if unlink:
+            shm.unlink()
+
+    table = pa.ipc.open_stream(pa.py_buffer(data)).read_all()
+    list_cols = [field.name for field in table.schema if pa.types.is_list(field.type)]
+    df = table.to_pandas()
+    # Arrow hands lists back as numpy arrays; stages produce Python lists
+    for col in list_cols:
+        if col in df.columns:
+            df[col] = [v.tolist() if isinstance(v, np.ndarray) else v for v in df[col]]
+    return df
+
+def _frame_dtypes(df):
+    """Dtypes plus the null marker (None or NaN) used by each object column"""
+    dtypes = {}
+    for col in df.columns:
+        values = df[col]
+        null_value = None
+        if values.dtype == object:
+            nulls = values[values.isna()]
+            null_value = None if any(v is None for v in nulls) else np.nan
+        dtypes[col] = (values.dtype, null_value)
+    return dtypes
+
+def _restore_dtypes(df, dtypes):
+    """Undo the dtype changes of an Arrow round trip (string[pyarrow] -> string, NaN -> None, ...)"""
+    for col, (dtype, null_value) in dtypes.items():
+        if dtype == object:
+            values = df[col]
+            df[col] = values.where(values.notna(), null_value).astype(object)
+        elif df[col].dtype != dtype:
+            df[col] = df[col].astype(dtype)
+    return df
+
+def _run_chunk(stage, args, name, size, dtypes):
+    """Worker entry point: read a chunk, run the stage, write the result back"""
+    chunk = _restore_dtypes(_read_shared(name, size), dtypes)
+    result = stage(chunk, *args)
+    return _write_shared(result) + (_frame_dtypes(result),)
+
+def _init_worker(paths):
+    """Make the parent's import paths (app/, scripts) available to spawned workers"""
+    for path in paths:
+        if path not in sys.path:
+            sys.path.append(path)
+
+def _get_pool(workers):
+    """Return the shared process pool, (re)creating it for a new worker count"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn: forking a process with Streamlit's threads running is unsafe
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(list(sys.path),)
+            )
+            _pool_workers = workers
+        return _pool
+
+def shutdown_pool():
+    """Stop the worker processes (they are restarted on the next partitioned run)"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+        _pool = None
+        _pool_workers = 0
+
+atexit.register(shutdown_pool)
+
+def partition_workers(n_rows, workers=None, min_rows=None):
+    """Number of worker processes to use for a frame of `n_rows` (1 = run in-process)"""
+    workers = PARTITION_WORKERS if workers is None else workers
+    min_rows = PARTITION_MIN_ROWS if min_rows is None else min_rows
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    if n_rows < max(min_rows, 2):
+        return 1
+    return max(1, min(workers, n_rows))
+
+def run_partitioned(df, stage, columns=None, args=(), workers=None, min_rows=None):
+    """
+    Run a row-level stage over `df`, split across worker processes when it is large.
+
+    Args:
+        df: Input dataframe
+        stage: Module-level function `stage(chunk, *args)` returning a frame of
+            output columns with the same index as `chunk` (one row per input row)
+        columns: Input columns the stage needs (only these are shipped to workers);
+            missing columns are skipped, None sends every column
+        args: Extra picklable arguments for the stage
+        workers: Worker processes (default PARTITION_WORKERS)
+        min_rows: Minimum rows before partitioning (default PARTITION_MIN_ROWS)
+
+    Returns:
+        Frame of stage outputs aligned with `df`, identical to `stage(df, *args)`
+    """
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+
+    n_workers = partition_workers(len(df), workers, min_rows)
+    if n_workers <= 1:
+        return stage(df, *args)
+
+    pool = _get_pool(n_workers)
+    bounds = np.linspace(0, len(df), n_workers + 1).astype(int)
+    inputs = []
+    futures = []
+    collected = 0
+    try:
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            chunk = df.iloc[start:end]
+            name, size = _write_shared(chunk)
+            inputs.append(name)
+            futures.append(pool.submit(_run_chunk, stage, args, name, size, _frame_dtypes(chunk)))
+
+        # Collect in submission order so the concatenation is deterministic
+        parts = []
+        for future in futures:
+            name, size, dtypes = future.result()
+            collected += 1
+            parts.append(_restore_dtypes(_read_shared(name, size, unlink=True), dtypes))
+    finally:
+        # After a failure, wait for the chunks not yet collected and free the
+        # output blocks of those that succeeded (shared memory is RAM)
+        for future in futures[collected:]:
+            try:
+                _unlink_shared(future.result()[0])
+            except Exception:
+                pass
+        for name in inputs:
+            _unlink_shared(name)
+
+    result = pd.concat(parts)
+    result.index = df.index
+    return result
@@ -0,0 +1,167 @@
+"""
+Path mining over history fields
+Cohort-level journeys read from the long-format history table: the ordered
+steps of every contact, transitions between consecutive steps, and n-step
+paths with the contacts and conversions behind them.
+
+Everything is computed on the table's entry arrays (codes of the
+dictionary-encoded values), with no per-contact Python loops.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .history_table import run_positions
+
+STEP_SEPARATOR = " → "
+
+def journey_steps(history, field, index, collapse_repeats=True, max_steps=None):
+    """
+    Ordered steps of the contacts labelled `index`, one row per step.
+
+    Args:
+        history: HistoryTable covering `index`
+        field: History field (e.g. 'original_source', 'apreu_activities')
+        index: Cohort index labels
+        collapse_repeats: Merge consecutive repeats of a value (HubSpot records
+            a property again when it is re-set to the same value)
+        max_steps: Keep only each contact's first `max_steps` steps
+
+    Returns:
+        DataFrame with contact (position in `index`), step (from 0) and
+        value (categorical)
+    """
+    offsets, values = history.entries(field, index)
+    contact = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    codes = values.indices.to_numpy(zero_copy_only=False).astype('int64') if len(values) else np.empty(0, dtype='int64')
+    if collapse_repeats and len(codes):
+        keep = np.r_[True, (codes[1:] != codes[:-1]) | (contact[1:] != contact[:-1])]
+        contact, codes = contact[keep], codes[keep]
+    step = run_positions(contact)
+    if max_steps is not None:
+        keep = step < max_steps
+        contact, codes, step = contact[keep], codes[keep], step[keep]
+    categories = values.dictionary.to_pylist() if len(values) else []
+    return pd.DataFrame({
+        'contact': contact,
+        'step': step,
+        'value': pd.Categorical.from_codes(codes, categories=categories),
+    })
+
+def _unique_rows(columns):
+    """
+    np.unique over the rows of integer `columns` (unique rows, inverse, counts).
+
+    Rows are packed into one int64 key (mixed radix) when they fit, which is
+    much faster than np.unique(axis=0).
+    """
+    matrix = np.stack(columns, axis=1)
+    radixes = [int(c.max()) + 1 if len(c) else 1 for c in columns]
+    if not len(matrix) or np.prod([float(r) for r in radixes]) >= 2 ** 62:
+        unique, inverse, counts = np.unique(matrix, axis=0, return_inverse=True, return_counts=True)
+        return unique, inverse.reshape(-1), counts
+    keys = np.zeros(len(matrix), dtype='int64')
+    for column, radix in zip(columns, radixes):
+        keys = keys * radix + column
+    unique_keys, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    unique = np.empty((len(unique_keys), len(columns)), dtype='int64')
+    for i, radix in reversed(list(enumerate(radixes))):
+        unique_keys, unique[:, i] = np.divmod(unique_keys, radix)
+    return unique, inverse, counts
+
+def _outcomes(keys, contact, size, outcome):
+    """Distinct contacts and, with `outcome`, converted contacts behind each of `size` keys"""
+    pairs = np.unique(keys * (int(contact.max()) + 1) + contact) if len(contact) else np.empty(0, dtype='int64')
+    key_of_pair, contact_of_pair = np.divmod(pairs, int(contact.max()) + 1) if len(contact) else (pairs, pairs)
+    contacts = np.bincount(key_of_pair, minlength=size)
+    if outcome is None:
+        return contacts, None
+    closed = np.bincount(key_of_pair, weights=np.asarray(outcome, dtype='float64')[contact_of_pair], minlength=size)
+    return contacts, closed.astype('int64')
+
+def _summary(columns, occurrences, contacts, closed, sort):
+    out = pd.DataFrame(columns)
+    out['occurrences'] = occurrences
+    out['contacts'] = contacts
+    if closed is not None:
+        out['closed'] = closed
+        out['close_rate'] = np.where(contacts > 0, closed / np.maximum(contacts, 1) * 100, 0.0)
+    return out.sort_values([sort], ascending=False, kind='stable').reset_index(drop=True)
+
+def transition_counts(steps, outcome=None, by_step=False):
+    """
+    Transitions between consecutive steps of the same contact.
+
+    Args:
+        steps: journey_steps frame
+        outcome: Optional boolean array aligned with the cohort (e.g. closed)
+        by_step: Also key transitions by the step they leave from (for a
+            step-layered Sankey, which has no cycles)
+
+    Returns:
+        DataFrame with [step,] source, target, occurrences, contacts and,
+        with `outcome`, closed and close_rate, most frequent first
+    """
+    contact = steps['contact'].to_numpy()
+    codes = steps['value'].cat.codes.to_numpy().astype('int64')
+    categories = steps['value'].cat.categories
+    same = contact[1:] == contact[:-1]
+    source, target, owner = codes[:-1][same], codes[1:][same], contact[:-1][same]
+    key_columns = [source, target]
+    if by_step:
+        key_columns.insert(0, steps['step'].to_numpy()[:-1][same])
+    unique, inverse, occurrences = _unique_rows(key_columns)
+    contacts, closed = _outcomes(inverse, owner, len(unique), outcome)
+    columns = {}
+    if by_step:
+        columns['step'] = unique[:, 0]
+    columns['source'] = pd.Categorical.from_codes(unique[:, -2], categories=categories)
+    columns['target'] = pd.Categorical.from_codes(unique[:, -1], categories=categories)
+    return _summary(columns, occurrences, contacts, closed, 'occurrences')
+
+def path_counts(steps, length, outcome=None, groups=None):
+    """
+    Paths of `length` consecutive steps (n-grams, at any point of the journey).
+
+    Args:
+        steps: journey_steps frame
+        length: Steps per path (2 is a transition)
+        outcome: Optional boolean array aligned with the cohort (e.g. closed)
+        groups: Optional labels aligned with the cohort (e.g. segment); paths
+            are then counted within each group
+
+    Returns:
+        DataFrame with [group,] path (steps joined with STEP_SEPARATOR),
+        occurrences, contacts and, with `outcome`, closed and close_rate,
+        by contacts (most first)
+    """
+    contact = steps['contact'].to_numpy()
+    codes = steps['value'].cat.codes.to_numpy().astype('int64')
+    categories = np.asarray(steps['value'].cat.categories, dtype=object)
+    starts = len(codes) - length + 1
+    if starts > 0:
+        # A path starts at every step followed by length - 1 steps of the same contact
+        valid = contact[length - 1:] == contact[:starts]
+        grams = [codes[j:starts + j][valid] for j in range(length)]
+        owner = contact[:starts][valid]
+    else:
+        grams, owner = [np.empty(0, dtype='int64')] * length, np.empty(0, dtype='int64')
+
+    if groups is not None:
+        group_codes, group_labels = pd.factorize(pd.Series(groups), use_na_sentinel=True)
+        keep = group_codes[owner] >= 0
+        grams = [group_codes[owner][keep].astype('int64')] + [g[keep] for g in grams]
+        owner = owner[keep]
+
+    unique, inverse, occurrences = _unique_rows(grams)
+    contacts, closed = _outcomes(inverse, owner, len(unique), outcome)
+    path_codes = unique[:, -length:]
+    paths = [STEP_SEPARATOR.join(parts) for parts in categories[path_codes].tolist()] if len(path_codes) else []
+    columns = {}
+    if groups is not None:
+        columns['group'] = np.asarray(group_labels, dtype=object)[unique[:, 0]] if len(unique) else []
+    columns['path'] = paths
+    out = _summary(columns, occurrences, contacts, closed, 'contacts')
+    if groups is not None:
+        out = out.sort_values(['group', 'contacts'], ascending=[True, False], kind='stable').reset_index(drop=True)
+    return out
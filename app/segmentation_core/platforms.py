@@ -0,0 +1,68 @@
+"""
+Platform classification
+Keyword detection of social/paid platforms and offline sources in source histories
+"""
+
+import pandas as pd
+from collections import Counter
+
+# Platform keywords dictionary
+PLATFORM_KEYWORDS = {
+    'Facebook': ['facebook', 'fb.com', 'facebook.com', 'facebook ads', 'facebook lead ads', 'fb ads', 'meta ads', 'fb.me'],
+    'Instagram': ['instagram', 'ig.com', 'instagram.com', 'instagram ads', 'ig ads', 'insta', 'instagr.am'],
+    'LinkedIn': ['linkedin', 'linkedin.com', 'linkedin ads', 'lnkd.in', 'linked in'],
+    'Twitter': ['twitter', 'twitter.com', 'x.com', 'twitter ads', 't.co', 'tweet', 'x ads'],
+    'TikTok': ['tiktok', 'tiktok.com', 'tiktok ads', 'tt ads', 'tik tok'],
+    'YouTube': ['youtube', 'youtube.com', 'youtu.be', 'youtube ads', 'yt.com', 'youtube.mx'],
+    'Google_Ads': ['google ads', 'google adwords', 'adwords', 'googleads', 'paid_search', 'cpc', 'ppc', 'sem'],
+    'Eventbrite': ['eventbrite', 'eventbrite.com', 'eventbrite.mx', 'evbuc.com'],
+    'WhatsApp': ['whatsapp', 'whatsapp.com', 'wa.me', 'whatsapp business'],
+    'MAKE': ['make.com', 'make', 'integromat'],
+    'AtomChat': ['atomchat', 'atom chat'],
+    'Organic_Social': ['organic_social', 'organic social', 'social']
+}
+
+def detect_platforms_in_text(text, platform_keywords=PLATFORM_KEYWORDS):
+    """Search for platform keywords in text and return a Counter of platform mentions"""
+    if pd.isna(text) or text == "":
+        return Counter()
+    
+    text_lower = str(text).lower()
+    platform_counts = Counter()
+    
+    for platform, keywords in platform_keywords.items():
+        for keyword in keywords:
+            keyword_lower = keyword.lower()
+            count = text_lower.count(keyword_lower)
+            if count > 0:
+                platform_counts[platform] += count
+    
+    return platform_counts
+
+def extract_platform_signals(row, text_columns):
+    """Extract platform signals from multiple text columns for a single row"""
+    all_counts = Counter()
+    
+    for col in text_columns:
+        if col in row.index and pd.notna(row[col]):
+            text = row[col]
+            counts = detect_platforms_in_text(text)
+            all_counts.update(counts)
+    
+    return all_counts
+
+def detect_offline_source(text):
+    """Check if text contains 'offline' indicator"""
+    if pd.isna(text) or text == "":
+        return False
+    
+    text_lower = str(text).lower()
+    return 'offline' in text_lower
+
+def count_offline_mentions(text):
+    """Count total number of offline mentions in historical data"""
+    if pd.isna(text) or text == "":
+        return 0
+    
+    text_lower = str(text).lower()
+    return text_lower.count('offline')
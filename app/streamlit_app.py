@@ -5,9 +5,6 @@ Una aplicación Streamlit integral que muestra tres estrategias de segmentación
 
 import streamlit as st
 import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
 from pathlib import Path
 import os
 from datetime import datetime
@@ -57,12 +54,28 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Import cluster-specific modules
-from cluster1_analysis import render_cluster1
-from cluster2_analysis import render_cluster2
-from cluster3_analysis import render_cluster3
-from utils import load_data, display_metrics, create_segment_pie_chart, validate_data, apply_global_filters
+# Cluster modules (and matplotlib/sklearn behind them) are imported when their
+# page is first opened, see lazy_import
+from utils import (
+    load_shared_dataset, get_session_dataset, clear_session_dataset, apply_shared_global_filters,
+    display_metrics, create_segment_pie_chart, validate_data,
+    compute_pipeline_funnel, run_key, render_diagnostics_panel, lazy_import,
+    render_incremental_controls
+)
 from geo_config import render_geo_config_ui, get_geo_config
+from input_formats import UPLOAD_EXTENSIONS
+import out_of_core
+
+LOGO_PATH = Path(__file__).resolve().parent / "assets" / "corchetes-blanco.webp"
+
+# Navigation label -> (module, render function) of each cluster page
+CLUSTER_PAGES = {
+    "📱 Cluster 1: Compromiso Social": ("cluster1_analysis", "render_cluster1"),
+    "🌍 Cluster 2: Geografía y Compromiso": ("cluster2_analysis", "render_cluster2"),
+    "🎪 Cluster 3: Actividades APREU": ("cluster3_analysis", "render_cluster3"),
+}
+# Cross-campus page, served from the partitioned multi-campus output
+CAMPUS_PAGE = "🏫 Comparación entre Campus"
 
 def main():
     """Main application entry point"""
@@ -73,15 +86,10 @@ def main():
     
     # Sidebar navigation
     with st.sidebar:
-        # Display logo
-        from pathlib import Path
-        from PIL import Image
-        
-        logo_path = Path("app/assets/corchetes-blanco.webp")
-        if logo_path.exists():
+        # Display logo (Streamlit serves the file directly, no PIL decode per rerun)
+        if LOGO_PATH.exists():
             try:
-                logo_img = Image.open(logo_path)
-                st.image(logo_img, use_container_width=True)
+                st.image(str(LOGO_PATH), use_container_width=True)
             except Exception as e:
                 st.error(f"Error loading logo: {e}")
                 st.markdown("### 🎯 APREU")
@@ -100,14 +108,15 @@ def main():
         
         uploaded_file = None
         
-        # Initialize session state for data persistence
-        if 'loaded_data' not in st.session_state:
-            st.session_state.loaded_data = None
+        # Initialize session state for data persistence (the frame itself lives in
+        # the process-wide dataset store, shared with other sessions)
+        if 'dataset_key' not in st.session_state:
+            st.session_state.dataset_key = None
         if 'data_source_info' not in st.session_state:
             st.session_state.data_source_info = None
         
-        # Use cached data if available
-        data = st.session_state.loaded_data
+        # Use the dataset already attached to this session, if any
+        data = get_session_dataset()
         gcs_bucket = None
         gcs_path = None
         
@@ -119,11 +128,11 @@ def main():
             PROJECT_BUCKET = os.getenv("GCS_BUCKET_NAME", "data_clusters")
             
             # Show current loaded data info if available
-            if st.session_state.loaded_data is not None and st.session_state.data_source_info:
+            if data is not None and st.session_state.data_source_info:
                 source_info = st.session_state.data_source_info.get('source', 'Datos cargados')
-                st.success(f"✅ **Datos ya cargados:** {source_info} ({len(st.session_state.loaded_data):,} contactos)")
+                st.success(f"✅ **Datos ya cargados:** {source_info} ({len(data):,} contactos)")
                 if st.button("🔄 Recargar desde Cloud Storage"):
-                    st.session_state.loaded_data = None
+                    clear_session_dataset()
                     st.session_state.data_source_info = None
                     st.rerun()
                 st.markdown("---")
@@ -145,12 +154,11 @@ def main():
                 else:
                     try:
                         with st.spinner("📥 Cargando archivo desde Cloud Storage..."):
-                            data = load_data(gcs_bucket=gcs_bucket, gcs_path=gcs_path)
+                            data = load_shared_dataset(gcs_bucket=gcs_bucket, gcs_path=gcs_path)
                             validation = validate_data(data)
                             
                             if validation['is_valid']:
-                                # Save to session state for persistence
-                                st.session_state.loaded_data = data
+                                # Attached to the session by load_shared_dataset
                                 st.session_state.data_source_info = {
                                     'type': 'gcs',
                                     'bucket': gcs_bucket,
@@ -174,12 +182,10 @@ def main():
                                         for warning in validation['warnings']:
                                             st.warning(warning)
                                 
-                                # Update data variable
-                                data = st.session_state.loaded_data
                             else:
                                 st.error(f"❌ Datos inválidos: Faltan columnas requeridas: {', '.join(validation['missing_basic'])}")
                                 data = None
-                                st.session_state.loaded_data = None
+                                clear_session_dataset()
                                 st.session_state.data_source_info = None
                     except Exception as e:
                         st.error(f"❌ Error cargando desde Cloud Storage: {e}")
@@ -191,7 +197,7 @@ def main():
                         4. El archivo existe en Cloud Storage
                         """)
                         data = None
-                        st.session_state.loaded_data = None
+                        clear_session_dataset()
                         st.session_state.data_source_info = None
             
             with st.expander("📖 ¿Cómo identificar la ruta del archivo?"):
@@ -250,8 +256,9 @@ def main():
             
             uploaded_file = st.file_uploader(
                 "Elegir un archivo CSV",
-                type=['csv'],
-                help="Sube tu archivo CSV. Archivos grandes se subirán automáticamente a Cloud Storage."
+                type=UPLOAD_EXTENSIONS,
+                help="Sube tu archivo CSV, comprimido (.csv.gz, .zip, .zst) o en Parquet/Feather. "
+                     "Comprimir el CSV reduce su tamaño ~8-10x. Archivos grandes se subirán automáticamente a Cloud Storage."
             )
             
             if uploaded_file is not None:
@@ -266,7 +273,7 @@ def main():
                     use_gcs = st.checkbox(
                         "☁️ Subir a Cloud Storage automáticamente",
                         value=True,
-                        help="El archivo se subirá a Cloud Storage y luego se cargará desde ahí"
+                        help="El archivo se subirá a Cloud Storage y se cargará mientras se sube"
                     )
                     
                     if use_gcs:
@@ -286,20 +293,15 @@ def main():
                         
                         if st.button("☁️ Subir y Cargar desde Cloud Storage", type="primary"):
                             try:
-                                with st.spinner("📤 Subiendo archivo a Cloud Storage..."):
-                                    # Upload to Cloud Storage
-                                    from utils import upload_to_gcs
-                                    upload_to_gcs(uploaded_file, gcs_bucket_upload, gcs_path_upload)
+                                with st.spinner("📤 Subiendo y cargando archivo..."):
+                                    # Parsed while it is uploaded: one transfer, no download back
+                                    from utils import upload_and_load_dataset
+                                    data = upload_and_load_dataset(uploaded_file, gcs_bucket_upload, gcs_path_upload)
                                     st.success(f"✅ Archivo subido a gs://{gcs_bucket_upload}/{gcs_path_upload}")
-                                
-                                with st.spinner("📥 Cargando datos desde Cloud Storage..."):
-                                    # Load from Cloud Storage
-                                    data = load_data(gcs_bucket=gcs_bucket_upload, gcs_path=gcs_path_upload)
                                     validation = validate_data(data)
                                     
                                     if validation['is_valid']:
-                                        # Save to session state
-                                        st.session_state.loaded_data = data
+                                        # Attached to the session by load_shared_dataset
                                         st.session_state.data_source_info = {
                                             'type': 'gcs_upload',
                                             'bucket': gcs_bucket_upload,
@@ -323,12 +325,10 @@ def main():
                                                 for warning in validation['warnings']:
                                                     st.warning(warning)
                                         
-                                        # Update data variable
-                                        data = st.session_state.loaded_data
                                     else:
                                         st.error(f"❌ Datos inválidos: Faltan columnas requeridas: {', '.join(validation['missing_basic'])}")
                                         data = None
-                                        st.session_state.loaded_data = None
+                                        clear_session_dataset()
                                         st.session_state.data_source_info = None
                             except Exception as e:
                                 st.error(f"❌ Error: {e}")
@@ -344,52 +344,46 @@ def main():
                     else:
                         # Try to load directly (may fail if too large)
                         try:
-                            data = load_data(uploaded_file)
+                            data = load_shared_dataset(uploaded_file)
                             validation = validate_data(data)
                             
                             if validation['is_valid']:
-                                # Save to session state
-                                st.session_state.loaded_data = data
+                                # Attached to the session by load_shared_dataset
                                 st.session_state.data_source_info = {
                                     'type': 'upload',
                                     'source': uploaded_file.name
                                 }
                                 st.info("💡 Los datos están guardados y disponibles para todos los clusters.")
-                                # Update data variable
-                                data = st.session_state.loaded_data
                         except Exception as e:
                             error_msg = str(e)
                             if "413" in error_msg or "Payload Too Large" in error_msg:
                                 st.error("❌ **Error: Archivo demasiado grande para subir directamente**")
                                 st.info("💡 Por favor activa la opción 'Subir a Cloud Storage automáticamente' arriba.")
                                 data = None
-                                st.session_state.loaded_data = None
+                                clear_session_dataset()
                                 st.session_state.data_source_info = None
                             else:
                                 raise
                 else:
                     # Small file, try to load directly
                     try:
-                        data = load_data(uploaded_file)
+                        data = load_shared_dataset(uploaded_file)
                         validation = validate_data(data)
                         
                         if validation['is_valid']:
-                            # Save to session state
-                            st.session_state.loaded_data = data
+                            # Attached to the session by load_shared_dataset
                             st.session_state.data_source_info = {
                                 'type': 'upload',
                                 'source': uploaded_file.name
                             }
                             st.info("💡 Los datos están guardados y disponibles para todos los clusters.")
-                            # Update data variable
-                            data = st.session_state.loaded_data
                     except Exception as e:
                         error_msg = str(e)
                         if "413" in error_msg or "Payload Too Large" in error_msg:
                             st.error("❌ **Error: Archivo demasiado grande**")
                             st.info("💡 Intenta usar la opción '☁️ Cargar desde Cloud Storage' para archivos grandes.")
                             data = None
-                            st.session_state.loaded_data = None
+                            clear_session_dataset()
                             st.session_state.data_source_info = None
                         else:
                             raise
@@ -400,16 +394,14 @@ def main():
             # Use default file
             try:
                 # Check if we already have data loaded
-                if st.session_state.loaded_data is not None:
-                    data = st.session_state.loaded_data
+                if data is not None:
                     if st.session_state.data_source_info:
                         st.success(f"✅ Datos ya cargados: {st.session_state.data_source_info.get('source', 'Archivo predeterminado')}")
                     else:
                         st.success(f"✅ Usando datos cargados previamente ({len(data):,} contactos)")
                 else:
-                    data = load_data()
-                    # Save to session state
-                    st.session_state.loaded_data = data
+                    data = load_shared_dataset()
+                    # Attached to the session by load_shared_dataset
                     st.session_state.data_source_info = {
                         'type': 'default',
                         'source': 'data/raw/contacts_campus_Qro_.csv'
@@ -428,7 +420,7 @@ def main():
                 st.error(f"❌ Error cargando archivo predeterminado: {e}")
                 st.info("💡 Intenta subir tu propio archivo CSV")
                 data = None
-                st.session_state.loaded_data = None
+                clear_session_dataset()
                 st.session_state.data_source_info = None
         
         st.markdown("---")
@@ -557,15 +549,23 @@ def main():
         # Geographic configuration (for Cluster 2)
         render_geo_config_ui()
         
+        st.markdown("---")
+        render_incremental_controls()
+        
         st.markdown("---")
         st.markdown("### 📊 Navegación")
         
+        # The campus comparison reads the partitioned campus store, so it
+        # stays available before any export is loaded
+        if data is None:
+            pages = ["🏠 Resumen", CAMPUS_PAGE]
+        else:
+            pages = ["🏠 Resumen", "📱 Cluster 1: Compromiso Social", "🌍 Cluster 2: Geografía y Compromiso", 
+                     "🎪 Cluster 3: Actividades APREU", CAMPUS_PAGE]
         cluster_choice = st.radio(
             "Seleccionar Estrategia de Segmentación:",
-            ["🏠 Resumen", "📱 Cluster 1: Compromiso Social", "🌍 Cluster 2: Geografía y Compromiso", 
-             "🎪 Cluster 3: Actividades APREU"],
-            index=0,
-            disabled=(data is None)
+            pages,
+            index=0
         )
         
         st.markdown("---")
@@ -663,7 +663,12 @@ def main():
                 st.info("Cargar datos primero para ver estructura de columnas")
     
     # Main content area
-    if data is None:
+    if cluster_choice == CAMPUS_PAGE:
+        # Served from the partitioned campus store; no export needs to be loaded
+        with st.spinner("Cargando módulo de análisis..."):
+            module = lazy_import("campus_comparison")
+        module.render_campus_comparison()
+    elif data is None:
         st.warning("⚠️ No hay datos cargados. Por favor elige una opción para cargar tus datos.")
         st.markdown("---")
         st.markdown("### 🚀 Comenzando - Cómo Cargar tus Datos")
@@ -781,7 +786,7 @@ def main():
             """)
     else:
         # Apply global filters
-        filtered_data, filters_applied = apply_global_filters(data)
+        filtered_data, filters_applied = apply_shared_global_filters(data)
         
         # Show filter status
         if len(filters_applied) > 0:
@@ -794,12 +799,16 @@ def main():
         # Route to appropriate cluster with filtered data
         if cluster_choice == "🏠 Resumen":
             render_overview(filtered_data)
-        elif cluster_choice == "📱 Cluster 1: Compromiso Social":
-            render_cluster1(filtered_data)
-        elif cluster_choice == "🌍 Cluster 2: Geografía y Compromiso":
-            render_cluster2(filtered_data)
-        elif cluster_choice == "🎪 Cluster 3: Actividades APREU":
-            render_cluster3(filtered_data)
+        elif cluster_choice in CLUSTER_PAGES:
+            module_name, render_name = CLUSTER_PAGES[cluster_choice]
+            with st.spinner("Cargando módulo de análisis..."):
+                module = lazy_import(module_name)
+            getattr(module, render_name)(filtered_data)
+    
+    # Rendered last so the timings include this rerun's pipelines
+    with st.sidebar:
+        st.markdown("---")
+        render_diagnostics_panel()
 
 def render_overview(data):
     """Render the overview dashboard"""
@@ -811,37 +820,12 @@ def render_overview(data):
         st.error("⚠️ Datos no cargados. Por favor revisa el archivo de datos.")
         return
     
-    # Calculate key metrics with clear pipeline
-    from utils import hist_latest
-    
-    # 1. Total contacts
-    total_contacts = len(data)
-    
-    # 2. APREU contacts
-    propiedad_col = 'Propiedad del contacto' if 'Propiedad del contacto' in data.columns else 'propiedad_del_contacto'
-    if propiedad_col in data.columns:
-        data_with_propiedad = data.copy()
-        data_with_propiedad[propiedad_col] = data_with_propiedad[propiedad_col].apply(hist_latest)
-        apreu_contacts = data_with_propiedad[data_with_propiedad[propiedad_col] == 'APREU']
-        apreu_count = len(apreu_contacts)
-    else:
-        apreu_contacts = data
-        apreu_count = total_contacts
-    
-    # 3. Contacts after removing "other" and "subscriber"
-    lifecycle_col = 'Lifecycle Stage' if 'Lifecycle Stage' in data.columns else 'lifecycle_stage'
-    if lifecycle_col in apreu_contacts.columns:
-        apreu_contacts_cleaned = apreu_contacts.copy()
-        apreu_contacts_cleaned[lifecycle_col] = apreu_contacts_cleaned[lifecycle_col].apply(hist_latest)
-        working_contacts = apreu_contacts_cleaned[~apreu_contacts_cleaned[lifecycle_col].str.lower().isin(['other', 'subscriber'])]
-        working_count = len(working_contacts)
-    else:
-        working_contacts = apreu_contacts
-        working_count = apreu_count
-    
-    # 4. Closed contacts (from working contacts)
-    close_col = 'close_date' if 'close_date' in working_contacts.columns else 'Close Date'
-    closed_count = working_contacts[close_col].notna().sum() if close_col in working_contacts.columns else 0
+    # Pipeline stage counts (total → APREU → cleaned → closed), computed once per dataset and filter selection
+    funnel = compute_pipeline_funnel(data, run_key("overview"))
+    total_contacts = funnel['total']
+    apreu_count = funnel['apreu']
+    working_count = funnel['cleaned']
+    closed_count = funnel['closed']
     close_rate = (closed_count / working_count * 100) if working_count > 0 else 0
     
     # Display metrics
@@ -862,6 +846,15 @@ def render_overview(data):
     with col4:
         st.metric("Tratos Cerrados", f"{closed_count:,}", delta=f"{close_rate:.1f}%", help="Contactos cerrados del conjunto de trabajo")
     
+    streamed = out_of_core.summary(data)
+    if streamed:
+        st.info(
+            f"💾 **Modo fuera de memoria:** la exportación ({streamed['rows']:,} contactos, "
+            f"{streamed['columns']} columnas) se procesó por lotes. Solo se cargaron los "
+            f"{streamed['kept']:,} contactos de trabajo y las columnas que usan los clusters; "
+            "los totales del pipeline incluyen los contactos descartados."
+        )
+    
     st.markdown("---")
     
     # Cluster Comparison Section
@@ -8,99 +8,213 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from pathlib import Path
-import unicodedata
+import hashlib
+import importlib
 import os
-from io import BytesIO
-
-# Try to import Google Cloud Storage (optional, for Cloud Storage support)
-try:
-    from google.cloud import storage
-    GCS_AVAILABLE = True
-except ImportError:
-    GCS_AVAILABLE = False
+import sys
+from pipeline_metrics import record_funnel_stage, get_funnel_counts, get_timed_runs, PipelineTimer
+import dataset_store
+import cohort_cache
+import gcs_loader
+import input_formats
+import out_of_core
+# Pure helpers live in segmentation_core; re-exported here for existing imports
+from segmentation_core.history import (
+    convert_hubspot_timestamp, hist_latest, hist_latest_series,
+    hist_all, hist_concat_text, normalize_text
+)
+from segmentation_core.incremental import DeltaState
+from segmentation_core.history_table import export_history_table
+from segmentation_core.metrics import (
+    calculate_close_rate, calculate_days_to_close, categorize_ttc, convert_academic_period
+)
 
 def upload_to_gcs(uploaded_file, bucket_name, blob_name):
-    """Upload file to Google Cloud Storage"""
-    if not GCS_AVAILABLE:
-        raise ImportError("google-cloud-storage no está instalado. Instálalo con: pip install google-cloud-storage")
+    """Upload file to Google Cloud Storage (resumable upload, in chunks)"""
+    # Raises ImportError when google-cloud-storage is missing (and no local stand-in is set)
+    backend = gcs_loader.get_backend()
     
     try:
-        client = storage.Client()
-        bucket = client.bucket(bucket_name)
-        blob = bucket.blob(blob_name)
-        
-        # Upload file
         uploaded_file.seek(0)  # Reset file pointer
-        blob.upload_from_file(uploaded_file, content_type='text/csv')
-        
+        content_type = input_formats.content_type_for(uploaded_file)
+        gcs_loader.upload_object(uploaded_file, bucket_name, blob_name, content_type, backend=backend)
         return True
     except Exception as e:
         raise Exception(f"Error subiendo a Cloud Storage: {e}")
 
-@st.cache_data
 def load_data_from_gcs(bucket_name, blob_name):
-    """Load data from Google Cloud Storage"""
-    if not GCS_AVAILABLE:
-        raise ImportError("google-cloud-storage no está instalado. Instálalo con: pip install google-cloud-storage")
+    """Load data from Google Cloud Storage (streamed in chunks, cached locally per generation)"""
+    return _read_gcs_object(bucket_name, blob_name)[0]
+
+def _read_gcs_object(bucket_name, blob_name):
+    """(DataFrame, format) of a bucket object in any supported input format"""
+    # Raises ImportError when google-cloud-storage is missing (and no local stand-in is set)
+    backend = gcs_loader.get_backend()
     
     try:
-        client = storage.Client()
-        bucket = client.bucket(bucket_name)
-        blob = bucket.blob(blob_name)
-        
-        # Download to memory
-        file_bytes = blob.download_as_bytes()
-        
-        # Read CSV from bytes
-        df = pd.read_csv(BytesIO(file_bytes), low_memory=True, dtype_backend='pyarrow')
-        return df
+        source = gcs_loader.open_object(bucket_name, blob_name, backend)
+        return out_of_core.read_export(source)
     except Exception as e:
         raise Exception(f"Error cargando desde Cloud Storage: {e}")
 
-@st.cache_data
+def find_default_data_file():
+    """Path of the default contacts export (raises FileNotFoundError if missing)"""
+    # Relative to this file's location, so it works regardless of where streamlit is run from
+    current_file = Path(__file__).resolve()
+    project_root = current_file.parent.parent  # Go up from app/ to SettingUp/
+    file_path = project_root / "data" / "raw" / "contacts_campus_Qro_.csv"
+    
+    # Try multiple possible locations for deployment
+    possible_paths = [
+        file_path,  # Original path
+        Path("data/raw/contacts_campus_Qro_.csv"),  # Relative to current directory
+        Path("/app/data/raw/contacts_campus_Qro_.csv"),  # Railway deployment path
+        Path("contacts_campus_Qro_.csv"),  # Same directory
+    ]
+    
+    for path in possible_paths:
+        if path.exists():
+            return path
+    
+    raise FileNotFoundError(f"Data file not found. Tried: {[str(p) for p in possible_paths]}")
+
 def load_data(uploaded_file=None, gcs_bucket=None, gcs_path=None):
-    """Load the main contacts dataset from uploaded file, Cloud Storage, or default file"""
+    """
+    Load the main contacts dataset from uploaded file, Cloud Storage, or default file.
+    
+    Accepts CSV, compressed CSV (gzip, zip, zstd), Parquet and Feather,
+    detected from the file content (see input_formats). Exports too large
+    for the memory budget are streamed and reduced to the contacts and
+    columns the pipelines use (see out_of_core).
+    """
     # Priority: GCS > uploaded file > default file
     if gcs_bucket and gcs_path:
-        # Load from Cloud Storage
-        df = load_data_from_gcs(gcs_bucket, gcs_path)
+        # Raises ImportError when google-cloud-storage is missing (and no local stand-in is set)
+        backend = gcs_loader.get_backend()
+        try:
+            source = gcs_loader.open_object(gcs_bucket, gcs_path, backend)
+            return out_of_core.load_export(source, f"gs://{gcs_bucket}/{gcs_path}")
+        except Exception as e:
+            raise Exception(f"Error cargando desde Cloud Storage: {e}")
     elif uploaded_file is not None:
         # Load from uploaded file with memory optimization
-        df = pd.read_csv(uploaded_file, low_memory=True, dtype_backend='pyarrow')
+        return out_of_core.load_export(uploaded_file)
     else:
-        # Load from default file (relative to this file's location)
-        # This works regardless of where streamlit is run from
-        current_file = Path(__file__).resolve()
-        project_root = current_file.parent.parent  # Go up from app/ to SettingUp/
-        file_path = project_root / "data" / "raw" / "contacts_campus_Qro_.csv"
-        
-        # Try multiple possible locations for deployment
-        possible_paths = [
-            file_path,  # Original path
-            Path("data/raw/contacts_campus_Qro_.csv"),  # Relative to current directory
-            Path("/app/data/raw/contacts_campus_Qro_.csv"),  # Railway deployment path
-            Path("contacts_campus_Qro_.csv"),  # Same directory
-        ]
-        
-        file_found = False
-        for path in possible_paths:
-            if path.exists():
-                file_path = path
-                file_found = True
-                break
-        
-        if not file_found:
-            raise FileNotFoundError(f"Data file not found. Tried: {[str(p) for p in possible_paths]}")
-        
-        df = pd.read_csv(file_path, low_memory=True, dtype_backend='pyarrow')
+        # Load from default file
+        return out_of_core.load_export(find_default_data_file(), 'default')
+
+def _session_id():
+    """Id of the current browser session ('local' outside a Streamlit run)"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+    except ImportError:
+        ctx = None
+    return ctx.session_id if ctx is not None else 'local'
+
+def dataset_content_key(uploaded_file=None, gcs_bucket=None, gcs_path=None):
+    """Content hash of the export load_data would read with the same arguments"""
+    if gcs_bucket and gcs_path:
+        # Object metadata only: nothing is downloaded here
+        info = gcs_loader.stat_object(gcs_bucket, gcs_path)
+        if info.md5_hash:
+            return f"md5:{info.md5_hash}"
+        # Composite objects (and the local stand-in) have no MD5
+        return f"gcs:{gcs_bucket}/{gcs_path}#{info.generation}"
+    if uploaded_file is not None:
+        if hasattr(uploaded_file, 'getvalue'):
+            return dataset_store.bytes_content_key(uploaded_file.getvalue())
+        return dataset_store.file_content_key(uploaded_file)
+    return dataset_store.file_content_key(find_default_data_file())
+
+def load_shared_dataset(uploaded_file=None, gcs_bucket=None, gcs_path=None):
+    """
+    Load an export through the process-wide dataset store and attach it to this session.
+    
+    Sessions opening the same content share one read-only frame; the session
+    keeps only the key (st.session_state.dataset_key) and a reference that
+    protects the frame from eviction.
+    """
+    key = dataset_content_key(uploaded_file, gcs_bucket, gcs_path)
+    data = dataset_store.get_or_build(
+        key, lambda: load_data(uploaded_file, gcs_bucket, gcs_path), kind='dataset'
+    )
+    _attach_session_dataset(key)
+    return data
+
+def upload_and_load_dataset(uploaded_file, gcs_bucket, gcs_path):
+    """
+    Upload a file to Cloud Storage and load it in the same pass, attaching it to this session.
+    
+    The CSV parser reads the upload while its chunks are sent to the bucket
+    (gcs_loader.tee_upload), so the file is not downloaded back. The frame is
+    keyed by the upload's MD5, which is also what Cloud Storage reports for
+    the object, so loading gs://gcs_bucket/gcs_path later reuses it.
+    """
+    # Raises ImportError when google-cloud-storage is missing (and no local stand-in is set)
+    backend = gcs_loader.get_backend()
+    key = dataset_content_key(uploaded_file)
+    uploaded = []
     
-    # Convert HubSpot timestamps
-    date_cols = ['Create Date', 'Close Date', 'First Conversion Date', 'Recent Conversion Date']
-    for col in date_cols:
-        if col in df.columns:
-            df[col] = convert_hubspot_timestamp(df[col])
+    def build():
+        df = gcs_loader.tee_upload(
+            uploaded_file, gcs_bucket, gcs_path, lambda stream: load_data(stream),
+            content_type=input_formats.content_type_for(uploaded_file), backend=backend
+        )
+        uploaded.append(True)
+        return df
     
-    return df
+    data = dataset_store.get_or_build(key, build, kind='dataset')
+    if not uploaded:
+        # Same content already loaded by another session: only the upload is needed
+        upload_to_gcs(uploaded_file, gcs_bucket, gcs_path)
+    _attach_session_dataset(key)
+    return data
+
+def _attach_session_dataset(key):
+    """Make `key` this session's dataset, releasing the previous one"""
+    previous = st.session_state.get('dataset_key')
+    if previous and previous != key:
+        dataset_store.release(previous, _session_id())
+    dataset_store.acquire(key, _session_id())
+    st.session_state.dataset_key = key
+
+def get_session_dataset():
+    """The dataset attached to this session, or None (none loaded, or evicted after DATASET_SESSION_TTL)"""
+    key = st.session_state.get('dataset_key')
+    if not key:
+        return None
+    data = dataset_store.get(key, holder=_session_id())
+    if data is None:
+        st.session_state.dataset_key = None
+    return data
+
+def clear_session_dataset():
+    """Detach the dataset from this session (it stays shared while other sessions use it)"""
+    key = st.session_state.get('dataset_key')
+    if key:
+        dataset_store.release(key, _session_id())
+    st.session_state.dataset_key = None
+
+def filter_selection():
+    """The session's dataset key and global filter selection (what the pages are showing)"""
+    return (
+        st.session_state.get('dataset_key'),
+        tuple(st.session_state.get('filter_periodos') or ()),
+        st.session_state.get('filter_closure_status', "All Contacts"),
+        tuple(st.session_state.get('filter_lifecycle_stages') or ()),
+    )
+
+def run_key(prefix):
+    """Key of a pipeline run on the session's filtered dataset (funnel counts are recorded under it)"""
+    return f"{prefix}_{hashlib.md5(repr(filter_selection()).encode()).hexdigest()[:16]}"
+
+def apply_shared_global_filters(data):
+    """apply_global_filters, shared across sessions with the same dataset and filter selection"""
+    key = st.session_state.get('dataset_key')
+    if key is None or data is None:
+        return apply_global_filters(data)
+    return dataset_store.get_or_build(('filtered',) + filter_selection(), lambda: apply_global_filters(data), kind='filtered', parent=key)
 
 def validate_data(df):
     """Validate that the uploaded data has required columns"""
@@ -144,13 +258,47 @@ def validate_data(df):
     
     return validation_results
 
+def convert_periodo(val):
+    """
+    Readable label of a periodo de ingreso value ('2024 Fall', or 'Unknown').
+    
+    Based on YYYYMM format where MM codes are:
+    05 = Special, 10 = Spring, 35 = Summer, 60 = Fall, 75 = Winter/Special
+    """
+    try:
+        if pd.isna(val):
+            return "Unknown"
+        periodo_str = str(int(float(val))).strip()
+        if len(periodo_str) != 6:
+            return "Unknown"
+        year = periodo_str[:4]
+        period_code = int(periodo_str[4:])
+        
+        # Map period codes to semester names (from notebooks)
+        period_map = {
+            5: "Special",
+            10: "Spring", 
+            35: "Summer",
+            60: "Fall",
+            75: "Winter/Special"
+        }
+        
+        semester = period_map.get(period_code, f"Unknown({period_code})")
+        return f"{year} {semester}"
+    except:
+        return "Unknown"
+
 def apply_global_filters(df):
     """Apply global filters from session state to dataframe"""
     if df is None or len(df) == 0:
         return df, []
     
+    timer = PipelineTimer('global_filters', rows_in=len(df))
     filtered_df = df.copy()
     filters_applied = []
+    # Out-of-core loads: contacts dropped while streaming, grouped by the values filtered below
+    excluded = out_of_core.excluded_rows(df)
+    timer.lap('copy', len(filtered_df))
     
     # Periodo de ingreso filter
     if 'filter_periodos' in st.session_state and len(st.session_state['filter_periodos']) > 0:
@@ -169,44 +317,20 @@ def apply_global_filters(df):
                 break
         
         if periodo_col:
-            # Convert periodo to readable format
-            # Based on YYYYMM format where MM codes are:
-            # 05 = Special, 10 = Spring, 35 = Summer, 60 = Fall, 75 = Winter/Special
-            def convert_periodo(val):
-                try:
-                    if pd.isna(val):
-                        return "Unknown"
-                    periodo_str = str(int(float(val))).strip()
-                    if len(periodo_str) != 6:
-                        return "Unknown"
-                    year = periodo_str[:4]
-                    period_code = int(periodo_str[4:])
-                    
-                    # Map period codes to semester names (from notebooks)
-                    period_map = {
-                        5: "Special",
-                        10: "Spring", 
-                        35: "Summer",
-                        60: "Fall",
-                        75: "Winter/Special"
-                    }
-                    
-                    semester = period_map.get(period_code, f"Unknown({period_code})")
-                    return f"{year} {semester}"
-                except:
-                    return "Unknown"
-            
             # Apply hist_latest and convert
             periodo_latest = filtered_df[periodo_col].apply(hist_latest)
             periodo_readable = periodo_latest.apply(convert_periodo)
             
             # Filter to selected periods
             filtered_df = filtered_df[periodo_readable.isin(st.session_state['filter_periodos'])]
+            if excluded is not None:
+                excluded = [r for r in excluded if convert_periodo(r[0]) in st.session_state['filter_periodos']]
             
             periodo_str = ', '.join(st.session_state['filter_periodos'][:2])
             if len(st.session_state['filter_periodos']) > 2:
                 periodo_str += f" (+{len(st.session_state['filter_periodos'])-2} more)"
             filters_applied.append(f"Periodo: {periodo_str}")
+            timer.lap('periodo', len(filtered_df))
     
     # Closure status filter (apply hist_latest to get actual close date)
     if 'filter_closure_status' in st.session_state and st.session_state['filter_closure_status'] != "All Contacts":
@@ -216,10 +340,15 @@ def apply_global_filters(df):
             close_date_latest = filtered_df[close_date_col].apply(hist_latest)
             if st.session_state['filter_closure_status'] == "Closed Only":
                 filtered_df = filtered_df[close_date_latest.notna()]
+                if excluded is not None:
+                    excluded = [r for r in excluded if r[1]]
                 filters_applied.append("Closed Only")
             elif st.session_state['filter_closure_status'] == "Open Only":
                 filtered_df = filtered_df[close_date_latest.isna()]
+                if excluded is not None:
+                    excluded = [r for r in excluded if not r[1]]
                 filters_applied.append("Open Only")
+            timer.lap('closure_status', len(filtered_df))
     
     # Lifecycle stage filter (using LATEST value only)
     if 'filter_lifecycle_stages' in st.session_state and len(st.session_state['filter_lifecycle_stages']) > 0:
@@ -228,66 +357,51 @@ def apply_global_filters(df):
             # Apply hist_latest to get latest value
             lifecycle_latest = filtered_df[lifecycle_col].apply(hist_latest)
             filtered_df = filtered_df[lifecycle_latest.isin(st.session_state['filter_lifecycle_stages'])]
+            if excluded is not None:
+                excluded = [r for r in excluded if r[2] in st.session_state['filter_lifecycle_stages']]
             
             stages_str = ', '.join(st.session_state['filter_lifecycle_stages'][:3])
             if len(st.session_state['filter_lifecycle_stages']) > 3:
                 stages_str += '...'
             filters_applied.append(f"Lifecycle (latest): {stages_str}")
+            timer.lap('lifecycle', len(filtered_df))
     
+    if excluded is not None:
+        out_of_core.with_excluded(filtered_df, excluded)
+    timer.finish(len(filtered_df))
     return filtered_df, filters_applied
 
-def convert_hubspot_timestamp(series):
-    """Convert HubSpot timestamps (milliseconds) to datetime"""
-    def convert_single(val):
-        if pd.isna(val):
-            return pd.NaT
-        try:
-            timestamp_ms = int(float(str(val).strip()))
-            return pd.to_datetime(timestamp_ms, unit='ms')
-        except (ValueError, TypeError):
-            return pd.NaT
-    
-    return series.apply(convert_single)
-
-def hist_latest(val):
-    """Extract the latest value from HubSpot history string (// delimited)"""
-    if pd.isna(val):
-        return np.nan
-    s = str(val).strip()
-    if s == "":  # Handle empty strings
-        return np.nan
-    if "//" in s:
-        parts = [p.strip() for p in s.split("//") if p.strip() != ""]
-        if not parts:
-            return np.nan
-        return parts[-1]
-    return s
-
-def hist_all(val):
-    """Parse HubSpot history string and return ALL values as a list"""
-    if pd.isna(val):
-        return []
-    s = str(val).strip()
-    if "//" in s:
-        parts = [p.strip() for p in s.split("//") if p.strip() != ""]
-        return [p for p in parts if p.lower() not in ['nan', 'none', '']]
-    return [s] if s.lower() not in ['nan', 'none', ''] else []
-
-def hist_concat_text(val):
-    """Concatenate all historical text values with space separator"""
-    values = hist_all(val)
-    return " ".join(values)
-
-def normalize_text(s):
-    """Normalize text by removing accents and converting to lowercase"""
-    if pd.isna(s):
-        return "unknown"
-    s = str(s).strip()
-    if s == "":
-        return "unknown"
-    s = unicodedata.normalize("NFKD", s)
-    s = "".join(ch for ch in s if not unicodedata.combining(ch))
-    return s.lower()
+@st.cache_data(show_spinner=False)
+def compute_pipeline_funnel(_data, funnel_key):
+    """
+    Compute the total → APREU → cleaned → closed contact counts of a dataset.
+    
+    Runs once per dataset and filter selection (funnel_key, see run_key) with vectorized masks and
+    records the counts in pipeline_metrics, so the overview never copies
+    or re-parses the data to display them.
+    """
+    # Contacts an out-of-core load dropped while streaming (none for in-memory loads)
+    excluded_total, excluded_apreu = out_of_core.excluded_counts(_data)
+    record_funnel_stage(funnel_key, 'total', len(_data) + excluded_total)
+    mask = pd.Series(True, index=_data.index)
+    
+    propiedad_col = 'Propiedad del contacto' if 'Propiedad del contacto' in _data.columns else 'propiedad_del_contacto'
+    if propiedad_col in _data.columns:
+        propiedad = hist_latest_series(_data[propiedad_col])
+        mask &= propiedad.str.upper().eq('APREU').fillna(False).astype(bool)
+    record_funnel_stage(funnel_key, 'apreu', mask.sum() + excluded_apreu)
+    
+    lifecycle_col = 'Lifecycle Stage' if 'Lifecycle Stage' in _data.columns else 'lifecycle_stage'
+    if lifecycle_col in _data.columns:
+        lifecycle = hist_latest_series(_data[lifecycle_col])
+        mask &= ~lifecycle.str.lower().isin(['other', 'subscriber'])
+    record_funnel_stage(funnel_key, 'cleaned', mask.sum())
+    
+    close_col = 'close_date' if 'close_date' in _data.columns else 'Close Date'
+    closed = (_data[close_col].notna() & mask).sum() if close_col in _data.columns else 0
+    record_funnel_stage(funnel_key, 'closed', closed)
+    
+    return get_funnel_counts(funnel_key)
 
 def display_metrics(metrics_dict, columns=4):
     """Display metrics in a grid layout"""
@@ -406,14 +520,317 @@ def create_heatmap(df, x_col, y_col, values_col, title="Heatmap"):
     
     return fig
 
-def create_scatter_plot(df, x_col, y_col, color_col=None, size_col=None, title=""):
-    """Create an interactive scatter plot"""
-    fig = px.scatter(
-        df, x=x_col, y=y_col, color=color_col, size=size_col,
-        title=title,
-        hover_data=df.columns,
-        color_continuous_scale='Viridis' if color_col and pd.api.types.is_numeric_dtype(df[color_col]) else None
+# Charts above these sizes are sent to the browser as WebGL traces or as
+# server-side aggregates instead of one SVG point per contact
+CHART_WEBGL_THRESHOLD = int(os.getenv("CHART_WEBGL_THRESHOLD", "5000"))
+CHART_AGGREGATE_THRESHOLD = int(os.getenv("CHART_AGGREGATE_THRESHOLD", "50000"))
+
+def get_cohort_version(df, *context):
+    """
+    Return a short fingerprint of a cohort for keying cached aggregates.
+    
+    Hashes the session's dataset key, the row count, the column names and
+    the index, so another export or any filter that changes which contacts
+    are present produces a new version. Values that change without
+    changing the rows (e.g. the geo configuration) must be passed in
+    `context`.
+    """
+    digest = hashlib.md5()
+    digest.update(repr(st.session_state.get('dataset_key')).encode())
+    if df is None:
+        digest.update(b"none")
+    else:
+        digest.update(str(len(df)).encode())
+        digest.update("|".join(map(str, df.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(df.index, index=False).values.tobytes())
+    for item in context:
+        digest.update(repr(item).encode())
+    return digest.hexdigest()[:16]
+
+# Incremental processing default (see segmentation_core.incremental); the sidebar toggle overrides it
+INCREMENTAL_PROCESSING = os.getenv("INCREMENTAL_PROCESSING", "0") == "1"
+
+# Latest incremental snapshot per cluster in this process (also persisted in cohort_cache)
+_delta_snapshots = {}
+# Bumped by "Reentrenar modelos" so cohorts scored with the discarded models are not reused
+_delta_generation = [0]
+
+def incremental_enabled():
+    return st.session_state.get('incremental_mode', INCREMENTAL_PROCESSING)
+
+def _delta_slot(cluster):
+    return cohort_cache.entry_key(f'delta_{cluster}', 'latest')
+
+def load_delta_state(cluster):
+    """DeltaState seeded with the latest snapshot of `cluster` (this process first, then disk)"""
+    snapshot = _delta_snapshots.get(cluster)
+    if snapshot is None:
+        snapshot = cohort_cache.load(_delta_slot(cluster))
+    return DeltaState(snapshot)
+
+def save_delta_state(cluster, delta):
+    """Keep the run's stage outputs and models as the snapshot for the next export"""
+    snapshot = delta.snapshot()
+    _delta_snapshots[cluster] = snapshot
+    cohort_cache.store(_delta_slot(cluster), snapshot, replace=True)
+
+def clear_delta_states():
+    """Forget every snapshot: the next incremental run recomputes everything and refits the models"""
+    _delta_snapshots.clear()
+    cohort_cache.remove('delta_')
+    _delta_generation[0] += 1
+
+# Models fitted per dataset version (Cluster 1 k-sweep) in this process (also persisted in cohort_cache)
+_model_states = {}
+
+def _model_slot(cluster, data, context):
+    parent = st.session_state.get('dataset_key')
+    return cohort_cache.entry_key(f'models_{cluster}', parent, get_cohort_version(data, *context))
+
+def load_model_state(cluster, data, *context):
+    """DeltaState holding the models fitted on this version of `data` (this process first, then disk)"""
+    slot = _model_slot(cluster, data, context)
+    snapshot = _model_states.get(slot)
+    if snapshot is None:
+        snapshot = cohort_cache.load(slot)
+    return DeltaState(snapshot)
+
+def save_model_state(cluster, data, state, *context):
+    """Keep the models of a run for later builds on the same version of `data`"""
+    if 'fitted' not in state.stats.values():
+        return
+    slot = _model_slot(cluster, data, context)
+    _model_states[slot] = state.snapshot()
+    cohort_cache.store(slot, _model_states[slot], replace=True)
+
+def _add_excluded_stages(funnel_key, data):
+    """Count the contacts an out-of-core load dropped while streaming in a cluster funnel"""
+    excluded_total, excluded_apreu = out_of_core.excluded_counts(data)
+    counts = get_funnel_counts(funnel_key) if funnel_key is not None else None
+    # Already added when the total covers more than the loaded rows (a stage built on a cached base)
+    if not excluded_total or not counts or counts.get('total', 0) != len(data):
+        return
+    record_funnel_stage(funnel_key, 'total', counts.get('total', 0) + excluded_total)
+    record_funnel_stage(funnel_key, 'apreu', counts.get('apreu', 0) + excluded_apreu)
+
+def shared_cohort(cluster, data, build, *context, funnel_key=None):
+    """
+    Return a cluster cohort from the process-wide dataset store, building it once.
+    
+    The cohort is keyed by the session's dataset, the rows of `data` and
+    `context`, so every session with the same data and filters shares one
+    read-only frame. It is evicted together with its dataset.
+    
+    Below the store, cohorts of a known dataset are also persisted on disk
+    (cohort_cache) with their funnel counts, which are recorded again under
+    `funnel_key` when the cohort is read back after a restart.
+    
+    `build(delta)` receives a DeltaState in incremental mode (None otherwise):
+    only contacts that are new or changed since the previous export are
+    reprocessed, and the stored models score them.
+    """
+    parent = st.session_state.get('dataset_key')
+    incremental = incremental_enabled()
+    if incremental:
+        # Incremental cohorts are scored with stored models, so they are cached apart
+        context = context + ('incremental', _delta_generation[0])
+    version = get_cohort_version(data, *context)
+    
+    def run_build():
+        if not incremental:
+            cohort = build(None)
+        else:
+            delta = load_delta_state(cluster)
+            cohort = build(delta)
+            save_delta_state(cluster, delta)
+            st.session_state.setdefault('incremental_stats', {})[cluster] = delta.stats
+        _add_excluded_stages(funnel_key, data)
+        return cohort
+    
+    def build_persistent():
+        if parent is None or not cohort_cache.cache_enabled():
+            return run_build()
+        
+        def build_with_funnel():
+            cohort = run_build()
+            return {'cohort': cohort, 'funnel': pd.DataFrame([get_funnel_counts(funnel_key)])}
+        
+        entry = cohort_cache.load_or_build(cohort_cache.entry_key(cluster, parent, version), build_with_funnel)
+        if not get_funnel_counts(funnel_key):
+            for stage, count in entry['funnel'].iloc[0].dropna().items():
+                record_funnel_stage(funnel_key, stage, count)
+        return entry['cohort']
+    
+    key = ('cohort', cluster, parent, version)
+    return dataset_store.get_or_build(key, build_persistent, kind='cohort', parent=parent)
+
+def shared_history():
+    """
+    Long-format history table of the session's dataset (export_history_table),
+    split once per dataset and shared by every cohort built from it.
+    
+    None when no dataset is attached (builders then split their own input).
+    """
+    key = st.session_state.get('dataset_key')
+    data = get_session_dataset()
+    if data is None:
+        return None
+    return dataset_store.get_or_build(('history', key), lambda: export_history_table(data), kind='cohort', parent=key)
+
+def render_incremental_controls():
+    """Sidebar toggle for incremental processing (reuse per run is shown in the diagnostics panel)"""
+    st.markdown("### ⚡ Procesamiento")
+    enabled = st.toggle(
+        "Procesamiento incremental",
+        value=INCREMENTAL_PROCESSING,
+        key="incremental_mode",
+        help="Con una nueva exportación, solo se reprocesan los contactos nuevos o modificados "
+             "(por Record ID) y se clasifican con los modelos guardados (KMeans del Cluster 1, "
+             "umbrales de compromiso del Cluster 2) en lugar de reentrenarlos."
     )
+    if enabled and st.button("🔁 Reentrenar modelos", help="Descarta los resultados guardados: el siguiente cálculo procesa todos los contactos y reentrena los modelos"):
+        clear_delta_states()
+        st.session_state.pop('incremental_stats', None)
+        st.rerun()
+
+def persistent_aggregate(kind, version, build):
+    """Aggregates (a frame or dict of frames) of the session's dataset, persisted on disk"""
+    dataset_key = st.session_state.get('dataset_key')
+    if dataset_key is None:
+        return build()
+    return cohort_cache.load_or_build(cohort_cache.entry_key(kind, dataset_key, version), build)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _shared_aggregate(kind, dataset_key, version, _build):
+    return persistent_aggregate(kind, version, _build)
+
+def shared_aggregate(kind, version, build):
+    """
+    persistent_aggregate behind a process-wide in-memory cache, keyed by
+    kind, the session's dataset and version (the build callable is not hashed)
+    """
+    return _shared_aggregate(kind, st.session_state.get('dataset_key'), version, build)
+
+def _numeric_values(df, col):
+    """Return a column as a float array with missing values dropped"""
+    values = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    return values[~np.isnan(values)]
+
+@st.cache_data(show_spinner=False)
+def _binned_scatter_spec(_df, version, x_col, y_col, color_col, bins, title):
+    """Aggregate a scatter into a 2D histogram and return the figure spec"""
+    x = pd.to_numeric(_df[x_col], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    y = pd.to_numeric(_df[y_col], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    mask = ~(np.isnan(x) | np.isnan(y))
+    
+    counts, x_edges, y_edges = np.histogram2d(x[mask], y[mask], bins=bins)
+    z = counts
+    colorbar_title = "Contactos"
+    
+    # Numeric color columns become the per-bin mean instead of the count
+    if color_col and pd.api.types.is_numeric_dtype(_df[color_col]):
+        c = pd.to_numeric(_df[color_col], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        c_mask = mask & ~np.isnan(c)
+        sums, _, _ = np.histogram2d(x[c_mask], y[c_mask], bins=[x_edges, y_edges], weights=c[c_mask])
+        c_counts, _, _ = np.histogram2d(x[c_mask], y[c_mask], bins=[x_edges, y_edges])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            z = np.where(c_counts > 0, sums / c_counts, np.nan)
+        colorbar_title = color_col
+    else:
+        z = np.where(counts > 0, counts, np.nan)
+    
+    fig = go.Figure(go.Heatmap(
+        x=(x_edges[:-1] + x_edges[1:]) / 2,
+        y=(y_edges[:-1] + y_edges[1:]) / 2,
+        z=z.T,
+        colorscale='Viridis',
+        colorbar=dict(title=colorbar_title),
+        hovertemplate=f"{x_col}: %{{x:.2f}}<br>{y_col}: %{{y:.2f}}<br>{colorbar_title}: %{{z:.2f}}<extra></extra>"
+    ))
+    fig.update_layout(
+        title=f"{title} ({int(mask.sum()):,} contactos agregados)" if title else None,
+        xaxis_title=x_col,
+        yaxis_title=y_col
+    )
+    return fig.to_dict()
+
+@st.cache_data(show_spinner=False)
+def _binned_histogram_spec(_df, version, x_col, nbins, color):
+    """Pre-compute histogram bins and return a bar figure spec"""
+    values = _numeric_values(_df, x_col)
+    counts, edges = np.histogram(values, bins=nbins or 'auto')
+    
+    fig = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts,
+        width=np.diff(edges),
+        marker_color=color,
+        hovertemplate=f"{x_col}: %{{x:.2f}}<br>Conteo: %{{y:,}}<extra></extra>"
+    ))
+    fig.update_layout(bargap=0, xaxis_title=x_col, yaxis_title="count")
+    return fig.to_dict()
+
+@st.cache_data(show_spinner=False)
+def _box_stats_spec(_df, version, x_col, y_col, color_sequence, color_map):
+    """Compute box-plot statistics per group and return a figure spec"""
+    data = pd.DataFrame({
+        'group': _df[x_col].astype(str),
+        'value': pd.to_numeric(_df[y_col], errors='coerce')
+    }).dropna(subset=['value'])
+    
+    grouped = data.groupby('group', sort=False)['value']
+    stats = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    stats.columns = ['q1', 'median', 'q3']
+    stats['min'] = grouped.min()
+    stats['max'] = grouped.max()
+    stats['mean'] = grouped.mean()
+    iqr = stats['q3'] - stats['q1']
+    stats['lowerfence'] = np.maximum(stats['min'], stats['q1'] - 1.5 * iqr)
+    stats['upperfence'] = np.minimum(stats['max'], stats['q3'] + 1.5 * iqr)
+    
+    palette = color_sequence or px.colors.qualitative.Plotly
+    fig = go.Figure()
+    for i, (group, row) in enumerate(stats.iterrows()):
+        color = (color_map or {}).get(group, palette[i % len(palette)])
+        fig.add_trace(go.Box(
+            name=group,
+            x=[group],
+            q1=[row['q1']], median=[row['median']], q3=[row['q3']],
+            lowerfence=[row['lowerfence']], upperfence=[row['upperfence']],
+            mean=[row['mean']],
+            marker_color=color,
+            boxpoints=False
+        ))
+    fig.update_layout(xaxis_title=x_col, yaxis_title=y_col)
+    return fig.to_dict()
+
+def _values_version(df, columns):
+    """Version of a chart's input when the caller passes none: the plotted values themselves"""
+    columns = [c for c in dict.fromkeys(columns) if c and c in df.columns]
+    return get_cohort_version(df, pd.util.hash_pandas_object(df[columns], index=False).sum())
+
+def create_scatter_plot(df, x_col, y_col, color_col=None, size_col=None, title="", version=None):
+    """
+    Create an interactive scatter plot sized to the cohort.
+    
+    Small cohorts get a regular scatter with full hover data, medium ones a
+    WebGL scatter with lean hover data, and large ones a server-side 2D
+    histogram cached per cohort version.
+    """
+    n_points = len(df)
+    
+    if n_points > CHART_AGGREGATE_THRESHOLD:
+        version = version or _values_version(df, [x_col, y_col, color_col])
+        fig = go.Figure(_binned_scatter_spec(df, version, x_col, y_col, color_col, 60, title))
+    else:
+        is_numeric_color = bool(color_col) and pd.api.types.is_numeric_dtype(df[color_col])
+        fig = px.scatter(
+            df, x=x_col, y=y_col, color=color_col, size=size_col,
+            title=title,
+            hover_data=df.columns if n_points <= CHART_WEBGL_THRESHOLD else None,
+            render_mode='webgl' if n_points > CHART_WEBGL_THRESHOLD else 'auto',
+            color_continuous_scale='Viridis' if is_numeric_color else None
+        )
     
     fig.update_layout(
         hovermode='closest',
@@ -422,6 +839,46 @@ def create_scatter_plot(df, x_col, y_col, color_col=None, size_col=None, title="
     
     return fig
 
+def create_histogram(df, x_col, title="", nbins=None, color_discrete_sequence=None, version=None):
+    """Create a histogram, binning server-side for large cohorts"""
+    if len(df) <= CHART_AGGREGATE_THRESHOLD:
+        return px.histogram(
+            df, x=x_col, title=title, nbins=nbins,
+            color_discrete_sequence=color_discrete_sequence
+        )
+    
+    version = version or _values_version(df, [x_col])
+    color = color_discrete_sequence[0] if color_discrete_sequence else None
+    fig = go.Figure(_binned_histogram_spec(df, version, x_col, nbins, color))
+    fig.update_layout(title=title)
+    return fig
+
+def create_box_plot(df, x_col, y_col, title="", labels=None, color_discrete_map=None,
+                    color_discrete_sequence=None, version=None):
+    """Create a box plot per group, sending only quartiles for large cohorts"""
+    if len(df) <= CHART_AGGREGATE_THRESHOLD:
+        return px.box(
+            df, x=x_col, y=y_col, color=x_col,
+            title=title, labels=labels,
+            color_discrete_map=color_discrete_map,
+            color_discrete_sequence=color_discrete_sequence
+        )
+    
+    version = version or _values_version(df, [x_col, y_col])
+    fig = go.Figure(_box_stats_spec(
+        df, version, x_col, y_col,
+        tuple(color_discrete_sequence) if color_discrete_sequence else None,
+        color_discrete_map
+    ))
+    labels = labels or {}
+    fig.update_layout(
+        title=title,
+        xaxis_title=labels.get(x_col, x_col),
+        yaxis_title=labels.get(y_col, y_col),
+        showlegend=True
+    )
+    return fig
+
 def format_percentage(value, decimals=1):
     """Format a decimal value as percentage"""
     if pd.isna(value):
@@ -434,67 +891,6 @@ def format_number(value):
         return "N/A"
     return f"{int(value):,}"
 
-def calculate_close_rate(df):
-    """Calculate close rate from dataframe using mean() for consistency with notebooks"""
-    # Prefer is_closed field (binary 0/1) for consistency with notebook calculations
-    if 'is_closed' in df.columns:
-        return df['is_closed'].mean() * 100 if len(df) > 0 else 0
-    # Fall back to close_date if is_closed not available
-    close_col = 'close_date' if 'close_date' in df.columns else 'Close Date'
-    if close_col in df.columns:
-        closed = df[close_col].notna().sum()
-        total = len(df)
-        return (closed / total * 100) if total > 0 else 0
-    return 0
-
-def calculate_days_to_close(create_date, close_date):
-    """Calculate days to close, filtering out negative values"""
-    if pd.isna(create_date) or pd.isna(close_date):
-        return np.nan
-    
-    days = (close_date - create_date).days
-    return days if days >= 0 else np.nan
-
-def categorize_ttc(days):
-    """Categorize time-to-close into buckets"""
-    if pd.isna(days):
-        return "Still Open"
-    elif days <= 30:
-        return "Early (≤30 days)"
-    elif days <= 60:
-        return "Medium (31-60 days)"
-    elif days <= 120:
-        return "Late (61-120 days)"
-    else:
-        return "Very Late (>120 days)"
-
-def convert_academic_period(period_code):
-    """Convert YYYYMM academic period codes to readable format"""
-    if pd.isna(period_code) or period_code == "":
-        return "Unknown"
-    
-    try:
-        period_str = str(period_code).strip()
-        if len(period_str) != 6:
-            return f"Invalid: {period_code}"
-        
-        year = int(period_str[:4])
-        period = int(period_str[4:])
-        
-        period_map = {
-            5: "Special",
-            10: "Spring", 
-            35: "Summer",
-            60: "Fall",
-            75: "Winter/Special"
-        }
-        
-        semester = period_map.get(period, f"Unknown({period})")
-        return f"{year} {semester}"
-        
-    except (ValueError, IndexError):
-        return f"Invalid: {period_code}"
-
 def create_download_button(df, filename, label="Download CSV"):
     """Create a download button for a dataframe"""
     csv = df.to_csv(index=False)
@@ -612,3 +1008,145 @@ def create_summary_card(title, metrics_dict, color="#f0f2f6"):
             else:
                 st.metric(label, value)
 
+
+def lazy_import(module_name):
+    """
+    Import a module the first time it is needed instead of at app start.
+    
+    The first import is timed and appears in the diagnostics panel; later
+    calls return the already loaded module.
+    """
+    module = sys.modules.get(module_name)
+    if module is None:
+        timer = PipelineTimer('lazy_import', module_name)
+        module = importlib.import_module(module_name)
+        timer.finish()
+    return module
+
+def render_section_selector(sections, key):
+    """
+    Render a horizontal navigator for the sections of a cluster page.
+    
+    Unlike st.tabs, which executes every tab body on each rerun, the caller
+    only runs the body of the returned section.
+    
+    Args:
+        sections: List of section labels
+        key: Unique widget key (keeps the selection across reruns)
+    """
+    return st.radio(
+        "Sección:",
+        options=sections,
+        horizontal=True,
+        key=key,
+        label_visibility="collapsed"
+    )
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _memoized_section_result(_compute, section, dataset_key, version):
+    """Cache backing memoize_section (the compute callable is not hashed)"""
+    return _compute()
+
+def memoize_section(section, version, compute):
+    """
+    Return the result of `compute()` memoized by section name, the session's
+    dataset and cohort version.
+    
+    The cache is shared by every session, so the dataset key keeps one
+    upload's results (e.g. its XLSX export) from being served for another.
+    
+    Args:
+        section: Unique name of the computation (e.g. "c1_xlsx_export")
+        version: Cohort version from get_cohort_version
+        compute: Zero-argument callable returning a picklable result
+    """
+    return _memoized_section_result(compute, section, st.session_state.get('dataset_key'), version)
+
+# Pipelines shown in the diagnostics panel, in execution order
+DIAGNOSTICS_PIPELINES = {
+    'load_data': 'Carga de datos',
+    'global_filters': 'Filtros globales',
+    'lazy_import': 'Importación de módulo',
+    'cluster1': 'Cluster 1',
+    'cluster2_base': 'Cluster 2 (base)',
+    'cluster2': 'Cluster 2',
+    'cluster3': 'Cluster 3',
+    'cluster1_export': 'Exportación XLSX C1',
+    'cluster2_export': 'Exportación XLSX C2',
+    'cluster3_export': 'Exportación XLSX C3',
+}
+
+def render_diagnostics_panel():
+    """
+    Sidebar panel with the stage timings of the latest run of each pipeline.
+    
+    Cached results do not re-run their pipeline, so a stage only appears after
+    it actually executed in this server process.
+    """
+    show = st.toggle(
+        "🩺 Mostrar diagnósticos",
+        value=os.getenv("SHOW_DIAGNOSTICS", "0") == "1",
+        key="show_diagnostics",
+        help="Tiempo, filas y memoria por etapa de cada pipeline"
+    )
+    if not show:
+        return
+    
+    shown = 0
+    for pipeline, label in DIAGNOSTICS_PIPELINES.items():
+        runs = get_timed_runs(pipeline, limit=1)
+        if not runs:
+            continue
+        run = runs[0]
+        total = run.get('total')
+        title = f"{label}: {total['seconds']:.2f}s" if total else f"{label}: en curso"
+        with st.expander(title, expanded=False):
+            st.caption(f"{run['started_at']} · {run['run_key'] or ''}")
+            stages = pd.DataFrame(run['stages'] + ([total] if total else []))
+            if len(stages) > 0:
+                stages = stages.rename(columns={
+                    'stage': 'Etapa', 'seconds': 'Segundos', 'rows_in': 'Filas entrada',
+                    'rows_out': 'Filas salida', 'mem_delta_mb': 'Δ Memoria (MB)'
+                })
+                st.dataframe(stages, hide_index=True, use_container_width=True)
+        shown += 1
+    
+    if shown == 0:
+        st.caption("Aún no se ha ejecutado ningún pipeline en este proceso.")
+    
+    stats = dataset_store.store_stats()
+    with st.expander(f"Almacén compartido: {stats['total_mb']:,.0f} / {stats['budget_mb']:,} MB", expanded=False):
+        if stats['entries']:
+            entries = pd.DataFrame(stats['entries']).rename(columns={
+                'key': 'Clave', 'kind': 'Tipo', 'mb': 'MB', 'sessions': 'Sesiones'
+            })
+            st.dataframe(entries, hide_index=True, use_container_width=True)
+        else:
+            st.caption("Sin datasets cargados.")
+    
+    incremental_stats = st.session_state.get('incremental_stats', {})
+    if incremental_stats:
+        rows = []
+        for cluster, stats in sorted(incremental_stats.items()):
+            for stage, value in stats.items():
+                if isinstance(value, dict):
+                    rows.append({'Cluster': cluster, 'Etapa': stage, 'Filas': value['rows'],
+                                 'Reutilizadas': value['reused']})
+                else:
+                    rows.append({'Cluster': cluster, 'Etapa': stage,
+                                 'Modelo': 'reutilizado' if value == 'reused' else 'entrenado'})
+        with st.expander("Procesamiento incremental", expanded=False):
+            st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+    
+    budget = out_of_core.memory_budget_mb()
+    st.caption(
+        f"Presupuesto de memoria: {budget:,.0f} MB · modo fuera de memoria: {out_of_core.OUT_OF_CORE_MODE}"
+        if budget else f"Modo fuera de memoria: {out_of_core.OUT_OF_CORE_MODE}"
+    )
+    
+    if cohort_cache.cache_enabled():
+        disk = cohort_cache.cache_stats()
+        st.caption(
+            f"Caché en disco: {disk['entries']} entradas, {disk['total_mb']:,.0f} / {disk['max_mb']:,} MB "
+            f"({disk['dir']})"
+        )
@@ -8,6 +8,8 @@ set -e  # Exit on error
 PROJECT_ID="advseg-477918"
 REGION="us-central1"
 SERVICE_NAME="streamlit-app"
+# Bucket mounted at /mnt/cache for the cohort disk cache (survives scale-to-zero)
+CACHE_BUCKET="${CACHE_BUCKET:-data_clusters}"
 
 echo "🚀 Deploying Streamlit App to Google Cloud Run"
 echo "Project: $PROJECT_ID"
@@ -42,7 +44,10 @@ gcloud run deploy $SERVICE_NAME \
     --max-instances=10 \
     --min-instances=0 \
     --timeout=300 \
-    --set-env-vars="PYARROW_IGNORE_TIMEZONE=1,GCS_BUCKET_NAME=data_clusters" \
+    --execution-environment=gen2 \
+    --add-volume=name=cache,type=cloud-storage,bucket=$CACHE_BUCKET \
+    --add-volume-mount=volume=cache,mount-path=/mnt/cache \
+    --set-env-vars="PYARROW_IGNORE_TIMEZONE=1,GCS_BUCKET_NAME=data_clusters,COHORT_CACHE_DIR=/mnt/cache/cohorts" \
     --project $PROJECT_ID
 
 echo ""
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the data pipelines.
+
+Generates synthetic HubSpot exports (scripts/generate_synthetic_export.py) and
+times load_data, apply_global_filters, each process_clusterN_data, a Cluster 2
+geo configuration change, the Cluster 1 k sweep, the close-rate confidence
+intervals and each XLSX export at several sizes. Results are written as JSON
+so runs can be compared and regressions spotted.
+
+Usage:
+    python scripts/benchmark_pipelines.py                          # 10k, 100k, 1M rows
+    python scripts/benchmark_pipelines.py --sizes 10000 100000 --skip-xlsx
+    python scripts/benchmark_pipelines.py --sizes 100000 --baseline exports/benchmarks/benchmark_20250101_120000.json
+    python scripts/benchmark_pipelines.py --sizes 100000 --delta-rate 0.02   # + incremental runs
+    python scripts/benchmark_pipelines.py --sizes 100000 --out-of-core       # + streamed load
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import warnings
+from datetime import datetime
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+APP_DIR = ROOT_DIR / "app"
+sys.path.insert(0, str(APP_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from generate_synthetic_export import write_export
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+# Changes smaller than this are timer noise, whatever the percentage
+REGRESSION_MIN_SECONDS = 0.05
+
+# Representative sidebar selection for apply_global_filters
+GLOBAL_FILTERS = {
+    'filter_periodos': ['2024 Fall', '2025 Spring', '2025 Fall', '2026 Spring'],
+    'filter_closure_status': 'All Contacts',
+    'filter_lifecycle_stages': ['lead', 'marketingqualifiedlead', 'salesqualifiedlead', 'opportunity', 'customer'],
+}
+
+# Geo configuration applied after the default one (cluster2_geo_change stage)
+GEO_CHANGE_CONFIG = {
+    'home_country': 'Mexico',
+    'home_country_aliases': ['mexico', 'mx', 'mex'],
+    'local_region': 'Jalisco',
+    'local_aliases': ['jalisco', 'jal', 'guadalajara'],
+}
+
+def _quiet_streamlit():
+    """Silence Streamlit's bare-mode warnings (no runtime / no ScriptRunContext)"""
+    import streamlit.logger
+    streamlit.logger.set_log_level("error")
+
+def _uncached(func):
+    """Underlying function of an st.cache_data wrapper, so every run is timed cold"""
+    return getattr(func, '__wrapped__', func)
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def time_stage(stages, name, func, repeat=1):
+    """Run `func` `repeat` times, record the fastest run and return its result"""
+    runs = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        runs.append(time.perf_counter() - start)
+
+    entry = {'seconds': round(min(runs), 4)}
+    if repeat > 1:
+        entry['runs'] = [round(r, 4) for r in runs]
+    if hasattr(result, 'shape'):
+        entry['rows'] = len(result)
+    elif isinstance(result, (bytes, bytearray)):
+        entry['bytes'] = len(result)
+    stages[name] = entry
+
+    if 'rows' in entry:
+        detail = f" → {entry['rows']:,} rows"
+    elif 'bytes' in entry:
+        detail = f" → {entry['bytes'] / 1024:,.0f} KB"
+    else:
+        detail = ""
+    print(f"  {name:<28} {entry['seconds']:>9.2f}s{detail}")
+    return result
+
+def mutate_export(data, delta_rate, seed=42):
+    """Next export of `data`: `delta_rate` of the contacts changed, half as many added, rows reshuffled"""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    changed = rng.choice(len(data), int(len(data) * delta_rate), replace=False)
+    mutated = data.copy()
+    mutated.loc[changed, 'Number of Sessions'] = mutated.loc[changed, 'Number of Sessions'].fillna(0) + 1
+    added = data.sample(int(len(data) * delta_rate / 2), random_state=seed).copy()
+    added['Record ID'] = added['Record ID'] + 10**10
+    return pd.concat([mutated, added]).sample(frac=1, random_state=seed).reset_index(drop=True)
+
+def benchmark_size(n_rows, data_dir, seed=42, repeat=1, skip_xlsx=False, delta_rate=0.0, out_of_core=False):
+    """Time every pipeline stage on an export of `n_rows` contacts"""
+    import streamlit as st
+    from utils import load_data, apply_global_filters
+    from geo_config import DEFAULT_CONFIG
+    from segmentation_core import (
+        build_cluster1_cohort, build_cluster2_cohort, build_cluster3_cohort,
+        build_cluster2_base, apply_geo_config, DeltaState, close_rate_intervals
+    )
+    from cluster1_analysis import create_cluster1_xlsx_export
+    from cluster2_analysis import create_cluster2_xlsx_export
+    from cluster3_analysis import create_cluster3_xlsx_export
+
+    print(f"\n{n_rows:,} contacts")
+    export_path = Path(data_dir) / f"contacts_{n_rows}_seed{seed}.csv"
+    generate_seconds = None
+    if not export_path.exists():
+        start = time.perf_counter()
+        write_export(n_rows, export_path, seed)
+        generate_seconds = round(time.perf_counter() - start, 3)
+        print(f"  generated {export_path} in {generate_seconds:.1f}s")
+
+    stages = {}
+    data = time_stage(stages, 'load_data', lambda: _uncached(load_data)(str(export_path)), repeat)
+    if out_of_core:
+        from out_of_core import stream_export
+        time_stage(stages, 'load_data_out_of_core', lambda: stream_export(str(export_path)), repeat)
+
+    for key, value in GLOBAL_FILTERS.items():
+        st.session_state[key] = value
+    time_stage(stages, 'apply_global_filters', lambda: apply_global_filters(data)[0], repeat)
+
+    geo_config = {k: DEFAULT_CONFIG[k] for k in ('home_country', 'home_country_aliases', 'local_region', 'local_aliases')}
+    # process_clusterN_data returns the cohort kept in the shared dataset store on
+    # repeats, so the builders behind it are timed (stage names kept for baselines)
+    cohorts = {
+        'cluster1': time_stage(stages, 'process_cluster1_data',
+                               lambda: build_cluster1_cohort(data, f"bench_c1_{n_rows}"), repeat),
+        'cluster2': time_stage(stages, 'process_cluster2_data',
+                               lambda: build_cluster2_cohort(data, geo_config, f"bench_c2_{n_rows}"), repeat),
+        'cluster3': time_stage(stages, 'process_cluster3_data',
+                               lambda: build_cluster3_cohort(data, f"bench_c3_{n_rows}"), repeat),
+    }
+
+    # Geo configuration change: only the geo-dependent stages run again on the cached base
+    cluster2_base = build_cluster2_base(data, f"bench_c2_{n_rows}")
+    time_stage(stages, 'cluster2_geo_change',
+               lambda: apply_geo_config(cluster2_base, GEO_CHANGE_CONFIG, f"bench_c2_{n_rows}"), repeat)
+
+    # Automatic k selection for the Cluster 1 engagement segments (k = 3..6)
+    time_stage(stages, 'cluster1_k_sweep',
+               lambda: build_cluster1_cohort(data, f"bench_c1_{n_rows}", k_values=(3, 4, 5, 6)), repeat)
+
+    # Close-rate intervals for every preparatoria (many small groups), both methods
+    for method in ('wilson', 'bootstrap'):
+        time_stage(stages, f'close_rate_ci_{method}',
+                   lambda: close_rate_intervals(cohorts['cluster3'], 'preparatoria', method=method), repeat)
+
+    if delta_rate > 0:
+        # Incremental runs: snapshot from the export, then only the changed contacts
+        next_export = mutate_export(data, delta_rate, seed)
+        builders = {
+            'cluster1': lambda d, delta: build_cluster1_cohort(d, f"bench_c1_{n_rows}", delta=delta),
+            'cluster2': lambda d, delta: build_cluster2_cohort(d, geo_config, f"bench_c2_{n_rows}", delta=delta),
+            'cluster3': lambda d, delta: build_cluster3_cohort(d, f"bench_c3_{n_rows}", delta=delta),
+        }
+        for cluster_name, build in builders.items():
+            seed_state = DeltaState()
+            build(data, seed_state)
+            snapshot = seed_state.snapshot()
+            time_stage(stages, f'{cluster_name}_incremental',
+                       lambda: build(next_export, DeltaState(snapshot)), repeat)
+
+    if not skip_xlsx:
+        exports = {
+            'cluster1': create_cluster1_xlsx_export,
+            'cluster2': create_cluster2_xlsx_export,
+            'cluster3': create_cluster3_xlsx_export,
+        }
+        for cluster_name, export in exports.items():
+            cohort = cohorts[cluster_name]
+            time_stage(stages, f'{cluster_name}_xlsx_export', lambda: export(cohort), repeat)
+
+    result = {'rows': n_rows, 'export_path': str(export_path), 'stages': stages}
+    if delta_rate > 0:
+        result['delta_rate'] = delta_rate
+    if generate_seconds is not None:
+        result['generate_seconds'] = generate_seconds
+    return result
+
+def compare_to_baseline(report, baseline, threshold):
+    """Print per-stage changes against a previous report; returns the regressions"""
+    regressions = []
+    print(f"\nComparison with baseline ({baseline.get('git_commit') or baseline.get('timestamp')}):")
+    for size, result in report['sizes'].items():
+        previous = baseline.get('sizes', {}).get(size)
+        if not previous:
+            continue
+        print(f"  {int(size):,} contacts")
+        for stage, entry in result['stages'].items():
+            before = previous['stages'].get(stage, {}).get('seconds')
+            if not before:
+                continue
+            change = (entry['seconds'] - before) / before * 100
+            slower = change > threshold and entry['seconds'] - before > REGRESSION_MIN_SECONDS
+            flag = "  ⚠️ REGRESSION" if slower else ""
+            print(f"    {stage:<28} {before:>9.2f}s → {entry['seconds']:>9.2f}s ({change:+.0f}%){flag}")
+            if flag:
+                regressions.append({'size': int(size), 'stage': stage, 'before': before,
+                                    'after': entry['seconds'], 'change_pct': round(change, 1)})
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the segmentation pipelines on synthetic exports")
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES,
+                        help="Export sizes in contacts (default: 10000 100000 1000000)")
+    parser.add_argument("--seed", type=int, default=42, help="Generator seed (default: 42)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per stage; the fastest is kept (default: 1)")
+    parser.add_argument("--skip-xlsx", action="store_true", help="Skip the XLSX export stages")
+    parser.add_argument("--delta-rate", type=float, default=0.0,
+                        help="Also time incremental runs on a next export with this share of changed "
+                             "contacts (e.g. 0.02; default: off)")
+    parser.add_argument("--out-of-core", action="store_true",
+                        help="Also time the streamed (out-of-core) load of each export")
+    parser.add_argument("--data-dir", default=str(ROOT_DIR / "data" / "synthetic"),
+                        help="Where generated exports are cached (default: data/synthetic)")
+    parser.add_argument("--output-dir", default="exports/benchmarks",
+                        help="Directory for the JSON results (default: exports/benchmarks)")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=20.0,
+                        help="Slowdown in percent reported as a regression (default: 20)")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="Exit with status 1 when a regression is found")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    _quiet_streamlit()
+    # Sheet-name length warnings from the XLSX exports
+    warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
+
+    import numpy as np
+    import pandas as pd
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'sizes': {},
+    }
+
+    for n_rows in args.sizes:
+        report['sizes'][str(n_rows)] = benchmark_size(
+            n_rows, args.data_dir, seed=args.seed, repeat=args.repeat, skip_xlsx=args.skip_xlsx,
+            delta_rate=args.delta_rate, out_of_core=args.out_of_core
+        )
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.threshold)
+        report['baseline'] = str(args.baseline)
+        report['regressions'] = regressions
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = output_dir / f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nResults → {output_path}")
+
+    if regressions and args.fail_on_regression:
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
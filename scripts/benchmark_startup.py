@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the Streamlit app.
+
+Measures, in a fresh Python process each time (as on a Cloud Run cold start):
+  - import_streamlit: importing Streamlit itself (server-side baseline)
+  - first_render: the first full script run of app/streamlit_app.py
+  - page_<cluster>: first opening of each cluster page (lazy module import + pipeline)
+  - page_campus: first opening of the campus comparison (partitioned store, also without data)
+
+It also lists which heavy libraries were loaded by the first render, so a
+top-level import that undoes the lazy loading shows up immediately.
+
+Usage:
+    python scripts/benchmark_startup.py
+    python scripts/benchmark_startup.py --repeat 5 --data-file data/raw/contacts_campus_Qro_.csv
+    python scripts/benchmark_startup.py --baseline exports/benchmarks/startup_20250101_120000.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+APP_FILE = ROOT_DIR / "app" / "streamlit_app.py"
+
+# Modules that should not be needed before a cluster page is opened
+# (PIL is not listed: plotly imports it, and the overview needs plotly)
+HEAVY_MODULES = ['matplotlib', 'sklearn', 'cluster1_analysis', 'cluster2_analysis', 'cluster3_analysis']
+
+REGRESSION_MIN_SECONDS = 0.05
+
+# Runs inside the child process; prints one JSON line with the timings
+PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+import streamlit
+import streamlit.logger
+streamlit.logger.set_log_level("error")
+from streamlit.testing.v1 import AppTest
+timings = {"import_streamlit": time.perf_counter() - start}
+
+app_file, heavy, open_pages, timeout = sys.argv[1], sys.argv[2].split(","), sys.argv[3] == "1", float(sys.argv[4])
+at = AppTest.from_file(app_file, default_timeout=timeout)
+t = time.perf_counter()
+at.run()
+timings["first_render"] = time.perf_counter() - t
+loaded = [m for m in heavy if m in sys.modules]
+errors = [e.message for e in at.exception]
+
+if open_pages and not errors:
+    nav = [r for r in at.radio if r.label.startswith("Seleccionar Estrategia")]
+    if nav:
+        for index, option in enumerate(nav[0].options[1:], start=1):
+            t = time.perf_counter()
+            nav[0].set_value(option).run()
+            timings["page_campus" if option.startswith("🏫") else f"page_cluster{index}"] = time.perf_counter() - t
+            errors += [e.message for e in at.exception]
+            nav = [r for r in at.radio if r.label.startswith("Seleccionar Estrategia")]
+
+print(json.dumps({"timings": timings, "loaded_at_first_render": loaded, "errors": errors}))
+'''
+
+def run_probe(cwd, open_pages, timeout):
+    """Run the probe in a new interpreter; returns its JSON result plus the process wall time"""
+    import time
+
+    env = dict(os.environ, PYTHONPATH=str(APP_FILE.parent), PIPELINE_LOG_JSON="0")
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE, str(APP_FILE), ",".join(HEAVY_MODULES), "1" if open_pages else "0", str(timeout)],
+        cwd=cwd, env=env, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+    lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"Startup probe failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(lines[-1])
+    result["timings"]["process_wall"] = wall
+    return result
+
+def summarize(runs):
+    """Median and min seconds per measurement across runs"""
+    names = sorted({name for run in runs for name in run["timings"]})
+    summary = {}
+    for name in names:
+        values = [run["timings"][name] for run in runs if name in run["timings"]]
+        summary[name] = {
+            'median': round(statistics.median(values), 4),
+            'min': round(min(values), 4),
+            'runs': [round(v, 4) for v in values],
+        }
+    return summary
+
+def compare_to_baseline(summary, baseline, threshold):
+    """Print median changes against a previous startup report; returns the regressions"""
+    regressions = []
+    print(f"\nComparison with baseline ({baseline.get('git_commit') or baseline.get('timestamp')}):")
+    for name, entry in summary.items():
+        before = baseline.get('summary', {}).get(name, {}).get('median')
+        if not before:
+            continue
+        after = entry['median']
+        change = (after - before) / before * 100
+        slower = change > threshold and after - before > REGRESSION_MIN_SECONDS
+        flag = "  ⚠️ REGRESSION" if slower else ""
+        print(f"  {name:<20} {before:>8.2f}s → {after:>8.2f}s ({change:+.0f}%){flag}")
+        if slower:
+            regressions.append({'measure': name, 'before': before, 'after': after, 'change_pct': round(change, 1)})
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the cold start time of the Streamlit app")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh processes to run (default: 3)")
+    parser.add_argument("--data-file", help="CSV served as the default data file, so the first render loads it "
+                                            "and the cluster pages can be opened (default: no data)")
+    parser.add_argument("--skip-pages", action="store_true", help="Only measure the first render")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds allowed per script run (default: 600)")
+    parser.add_argument("--output-dir", default="exports/benchmarks",
+                        help="Directory for the JSON results (default: exports/benchmarks)")
+    parser.add_argument("--baseline", help="Previous startup results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=20.0,
+                        help="Slowdown in percent reported as a regression (default: 20)")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="Exit with status 1 when a regression is found")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    from benchmark_pipelines import _git_commit
+
+    runs = []
+    with tempfile.TemporaryDirectory() as cwd:
+        # load_data falls back to ./contacts_campus_Qro_.csv when data/raw has no export
+        if args.data_file:
+            os.symlink(Path(args.data_file).resolve(), Path(cwd) / "contacts_campus_Qro_.csv")
+        for i in range(args.repeat):
+            result = run_probe(cwd, open_pages=not args.skip_pages, timeout=args.timeout)
+            runs.append(result)
+            timings = ", ".join(f"{k} {v:.2f}s" for k, v in result["timings"].items())
+            print(f"run {i + 1}: {timings}")
+            if result["errors"]:
+                print(f"  errors: {result['errors'][:3]}")
+
+    summary = summarize(runs)
+    loaded = sorted({m for run in runs for m in run["loaded_at_first_render"]})
+    print("\nMedian:")
+    for name, entry in summary.items():
+        print(f"  {name:<20} {entry['median']:>8.2f}s")
+    if loaded:
+        print(f"\n⚠️ Loaded before any cluster page was opened: {', '.join(loaded)}")
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'data_file': args.data_file,
+        'repeat': args.repeat,
+        'summary': summary,
+        'loaded_at_first_render': loaded,
+        'errors': sorted({e for run in runs for e in run["errors"]}),
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(summary, baseline, args.threshold)
+        report['baseline'] = str(args.baseline)
+        report['regressions'] = regressions
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = output_dir / f"startup_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nResults → {output_path}")
+
+    if regressions and args.fail_on_regression:
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
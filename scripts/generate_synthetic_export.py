@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Synthetic HubSpot export generator.
+
+Writes a contacts CSV with the columns the app expects (see
+docs/technical/COLUMN_REFERENCE.md): '//'-delimited property histories,
+millisecond-epoch dates, platform keywords in the source fields, APREU
+activity histories, Mexican state spelling variants and periodo codes.
+The same seed always produces the same file.
+
+Usage:
+    python scripts/generate_synthetic_export.py 100000 data/synthetic/contacts_100k.csv
+    python scripts/generate_synthetic_export.py 1000000 contacts_1m.csv --seed 7
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DAY_MS = 86_400_000
+
+PROPIEDAD = ['APREU', 'APREU', 'APREU', 'Admisiones', 'Posgrado', '']
+LIFECYCLE_PATH = ['subscriber', 'lead', 'marketingqualifiedlead', 'salesqualifiedlead', 'opportunity', 'customer']
+
+ORIGINAL_SOURCES = ['PAID_SOCIAL', 'PAID_SOCIAL', 'PAID_SEARCH', 'ORGANIC_SEARCH', 'SOCIAL_MEDIA',
+                    'DIRECT_TRAFFIC', 'OFFLINE', 'REFERRALS', 'EMAIL_MARKETING']
+DRILL_DOWN_1 = ['Facebook', 'Instagram', 'facebook ads', 'instagram ads', 'TikTok', 'google ads', 'cpc',
+                'YouTube', 'LinkedIn', 'Eventbrite', 'WhatsApp', 'IMPORT', 'API', 'CRM_UI', 'INTEGRATION']
+DRILL_DOWN_2 = ['Facebook Lead Ads', 'meta ads', 'ig ads', 'tiktok ads', 'adwords', 'paid_search',
+                'make.com', 'AtomChat', 'wa.me', 'evbuc.com', 'offline', 'campaña licenciaturas', '']
+CANAL = ['Facebook', 'Instagram', 'TikTok', 'Google Ads', 'WhatsApp', 'Sitio web', 'Feria', 'Evento', 'Referido']
+REFERRERS = ['https://www.facebook.com/', 'https://l.instagram.com/', 'https://www.youtube.com/',
+             'https://www.google.com/', 'https://wa.me/', 'https://www.tiktok.com/', 'https://t.co/',
+             'https://www.eventbrite.com.mx/', 'https://www.anahuac.mx/queretaro', '']
+
+COUNTRIES = ['Mexico', 'México', 'mexico', 'MX', 'United States', 'Estados Unidos', 'USA',
+             'Colombia', 'España', 'Guatemala', '']
+COUNTRY_WEIGHTS = [0.3, 0.2, 0.1, 0.05, 0.05, 0.03, 0.02, 0.03, 0.02, 0.02, 0.18]
+STATES = ['Querétaro', 'Queretaro', 'Qro', 'QRO.', 'Santiago de Querétaro', 'Guanajuato', 'Gto',
+          'Jalisco', 'Jal', 'CDMX', 'Ciudad de México', 'Edo. Mex.', 'Estado de México', 'Michoacán',
+          'Hidalgo', 'San Luis Potosí', 'SLP', 'Nuevo León', 'NL', 'Puebla', 'Texas', 'California', '']
+STATE_WEIGHTS = [0.14, 0.1, 0.05, 0.02, 0.03, 0.07, 0.02, 0.04, 0.01, 0.05, 0.03, 0.02, 0.03, 0.04,
+                 0.04, 0.03, 0.01, 0.03, 0.01, 0.02, 0.02, 0.01, 0.18]
+CITIES = ['Querétaro', 'Santiago de Querétaro', 'San Juan del Río', 'Celaya', 'León', 'Guadalajara',
+          'Ciudad de México', 'Morelia', 'Monterrey', 'Houston', '']
+PREP_COUNTRIES = ['México', 'Mexico', 'Estados Unidos de América', 'USA', 'Colombia', '']
+PREPAS = ['Colegio Álamos', 'Instituto Queretano San Javier', 'Prepa Tec Campus Querétaro',
+          'Colegio Inglés', 'CBTis 118', 'Instituto Asunción', 'Liceo del Valle', 'Colegio Salesiano']
+PREP_YEARS = ['1', '2', '3', 'Primer año', 'Segundo año', 'Tercer año', 'Egresado']
+
+APREU_ACTIVITIES = ['Open Day', 'Fogatada', 'TDLA', 'Gira Panamá', 'Feria universitaria', 'Expo',
+                    'Sitio web', 'Formulario RUA', 'Landing page', 'WhatsApp', 'Llamada', 'Mensaje directo',
+                    'Lion Leaders', 'Beca', 'Referido', 'Embajador', 'Webinar', 'Visita campus']
+CONVERSIONS = ['Formulario RUA', 'Solicitud de informes: Sitio web', 'Registro Open Day',
+               'Registro Fogatada', 'WhatsApp Chat', 'Facebook Lead Ads', 'Landing page Becas', 'Webinar']
+
+# YYYY + semester code (05 especial, 10 primavera, 35 verano, 60 otoño, 75 invierno)
+PERIODO_CODES = ['05', '10', '35', '60', '75']
+PERIODO_WEIGHTS = [0.03, 0.3, 0.07, 0.55, 0.05]
+
+def _history(rng, options, n, max_len=3, empty_rate=0.0, weights=None):
+    """'//'-delimited history strings of 1..max_len values (optionally some empty)"""
+    parts = rng.choice(np.array(options, dtype=object), size=(n, max_len), p=weights)
+    lengths = rng.integers(1, max_len + 1, n)
+    values = parts[:, 0].copy()
+    for j in range(1, max_len):
+        values = np.where(lengths > j, values + '//' + parts[:, j], values)
+    if empty_rate:
+        values = np.where(rng.random(n) < empty_rate, '', values)
+    return values
+
+def _lifecycle(rng, n):
+    """Lifecycle histories that move forward through the funnel, some ending in 'other'"""
+    last = rng.choice(len(LIFECYCLE_PATH), n, p=[0.12, 0.38, 0.22, 0.1, 0.1, 0.08])
+    first = np.minimum(last, rng.integers(0, 3, n))
+    path = np.array(LIFECYCLE_PATH, dtype=object)
+    values = path[first]
+    for step in range(1, len(LIFECYCLE_PATH)):
+        values = np.where(first + step <= last, values + '//' + path[np.minimum(first + step, last)], values)
+    return np.where(rng.random(n) < 0.04, values + '//other', values)
+
+def _counts(rng, n, mean, zero_rate):
+    """Skewed non-negative counts with a share of exact zeros"""
+    values = rng.negative_binomial(1, 1 / (1 + mean), n)
+    return np.where(rng.random(n) < zero_rate, 0, values)
+
+def generate_export(n_rows, seed=42):
+    """Return a synthetic HubSpot contacts export with `n_rows` rows"""
+    rng = np.random.default_rng(seed)
+    n = n_rows
+
+    start = pd.Timestamp('2022-08-01').value // 10**6
+    create = start + rng.integers(0, 900 * DAY_MS, n)
+    is_closed = rng.random(n) < 0.22
+    # A few close dates fall before the create date, as in real exports
+    close = np.where(is_closed, create + rng.integers(-10 * DAY_MS, 300 * DAY_MS, n), np.nan)
+    first_conversion = create + rng.integers(0, 5 * DAY_MS, n)
+    recent_conversion = first_conversion + rng.integers(0, 200 * DAY_MS, n)
+
+    years = rng.integers(2023, 2027, n).astype(str).astype(object)
+    periodo = years + rng.choice(np.array(PERIODO_CODES, dtype=object), n, p=PERIODO_WEIGHTS)
+    periodo = np.where(rng.random(n) < 0.1, periodo + '//' + years + '60', periodo)
+    periodo = np.where(rng.random(n) < 0.15, '', periodo)
+
+    likelihood = rng.beta(1.2, 6, n).round(4)
+    # Some portals export the score as a percentage
+    likelihood = np.where(rng.random(n) < 0.1, (likelihood * 100).round(2), likelihood)
+
+    df = pd.DataFrame({
+        'Record ID': rng.permutation(n) + 100_000_000,
+        'Broadcast Clicks': _counts(rng, n, 1.5, 0.7),
+        'LinkedIn Clicks': _counts(rng, n, 0.6, 0.9),
+        'Twitter Clicks': _counts(rng, n, 0.4, 0.93),
+        'Facebook Clicks': _counts(rng, n, 2.0, 0.65),
+        'Number of Sessions': _counts(rng, n, 6, 0.1),
+        'Number of Pageviews': _counts(rng, n, 18, 0.1),
+        'Number of Form Submissions': _counts(rng, n, 1.5, 0.25),
+        'Original Source': _history(rng, ORIGINAL_SOURCES, n, 2),
+        'Original Source Drill-Down 1': _history(rng, DRILL_DOWN_1, n, 2, empty_rate=0.1),
+        'Original Source Drill-Down 2': _history(rng, DRILL_DOWN_2, n, 2, empty_rate=0.3),
+        'Canal de adquisición': _history(rng, CANAL, n, 2, empty_rate=0.4),
+        'Latest Traffic Source': _history(rng, ORIGINAL_SOURCES, n, 3),
+        'Last Referring Site': _history(rng, REFERRERS, n, 2, empty_rate=0.2),
+        'Likelihood to close': likelihood,
+        'Create Date': create,
+        'Close Date': close,
+        'Lifecycle Stage': _lifecycle(rng, n),
+        'Propiedad del contacto': _history(rng, PROPIEDAD, n, 1),
+        'IP Country': rng.choice(COUNTRIES, n, p=COUNTRY_WEIGHTS),
+        'IP State/Region': rng.choice(STATES, n, p=STATE_WEIGHTS),
+        'Ciudad preparatoria BPM': rng.choice(CITIES, n),
+        'Preparatoria BPM': _history(rng, PREPAS, n, 1, empty_rate=0.5),
+        'Estado de preparatoria BPM': rng.choice(STATES, n, p=STATE_WEIGHTS),
+        'Estado de procedencia': _history(rng, STATES, n, 2, weights=STATE_WEIGHTS),
+        'País preparatoria BPM': rng.choice(PREP_COUNTRIES, n, p=[0.45, 0.2, 0.04, 0.03, 0.03, 0.25]),
+        'Periodo de ingreso a licenciatura (MQL)': periodo,
+        'Actividades de promoción APREU': _history(rng, APREU_ACTIVITIES, n, 5, empty_rate=0.3),
+        'First Conversion': _history(rng, CONVERSIONS, n, 1, empty_rate=0.1),
+        'First Conversion Date': first_conversion,
+        'Recent Conversion': _history(rng, CONVERSIONS, n, 1, empty_rate=0.1),
+        'Recent Conversion Date': recent_conversion,
+        '¿Cuál es el nombre de tu preparatoria?': _history(rng, PREPAS, n, 1, empty_rate=0.6),
+        'Preparatoria donde estudia': _history(rng, PREPAS, n, 1, empty_rate=0.7),
+        '¿Qué año de preparatoria estás cursando?': _history(rng, PREP_YEARS, n, 1, empty_rate=0.4),
+        'Marketing emails delivered': _counts(rng, n, 12, 0.15),
+    })
+    df['Marketing emails opened'] = (df['Marketing emails delivered'] * rng.beta(2, 4, n)).astype(int)
+    df['Marketing emails clicked'] = (df['Marketing emails opened'] * rng.beta(1, 6, n)).astype(int)
+
+    # Empty strings are missing values in a HubSpot CSV
+    return df.replace('', np.nan)
+
+def write_export(n_rows, path, seed=42):
+    """Generate an export and write it as CSV; returns the path"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    generate_export(n_rows, seed).to_csv(path, index=False)
+    return path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic HubSpot contacts export")
+    parser.add_argument("rows", type=int, help="Number of contacts")
+    parser.add_argument("output", help="Output CSV path")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    path = write_export(args.rows, args.output, args.seed)
+    print(f"{args.rows:,} contacts → {path} ({time.perf_counter() - start:.1f}s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
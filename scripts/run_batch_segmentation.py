@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Headless batch runner for the three segmentations.
+
+Runs Cluster 1, 2 and 3 over a HubSpot export without the Streamlit UI,
+one cluster per worker process, and writes segment assignments and summary
+tables as Parquet. Only segmentation_core and the Streamlit-free app modules
+(out_of_core, pipeline_metrics) are imported, never Streamlit itself.
+
+Usage:
+    python scripts/run_batch_segmentation.py data/raw/contacts_campus_Qro_.csv --output-dir exports/batch
+    python scripts/run_batch_segmentation.py export.csv --geo-preset "USA (California)"
+    python scripts/run_batch_segmentation.py export.csv --geo-config geo.json --clusters 1 2
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+sys.path.insert(0, str(APP_DIR))
+
+# Segment column and extra columns written to <cluster>_segments.parquet
+CLUSTER_OUTPUTS = {
+    'cluster1': ('segment_engagement', ['cluster', 'platform_tag', 'segment_overlay', 'engagement_score', 'social_intensity']),
+    'cluster2': ('segment_c2', ['geo_tier', 'segment_c2_action', 'is_high_engager', 'engagement_score', 'country_any', 'state_any']),
+    'cluster3': ('segment_c3', ['entry_channel', 'action_tag', 'preparatoria', 'engagement_score', 'email_engagement_score']),
+}
+
+# Dataset shared with forked workers (set in the parent before the pool starts)
+_DATA = None
+
+def build_geo_config(args):
+    """Build the geo configuration dict from CLI arguments"""
+    from segmentation_core import DEFAULT_CONFIG, EXAMPLE_CONFIGS
+
+    def split_aliases(value):
+        return [a.strip().lower() for a in value.split(',') if a.strip()]
+
+    config = {
+        'home_country': DEFAULT_CONFIG['home_country'],
+        'home_country_aliases': list(DEFAULT_CONFIG['home_country_aliases']),
+        'local_region': DEFAULT_CONFIG['local_region'],
+        'local_aliases': list(DEFAULT_CONFIG['local_aliases']),
+    }
+
+    if args.geo_preset:
+        if args.geo_preset not in EXAMPLE_CONFIGS:
+            raise SystemExit(f"Unknown geo preset '{args.geo_preset}'. Options: {', '.join(EXAMPLE_CONFIGS)}")
+        preset = EXAMPLE_CONFIGS[args.geo_preset]
+        config.update({
+            'home_country': preset['home_country'],
+            'home_country_aliases': split_aliases(preset['home_aliases']),
+            'local_region': preset['local_region'],
+            'local_aliases': split_aliases(preset['local_aliases']),
+        })
+
+    if args.geo_config:
+        with open(args.geo_config, encoding='utf-8') as f:
+            overrides = json.load(f)
+        for key in ('home_country_aliases', 'local_aliases'):
+            if isinstance(overrides.get(key), str):
+                overrides[key] = split_aliases(overrides[key])
+        config.update({k: v for k, v in overrides.items() if k in config})
+
+    if args.home_country:
+        config['home_country'] = args.home_country
+    if args.home_aliases:
+        config['home_country_aliases'] = split_aliases(args.home_aliases)
+    if args.local_region:
+        config['local_region'] = args.local_region
+    if args.local_aliases:
+        config['local_aliases'] = split_aliases(args.local_aliases)
+
+    return config
+
+def summarize_cohort(cohort, segment_col):
+    """Per-segment KPIs (counts, engagement, close rate) for the summary table"""
+    from segmentation_core import group_kpis
+
+    summary = group_kpis(
+        cohort, segment_col,
+        ['num_sessions', 'engagement_score', 'days_to_close'],
+        stats=('mean', 'median')
+    )
+    return summary.reset_index()
+
+def timed_stages(run_key):
+    """Stages PipelineTimer recorded under `run_key` (every pipeline of the run, oldest first)"""
+    from pipeline_metrics import get_timed_runs
+
+    return [
+        {'pipeline': run['pipeline'], 'stage': stage['stage'], 'seconds': stage['seconds'], 'rows_out': stage['rows_out']}
+        for run in reversed(get_timed_runs()) if run['run_key'] == str(run_key)
+        for stage in run['stages'] + ([run['total']] if 'total' in run else [])
+    ]
+
+def format_stages(stages):
+    """One-line rendering of timed_stages() for the console"""
+    return ", ".join(f"{s['pipeline']}.{s['stage']} {s['seconds']:.2f}s" for s in stages)
+
+def cluster_outputs(cluster_name, data, geo_config, cache_key):
+    """
+    Run one cluster pipeline; returns (segments, summary or None, funnel
+    counts, timings, pipeline stages)
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    from segmentation_core import build_cluster1_cohort, build_cluster2_cohort, build_cluster3_cohort
+    timings['import'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if cluster_name == 'cluster1':
+        cohort = build_cluster1_cohort(data, funnel_key=cache_key)
+    elif cluster_name == 'cluster2':
+        cohort = build_cluster2_cohort(data, geo_config, funnel_key=cache_key)
+    else:
+        cohort = build_cluster3_cohort(data, funnel_key=cache_key)
+    timings['process'] = time.perf_counter() - start
+
+    from pipeline_metrics import get_funnel_counts
+    funnel = get_funnel_counts(cache_key)
+
+    segment_col, extra_cols = CLUSTER_OUTPUTS[cluster_name]
+
+    start = time.perf_counter()
+    summary = summarize_cohort(cohort, segment_col) if len(cohort) > 0 else None
+    timings['summarize'] = time.perf_counter() - start
+
+    out_cols = ['contact_id', segment_col] + [c for c in extra_cols if c in cohort.columns]
+    out_cols = [c for c in out_cols if c in cohort.columns]
+    return cohort[out_cols], summary, funnel, timings, timed_stages(cache_key)
+
+def run_cluster(cluster_name, geo_config, output_dir, data=None):
+    """Run one cluster pipeline and write its Parquet outputs; returns stage timings"""
+    data = _DATA if data is None else data
+    segments, summary, funnel, timings, stages = cluster_outputs(cluster_name, data, geo_config, f"batch_{cluster_name}")
+
+    start = time.perf_counter()
+    segments.to_parquet(output_dir / f"{cluster_name}_segments.parquet", index=False)
+    if summary is not None:
+        summary.to_parquet(output_dir / f"{cluster_name}_summary.parquet", index=False)
+    timings['write'] = time.perf_counter() - start
+
+    return {
+        'cluster': cluster_name,
+        'contacts': len(segments),
+        'funnel': funnel,
+        'timings': {k: round(v, 3) for k, v in timings.items()},
+        'stages': stages,
+    }
+
+def _init_worker(data):
+    """Pool initializer for start methods that cannot share memory with the parent"""
+    global _DATA
+    _DATA = data
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the APREU segmentations without Streamlit")
+    parser.add_argument("export_path", help="HubSpot contacts export (CSV)")
+    parser.add_argument("--output-dir", default="exports/batch", help="Directory for Parquet outputs (default: exports/batch)")
+    parser.add_argument("--clusters", nargs="+", choices=["1", "2", "3"], default=["1", "2", "3"],
+                        help="Clusters to run (default: all)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per cluster, up to CPU count)")
+    parser.add_argument("--geo-preset", help="Preset from geo_config.EXAMPLE_CONFIGS, e.g. 'USA (California)'")
+    parser.add_argument("--geo-config", help="JSON file with home_country, home_country_aliases, local_region, local_aliases")
+    parser.add_argument("--home-country", help="Home country name")
+    parser.add_argument("--home-aliases", help="Comma-separated home country aliases")
+    parser.add_argument("--local-region", help="Local region name")
+    parser.add_argument("--local-aliases", help="Comma-separated local region aliases")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    global _DATA
+    args = parse_args(argv)
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    geo_config = build_geo_config(args)
+    clusters = [f"cluster{c}" for c in args.clusters]
+
+    from out_of_core import load_export
+
+    run_start = time.perf_counter()
+    start = time.perf_counter()
+    _DATA = load_export(args.export_path, "batch_load")
+    load_seconds = time.perf_counter() - start
+    load_stages = timed_stages("batch_load")
+    print(f"load_data: {len(_DATA):,} contacts in {load_seconds:.2f}s | {format_stages(load_stages)}")
+
+    workers = args.workers or min(len(clusters), os.cpu_count() or 1)
+    results = []
+
+    # Share the CPUs between cluster workers and the row-level partitions inside each
+    # (module attribute for forked workers, environment for spawned ones)
+    if workers > 1 and not os.environ.get("PARTITION_WORKERS"):
+        from segmentation_core import partition
+        partition.PARTITION_WORKERS = max(1, (os.cpu_count() or 1) // workers)
+        os.environ["PARTITION_WORKERS"] = str(partition.PARTITION_WORKERS)
+
+    if workers <= 1:
+        for cluster_name in clusters:
+            results.append(run_cluster(cluster_name, geo_config, output_dir))
+    else:
+        # Forked workers inherit the loaded frame copy-on-write; other start
+        # methods receive it once per worker through the initializer
+        if 'fork' in multiprocessing.get_all_start_methods():
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(_DATA,))
+        with pool:
+            futures = [pool.submit(run_cluster, name, geo_config, output_dir) for name in clusters]
+            results = [f.result() for f in futures]
+
+    for result in results:
+        stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in result['timings'].items())
+        print(f"{result['cluster']}: {result['contacts']:,} contacts | {stages}")
+        print(f"  {format_stages(result['stages'])}")
+
+    report = {
+        'export_path': str(args.export_path),
+        'contacts': len(_DATA),
+        'geo_config': geo_config,
+        'load_seconds': round(load_seconds, 3),
+        'load_stages': load_stages,
+        'total_seconds': round(time.perf_counter() - run_start, 3),
+        'clusters': results,
+    }
+    with open(output_dir / "run_summary.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"Total: {report['total_seconds']:.2f}s → {output_dir}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Multi-campus batch runner.
+
+Runs Cluster 1, 2 and 3 over the export of every campus listed in a manifest,
+each campus with its own local region, one campus per worker process. Cohorts
+and aggregates are written partitioned by campus (see app/campus_store.py),
+which the app's "🏫 Comparación de Campus" page reads.
+
+Usage:
+    python scripts/run_campus_segmentation.py campuses.json
+    python scripts/run_campus_segmentation.py campuses.json --campuses Qro Gdl --workers 2
+    python scripts/run_campus_segmentation.py campuses.json --output-dir exports/campus --clusters 2
+
+Manifest:
+    {
+      "home_country": "Mexico",
+      "home_country_aliases": ["mexico", "mx", "mex"],
+      "campuses": [
+        {"campus": "Qro", "export_path": "data/raw/contacts_campus_Qro_.csv",
+         "local_region": "Querétaro", "local_aliases": "queretaro, qro"},
+        {"campus": "Gdl", "export_path": "data/raw/contacts_campus_Gdl_.csv",
+         "local_region": "Jalisco", "local_aliases": ["jalisco", "guadalajara", "gdl"]}
+      ]
+    }
+
+Top-level geo keys apply to every campus; a campus can override them or use a
+"geo_preset" from geo_config.EXAMPLE_CONFIGS. Export paths are relative to
+the manifest.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+sys.path.insert(0, str(APP_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from run_batch_segmentation import build_geo_config, cluster_outputs, timed_stages, format_stages, CLUSTER_OUTPUTS
+
+GEO_KEYS = ('home_country', 'home_country_aliases', 'local_region', 'local_aliases')
+
+def campus_geo_config(entry, defaults):
+    """Geo configuration of one campus: manifest defaults, then its preset, then its own keys"""
+    geo = {**{k: defaults[k] for k in GEO_KEYS if k in defaults}, **{k: entry[k] for k in GEO_KEYS if k in entry}}
+
+    def aliases(value):
+        return ', '.join(value) if isinstance(value, list) else value
+
+    return build_geo_config(Namespace(
+        geo_preset=entry.get('geo_preset', defaults.get('geo_preset')),
+        geo_config=None,
+        home_country=geo.get('home_country'),
+        home_aliases=aliases(geo.get('home_country_aliases')),
+        local_region=geo.get('local_region'),
+        local_aliases=aliases(geo.get('local_aliases')),
+    ))
+
+def load_manifest(path, only=None):
+    """Campus entries of the manifest (campus, export_path, geo_config), optionally a subset"""
+    manifest_path = Path(path)
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    entries = []
+    for entry in manifest.get('campuses', []):
+        if only and entry['campus'] not in only:
+            continue
+        export_path = Path(entry['export_path'])
+        if not export_path.is_absolute():
+            export_path = manifest_path.parent / export_path
+        entries.append({
+            'campus': entry['campus'],
+            'export_path': str(export_path),
+            'geo_config': campus_geo_config(entry, manifest),
+        })
+    if only:
+        missing = set(only) - {e['campus'] for e in entries}
+        if missing:
+            raise SystemExit(f"Campus not in manifest: {', '.join(sorted(missing))}")
+    if not entries:
+        raise SystemExit("The manifest lists no campuses")
+    return entries
+
+def run_campus(campus, export_path, geo_config, clusters, output_dir):
+    """Load one campus export, run the clusters and write its partitions; returns its run summary"""
+    import pandas as pd
+    import campus_store
+    from out_of_core import load_export
+
+    run_start = time.perf_counter()
+    start = time.perf_counter()
+    data = load_export(export_path, f"campus_{campus}_load")
+    load_seconds = time.perf_counter() - start
+
+    results = []
+    funnel_rows = []
+    for cluster_name in clusters:
+        segments, summary, funnel, timings, stages = cluster_outputs(
+            cluster_name, data, geo_config, f"campus_{campus}_{cluster_name}"
+        )
+
+        start = time.perf_counter()
+        campus_store.write_partition(output_dir, "segments", segments, campus, cluster_name)
+        if summary is not None:
+            # One segment column name for every cluster, so campuses and clusters stack
+            summary = summary.rename(columns={CLUSTER_OUTPUTS[cluster_name][0]: 'segment'})
+            campus_store.write_partition(output_dir, "summary", summary, campus, cluster_name)
+        timings['write'] = time.perf_counter() - start
+
+        funnel_rows += [{'cluster': cluster_name, 'stage': stage, 'count': int(count)} for stage, count in funnel.items()]
+        results.append({
+            'cluster': cluster_name,
+            'contacts': len(segments),
+            'funnel': funnel,
+            'timings': {k: round(v, 3) for k, v in timings.items()},
+            'stages': stages,
+        })
+        # Only this campus' export and the current cohort are held by the worker
+        del segments, summary
+
+    campus_store.write_partition(output_dir, "funnel", pd.DataFrame(funnel_rows, columns=['cluster', 'stage', 'count']), campus)
+    meta = {
+        'export_path': str(export_path),
+        'contacts': len(data),
+        'geo_config': geo_config,
+        'load_seconds': round(load_seconds, 3),
+        'load_stages': timed_stages(f"campus_{campus}_load"),
+        'total_seconds': round(time.perf_counter() - run_start, 3),
+        'clusters': results,
+    }
+    campus_store.write_campus_meta(output_dir, campus, meta)
+    return {'campus': campus, **meta}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the APREU segmentations for every campus export")
+    parser.add_argument("manifest", help="JSON manifest with the campus exports and their local regions")
+    parser.add_argument("--output-dir", default=None,
+                        help="Root of the partitioned output (default: CAMPUS_OUTPUT_DIR, exports/campus)")
+    parser.add_argument("--campuses", nargs="+", help="Run only these campuses of the manifest")
+    parser.add_argument("--clusters", nargs="+", choices=["1", "2", "3"], default=["1", "2", "3"],
+                        help="Clusters to run (default: all)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Campuses processed at once, one per worker process (default: up to CPU count)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    import campus_store
+    from segmentation_core import partition
+    import out_of_core
+
+    output_dir = Path(args.output_dir or campus_store.CAMPUS_OUTPUT_DIR)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    entries = load_manifest(args.manifest, args.campuses)
+    clusters = [f"cluster{c}" for c in args.clusters]
+
+    workers = max(1, min(args.workers or os.cpu_count() or 1, len(entries)))
+    if workers > 1:
+        # Campus workers share the CPUs and the memory budget (module attributes
+        # for forked workers, environment for spawned ones)
+        if not os.environ.get("PARTITION_WORKERS"):
+            partition.PARTITION_WORKERS = max(1, (os.cpu_count() or 1) // workers)
+            os.environ["PARTITION_WORKERS"] = str(partition.PARTITION_WORKERS)
+        budget = out_of_core.memory_budget_mb()
+        if budget and not os.environ.get("MEMORY_BUDGET_MB"):
+            out_of_core.MEMORY_BUDGET_MB = max(1, int(budget / workers))
+            os.environ["MEMORY_BUDGET_MB"] = str(out_of_core.MEMORY_BUDGET_MB)
+
+    run_start = time.perf_counter()
+    jobs = [(e['campus'], e['export_path'], e['geo_config'], clusters, output_dir) for e in entries]
+    if workers == 1:
+        results = [run_campus(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_campus, *job) for job in jobs]
+            results = [f.result() for f in futures]
+
+    for result in results:
+        print(f"{result['campus']} ({result['geo_config']['local_region']}): "
+              f"{result['contacts']:,} contacts in {result['total_seconds']:.2f}s")
+        for cluster in result['clusters']:
+            stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in cluster['timings'].items())
+            print(f"  {cluster['cluster']}: {cluster['contacts']:,} contacts | {stages}")
+            print(f"    {format_stages(cluster['stages'])}")
+
+    report = {
+        'manifest': str(args.manifest),
+        'workers': workers,
+        'total_seconds': round(time.perf_counter() - run_start, 3),
+        'campuses': [{k: r[k] for k in ('campus', 'contacts', 'total_seconds')} for r in results],
+    }
+    with open(output_dir / "run_summary.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"Total: {report['total_seconds']:.2f}s → {output_dir}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())